@@ -8,6 +8,13 @@ Run scripts using:
 
 and it will use the package directory to store all user files, will fix up
 search paths so the package does not need to be installed, etc.
+
+Scripts can also be run by a resident runner (scripts/maintenance/runner.py),
+which saves the time to start Pywikibot:
+
+    python pwb.py -runner:<socket> <name_of_script> <options>
+
+If no runner is listening on the socket, the script is run directly.
 """
 # (C) Pywikibot team, 2015-2018
 #
@@ -52,6 +59,85 @@ if not python_is_supported():
     print(versions_required_message % sys.version)
     sys.exit(1)
 
+
+def _receive_status(sock):
+    """Receive a signed integer from the runner or None if it closed."""
+    import struct
+    data = b''
+    while len(data) < 4:
+        chunk = sock.recv(4 - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return struct.unpack('!i', data)[0]
+
+
+def run_by_runner(path, argv):
+    """Run a script by the runner listening on the socket.
+
+    The protocol is described in pywikibot.runner, which isn't imported to
+    not load pywikibot in this process.
+
+    @param path: The path of the Unix socket of the runner
+    @param argv: The script and its arguments
+    @return: The exit status of the script or None if no runner is available
+    """
+    import array
+    import json
+    import signal
+    import socket
+    import struct
+
+    if not hasattr(socket.socket, 'sendmsg'):
+        print('The runner requires Python 3.3+ on a Unix system; running '
+              'the script directly.', file=sys.stderr)
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error as e:
+        print('No runner available on {0} ({1}); running the script '
+              'directly.'.format(path, e), file=sys.stderr)
+        sock.close()
+        return None
+
+    request = json.dumps({'argv': argv, 'cwd': os.getcwd(),
+                          'env': dict(os.environ)}).encode('utf-8')
+    data = struct.pack('!I', len(request)) + request
+    sys.stdout.flush()
+    sys.stderr.flush()
+    sent = sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                                  array.array('i', [0, 1, 2]))])
+    sock.sendall(data[sent:])
+
+    pid = status = None
+    while status is None:
+        try:
+            if pid is None:
+                pid = _receive_status(sock)
+                if pid is None:
+                    break
+            else:
+                status = _receive_status(sock)
+                if status is None:
+                    break
+        except KeyboardInterrupt:
+            if pid is None:
+                raise
+            os.kill(pid, signal.SIGINT)
+    sock.close()
+    if status is None:
+        print('The runner closed the connection.', file=sys.stderr)
+        return 1
+    return status
+
+
+if len(sys.argv) > 1 and sys.argv[1].startswith('-runner:'):
+    _status = run_by_runner(sys.argv[1][len('-runner:'):], sys.argv[2:])
+    if _status is not None:
+        sys.exit(_status)
+    del sys.argv[1]
+
 pwb = None
 
 
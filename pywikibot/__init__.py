@@ -45,8 +45,6 @@ from pywikibot.bot import (
 from pywikibot.bot_choice import (
     QuitKeyboardInterrupt as _QuitKeyboardInterrupt,
 )
-from pywikibot.data.api import UploadWarning as _UploadWarning
-from pywikibot.diff import PatchManager
 from pywikibot.exceptions import (
     Error, InvalidTitle, BadTitle, NoPage, NoMoveTarget, SectionError,
     SiteDefinitionError, NoSuchSite, UnknownSite, UnknownFamily,
@@ -64,12 +62,12 @@ from pywikibot.exceptions import (
 )
 from pywikibot.family import Family
 from pywikibot.i18n import translate
-from pywikibot.site import BaseSite
 from pywikibot.tools import (
     # __ to avoid conflict with ModuleDeprecationWrapper._deprecated
     classproperty,
     deprecated as __deprecated,
     deprecate_arg as _deprecate_arg,
+    filter_unique,
     normalize_username,
     MediaWikiVersion,
     redirect_func,
@@ -93,7 +91,7 @@ textlib_methods = (
 )
 
 __all__ = (
-    'config', 'ui', 'Site', 'UnicodeMixin', 'translate',
+    'config', 'ui', 'Site', 'login_all', 'UnicodeMixin', 'translate',
     'Page', 'FilePage', 'Category', 'Link', 'User',
     'ItemPage', 'PropertyPage', 'Claim',
     'html2unicode', 'url2unicode', 'unicode2html',
@@ -322,6 +320,7 @@ class Coordinate(_WbRepresentation):
                     % self.globe)
             return self.site.globes()[self.globe]
 
+        from pywikibot.page import ItemPage
         if isinstance(self._entity, ItemPage):
             return self._entity.concept_uri()
 
@@ -452,6 +451,7 @@ class Coordinate(_WbRepresentation):
         @type lazy_load: bool
         @return: pywikibot.ItemPage
         """
+        from pywikibot.page import ItemPage
         if isinstance(self._entity, ItemPage):
             return self._entity
 
@@ -808,6 +808,7 @@ class WbQuantity(_WbRepresentation):
     @property
     def unit(self):
         """Return _unit's entity uri or '1' if _unit is None."""
+        from pywikibot.page import ItemPage
         if isinstance(self._unit, ItemPage):
             return self._unit.concept_uri()
         return self._unit or '1'
@@ -833,6 +834,7 @@ class WbQuantity(_WbRepresentation):
             return self._unit
 
         repo = repo or self.site
+        from pywikibot.page import ItemPage
         self._unit = ItemPage.from_entity_uri(repo, self._unit, lazy_load)
         return self._unit
 
@@ -977,6 +979,7 @@ class _WbDataPage(_WbRepresentation):
         @param label: Label describing the data type in error messages.
         @type site: str
         """
+        from pywikibot.page import Page
         if not isinstance(page, Page):
             raise ValueError('Page must be a pywikibot.Page object.')
 
@@ -1043,6 +1046,7 @@ class _WbDataPage(_WbRepresentation):
         @rtype: pywikibot._WbDataPage
         """
         data_site = cls._get_data_site(site)
+        from pywikibot.page import Page
         page = Page(data_site, page_name)
         return cls(page, site)
 
@@ -1188,6 +1192,8 @@ def Site(code=None, fam=None, user=None, sysop=None, interface=None, url=None):
     if url and (code or fam):
         raise ValueError('URL to the wiki OR a pair of code and family name '
                          'should be provided')
+    from pywikibot.site import BaseSite
+
     _logger = "wiki"
 
     if url:
@@ -1268,18 +1274,87 @@ def Site(code=None, fam=None, user=None, sysop=None, interface=None, url=None):
 getSite = redirect_func(Site, old_name='getSite')
 
 
-# These imports depend on Wb* classes above.
-from pywikibot.page import (
-    Page,
-    FilePage,
-    Category,
-    Link,
-    User,
-    ItemPage,
-    PropertyPage,
-    Claim,
-)
-from pywikibot.page import html2unicode, url2unicode, unicode2html
+def _central_login_domain(site):
+    """
+    Return the domain on which the login to the site is shared.
+
+    Sites of families which share a CentralAuth session, like the Wikimedia
+    projects, are logged in on all sites of the same second level domain
+    when one of them logs in.
+
+    @rtype: str or None
+    """
+    if site.family.name not in site.family.cross_projects:
+        return None
+    return '.'.join(site.hostname().split('.')[-2:])
+
+
+def login_all(sites, workers=8, sysop=False, tokens=('csrf', )):
+    """
+    Log in to several sites at the same time.
+
+    Each site logs in unless it is already logged in, loads the user info
+    and preloads the tokens. Up to workers sites are handled at the same time
+    in separate threads.
+
+    Where sites share a CentralAuth session, only one site of each domain
+    logs in at first. The other sites of the domain are handled afterwards
+    and are usually logged in by the session cookies then.
+
+    @param sites: The sites
+    @type sites: iterable of APISite
+    @param workers: The number of threads
+    @type workers: int
+    @param sysop: Whether to log in with the sysop account
+    @type sysop: bool
+    @param tokens: The types of tokens which are preloaded
+    @type tokens: iterable of str
+    @return: The exception of each site which failed to log in
+    @rtype: dict
+    """
+    leaders = []
+    followers = []
+    domains = set()
+    for site in filter_unique(sites):
+        domain = _central_login_domain(site)
+        if domain in domains:
+            followers.append(site)
+        else:
+            leaders.append(site)
+            if domain is not None:
+                domains.add(domain)
+
+    errors = {}
+    lock = threading.Lock()
+
+    def work(pending):
+        """Log in to the pending sites until there are none left."""
+        while True:
+            with lock:
+                site = next(pending, None)
+            if site is None:
+                return
+            try:
+                site.login(sysop)
+                if tokens and site.logged_in(sysop):
+                    site.tokens.load_tokens(tokens)
+            except Exception as e:
+                with lock:
+                    errors[site] = e
+
+    for group in (leaders, followers):
+        pending = iter(group)
+        threads = [threading.Thread(target=work, args=(pending, ))
+                   for _ in range(min(workers, len(group)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    for site, e in errors.items():
+        error('Logging in to {0} failed: {1}'.format(site, e))
+    return errors
 
 
 link_regex = re.compile(r'\[\[(?P<title>[^\]|[<>{}]*)(\|.*?)?\]\]')
@@ -1298,6 +1373,7 @@ def showDiff(oldtext, newtext, context=0):
     The differences are highlighted (only on compatible systems) to show which
     changes were made.
     """
+    from pywikibot.diff import PatchManager
     PatchManager(oldtext, newtext, context=context).print_hunks()
 
 
@@ -1402,7 +1478,26 @@ _putthread.setName('Put-Thread')
 _putthread.setDaemon(True)
 
 wrapper = _ModuleDeprecationWrapper(__name__)
-wrapper._add_deprecated_attr('ImagePage', FilePage)
+
+# The page and site modules and their dependencies are only imported when
+# they are used. Many scripts need them anyway, but not all.
+for _name in ('Page', 'FilePage', 'Category', 'Link', 'User', 'ItemPage',
+              'PropertyPage', 'Claim', 'html2unicode', 'url2unicode',
+              'unicode2html'):
+    wrapper._add_lazy_attr(_name, 'pywikibot.page', _name)
+wrapper._add_lazy_attr('BaseSite', 'pywikibot.site', 'BaseSite')
+wrapper._add_lazy_attr('PatchManager', 'pywikibot.diff', 'PatchManager')
+for _name, _module in (('comms', 'pywikibot.comms.http'),
+                       ('data', 'pywikibot.data.api'),
+                       ('diff', 'pywikibot.diff'),
+                       ('echo', 'pywikibot.echo'),
+                       ('login', 'pywikibot.login'),
+                       ('page', 'pywikibot.page'),
+                       ('site', 'pywikibot.site')):
+    wrapper._add_lazy_attr(_name, _module)
+
+wrapper._add_deprecated_attr('ImagePage',
+                             replacement_name='pywikibot.page.FilePage')
 wrapper._add_deprecated_attr(
     'cookie_jar', replacement_name='pywikibot.comms.http.cookie_jar')
 wrapper._add_deprecated_attr(
@@ -1418,6 +1513,6 @@ wrapper._add_deprecated_attr(
     warning_message='pywikibot.QuitKeyboardInterrupt is deprecated; '
                     'use pywikibot.bot.QuitKeyboardInterrupt instead.')
 wrapper._add_deprecated_attr(
-    'UploadWarning', _UploadWarning,
+    'UploadWarning', replacement_name='pywikibot.data.api.UploadWarning',
     warning_message='pywikibot.UploadWarning is deprecated; '
                     'use APISite.upload with a warning handler instead.')
@@ -65,12 +65,16 @@ import datetime
 import json
 import logging
 import logging.handlers
+import math
 import os
 import sys
+import threading
 import time
 import warnings
 import webbrowser
 
+from array import array
+from contextlib import contextmanager
 from warnings import warn
 
 _logger = "bot"
@@ -81,6 +85,7 @@ from pywikibot import backports
 from pywikibot import config
 from pywikibot import daemonize
 from pywikibot import i18n
+from pywikibot import throttle
 from pywikibot import version
 from pywikibot.bot_choice import (
     Option, StandardOption, NestedOption, IntegerOption, ContextOption,
@@ -97,7 +102,7 @@ from pywikibot.logging import (
 )
 from pywikibot.logging import critical
 from pywikibot.tools import (
-    deprecated, deprecate_arg, deprecated_args, PY2, PYTHON_VERSION,
+    deprecated, deprecate_arg, deprecated_args, PY2, PYTHON_VERSION, Queue,
 )
 from pywikibot.tools._logging import (
     LoggingFormatter as _LoggingFormatter,
@@ -388,6 +393,10 @@ add_init_routine(init_handlers)
 
 # User input functions
 
+# Questions are asked one after another, also when a bot treats pages in
+# several threads.
+_ui_lock = threading.RLock()
+
 
 def input(question, password=False, default='', force=False):
     """Ask the user a question, return the user's answer.
@@ -408,7 +417,9 @@ def input(question, password=False, default='', force=False):
     if not _handlers_initialized:
         init_handlers()
 
-    data = ui.input(question, password=password, default=default, force=force)
+    with _ui_lock:
+        data = ui.input(question, password=password, default=default,
+                        force=force)
     return data
 
 
@@ -444,8 +455,9 @@ def input_choice(question, answers, default=None, return_shortcut=True,
     if not _handlers_initialized:
         init_handlers()
 
-    return ui.input_choice(question, answers, default, return_shortcut,
-                           automatic_quit=automatic_quit, force=force)
+    with _ui_lock:
+        return ui.input_choice(question, answers, default, return_shortcut,
+                               automatic_quit=automatic_quit, force=force)
 
 
 def input_yn(question, default=None, automatic_quit=True, force=False):
@@ -503,9 +515,11 @@ def inputChoice(question, answers, hotkeys, default=None):
     if not _handlers_initialized:
         init_handlers()
 
-    return ui.input_choice(question=question, options=zip(answers, hotkeys),
-                           default=default, return_shortcut=True,
-                           automatic_quit=False)
+    with _ui_lock:
+        return ui.input_choice(question=question,
+                               options=zip(answers, hotkeys),
+                               default=default, return_shortcut=True,
+                               automatic_quit=False)
 
 
 def input_list_choice(question, answers, default=None, force=False):
@@ -527,8 +541,9 @@ def input_list_choice(question, answers, default=None, force=False):
     if not _handlers_initialized:
         init_handlers()
 
-    return ui.input_list_choice(question, answers, default=default,
-                                force=force)
+    with _ui_lock:
+        return ui.input_list_choice(question, answers, default=default,
+                                    force=force)
 
 
 class Choice(StandardOption):
@@ -893,6 +908,11 @@ def handle_args(args=None, do_help=True):
                    % config.cosmetic_changes)
         elif option == '-simulate':
             config.simulate = True
+        elif option == '-workers':
+            config.bot_workers = int(value)
+        elif option == '-timings':
+            config.bot_timings_file = value or config.datafilepath(
+                'logs', '%s-timings.json' % moduleName)
         #
         #  DEBUG control:
         #
@@ -1032,6 +1052,15 @@ GLOBAL OPTIONS
                   debugging of new code (if given, doesn't do any real
                   changes, but only shows what would have been changed).
 
+-workers:n        Treat n pages at the same time in separate threads. Only
+                  useful for bots which mostly wait for the wiki or other
+                  web sites. Default is set by config.py
+
+-timings[:file]   Write the durations of the phases of the bot run and the
+                  page counters to this file when the bot exits: as JSON
+                  or in the Prometheus text format if file ends with .prom.
+                  Default is logs/<script>-timings.json.
+
 -<config var>:n   You may use all given numeric config variables as option and
                   modify it with command line.
 
@@ -1174,6 +1203,150 @@ class OptionHandler(object):
                                   .format(option, self.__class__.__name__))
 
 
+class BotTimings(object):
+
+    """
+    Durations of the phases of a bot run.
+
+    BaseBot records how long it takes to get each page from the generator
+    ('generator'), to initialize it ('init_page'), to treat it ('treat'),
+    to show the diff ('diff') and to save it ('save'). While the bot is
+    running the waits of all throttles are recorded as 'throttle'.
+    """
+
+    # percentiles shown and dumped for each phase
+    percentiles = (50, 95, 99)
+
+    def __init__(self):
+        """Constructor."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all recorded durations."""
+        with self._lock:
+            self.durations = {}
+
+    def record(self, phase, duration):
+        """
+        Record one duration of a phase.
+
+        @param phase: name of the phase
+        @type phase: str
+        @param duration: duration in seconds
+        @type duration: float
+        """
+        with self._lock:
+            if phase not in self.durations:
+                self.durations[phase] = array(str('d'))
+            self.durations[phase].append(duration)
+
+    @contextmanager
+    def timer(self, phase):
+        """Context manager recording the time spent in its block."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(phase, time.time() - start)
+
+    def as_dict(self):
+        """
+        Return the statistics of each phase.
+
+        The percentiles use the nearest rank method.
+
+        @return: phase names mapped to dicts with the keys count, total,
+            max and p50, p95 and p99 in seconds
+        @rtype: dict
+        """
+        with self._lock:
+            durations = dict((phase, sorted(values))
+                             for phase, values in self.durations.items())
+        stats = {}
+        for phase, values in durations.items():
+            count = len(values)
+            stats[phase] = {'count': count,
+                            'total': sum(values),
+                            'max': values[-1]}
+            for percent in self.percentiles:
+                rank = max(int(math.ceil(percent * count / 100.0)), 1)
+                stats[phase]['p%d' % percent] = values[rank - 1]
+        return stats
+
+    def output(self):
+        """Log the statistics of each phase, sorted by the time spent."""
+        stats = self.as_dict()
+        if not stats:
+            return
+        header = ['phase', 'count', 'total [s]'] + [
+            'p%d [s]' % percent for percent in self.percentiles]
+        line = '{0:<10} {1:>7} {2:>10}' + ''.join(
+            ' {%d:>9}' % (i + 3) for i in range(len(self.percentiles)))
+        pywikibot.log(line.format(*header))
+        for phase, phase_stats in sorted(stats.items(),
+                                         key=lambda item: -item[1]['total']):
+            values = [phase, phase_stats['count'],
+                      '%.3f' % phase_stats['total']] + [
+                '%.3f' % phase_stats['p%d' % percent]
+                for percent in self.percentiles]
+            pywikibot.log(line.format(*values))
+
+    def dump(self, filename, **info):
+        """
+        Write the statistics to a file.
+
+        The file is written in the Prometheus text format if the filename
+        ends with '.prom', otherwise as JSON.
+
+        @param filename: name of the file
+        @type filename: str
+        @param info: additional values like the bot name and the counters,
+            numeric values are written as gauges in the Prometheus format
+        """
+        stats = self.as_dict()
+        if filename.endswith('.prom'):
+            content = self._prometheus(stats, info)
+        else:
+            info['phases'] = stats
+            content = json.dumps(info, indent=4, sort_keys=True) + '\n'
+        # write the file at once, it may be read by a monitoring system
+        tmp_filename = filename + '.tmp'
+        with codecs.open(tmp_filename, 'w', 'utf-8') as f:
+            f.write(content)
+        # rename only replaces an existing file atomically on POSIX
+        if os.path.exists(filename) and sys.platform == 'win32':
+            os.remove(filename)
+        os.rename(tmp_filename, filename)
+
+    def _prometheus(self, stats, info):
+        """Return the statistics in the Prometheus text format."""
+        labels = 'bot="{0}"'.format(info.get('bot', ''))
+        lines = [
+            '# HELP pywikibot_bot_phase_seconds '
+            'Durations of the phases of a bot run.',
+            '# TYPE pywikibot_bot_phase_seconds summary',
+        ]
+        for phase, phase_stats in sorted(stats.items()):
+            phase_labels = '{0},phase="{1}"'.format(labels, phase)
+            for percent in self.percentiles:
+                lines.append('pywikibot_bot_phase_seconds{{{0},quantile='
+                             '"{1}"}} {2!r}'.format(
+                                 phase_labels, percent / 100.0,
+                                 phase_stats['p%d' % percent]))
+            lines.append('pywikibot_bot_phase_seconds_sum{{{0}}} {1!r}'
+                         .format(phase_labels, phase_stats['total']))
+            lines.append('pywikibot_bot_phase_seconds_count{{{0}}} {1}'
+                         .format(phase_labels, phase_stats['count']))
+        for name, value in sorted(info.items()):
+            if isinstance(value, (int, float)) and not isinstance(value,
+                                                                  bool):
+                lines.append('# TYPE pywikibot_bot_{0} gauge'.format(name))
+                lines.append('pywikibot_bot_{0}{{{1}}} {2!r}'.format(
+                    name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+
 class BaseBot(OptionHandler):
 
     """
@@ -1200,6 +1373,9 @@ class BaseBot(OptionHandler):
 
     _current_page = None
 
+    # thread local data of the workers while treating pages concurrently
+    _treat_local = None
+
     def __init__(self, **kwargs):
         """
         Only accept options defined in availableOptions.
@@ -1214,10 +1390,14 @@ class BaseBot(OptionHandler):
 
         self._treat_counter = 0
         self._save_counter = 0
+        self._lock = threading.RLock()
+        self.timings = BotTimings()
 
     @property
     def current_page(self):
         """Return the current working page as a property."""
+        if self._treat_local is not None:
+            return getattr(self._treat_local, 'page', None)
         return self._current_page
 
     @current_page.setter
@@ -1230,11 +1410,17 @@ class BaseBot(OptionHandler):
 
         This also prevents the same title from being printed twice.
 
+        When pages are treated by several workers, each worker thread has
+        its own current page.
+
         @param page: the working page
         @type page: pywikibot.Page
         """
-        if page != self._current_page:
-            self._current_page = page
+        if page != self.current_page:
+            if self._treat_local is not None:
+                self._treat_local.page = page
+            else:
+                self._current_page = page
             msg = u'Working on %r' % page.title()
             if config.colorized_output:
                 log(msg)
@@ -1243,6 +1429,32 @@ class BaseBot(OptionHandler):
             else:
                 stdout(msg)
 
+    @property
+    def _site(self):
+        """
+        Return the site which the bot subclasses use.
+
+        When pages are treated by several workers, each worker thread has
+        the site which init_page has set for its page.
+        """
+        if (self._treat_local is not None and
+                hasattr(self._treat_local, 'site')):
+            return self._treat_local.site
+        try:
+            return self._shared_site
+        except AttributeError:
+            raise AttributeError("'{0}' object has no attribute '_site'"
+                                 .format(self.__class__.__name__))
+
+    @_site.setter
+    def _site(self, site):
+        """Set the site of the worker thread or of the bot."""
+        if (self._treat_local is not None and
+                hasattr(self._treat_local, 'site')):
+            self._treat_local.site = site
+        else:
+            self._shared_site = site
+
     def user_confirm(self, question):
         """Obtain user response if bot option 'always' not enabled."""
         if self.getOption('always'):
@@ -1285,7 +1497,8 @@ class BaseBot(OptionHandler):
 
         * 'asynchronous' - passed to page.save
         * 'summary' - passed to page.save
-        * 'show_diff' - show changes between oldtext and newtext (enabled)
+        * 'show_diff' - show changes between oldtext and newtext (enabled,
+          but disabled with 'always' if config.always_show_diff is False)
         * 'ignore_save_related_errors' - report and ignore (disabled)
         * 'ignore_server_errors' - report and ignore (disabled)
 
@@ -1297,18 +1510,25 @@ class BaseBot(OptionHandler):
                              % page.title(asLink=True))
             return
 
-        self.current_page = page
+        # show the diff and the question of concurrent workers together,
+        # in the order of the pages if the saves are ordered
+        self._wait_for_previous_pages()
+        with self._user_interaction():
+            self.current_page = page
 
-        show_diff = kwargs.pop('show_diff', True)
+            show_diff = kwargs.pop('show_diff', True)
+            if self.getOption('always') and not config.always_show_diff:
+                show_diff = False
 
-        if show_diff:
-            pywikibot.showDiff(oldtext, newtext)
+            if show_diff:
+                with self.timings.timer('diff'):
+                    pywikibot.showDiff(oldtext, newtext)
 
-        if 'summary' in kwargs:
-            pywikibot.output(u'Edit summary: %s' % kwargs['summary'])
+            if 'summary' in kwargs:
+                pywikibot.output(u'Edit summary: %s' % kwargs['summary'])
 
-        page.text = newtext
-        return self._save_page(page, page.save, **kwargs)
+            page.text = newtext
+            return self._save_page(page, page.save, **kwargs)
 
     def _save_page(self, page, func, *args, **kwargs):
         """
@@ -1327,8 +1547,9 @@ class BaseBot(OptionHandler):
         @return: whether the page was saved successfully
         @rtype: bool
         """
-        if not self.user_confirm('Do you want to accept these changes?'):
-            return False
+        with self._user_interaction():
+            if not self.user_confirm('Do you want to accept these changes?'):
+                return False
 
         if 'asynchronous' not in kwargs and self.getOption('always'):
             kwargs['asynchronous'] = True
@@ -1337,9 +1558,12 @@ class BaseBot(OptionHandler):
                                                 False)
         ignore_server_errors = kwargs.pop('ignore_server_errors', False)
 
+        self._wait_for_previous_pages()
         try:
-            func(*args, **kwargs)
-            self._save_counter += 1
+            with self.timings.timer('save'):
+                func(*args, **kwargs)
+            with self._lock:
+                self._save_counter += 1
         except pywikibot.PageSaveRelatedError as e:
             if not ignore_save_related_errors:
                 raise
@@ -1366,6 +1590,26 @@ class BaseBot(OptionHandler):
             return True
         return False
 
+    def _user_interaction(self):
+        """
+        Return a lock to show a diff and ask the user in one go.
+
+        It is only needed when pages are treated by several workers and
+        the user is asked.
+        """
+        if self._treat_local is None or self.getOption('always'):
+            return _NoLock()
+        return _ui_lock
+
+    def _wait_for_previous_pages(self):
+        """Wait until the pages before have been treated if requested."""
+        if self._treat_local is None or not config.bot_workers_ordered:
+            return
+        index = self._treat_local.index
+        with self._treated:
+            while self._treated_before < index:
+                self._treated.wait()
+
     def quit(self):
         """Cleanup and quit processing."""
         raise QuitKeyboardInterrupt
@@ -1399,6 +1643,9 @@ class BaseBot(OptionHandler):
             if self._save_counter:
                 pywikibot.output("Write operation time: %d seconds"
                                  % (seconds / self._save_counter))
+            self.timings.output()
+            if config.bot_timings_file:
+                self.dump_timings(config.bot_timings_file)
 
         # exc_info contains exception from self.run() while terminating
         exc_info = sys.exc_info()
@@ -1408,6 +1655,26 @@ class BaseBot(OptionHandler):
             pywikibot.output("Script terminated by exception:\n")
             pywikibot.exception()
 
+    def dump_timings(self, filename):
+        """
+        Write the timings and counters of the run to a file.
+
+        @param filename: name of the file, see L{BotTimings.dump}
+        @type filename: str
+        """
+        now = time.time()
+        try:
+            self.timings.dump(
+                filename, bot=self.__class__.__name__,
+                start=self._start_ts.isoformat(),
+                seconds=now - self._start_time,
+                pages_read=self._treat_counter,
+                pages_written=self._save_counter,
+                pages_per_minute=self._pages_per_minute(now))
+        except (IOError, OSError) as e:
+            pywikibot.error('Could not write the timings to {0}: {1}'
+                            .format(filename, e))
+
     def treat(self, page):
         """Process one page (Abstract method)."""
         raise NotImplementedError('Method %s.treat() not implemented.'
@@ -1417,44 +1684,168 @@ class BaseBot(OptionHandler):
         """Return whether treat should be executed for the page."""
         pass
 
+    def _init_pages(self):
+        """Yield the pages of the generator which are not skipped."""
+        start = time.time()
+        for page in self.generator:
+            now = time.time()
+            self.timings.record('generator', now - start)
+            try:
+                self.init_page(page)
+            except SkipPageError as e:
+                pywikibot.warning('Skipped "{0}" due to: {1}'.format(
+                                  page, e.reason))
+                if PY2:
+                    # Python 2 does not clear the exception and it may seem
+                    # that the generator stopped due to an exception
+                    sys.exc_clear()
+                skipped = True
+            else:
+                skipped = False
+            start = time.time()
+            self.timings.record('init_page', start - now)
+            if not skipped:
+                yield page
+                start = time.time()
+
+    def _count_treated(self):
+        """Count a treated page."""
+        self._treat_counter += 1
+        if PY2 and self._treat_counter == sys.maxint:
+            # Warn the user that the bot may not function correctly
+            pywikibot.error(
+                '\n%s: page count reached Python 2 sys.maxint (%d).\n'
+                'Python 3 should be used to process very large batches'
+                % (self.__class__.__name__, sys.maxint))
+        if config.bot_progress_interval > 0:
+            now = time.time()
+            if now - self._progress_time >= config.bot_progress_interval:
+                self._progress_time = now
+                pywikibot.output(
+                    '{0} pages read, {1} pages written, {2:.1f} pages/min'
+                    .format(self._treat_counter, self._save_counter,
+                            self._pages_per_minute(now)))
+
+    def _pages_per_minute(self, now):
+        """Return the pages read per minute since the start of the run."""
+        minutes = (now - self._start_time) / 60
+        return self._treat_counter / minutes if minutes > 0 else 0.0
+
+    def _run_workers(self, workers):
+        """
+        Treat the pages in worker threads.
+
+        init_page is still called in this thread and in the order of the
+        generator, treat is called by the workers. The generator is only
+        advanced when a worker is free. Questions to the user are asked
+        one after another and the counters are updated here.
+
+        Like the current page, the site which init_page has set for a page
+        is kept by the worker treating it, so init_page of the next pages
+        does not change the site while a worker treats a page.
+
+        An exception of a worker, like QuitKeyboardInterrupt, stops
+        the run: no further pages are treated and the exception is raised
+        here after the running workers have finished.
+
+        @param workers: number of worker threads
+        @type workers: int
+        """
+        self._treat_local = threading.local()
+        self._treated = threading.Condition()
+        self._treated_before = 0
+        finished = set()
+        stop = []
+        tasks = Queue.Queue(workers)
+        results = Queue.Queue()
+
+        def work():
+            """Treat the pages until stopped."""
+            while True:
+                task = tasks.get()
+                if task is None:
+                    return
+                index, page, site = task
+                if not stop:
+                    self._treat_local.index = index
+                    self._treat_local.site = site
+                    try:
+                        with self.timings.timer('treat'):
+                            self.treat(page)
+                    except BaseException as e:
+                        results.put(e)
+                    else:
+                        results.put(None)
+                with self._treated:
+                    finished.add(index)
+                    while self._treated_before in finished:
+                        finished.remove(self._treated_before)
+                        self._treated_before += 1
+                    self._treated.notify_all()
+
+        def count_results():
+            """Count the treated pages and keep the errors of workers."""
+            while True:
+                try:
+                    error = results.get_nowait()
+                except Queue.Empty:
+                    return
+                if error is None:
+                    self._count_treated()
+                elif not stop:
+                    stop.append(error)
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for index, page in enumerate(self._init_pages()):
+                count_results()
+                if stop:
+                    break
+                tasks.put((index, page, getattr(self, '_site', None)))
+        except BaseException:
+            stop.append(None)
+            raise
+        finally:
+            for thread in threads:
+                tasks.put(None)
+            for thread in threads:
+                thread.join()
+            self._treat_local = None
+            count_results()
+        if stop:
+            raise stop[0]
+
     def run(self):
-        """Process all pages in generator."""
+        """
+        Process all pages in generator.
+
+        The pages are treated by several threads if config.bot_workers is
+        greater than one.
+        """
         self._start_ts = pywikibot.Timestamp.now()
+        self._start_time = self._progress_time = time.time()
         if not hasattr(self, 'generator'):
             raise NotImplementedError('Variable %s.generator not set.'
                                       % self.__class__.__name__)
 
-        maxint = 0
         if PY2:
-            maxint = sys.maxint
-
             # Python 2 does not clear previous exceptions and method `exit`
             # relies on sys.exc_info returning exceptions occurring in `run`.
             sys.exc_clear()
 
+        throttle.timings = self.timings
         try:
-            for page in self.generator:
-                try:
-                    self.init_page(page)
-                except SkipPageError as e:
-                    pywikibot.warning('Skipped "{0}" due to: {1}'.format(
-                                      page, e.reason))
-                    if PY2:
-                        # Python 2 does not clear the exception and it may seem
-                        # that the generator stopped due to an exception
-                        sys.exc_clear()
-                    continue
-
-                # Process the page
-                self.treat(page)
-
-                self._treat_counter += 1
-                if maxint and self._treat_counter == maxint:
-                    # Warn the user that the bot may not function correctly
-                    pywikibot.error(
-                        '\n%s: page count reached Python 2 sys.maxint (%d).\n'
-                        'Python 3 should be used to process very large batches'
-                        % (self.__class__.__name__, sys.maxint))
+            if config.bot_workers > 1:
+                self._run_workers(config.bot_workers)
+            else:
+                for page in self._init_pages():
+                    # Process the page
+                    with self.timings.timer('treat'):
+                        self.treat(page)
+                    self._count_treated()
         except QuitKeyboardInterrupt:
             pywikibot.output('\nUser quit %s bot run...' %
                              self.__class__.__name__)
@@ -1465,9 +1856,21 @@ class BaseBot(OptionHandler):
                 pywikibot.output('\nKeyboardInterrupt during %s bot run...' %
                                  self.__class__.__name__)
         finally:
+            throttle.timings = None
             self.exit()
 
 
+class _NoLock(object):
+
+    """Context manager doing nothing instead of a lock."""
+
+    def __enter__(self):
+        """Do nothing."""
+
+    def __exit__(self, *exc_info):
+        """Do nothing."""
+
+
 # TODO: Deprecate Bot class as self.site may be the site of the page or may be
 # a site previously defined
 class Bot(BaseBot):
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Transports which record HTTP traffic to and replay it from a cassette.
+
+A cassette is a gzip compressed file with one JSON object per line for each
+request and its response. The L{RecordingTransport} appends each request
+which it sends to the cassette, and the L{ReplayTransport} answers requests
+with the recorded responses instead of accessing the network, so a bot run
+can be recorded once and repeated offline as often as needed.
+
+Requests are matched by their method, URL and body after normalising them:
+the order of the parameters does not matter, the boundary of multipart
+bodies is ignored and passwords are never written to the cassette. If the
+same request has been recorded several times, the responses are replayed in
+the recorded order and the last one is repeated after that.
+
+The body of a streamed response, requested with C{stream=True}, is only
+recorded as far as the caller reads it. It is written to the cassette when
+the response is closed or read to the end.
+
+The transport of L{pywikibot.comms.http} is chosen by C{config.http_cassette},
+C{config.http_cassette_mode} and C{config.http_replay_latency}.
+"""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import base64
+import collections
+import gzip
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+
+import requests
+
+from requests.structures import CaseInsensitiveDict
+
+from pywikibot.exceptions import FatalServerError
+from pywikibot.tools import PY2
+
+if not PY2:
+    from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+else:
+    from urllib import urlencode
+    from urlparse import parse_qsl, urlsplit, urlunsplit
+
+#: The parameters whose values are not written to the cassette
+SECRET_PARAMETERS = frozenset(['lgpassword', 'password', 'retype',
+                               'oathtoken'])
+
+#: The response headers which are not recorded
+SKIPPED_HEADERS = frozenset(['content-encoding', 'content-length',
+                             'set-cookie', 'transfer-encoding'])
+
+_BOUNDARY_REGEX = re.compile(r'boundary="?([^";]+)"?')
+
+
+def _decode(value):
+    """Return the value as unicode, assuming it's UTF-8 encoded."""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def _normalize_parameters(items):
+    """Return the parameters sorted and without secrets as query string."""
+    items = sorted((key, '' if key in SECRET_PARAMETERS else _decode(value))
+                   for key, value in ((_decode(key), value)
+                                      for key, value in items))
+    return urlencode([(key.encode('utf-8'), value.encode('utf-8'))
+                      for key, value in items])
+
+
+def normalize_request(method, url, params=None, data=None, headers=None):
+    """
+    Return the key of a request, by which it is looked up in a cassette.
+
+    @param method: The HTTP method
+    @type method: str
+    @param url: The URL which may contain a query
+    @type url: str
+    @param params: Additional parameters of the query
+    @type params: dict or list of tuple or None
+    @param data: The body
+    @type data: str, bytes, dict or list of tuple or None
+    @param headers: The request headers
+    @type headers: dict or None
+    @rtype: str
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if isinstance(params, dict):
+        query += list(params.items())
+    elif params:
+        query += list(params)
+    url = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path,
+                      _normalize_parameters(query), ''))
+
+    content_type = ''
+    for key, value in (headers or {}).items():
+        if key.lower() == 'content-type':
+            content_type = value
+    if isinstance(data, dict):
+        body = _normalize_parameters(data.items())
+    elif isinstance(data, (list, tuple)):
+        body = _normalize_parameters(data)
+    elif not data:
+        body = ''
+    elif content_type.startswith('multipart/'):
+        # The boundary is random
+        data = data if isinstance(data, bytes) else data.encode('utf-8')
+        match = _BOUNDARY_REGEX.search(content_type)
+        if match:
+            data = data.replace(match.group(1).encode('utf-8'), b'boundary')
+        body = 'sha1:' + hashlib.sha1(data).hexdigest()
+    else:
+        body = _normalize_parameters(
+            parse_qsl(_decode(data), keep_blank_values=True))
+    return '{0} {1}\n{2}'.format(method.upper(), url, body)
+
+
+class _RecordedStream(object):
+
+    """The raw body of a streamed response which records what is read."""
+
+    def __init__(self, raw, callback):
+        """
+        Constructor.
+
+        @param raw: The raw body
+        @type raw: urllib3.response.HTTPResponse
+        @param callback: Called with the body which has been read, once the
+            response is closed or read to the end
+        @type callback: callable
+        """
+        self._raw = raw
+        self._callback = callback
+        self._chunks = []
+
+    def __getattr__(self, name):
+        """Return the attribute of the raw body."""
+        return getattr(self._raw, name)
+
+    def stream(self, *args, **kwargs):
+        """Yield the chunks of the body and record them."""
+        for chunk in self._raw.stream(*args, **kwargs):
+            self._chunks.append(chunk)
+            yield chunk
+        self._finish()
+
+    def read(self, *args, **kwargs):
+        """Read from the body and record it."""
+        data = self._raw.read(*args, **kwargs)
+        if data:
+            self._chunks.append(data)
+        else:
+            self._finish()
+        return data
+
+    def close(self):
+        """Close the body and record what has been read."""
+        self._raw.close()
+        self._finish()
+
+    def release_conn(self):
+        """Release the connection and record what has been read."""
+        self._raw.release_conn()
+        self._finish()
+
+    def _finish(self):
+        """Pass what has been read to the callback once."""
+        if self._callback is not None:
+            callback, self._callback = self._callback, None
+            callback(b''.join(self._chunks))
+
+
+class CassetteTransport(object):
+
+    """Base class of the transports which use a cassette."""
+
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        @param filename: The file name of the cassette
+        @type filename: str
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+
+
+class RecordingTransport(CassetteTransport):
+
+    """Send the requests and append them with the responses to a cassette."""
+
+    def __init__(self, filename, session):
+        """
+        Constructor.
+
+        @param filename: The file name of the cassette
+        @type filename: str
+        @param session: The session which sends the requests
+        @type session: requests.Session
+        """
+        super(RecordingTransport, self).__init__(filename)
+        self.session = session
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                **kwargs):
+        """
+        Send the request and record it.
+
+        @see: L{requests.Session.request} for the parameters.
+        @rtype: requests.Response
+        """
+        start = time.time()
+        response = self.session.request(method, url, params=params,
+                                        data=data, headers=headers, **kwargs)
+        entry = {
+            'request': normalize_request(method, url, params, data, headers),
+            'status': response.status_code,
+            'reason': response.reason,
+            'url': response.url,
+            'headers': dict((key, value) for key, value in
+                            response.headers.items()
+                            if key.lower() not in SKIPPED_HEADERS),
+            'elapsed': time.time() - start,
+        }
+        if kwargs.get('stream'):
+            # Don't read more of the body than the caller does
+            response.raw = _RecordedStream(
+                response.raw, lambda content: self._write(entry, content))
+        else:
+            self._write(entry, response.content)
+        return response
+
+    def _write(self, entry, content):
+        """Append the entry with the content to the cassette."""
+        entry['content'] = base64.b64encode(content).decode('ascii')
+        line = (json.dumps(entry, sort_keys=True) + '\n').encode('utf-8')
+        with self._lock:
+            # Each request is appended as a gzip member of its own, so that
+            # the cassette stays readable if the process is killed
+            with gzip.open(self.filename, 'ab') as f:
+                f.write(line)
+
+
+class ReplayTransport(CassetteTransport):
+
+    """Answer the requests with the responses recorded in a cassette."""
+
+    def __init__(self, filename, latency=0):
+        """
+        Constructor.
+
+        @param filename: The file name of the cassette
+        @type filename: str
+        @param latency: The seconds each response takes or None for the time
+            it took when it was recorded
+        @type latency: float or None
+        """
+        super(ReplayTransport, self).__init__(filename)
+        self.latency = latency
+        self.entries = collections.defaultdict(collections.deque)
+        with gzip.open(filename, 'rb') as f:
+            for line in f:
+                entry = json.loads(line.decode('utf-8'))
+                self.entries[entry['request']].append(entry)
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                **kwargs):
+        """
+        Return the recorded response to the request.
+
+        @see: L{requests.Session.request} for the parameters.
+        @rtype: requests.Response
+        @raises FatalServerError: The request has not been recorded
+        """
+        key = normalize_request(method, url, params, data, headers)
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise FatalServerError(
+                    'The cassette {0} contains no response to the request '
+                    '{1}'.format(self.filename, key))
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+
+        latency = entry['elapsed'] if self.latency is None else self.latency
+        if latency:
+            time.sleep(latency)
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers)
+        response._content = base64.b64decode(entry['content'])
+        response._content_consumed = True
+        response.raw = io.BytesIO(response._content)
+        return response
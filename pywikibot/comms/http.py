@@ -14,7 +14,7 @@ This module is responsible for
 from __future__ import absolute_import, print_function, unicode_literals
 
 #
-# (C) Pywikibot team, 2007-2017
+# (C) Pywikibot team, 2007-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -24,6 +24,7 @@ __docformat__ = 'epytext'
 import atexit
 import sys
 
+from distutils.version import StrictVersion
 from string import Formatter
 from warnings import warn
 
@@ -46,7 +47,7 @@ from pywikibot import config
 
 from pywikibot import __release__
 from pywikibot.bot import calledModuleName
-from pywikibot.comms import threadedhttp
+from pywikibot.comms import cassette, threadedhttp
 from pywikibot.exceptions import (
     FatalServerError, Server504Error, Server414Error
 )
@@ -68,6 +69,13 @@ SSL_CERT_VERIFY_FAILED_MSG = 'certificate verify failed'
 
 _logger = "comm.http"
 
+# Fix up socket_timeout
+# Older requests library expect a single value whereas newer versions also
+# accept a tuple (connect timeout, read timeout).
+if (isinstance(config.socket_timeout, tuple) and
+        StrictVersion(requests.__version__) < StrictVersion('2.4.0')):
+    config.socket_timeout = max(config.socket_timeout)
+
 
 def mode_check_decorator(func):
     """Decorate load()/save() CookieJar methods."""
@@ -85,17 +93,24 @@ def mode_check_decorator(func):
 # in PY2 cookielib.LWPCookieJar is not a new-style class.
 class PywikibotCookieJar(cookielib.LWPCookieJar, object):
 
-    """CookieJar which checks file permissions."""
+    """
+    CookieJar which checks file permissions.
+
+    Loading and saving hold the lock of the cookies, so that the sites can
+    log in by several threads at the same time.
+    """
 
     @mode_check_decorator
     def load(self, **kwargs):
         """Load cookies from file."""
-        super(PywikibotCookieJar, self).load()
+        with self._cookies_lock:
+            super(PywikibotCookieJar, self).load()
 
     @mode_check_decorator
     def save(self, **kwargs):
         """Save cookies to file."""
-        super(PywikibotCookieJar, self).save()
+        with self._cookies_lock:
+            super(PywikibotCookieJar, self).save()
 
 
 cookie_jar = PywikibotCookieJar(config.datafilepath('pywikibot.lwp'))
@@ -109,6 +124,21 @@ else:
 session = requests.Session()
 session.cookies = cookie_jar
 
+#: The transport which sends the requests, it's either the session or
+#: a transport of L{pywikibot.comms.cassette}
+transport = session
+if config.http_cassette:
+    if config.http_cassette_mode == 'replay':
+        transport = cassette.ReplayTransport(config.http_cassette,
+                                             config.http_replay_latency)
+    elif config.http_cassette_mode == 'record':
+        transport = cassette.RecordingTransport(config.http_cassette,
+                                                session)
+    else:
+        raise ValueError('config.http_cassette_mode must be "record" or '
+                         '"replay", not "{0}"'.format(
+                             config.http_cassette_mode))
+
 
 # Prepare flush on quit
 def _flush():
@@ -351,8 +381,9 @@ def _http_process(session, http_request):
     """
     Process an `threadedhttp.HttpRequest` instance.
 
-    @param session: Session that will be used to process the `http_request`.
-    @type session: L{requests.Session}
+    @param session: Session or transport that will be used to process the
+        `http_request`.
+    @type session: L{requests.Session} or L{cassette.CassetteTransport}
     @param http_request: Request that will be processed.
     @type http_request: L{threadedhttp.HttpRequest}
     @return: None
@@ -470,7 +501,7 @@ def _enqueue(uri, method="GET", params=None, body=None, headers=None, data=None,
 
     request = threadedhttp.HttpRequest(
         uri, method, params, body, all_headers, callbacks, **kwargs)
-    _http_process(session, request)
+    _http_process(transport, request)
     return request
 
 
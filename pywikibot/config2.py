@@ -33,7 +33,7 @@ build paths relative to base_dir:
 """
 #
 # (C) Rob W.W. Hooft, 2003
-# (C) Pywikibot team, 2003-2017
+# (C) Pywikibot team, 2003-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -47,11 +47,8 @@ import stat
 import sys
 import types
 
-from distutils.version import StrictVersion
 from locale import getdefaultlocale
 
-from requests import __version__ as requests_version
-
 from warnings import warn
 
 from pywikibot.logging import error, output, warning
@@ -162,6 +159,15 @@ fake_user_agent = False
 site_interface = 'APISite'
 # number of days to cache namespaces, api configuration, etc.
 API_config_expiry = 30
+# Keep a snapshot of the siteinfo, the API parameter information, the user
+# information and the tokens of each site and user in a single file. It is
+# loaded when the site is created, so that new processes do not need to ask
+# the server for them again. It contains the tokens of the user, so it is
+# only readable by the owner.
+site_snapshot = False
+# number of days after which a site snapshot is refreshed in the background.
+# Until then it is only checked against the server before the first write.
+site_snapshot_expiry = 1
 
 # The maximum number of bytes which uses a GET request, if not positive
 # it'll always use POST requests
@@ -476,6 +482,15 @@ except AttributeError:
     # we get "StdioOnnaStick instance has no attribute 'isatty'"
     colorized_output = False
 
+# Should bots running with the -always option show the diff of each page
+# they save? Nobody reads them when the output is not a terminal, e.g. when
+# the bot is run by cron, and large diffs take time to compute. Set this to
+# True to write them to redirected output anyway.
+try:
+    always_show_diff = sys.stderr.isatty()
+except AttributeError:
+    always_show_diff = False
+
 # An indication of the size of your screen, or rather the size of the screen
 # to be shown, for flickrripper
 tkhorsize = 1600
@@ -656,6 +671,24 @@ max_retries = 15
 # Minimum time to wait before resubmitting a failed API request.
 retry_wait = 5
 
+# Every query asks for the userinfo of the bot, to notice when it was logged
+# out or logged in as another user. Set lean_api_requests to True to leave it
+# out. The userinfo is then requested separately before each write and when
+# it is older than 'lean_userinfo_interval' seconds.
+lean_api_requests = False
+lean_userinfo_interval = 300
+
+# Set api_formatversion to 2 to load pages and revisions with
+# formatversion=2 from sites running MediaWiki 1.25 or newer. The responses
+# are smaller and are used without converting them.
+api_formatversion = 1
+
+# Seconds a thread waits for other threads to load the same property, like
+# the page info or the coordinates, of other pages, so that they are loaded
+# with a single query. Pages of a site.batch() are always loaded together.
+# Set it to e.g. 0.05 for bots which load pages by many threads.
+api_batch_window = 0.0
+
 # ############# TABLE CONVERSION BOT SETTINGS ##############
 
 # will split long paragraphs for better reading the source.
@@ -667,11 +700,20 @@ deIndentTables = True
 
 # ############# WEBLINK CHECKER SETTINGS ##############
 
-# How many external links should weblinkchecker.py check at the same time?
+# How many external links should weblinkchecker.py check and reflinks.py
+# fetch at the same time?
 # If you have a fast connection, you might want to increase this number so
 # that slow servers won't slow you down.
 max_external_links = 50
 
+# How many of them may be on the same host, and how many seconds must pass
+# between two requests to the same host?
+max_external_links_per_host = 4
+weblink_host_delay = 0.5
+
+# How many seconds should the result of a check be reused for the same link?
+weblink_cache_ttl = 3600
+
 report_dead_links_on_talk = False
 
 # Don't alert on links days_dead old or younger
@@ -780,6 +822,16 @@ persistent_http = False
 # read timeout, or a single value for both in a tuple (since requests 2.4.0).
 socket_timeout = (6.05, 45)
 
+# Record the HTTP requests and responses to this gzip compressed file, or
+# replay the responses from it instead of accessing the network. It is used
+# to run a bot offline and repeatably, e.g. to profile it.
+http_cassette = None
+# Whether to 'record' to or 'replay' from the cassette.
+http_cassette_mode = 'record'
+# The seconds each response takes when replaying. If it is None, each takes
+# as long as when it was recorded.
+http_replay_latency = 0.0
+
 
 # ############# COSMETIC CHANGES SETTINGS ##############
 # The bot can make some additional changes to each page it edits, e.g. fix
@@ -851,6 +903,29 @@ actions_to_block = []
 # Set simulate to True or use -simulate option to block all actions given above.
 simulate = False
 
+# Number of threads treating the pages of a bot at the same time. More than
+# one only helps bots which mostly wait for the wiki or other web sites.
+# Questions to the user are asked one after another. Use the -workers:n
+# option to change it for a single run.
+bot_workers = 1
+
+# Whether the pages treated by several bot workers are saved in the order
+# of the generator. A worker then waits with saving a page until all pages
+# before it have been treated.
+bot_workers_ordered = False
+
+# Output a progress line with the number of pages read and written and the
+# pages per minute every bot_progress_interval seconds while a bot is
+# running. Use 0 to disable it.
+bot_progress_interval = 0
+
+# Write the durations of the phases of a bot run (getting pages from the
+# generator, init_page, treat, diff, save and throttle waits) and the page
+# counters to this file when the bot exits. The file is written in the
+# Prometheus text format if its name ends with '.prom', otherwise as JSON.
+# Use the -timings:<file> option to set it for a single run.
+bot_timings_file = None
+
 # How many pages should be put to a queue in asynchronous mode.
 # If maxsize is <= 0, the queue size is infinite.
 # Increasing this value will increase memory space but could speed up
@@ -866,7 +941,7 @@ line_separator = LS = u'\n'
 # Settings to enable mwparserfromhell
 # <https://mwparserfromhell.readthedocs.org/en/latest/>
 # Currently used in textlib.extract_templates_and_params
-# This is more accurate than our current regex, but only works
+# This is more accurate than our own tokenizer, but only works
 # if the user has already installed the library.
 use_mwparserfromhell = True
 
@@ -1133,13 +1208,6 @@ if family == 'wikipedia' and mylang == 'language':
                 "Defaulting to family='test' and mylang='test'.")
     family = mylang = 'test'
 
-# Fix up socket_timeout
-# Older requests library expect a single value whereas newer versions also
-# accept a tuple (connect timeout, read timeout).
-if (isinstance(socket_timeout, tuple) and
-        StrictVersion(requests_version) < StrictVersion('2.4.0')):
-    socket_timeout = max(socket_timeout)
-
 # SECURITY WARNINGS
 if (not ignore_file_security_warnings and
         private_files_permission & (stat.S_IRWXG | stat.S_IRWXO) != 0):
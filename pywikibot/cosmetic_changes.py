@@ -50,14 +50,17 @@ or by adding a list to the given one:
 """
 #
 # (C) xqt, 2009-2016
-# (C) Pywikibot team, 2006-2017
+# (C) Pywikibot team, 2006-2018
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, unicode_literals
 
 import re
+import threading
+import time
 
+from collections import defaultdict
 from warnings import warn
 
 try:
@@ -70,7 +73,7 @@ import pywikibot
 from pywikibot import config, textlib
 from pywikibot.textlib import _MultiTemplateMatchBuilder, FILE_LINK_REGEX
 from pywikibot.tools import deprecated_args, first_lower, first_upper
-from pywikibot.tools import MediaWikiVersion
+from pywikibot.tools import MediaWikiVersion, StringTypes
 
 
 # This is from interwiki.py;
@@ -137,6 +140,91 @@ CANCEL_METHOD = 2
 CANCEL_MATCH = 3
 
 
+def triggers(*items):
+    """
+    Declare what a clean up method needs to find in the text to change it.
+
+    Each item is either a literal substring or a compiled regular
+    expression. If the toolkit skips unchanged texts, the method is only
+    executed when at least one item is found in the text. The items must
+    therefore be necessary conditions for any change of the method.
+    """
+    def decorator(method):
+        method.triggers = items
+        return method
+    return decorator
+
+
+class CosmeticChangesStatistics(object):
+
+    """
+    Timing and hit counters of the clean up methods.
+
+    For each method it counts how often it was executed, skipped by its
+    triggers and how often it changed the text as well as the total time
+    spent in it.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Reset all counters."""
+        with self._lock:
+            self.calls = defaultdict(int)
+            self.skips = defaultdict(int)
+            self.hits = defaultdict(int)
+            self.times = defaultdict(float)
+
+    def record(self, name, duration, changed):
+        """Record one execution of a method."""
+        with self._lock:
+            self.calls[name] += 1
+            self.times[name] += duration
+            if changed:
+                self.hits[name] += 1
+
+    def record_skip(self, name):
+        """Record that a method was skipped by its triggers."""
+        with self._lock:
+            self.skips[name] += 1
+
+    def as_dict(self):
+        """
+        Return the counters of each method.
+
+        @return: method names mapped to dicts with the keys calls, skips,
+            hits and time
+        @rtype: dict
+        """
+        with self._lock:
+            return dict(
+                (name, {'calls': self.calls[name],
+                        'skips': self.skips[name],
+                        'hits': self.hits[name],
+                        'time': self.times[name]})
+                for name in set(self.calls) | set(self.skips))
+
+    def output(self):
+        """Output the counters, sorted by the time spent in each method."""
+        stats = self.as_dict()
+        if not stats:
+            return
+        pywikibot.output('{0:<40} {1:>7} {2:>7} {3:>7} {4:>10}'.format(
+            'method', 'calls', 'skips', 'hits', 'time [s]'))
+        for name, counts in sorted(stats.items(),
+                                   key=lambda item: -item[1]['time']):
+            pywikibot.output(
+                '{0:<40} {calls:>7} {skips:>7} {hits:>7} {time:>10.3f}'
+                .format(name, **counts))
+
+
+# Counters of all toolkits
+statistics = CosmeticChangesStatistics()
+
+
 def _format_isbn_match(match, strict=True):
     """Helper function to validate and format a single matched ISBN."""
     scripts_isbn = None
@@ -198,10 +286,17 @@ class CosmeticChangesToolkit(object):
 
     @deprecated_args(debug='diff', redirect=None)
     def __init__(self, site, diff=False, namespace=None, pageTitle=None,
-                 ignore=CANCEL_ALL):
-        """Constructor."""
+                 ignore=CANCEL_ALL, skip_unchanged=False):
+        """
+        Constructor.
+
+        @param skip_unchanged: Skip each clean up method whose triggers are
+            not found in the text instead of executing it.
+        @type skip_unchanged: bool
+        """
         self.site = site
         self.diff = diff
+        self.skip_unchanged = skip_unchanged
         try:
             self.namespace = self.site.namespaces.resolve(namespace).pop(0)
         except (KeyError, TypeError, IndexError):
@@ -238,10 +333,29 @@ class CosmeticChangesToolkit(object):
         )
 
     @classmethod
-    def from_page(cls, page, diff, ignore):
+    def from_page(cls, page, diff, ignore, skip_unchanged=False):
         """Create toolkit based on the page."""
         return cls(page.site, diff=diff, namespace=page.namespace(),
-                   pageTitle=page.title(), ignore=ignore)
+                   pageTitle=page.title(), ignore=ignore,
+                   skip_unchanged=skip_unchanged)
+
+    @staticmethod
+    def may_change(method, text):
+        """
+        Return whether the method may change the text based on its triggers.
+
+        Methods without triggers may always change the text.
+        """
+        items = getattr(method, 'triggers', None)
+        if items is None:
+            return True
+        for item in items:
+            if isinstance(item, StringTypes):
+                if item in text:
+                    return True
+            elif item.search(text):
+                return True
+        return False
 
     def safe_execute(self, method, text):
         """Execute the method and catch exceptions if enabled."""
@@ -260,7 +374,14 @@ class CosmeticChangesToolkit(object):
     def _change(self, text):
         """Execute all clean up methods."""
         for method in self.common_methods:
-            text = self.safe_execute(method, text)
+            name = method.__name__
+            if self.skip_unchanged and not self.may_change(method, text):
+                statistics.record_skip(name)
+                continue
+            start = time.time()
+            new_text = self.safe_execute(method, text)
+            statistics.record(name, time.time() - start, new_text != text)
+            text = new_text
         return text
 
     def change(self, text):
@@ -279,6 +400,7 @@ class CosmeticChangesToolkit(object):
                 pywikibot.showDiff(text, new_text)
             return new_text
 
+    @triggers('[[')
     def fixSelfInterwiki(self, text):
         """
         Interwiki links to the site itself are displayed like local links.
@@ -291,6 +413,7 @@ class CosmeticChangesToolkit(object):
             text = interwikiR.sub(r'[[\1]]', text)
         return text
 
+    @triggers('[[', re.compile(r'\A\s|\s\Z'))
     def standardizePageFooter(self, text):
         """
         Standardize page footer.
@@ -355,6 +478,7 @@ class CosmeticChangesToolkit(object):
                                                 template_subpage=subpage)
         return text
 
+    @triggers('[[')
     def translateAndCapitalizeNamespaces(self, text):
         """Use localized namespace names."""
         # arz uses english stylish codes
@@ -400,6 +524,7 @@ class CosmeticChangesToolkit(object):
                     exceptions)
         return text
 
+    @triggers('[[')
     def translateMagicWords(self, text):
         """Use localized magic words."""
         # not wanted at ru
@@ -431,6 +556,7 @@ class CosmeticChangesToolkit(object):
                                          exceptions)
         return text
 
+    @triggers('[[')
     def cleanUpLinks(self, text):
         """Tidy up wikilinks found in a string.
 
@@ -613,6 +739,7 @@ class CosmeticChangesToolkit(object):
         text = pywikibot.html2unicode(text, ignore=ignore)
         return text
 
+    @triggers(re.compile(r'(?m)[\t ](?: |$)'))
     def removeUselessSpaces(self, text):
         """Cleanup multiple or trailing spaces."""
         exceptions = ['comment', 'math', 'nowiki', 'pre', 'startspace', 'table']
@@ -622,6 +749,7 @@ class CosmeticChangesToolkit(object):
                                      site=self.site)
         return text
 
+    @triggers('&nbsp;%')
     def removeNonBreakingSpaceBeforePercent(self, text):
         """
         Remove a non-breaking space between number and percent sign.
@@ -634,6 +762,7 @@ class CosmeticChangesToolkit(object):
                                      ['timeline'])
         return text
 
+    @triggers('=')
     def cleanUpSectionHeaders(self, text):
         """
         Add a space between the equal signs and the section title.
@@ -653,6 +782,7 @@ class CosmeticChangesToolkit(object):
             r'\1 \g<title> \1%s' % config.LS,
             ['comment', 'math', 'nowiki', 'pre'])
 
+    @triggers('*', '#')
     def putSpacesInLists(self, text):
         """
         Add a space between the * or # and the text.
@@ -671,6 +801,7 @@ class CosmeticChangesToolkit(object):
                 exceptions)
         return text
 
+    @triggers('{{')
     def replaceDeprecatedTemplates(self, text):
         """Replace deprecated templates."""
         exceptions = ['comment', 'math', 'nowiki', 'pre']
@@ -695,6 +826,7 @@ class CosmeticChangesToolkit(object):
         return text
 
     # from fixes.py
+    @triggers('[')
     def fixSyntaxSave(self, text):
         """Convert weblinks to wikilink, fix link syntax."""
         def replace_link(match):
@@ -763,6 +895,7 @@ class CosmeticChangesToolkit(object):
             r'[\g<url> \g<label>]', exceptions)
         return text
 
+    @triggers('<')
     def fixHtml(self, text):
         """Relace html markups with wikitext markups."""
         def replace_header(match):
@@ -795,6 +928,7 @@ class CosmeticChangesToolkit(object):
         # TODO: maybe we can make the bot replace <p> tags with \r\n's.
         return text
 
+    @triggers('<')
     def fixReferences(self, text):
         """Fix references tags."""
         # See also https://en.wikipedia.org/wiki/User:AnomieBOT/source/tasks/OrphanReferenceFixer.pm
@@ -812,6 +946,7 @@ class CosmeticChangesToolkit(object):
                                      r'<ref \1/>', exceptions)
         return text
 
+    @triggers('prettytable')
     def fixStyle(self, text):
         """Convert prettytable to wikitable class."""
         exceptions = ['nowiki', 'comment', 'math', 'pre', 'source',
@@ -822,6 +957,7 @@ class CosmeticChangesToolkit(object):
                                          r'\1wikitable\2', exceptions)
         return text
 
+    @triggers('ccm', 'º', '°')
     def fixTypo(self, text):
         """Fix units."""
         exceptions = ['nowiki', 'comment', 'math', 'pre', 'source',
@@ -26,11 +26,17 @@ try:
 except ImportError:
     import pickle
 
+# Decode the responses with orjson if it is installed, as it is faster
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
 import pywikibot
 
 from pywikibot import config, login
 
-from pywikibot.comms import http
+from pywikibot.comms import cassette, http
 from pywikibot.exceptions import (
     Server504Error, Server414Error, FatalServerError, NoUsername,
     Error, TimeoutError, InvalidTitle, UnsupportedPage
@@ -1231,6 +1237,61 @@ class OptionSet(MutableMapping):
         return len(self._enabled) + len(self._disabled)
 
 
+class RequestProfile(object):
+
+    """
+    The site specific decisions about the default parameters of requests.
+
+    They depend on the MediaWiki version and the extensions of a site. Each
+    of them is looked up in the siteinfo when it is first needed and reused
+    for all following requests. They are looked up separately, as the
+    siteinfo itself is requested with a query.
+    """
+
+    def __init__(self, site):
+        """
+        Constructor.
+
+        @param site: The site the requests are sent to
+        @type site: pywikibot.site.APISite
+        """
+        self.site = site
+        self.siteinfo = site._siteinfo
+        self._values = {}
+
+    def _get(self, name, func):
+        """Return the value and determine it using func the first time."""
+        if name not in self._values:
+            self._values[name] = func()
+        return self._values[name]
+
+    @property
+    def rawcontinue(self):
+        """Whether queries without continue need the rawcontinue parameter."""
+        return self._get('rawcontinue', lambda: MediaWikiVersion(
+            self.site.version()) >= MediaWikiVersion('1.25wmf5'))
+
+    @property
+    def assert_user(self):
+        """Whether all write actions support the assert parameter."""
+        return self._get('assert_user', lambda: MediaWikiVersion(
+            self.site.version()) >= MediaWikiVersion('1.23'))
+
+    @property
+    def proofread(self):
+        """Whether queries with prop request the proofread property."""
+        return self._get('proofread',
+                         lambda: self.site.has_extension('ProofreadPage'))
+
+    @property
+    def formatversion(self):
+        """The format version for requests which can handle version 2."""
+        if config.api_formatversion != 2:
+            return 1
+        return self._get('formatversion', lambda: 2 if MediaWikiVersion(
+            self.site.version()) >= MediaWikiVersion('1.25') else 1)
+
+
 class EnableSSLSiteWrapper(object):
 
     """Wrapper to change the site protocol to https."""
@@ -1431,6 +1492,10 @@ class Request(MutableMapping):
         # Client side verification that the request is being performed
         # by a logged in user, and warn if it isn't a config username.
         if self.write:
+            # A site snapshot is checked against the server before the first
+            # write, as it might be outdated.
+            if hasattr(self.site, '_snapshot'):
+                self.site._snapshot.verify()
             if not hasattr(self.site, "_userinfo"):
                 raise Error(u"API write action attempted without userinfo")
             assert('name' in self.site._userinfo)
@@ -1455,7 +1520,7 @@ class Request(MutableMapping):
         # otherwise be a problem.
         # This situation is only tripped when one of the first actions
         # on the site is a write action and the extension isn't installed.
-        if ((self.write and MediaWikiVersion(self.site.version()) >= MediaWikiVersion("1.23")) or
+        if ((self.write and self.site.request_profile.assert_user) or
                 (self.action == 'edit' and
                  self.site.has_extension('AssertEdit'))):
             pywikibot.debug(u"Adding user assertion", _logger)
@@ -1671,16 +1736,19 @@ class Request(MutableMapping):
             # will be blocked from accessing the userinfo.
             # Work around this by requiring userinfo only if 'tokens' and 'login'
             # are not both set.
+            # In lean mode, the userinfo is requested separately instead.
             typep = self._params.get('type', [])
-            if not ('tokens' in meta and 'login' in typep):
+            if (not ('tokens' in meta and 'login' in typep) and
+                    not config.lean_api_requests):
                 if 'userinfo' not in meta:
                     meta = set(meta + ['userinfo'])
                     self._params['meta'] = sorted(meta)
                 uiprop = self._params.get("uiprop", [])
                 uiprop = set(uiprop + ["blockinfo", "hasmsg"])
                 self._params['uiprop'] = sorted(uiprop)
+            profile = self.site.request_profile
             if 'prop' in self._params:
-                if self.site.has_extension('ProofreadPage'):
+                if profile.proofread:
                     prop = set(self._params['prop'] + ['proofread'])
                     self._params['prop'] = sorted(prop)
             # When neither 'continue' nor 'rawcontinue' is present and the
@@ -1688,7 +1756,7 @@ class Request(MutableMapping):
             # parameter. Querying siteinfo is save as it adds 'continue'.
             if ('continue' not in self._params and
                     'rawcontinue' not in self._params and
-                    MediaWikiVersion(self.site.version()) >= MediaWikiVersion('1.25wmf5')):
+                    profile.rawcontinue):
                 self._params['rawcontinue'] = ['']
         if "maxlag" not in self._params and config.maxlag:
             self._params["maxlag"] = [str(config.maxlag)]
@@ -1868,6 +1936,9 @@ class Request(MutableMapping):
                     continue
                 if '*' in warning:
                     text = warning['*']
+                elif 'warnings' in warning:
+                    # formatversion 2
+                    text = warning['warnings']
                 elif 'html' in warning:
                     # bug T51978
                     text = warning['html']['*']
@@ -1882,6 +1953,31 @@ class Request(MutableMapping):
                             not self._warning_handler(mod, single_warning)):
                         pywikibot.warning(u"API warning (%s): %s" % (mod, single_warning))
 
+    def _check_userinfo(self):
+        """
+        Request the userinfo in lean mode when it is due.
+
+        Lean queries don't include the userinfo. It is requested before each
+        write instead and when it is older than
+        C{config.lean_userinfo_interval} seconds. The site logs in again if
+        the bot isn't logged in as its user anymore.
+        """
+        if not config.lean_api_requests or self.site.user() is None:
+            return
+        if 'userinfo' in self._params.get('meta', []):
+            return
+        if (not self.write and time.time() - self.site._userinfo_time <
+                config.lean_userinfo_interval):
+            return
+        expected = self.site.user()
+        username = self.site.getuserinfo(force=True).get('name')
+        if username != expected:
+            pywikibot.error(
+                "Logged in as '{actual}' instead of '{expected}'. "
+                'Forcing re-login.'.format(actual=username,
+                                           expected=expected))
+            self.site._relogin()
+
     def submit(self):
         """
         Submit a query and parse the response.
@@ -1890,6 +1986,7 @@ class Request(MutableMapping):
         @rtype: dict
         """
         self._add_defaults()
+        self._check_userinfo()
         if (not config.enable_GET_without_SSL and
                 self.site.protocol() != 'https' or
                 self.site.is_oauth_token_available()):  # work around T108182
@@ -1980,7 +2077,7 @@ class Request(MutableMapping):
             if rawdata.startswith(u"unknown_action"):
                 raise APIError(rawdata[:14], rawdata[16:])
             try:
-                result = json.loads(rawdata)
+                result = json_loads(rawdata)
             except ValueError:
                 # if the result isn't valid JSON, there must be a server
                 # problem. Wait a few seconds and try again
@@ -2317,6 +2414,9 @@ class CachedRequest(Request):
         @rtype: bool
         """
         self._add_defaults()
+        if isinstance(http.transport, cassette.CassetteTransport):
+            # The request must be in the cassette, independent of the cache
+            return False
         try:
             filename = self._cachefile_path()
             with open(filename, 'rb') as f:
@@ -2643,6 +2743,18 @@ class QueryGenerator(_RequestWrapper):
         """
         self.limit = int(value)
 
+    def set_formatversion(self):
+        """
+        Request the results in the format version of the site profile.
+
+        It is 2 if C{config.api_formatversion} is 2 and the site supports it.
+        The results must then be processed by code which handles both format
+        versions, like L{update_page}.
+        """
+        formatversion = self.site.request_profile.formatversion
+        if formatversion != 1:
+            self.request['formatversion'] = formatversion
+
     def _update_limit(self):
         """Set query limit for self.module based on api response."""
         param = self.site._paraminfo.parameter('query+' + self.limited_module,
@@ -2797,10 +2909,11 @@ class QueryGenerator(_RequestWrapper):
                         resultdata = [resultdata[k]
                                       for k in sorted(resultdata.keys())]
                 else:
-                    pywikibot.debug(u"%s received %s; limit=%s"
-                                    % (self.__class__.__name__,
-                                       resultdata,
-                                       self.limit),
+                    # Don't format the whole list, which contains the
+                    # content of the pages with formatversion 2
+                    pywikibot.debug('{0} received {1} items; limit={2}'
+                                    .format(self.__class__.__name__,
+                                            len(resultdata), self.limit),
                                     _logger)
                 if "normalized" in self.data["query"]:
                     self.normalized = dict((item['to'], item['from'])
@@ -2903,6 +3016,8 @@ class PageGenerator(QueryGenerator):
         QueryGenerator.__init__(self, **kwargs)
         self.resultkey = "pages"  # element to look for in result
         self.props = self.request['prop']
+        # The pages are only processed by update_page
+        self.set_formatversion()
 
     def result(self, pagedata):
         """Convert page dict entry from api to Page object.
@@ -3163,6 +3278,8 @@ def update_page(page, pagedict, props=[]):
     @raises InvalidTitle: Page title is invalid
     @raises UnsupportedPage: Page with namespace < 0 is not supported yet
     """
+    # With formatversion 2, pagedict uses true and false instead of empty
+    # strings and missing keys for booleans and 'content' instead of '*'.
     if "pageid" in pagedict:
         page._pageid = int(pagedict['pageid'])
     elif "missing" in pagedict:
@@ -3183,7 +3300,7 @@ def update_page(page, pagedict, props=[]):
         page._quality = pagedict['proofread']['quality']
         page._quality_text = pagedict['proofread']['quality_text']
     if 'info' in props:
-        page._isredir = 'redirect' in pagedict
+        page._isredir = pagedict.get('redirect', False) is not False
     if 'touched' in pagedict:
         page._timestamp = pagedict['touched']
     if 'protection' in pagedict:
@@ -3201,10 +3318,10 @@ def update_page(page, pagedict, props=[]):
                 revid=rev['revid'],
                 timestamp=pywikibot.Timestamp.fromISOformat(rev['timestamp']),
                 user=rev.get('user', u''),
-                anon='anon' in rev,
+                anon=rev.get('anon', False) is not False,
                 comment=rev.get('comment', u''),
-                minor='minor' in rev,
-                text=rev.get('*', None),
+                minor=rev.get('minor', False) is not False,
+                text=rev.get('content', rev.get('*')),
                 rollbacktoken=rev.get('rollbacktoken', None),
                 parentid=rev.get('parentid'),
                 contentmodel=rev.get('contentmodel', None),
@@ -3235,7 +3352,7 @@ def update_page(page, pagedict, props=[]):
         links = []
         for ll in pagedict["langlinks"]:
             link = pywikibot.Link.langlinkUnsafe(ll['lang'],
-                                                 ll['*'],
+                                                 ll.get('title', ll.get('*')),
                                                  source=page.site)
             links.append(link)
 
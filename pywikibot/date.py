@@ -7,7 +7,7 @@
 # (C) Andre Engels, 2004-2005
 # (C) Yuri Astrakhan, 2005-2006 (<Firstname><Lastname>@gmail.com)
 #       (years/decades/centuries/millenniums str <=> int conversions)
-# (C) Pywikibot team, 2004-2017
+# (C) Pywikibot team, 2004-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -18,6 +18,9 @@ import datetime
 import re
 import sys
 
+from collections import MutableMapping
+from functools import partial
+
 from pywikibot.tools import first_lower, first_upper, deprecated
 
 if sys.version_info[0] > 2:
@@ -1949,13 +1952,102 @@ formats = {
     },
 }
 
+
+class _LazyFormatDict(MutableMapping):
+
+    """
+    Mapping of language codes to converter functions built on demand.
+
+    Entries may be registered with a factory using L{add_lazy}; the factory
+    is called the first time the language is looked up and its result is
+    stored like any other entry. Apart from that it behaves like the plain
+    dicts used for the other formats.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._data = {}
+        self._factories = {}
+
+    def add_lazy(self, lang, factory):
+        """Register a factory which builds the converter for lang."""
+        self._data.pop(lang, None)
+        self._factories[lang] = factory
+
+    def __getitem__(self, lang):
+        """Return the converter for lang, building it if needed."""
+        try:
+            return self._data[lang]
+        except KeyError:
+            factory = self._factories[lang]
+        func = self._data[lang] = factory()
+        self._factories.pop(lang, None)
+        return func
+
+    def __setitem__(self, lang, func):
+        """Set the converter for lang."""
+        self._factories.pop(lang, None)
+        self._data[lang] = func
+
+    def __delitem__(self, lang):
+        """Remove the converter for lang."""
+        if lang in self._factories:
+            del self._factories[lang]
+            self._data.pop(lang, None)
+        else:
+            del self._data[lang]
+
+    def __contains__(self, lang):
+        """Return whether lang has a converter without building it."""
+        return lang in self._data or lang in self._factories
+
+    def __iter__(self):
+        """Iterate over all language codes."""
+        for lang in list(self._data):
+            yield lang
+        for lang in list(self._factories):
+            if lang not in self._data:
+                yield lang
+
+    def __len__(self):
+        """Return the number of language codes."""
+        return len(self._data) + len(
+            set(self._factories).difference(self._data))
+
+
 #
 # Add auto-generated empty dictionaries for DayOfMonth and MonthOfYear articles
 #
 for dayOfMonth in dayMnthFmts:
-    formats[dayOfMonth] = {}
+    formats[dayOfMonth] = _LazyFormatDict()
 for monthOfYear in yrMnthFmts:
-    formats[monthOfYear] = {}
+    formats[monthOfYear] = _LazyFormatDict()
+
+
+def _make_dh_func(helper, pattern):
+    """Return a converter calling helper with the given pattern."""
+    return lambda v: helper(v, pattern)
+
+
+def _make_multi_func(tuplst):
+    """Return a converter trying each (helper, pattern, predicate)."""
+    tuplst = [(_make_dh_func(helper, pattern), predicate)
+              for helper, pattern, predicate in tuplst]
+    return lambda m: multi(m, tuplst)
+
+
+def _month_fmt(isMnthOfYear, ind):
+    """Return the format name and the dh helper for one month."""
+    if isMnthOfYear:
+        return yrMnthFmts[ind], dh_mnthOfYear
+    else:
+        return dayMnthFmts[ind], dh_dayOfMnth
+
+
+def _make_month_named_func(helper, lang, pattern, makeUpperCase, month):
+    """Return a converter for a pattern using a localized month name."""
+    return _make_dh_func(
+        helper, _month_named_pattern(lang, pattern, makeUpperCase, month))
 
 
 def addFmt1(lang, isMnthOfYear, patterns):
@@ -1964,6 +2056,7 @@ def addFmt1(lang, isMnthOfYear, patterns):
     The function must accept one parameter for the ->int or ->string
     conversions, just like everywhere else in the formats map.
     The patterns parameter is a list of 12 elements to be used for each month.
+    The converters are only built when they are looked up the first time.
 
     """
     if len(patterns) != 12:
@@ -1971,18 +2064,21 @@ def addFmt1(lang, isMnthOfYear, patterns):
 
     for i in range(12):
         if patterns[i] is not None:
-            if isMnthOfYear:
-                formats[yrMnthFmts[i]][lang] = eval(
-                    u'lambda v: dh_mnthOfYear(v, u"%s")' % patterns[i])
-            else:
-                formats[dayMnthFmts[i]][lang] = eval(
-                    u'lambda v: dh_dayOfMnth(v, u"%s")' % patterns[i])
+            fmt, helper = _month_fmt(isMnthOfYear, i)
+            formats[fmt].add_lazy(
+                lang, partial(_make_dh_func, helper, patterns[i]))
 
 
 def addFmt2(lang, isMnthOfYear, pattern, makeUpperCase=None):
-    """Update yrMnthFmts and dayMnthFmts using addFmt1."""
-    addFmt1(lang, isMnthOfYear,
-            makeMonthNamedList(lang, pattern, makeUpperCase))
+    """Update yrMnthFmts and dayMnthFmts like addFmt1 using month names.
+
+    The localized month names are only looked up when a converter is built.
+    """
+    for i in range(12):
+        fmt, helper = _month_fmt(isMnthOfYear, i)
+        formats[fmt].add_lazy(
+            lang, partial(_make_month_named_func, helper, lang, pattern,
+                          makeUpperCase, i + 1))
 
 
 def makeMonthList(pattern):
@@ -1990,6 +2086,14 @@ def makeMonthList(pattern):
     return [pattern % m for m in range(1, 13)]
 
 
+def _month_named_pattern(lang, pattern, makeUpperCase, month):
+    """Return pattern formatted with the localized name of one month."""
+    name = monthName(lang, month)
+    if makeUpperCase is not None:
+        name = first_upper(name) if makeUpperCase else first_lower(name)
+    return pattern % name
+
+
 def makeMonthNamedList(lang, pattern, makeUpperCase=None):
     """Create a list of 12 elements based on the name of the month.
 
@@ -1999,13 +2103,8 @@ def makeMonthNamedList(lang, pattern, makeUpperCase=None):
     Use %%d for any other parameters that should be preserved.
 
     """
-    if makeUpperCase is None:
-        return [pattern % monthName(lang, m) for m in range(1, 13)]
-    elif makeUpperCase:
-        f = first_upper
-    else:
-        f = first_lower
-    return [pattern % f(monthName(lang, m)) for m in range(1, 13)]
+    return [_month_named_pattern(lang, pattern, makeUpperCase, m)
+            for m in range(1, 13)]
 
 
 # Add day of the month formats to the formatting table: "en:May 15"
@@ -2194,30 +2293,25 @@ waMonthNames = [u"djanvî", u"fevrî", u"måss", u"avri", u"may", u"djun",
 
 # For month names begining with a consonant...
 for i in (0, 1, 2, 4, 5, 6, 8, 10, 11):
-    formats[dayMnthFmts[i]]['wa'] = eval(
-        (u'lambda m: multi(m, [' +
-         u'(lambda v: dh_dayOfMnth(v, u"%%dî d\' %s"), lambda p: p == 1),' +
-         u'(lambda v: dh_dayOfMnth(v, u"%%d d\' %s"),  lambda p: p in [2,3,20,22,23]),' +
-         u'(lambda v: dh_dayOfMnth(v, u"%%d di %s"),   alwaysTrue)])')
-        % (waMonthNames[i], waMonthNames[i], waMonthNames[i]))
+    formats[dayMnthFmts[i]].add_lazy('wa', partial(_make_multi_func, [
+        (dh_dayOfMnth, u"%%dî d' %s" % waMonthNames[i], lambda p: p == 1),
+        (dh_dayOfMnth, u"%%d d' %s" % waMonthNames[i],
+         lambda p: p in [2, 3, 20, 22, 23]),
+        (dh_dayOfMnth, u"%%d di %s" % waMonthNames[i], alwaysTrue)]))
 
 # For month names begining with a vowel...
 for i in (3, 7, 9):
-    formats[dayMnthFmts[i]]['wa'] = eval(
-        (u'lambda m: multi(m, [' +
-         u'(lambda v: dh_dayOfMnth(v, u"%%dî d\' %s"), lambda p: p == 1),' +
-         u'(lambda v: dh_dayOfMnth(v, u"%%d d\' %s"),  alwaysTrue)])')
-        % (waMonthNames[i], waMonthNames[i]))
+    formats[dayMnthFmts[i]].add_lazy('wa', partial(_make_multi_func, [
+        (dh_dayOfMnth, u"%%dî d' %s" % waMonthNames[i], lambda p: p == 1),
+        (dh_dayOfMnth, u"%%d d' %s" % waMonthNames[i], alwaysTrue)]))
 
 # Brazil uses "1añ" for the 1st of every month, and number without suffix for
 # all other days
 brMonthNames = makeMonthNamedList('br', u"%s", True)
 for i in range(0, 12):
-    formats[dayMnthFmts[i]]['br'] = eval(
-        (u'lambda m: multi(m, [' +
-         u'(lambda v: dh_dayOfMnth(v, u"%%dañ %s"), lambda p: p == 1),' +
-         u'(lambda v: dh_dayOfMnth(v, u"%%d %s"),   alwaysTrue)])')
-        % (brMonthNames[i], brMonthNames[i]))
+    formats[dayMnthFmts[i]].add_lazy('br', partial(_make_multi_func, [
+        (dh_dayOfMnth, u"%%dañ %s" % brMonthNames[i], lambda p: p == 1),
+        (dh_dayOfMnth, u"%%d %s" % brMonthNames[i], alwaysTrue)]))
 
 #
 # Month of the Year: "en:May 1976"
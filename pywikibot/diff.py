@@ -11,6 +11,7 @@ import difflib
 import math
 import sys
 
+from bisect import bisect
 from collections import Sequence
 if sys.version_info[0] > 2:
     from itertools import zip_longest
@@ -25,6 +26,132 @@ from pywikibot.tools import deprecated_args
 from pywikibot.tools.formatter import color_format
 
 
+class LineMatcher(difflib.SequenceMatcher):
+
+    """
+    SequenceMatcher anchoring the matches on unique lines.
+
+    SequenceMatcher searches the longest matching block of the remaining
+    ranges again and again. On long pages with many scattered changes this
+    takes quadratic time. This matcher first matches the lines which occur
+    exactly once in both sequences, taking the longest subsequence of them
+    in the same order (patience diff). Only the short gaps between these
+    anchors are compared like SequenceMatcher does.
+
+    The opcodes have the same format as those of SequenceMatcher.
+    """
+
+    def get_matching_blocks(self):
+        """
+        Return list of triples describing matching subsequences.
+
+        @see: difflib.SequenceMatcher.get_matching_blocks
+        """
+        if self.matching_blocks is not None:
+            return self.matching_blocks
+
+        la, lb = len(self.a), len(self.b)
+        blocks = []
+        alo = blo = 0
+        for i, j in self._unique_anchors():
+            self._match_gap(alo, i, blo, j, blocks)
+            blocks.append((i, j, 1))
+            alo, blo = i + 1, j + 1
+        self._match_gap(alo, la, blo, lb, blocks)
+
+        # collapse adjacent blocks like SequenceMatcher does
+        i1 = j1 = k1 = 0
+        non_adjacent = []
+        for i2, j2, k2 in blocks:
+            if i1 + k1 == i2 and j1 + k1 == j2:
+                k1 += k2
+            else:
+                if k1:
+                    non_adjacent.append((i1, j1, k1))
+                i1, j1, k1 = i2, j2, k2
+        if k1:
+            non_adjacent.append((i1, j1, k1))
+        non_adjacent.append((la, lb, 0))
+
+        self.matching_blocks = [difflib.Match._make(block)
+                                for block in non_adjacent]
+        return self.matching_blocks
+
+    def _unique_anchors(self):
+        """
+        Return the longest ordered list of lines unique in a and in b.
+
+        @return: pairs of indexes into a and b, ascending in both
+        @rtype: list of tuple
+        """
+        a_index = {}
+        for i, line in enumerate(self.a):
+            a_index[line] = None if line in a_index else i
+        b_index = {}
+        for j, line in enumerate(self.b):
+            if a_index.get(line) is not None:
+                b_index[line] = None if line in b_index else j
+        pairs = sorted((a_index[line], j)
+                       for line, j in b_index.items() if j is not None)
+
+        # longest increasing subsequence of the b indexes by patience sorting
+        tails = []  # smallest last b index of the subsequences of each length
+        ends = []  # index of the pair ending them
+        previous = []
+        for n, (i, j) in enumerate(pairs):
+            pile = bisect(tails, j)
+            if pile == len(tails):
+                tails.append(j)
+                ends.append(n)
+            else:
+                tails[pile] = j
+                ends[pile] = n
+            previous.append(ends[pile - 1] if pile else -1)
+
+        anchors = []
+        n = ends[-1] if ends else -1
+        while n >= 0:
+            anchors.append(pairs[n])
+            n = previous[n]
+        anchors.reverse()
+        return anchors
+
+    def _match_gap(self, alo, ahi, blo, bhi, blocks):
+        """Add the blocks of SequenceMatcher between two anchors."""
+        a, b = self.a, self.b
+        # lines next to the anchors, which may also be popular lines
+        # ignored by find_longest_match, extend the anchor blocks
+        start = alo
+        if alo > 0:
+            while alo < ahi and blo < bhi and a[alo] == b[blo]:
+                alo += 1
+                blo += 1
+        if alo > start:
+            blocks.append((start, blo - (alo - start), alo - start))
+        end = ahi
+        if ahi < len(a):
+            while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+                ahi -= 1
+                bhi -= 1
+        suffix = (ahi, bhi, end - ahi)
+
+        queue = [(alo, ahi, blo, bhi)]
+        gap_blocks = []
+        while queue:
+            alo, ahi, blo, bhi = queue.pop()
+            i, j, k = x = self.find_longest_match(alo, ahi, blo, bhi)
+            if k:
+                gap_blocks.append(x)
+                if alo < i and blo < j:
+                    queue.append((alo, i, blo, j))
+                if i + k < ahi and j + k < bhi:
+                    queue.append((i + k, ahi, j + k, bhi))
+        gap_blocks.sort()
+        blocks.extend(gap_blocks)
+        if suffix[2]:
+            blocks.append(suffix)
+
+
 class Hunk(object):
 
     """One change hunk between a and b.
@@ -60,20 +187,37 @@ class Hunk(object):
             '-': 'lightred',
         }
 
-        self.diff = list(self.create_diff())
-        self.diff_plain_text = u''.join(self.diff)
-        self.diff_text = u''.join(self.format_diff())
-
         first, last = self.group[0], self.group[-1]
         self.a_rng = (first[1], last[2])
         self.b_rng = (first[3], last[4])
 
         self.header = self.get_header()
-        self.diff_plain_text = u'%s\n%s' % (self.header, self.diff_plain_text)
-        self.diff_text = u'%s' % self.diff_text
+
+        # the diff texts are only created when they are needed
+        self._diff = None
+        self._diff_text = None
 
         self.reviewed = self.PENDING
 
+    @property
+    def diff(self):
+        """Return the lines of the diff, without formatting."""
+        if self._diff is None:
+            self._diff = list(self.create_diff())
+        return self._diff
+
+    @property
+    def diff_plain_text(self):
+        """Return the header and the diff lines, without formatting."""
+        return u'%s\n%s' % (self.header, u''.join(self.diff))
+
+    @property
+    def diff_text(self):
+        """Return the colored diff lines."""
+        if self._diff_text is None:
+            self._diff_text = u''.join(self.format_diff())
+        return self._diff_text
+
     def get_header(self):
         """Provide header of unified diff."""
         return self.get_header_text(self.a_rng, self.b_rng) + '\n'
@@ -281,7 +425,10 @@ class PatchManager(object):
                 self.b = text_b.splitlines(1)
 
         # groups and hunk have same order (one hunk correspond to one group).
-        s = difflib.SequenceMatcher(None, self.a, self.b)
+        if isinstance(self.a, list):
+            s = LineMatcher(None, self.a, self.b)
+        else:
+            s = difflib.SequenceMatcher(None, self.a, self.b)
         self.groups = list(s.get_grouped_opcodes(0))
         self.hunks = []
         previous_hunk = None
@@ -25,8 +25,6 @@ else:
 
 from warnings import warn
 
-import requests
-
 import pywikibot
 from pywikibot import config
 from pywikibot.exceptions import UnknownFamily, FamilyMaintenanceWarning
@@ -1286,6 +1284,7 @@ class Family(object):
         """
         # Here we return the latest mw release for downloading
         if not hasattr(self, '_version'):
+            import requests
             self._version = requests.get(
                 'https://www.mediawiki.org/w/api.php?action=expandtemplates'
                 '&text={{MW_stable_release_number}}&prop=wikitext&format=json'
@@ -15,9 +15,15 @@ The default message location may be changed by calling
 L{set_message_package} with a package name. The package must contain
 an __init__.py, and a message bundle called 'pywikibot' containing
 messages. See L{twntranslate} for more information on the messages.
+
+All bundles of a package may be compiled into a single catalogue file
+using L{compile_messages} (or the compile_i18n maintenance script). If
+that catalogue is found in the cache directory of the user it is used
+instead of reading the JSON file of each bundle and language separately,
+as long as the JSON files have not changed since it has been compiled.
 """
 #
-# (C) Pywikibot team, 2004-2017
+# (C) Pywikibot team, 2004-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -25,8 +31,10 @@ from __future__ import absolute_import, unicode_literals
 
 import json
 import os
+import pickle
 import pkgutil
 import re
+import threading
 
 from collections import defaultdict, Mapping
 from warnings import warn
@@ -38,9 +46,12 @@ from pywikibot import config
 from pywikibot.exceptions import Error
 from pywikibot.plural import plural_rules
 from pywikibot.tools import (
-    deprecated, deprecated_args, issue_deprecation_warning, StringTypes)
+    deprecated, deprecated_args, issue_deprecation_warning, OrderedDict,
+    StringTypes)
 
 PLURAL_PATTERN = r'{{PLURAL:(?:%\()?([^\)]*?)(?:\)d)?\|(.*?)}}'
+_PLURAL_REGEX = re.compile(PLURAL_PATTERN)
+_PLURAL_VARIANTS_REGEX = re.compile(r'(?!$)(?: *(\d+) *= *)?(.*?)(?:\||$)')
 
 # Package name for the translation messages. The messages data must loaded
 # relative to that package name. In the top of this package should be
@@ -53,6 +64,55 @@ _messages_available = None
 # Cache of translated messages
 _cache = defaultdict(dict)
 
+# Suffix of the name of the compiled message catalogue of a messages
+# package in the cache directory and the version of its format; see
+# compile_messages
+CATALOGUE_FILENAME = 'messages.pickle'
+_CATALOGUE_VERSION = 3
+# Loaded catalogues by package name; False if a package has none
+_catalogues = {}
+
+
+class _LRUCache(object):
+
+    """Thread safe mapping which keeps the most recently used items only."""
+
+    def __init__(self, maxsize):
+        """Constructor."""
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as recently used."""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def __setitem__(self, key, value):
+        """Cache a value and drop the least recently used one if needed."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached values."""
+        with self._lock:
+            self._data.clear()
+
+
+# Cache of the language and message found by twtranslate for a given
+# language, message key and fallback mode
+_resolved_cache = _LRUCache(1024)
+# Cache of parsed PLURAL messages; see _compile_plural
+_plural_cache = _LRUCache(1024)
+
 
 def set_messages_package(package_name):
     """Set the package name where i18n messages are located."""
@@ -305,12 +365,190 @@ class TranslationError(Error, ImportError):
     pass
 
 
+class _MessageCatalogue(object):
+
+    """
+    Compiled messages of all bundles of a messages package.
+
+    Each message key is stored with its own pickled mapping of languages to
+    messages, which is only unpickled when the key is used the first time.
+    """
+
+    def __init__(self, messages):
+        """Constructor."""
+        self._raw = messages
+        self._decoded = {}
+
+    def _translations(self, twtitle):
+        """Return the mapping of language codes to messages for twtitle."""
+        try:
+            return self._decoded[twtitle]
+        except KeyError:
+            pass
+        raw = self._raw.get(twtitle)
+        translations = pickle.loads(raw) if raw is not None else {}
+        self._decoded[twtitle] = translations
+        return translations
+
+    def get(self, lang, twtitle):
+        """Return the message for twtitle in lang or None."""
+        return self._translations(twtitle).get(lang)
+
+    def langs(self, twtitle):
+        """Return the sorted language codes which have twtitle."""
+        return sorted(self._translations(twtitle))
+
+
+def _catalogue_path(package_name):
+    """Return the default path of the catalogue of a messages package."""
+    return os.path.join(config.base_dir, 'cache', '{0}.{1}'.format(
+        package_name, CATALOGUE_FILENAME))
+
+
+def _package_path(package_name):
+    """Return the directory of a messages package."""
+    mod = __import__(package_name, fromlist=[str('__path__')])
+    return next(iter(mod.__path__))
+
+
+def _source_files(path):
+    """Yield the bundle, language and path of each JSON file of a package."""
+    for bundle in sorted(os.listdir(path)):
+        bundle_path = os.path.join(path, bundle)
+        if not os.path.isdir(bundle_path):
+            continue
+        for json_file in sorted(os.listdir(bundle_path)):
+            if json_file.endswith('.json'):
+                yield (bundle, json_file[:-len('.json')],
+                       os.path.join(bundle_path, json_file))
+
+
+def _sources(path):
+    """
+    Return the modification times of the directories of a package.
+
+    A catalogue is only used if they are the same as when it has been
+    compiled. Adding, removing or replacing a JSON file, as updating the
+    package does, changes the time of its bundle directory. Only the
+    directories are checked, which is much cheaper than checking each
+    JSON file.
+
+    @rtype: list of tuple
+    """
+    sources = [('', os.stat(path).st_mtime)]
+    for bundle in sorted(os.listdir(path)):
+        bundle_path = os.path.join(path, bundle)
+        if os.path.isdir(bundle_path):
+            sources.append((bundle, os.stat(bundle_path).st_mtime))
+    return sources
+
+
+def _get_catalogue():
+    """
+    Return the compiled catalogue of the messages package.
+
+    The catalogue is read once; if there is no valid catalogue of the
+    package or its directories have changed since it has been compiled,
+    False is returned and the JSON files are used instead.
+
+    @rtype: _MessageCatalogue or False
+    """
+    package_name = _messages_package_name
+    if package_name in _catalogues:
+        return _catalogues[package_name]
+    _catalogues[package_name] = False
+    filename = _catalogue_path(package_name)
+    if not os.path.exists(filename):
+        return False
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except (OSError, IOError) as e:
+        pywikibot.warning('Could not read i18n catalogue of {0}: {1}'
+                          .format(package_name, e))
+        return False
+    try:
+        data = pickle.loads(data)
+    except Exception as e:
+        pywikibot.warning('Could not load i18n catalogue of {0}: {1}'
+                          .format(package_name, e))
+        return False
+    if data.get('version') != _CATALOGUE_VERSION:
+        pywikibot.warning(
+            'Ignoring i18n catalogue of {0} with version {1}; compile it '
+            'again using compile_messages.'.format(package_name,
+                                                   data.get('version')))
+        return False
+    try:
+        sources = _sources(_package_path(package_name))
+    except (OSError, IOError, ImportError):
+        sources = None
+    if data['sources'] != sources:
+        pywikibot.warning(
+            'Ignoring i18n catalogue of {0} because the messages have '
+            'changed; compile it again using compile_messages.'
+            .format(package_name))
+        return False
+    _catalogues[package_name] = _MessageCatalogue(data['messages'])
+    return _catalogues[package_name]
+
+
+def compile_messages(package_name=None, filename=None):
+    """
+    Compile all message bundles of a package into one catalogue file.
+
+    The catalogue is stored in the cache directory of the user, outside
+    of the package, unless another filename is given. It is ignored once
+    the directories of the package have changed, so it must be compiled
+    again after the JSON files have been updated.
+
+    @param package_name: name of the messages package; the current messages
+        package if None
+    @type package_name: str
+    @param filename: path of the catalogue file to write
+    @type filename: str
+    @return: path of the written catalogue file
+    @rtype: str
+    """
+    package_name = package_name or _messages_package_name
+    path = _package_path(package_name)
+    # Files changed while they are read make the catalogue outdated
+    sources = _sources(path)
+
+    messages = defaultdict(dict)
+    for bundle, lang, json_file in _source_files(path):
+        with open(json_file, 'rb') as f:
+            transdict = json.loads(f.read().decode('utf-8'))
+        for twtitle, message in transdict.items():
+            if twtitle != '@metadata':
+                messages[twtitle][lang] = message
+
+    data = {
+        'version': _CATALOGUE_VERSION,
+        'sources': sources,
+        'messages': dict((twtitle, pickle.dumps(translations, 2))
+                         for twtitle, translations in messages.items()),
+    }
+    if filename is None:
+        filename = config.makepath(_catalogue_path(package_name))
+    with open(filename, 'wb') as f:
+        pickle.dump(data, f, 2)
+
+    _catalogues.pop(package_name, None)
+    _resolved_cache.clear()
+    return filename
+
+
 def _get_translation(lang, twtitle):
     """
     Return message of certain twtitle if exists.
 
     For internal use, don't use it directly.
     """
+    catalogue = _get_catalogue()
+    if catalogue:
+        return catalogue.get(lang, twtitle)
+
     if twtitle in _cache[lang]:
         return _cache[lang][twtitle]
     message_bundle = twtitle.split('-')[0]
@@ -330,6 +568,43 @@ def _get_translation(lang, twtitle):
         return
 
 
+def _compile_plural(message):
+    """
+    Split a message into literal text and parsed PLURAL instances.
+
+    The result is cached, so every message is only parsed once.
+
+    @return: literal strings and (selector, plural entries, specific
+        entries) tuples in the order of the message
+    @rtype: list
+    """
+    parts = _plural_cache.get(message)
+    if parts is not None:
+        return parts
+
+    parts = []
+    pos = 0
+    for match in _PLURAL_REGEX.finditer(message):
+        parts.append(message[pos:match.start()])
+        variants = match.group(2)
+        plural_entries = []
+        specific_entries = {}
+        # A plural entry can not start at the end of the variants list,
+        # and must end with | or the end of the variants list.
+        for number, plural in _PLURAL_VARIANTS_REGEX.findall(variants):
+            if number:
+                specific_entries[int(number)] = plural
+            else:
+                assert not specific_entries, \
+                    'generic entries defined after specific in "{0}"'.format(variants)
+                plural_entries += [plural]
+        parts.append((match.group(1), plural_entries, specific_entries))
+        pos = match.end()
+    parts.append(message[pos:])
+    _plural_cache[message] = parts
+    return parts
+
+
 def _extract_plural(code, message, parameters):
     """Check for the plural variants in message and replace them.
 
@@ -343,9 +618,7 @@ def _extract_plural(code, message, parameters):
     def static_plural_value(n):
         return rule['plural']
 
-    def replace_plural(match):
-        selector = match.group(1)
-        variants = match.group(2)
+    def replace_plural(selector, plural_entries, specific_entries):
         num = parameters[selector]
         if not isinstance(num, int):
             issue_deprecation_warning(
@@ -353,19 +626,6 @@ def _extract_plural(code, message, parameters):
                 'an int', 1)
             num = int(num)
 
-        plural_entries = []
-        specific_entries = {}
-        # A plural entry can not start at the end of the variants list,
-        # and must end with | or the end of the variants list.
-        for number, plural in re.findall(r'(?!$)(?: *(\d+) *= *)?(.*?)(?:\||$)',
-                                         variants):
-            if number:
-                specific_entries[int(number)] = plural
-            else:
-                assert not specific_entries, \
-                    'generic entries defined after specific in "{0}"'.format(variants)
-                plural_entries += [plural]
-
         if num in specific_entries:
             return specific_entries[num]
 
@@ -392,7 +652,9 @@ def _extract_plural(code, message, parameters):
         assert rule['nplurals'] == 1
         plural_value = static_plural_value
 
-    return re.sub(PLURAL_PATTERN, replace_plural, message)
+    return ''.join(part if isinstance(part, StringTypes)
+                   else replace_plural(*part)
+                   for part in _compile_plural(message))
 
 
 class _PluralMappingAlias(Mapping):
@@ -522,6 +784,31 @@ def translate(code, xdict, parameters=None, fallback=False):
     return trans
 
 
+def _resolve_translation(langs, twtitle):
+    """
+    Return the first language of langs which has a message for twtitle.
+
+    The result is cached for each combination of languages and message key.
+
+    @param langs: language codes in the order of preference
+    @type langs: list of str
+    @return: the language code and the message or (None, None)
+    @rtype: tuple
+    """
+    key = (_messages_package_name, tuple(langs), twtitle)
+    result = _resolved_cache.get(key)
+    if result is None:
+        for alt in langs:
+            trans = _get_translation(alt, twtitle)
+            if trans:
+                result = (alt, trans)
+                break
+        else:
+            result = (None, None)
+        _resolved_cache[key] = result
+    return result
+
+
 @deprecated_args(code='source')
 def twtranslate(source, twtitle, parameters=None, fallback=True,
                 only_plural=False):
@@ -614,11 +901,8 @@ def twtranslate(source, twtitle, parameters=None, fallback=True,
     langs = [lang]
     if fallback:
         langs += _altlang(lang) + ['en']
-    for alt in langs:
-        trans = _get_translation(alt, twtitle)
-        if trans:
-            break
-    else:
+    alt, trans = _resolve_translation(langs, twtitle)
+    if not trans:
         raise TranslationError(
             'No %s translation has been defined for TranslateWiki key'
             ' %r\nIt can happen due to lack of i18n submodule or files. '
@@ -695,6 +979,11 @@ def twget_keys(twtitle):
 
     @raises OSError: the package i18n can not be loaded
     """
+    catalogue = _get_catalogue()
+    if catalogue:
+        return [lang for lang in catalogue.langs(twtitle)
+                if lang != 'qqq' and catalogue.get(lang, twtitle)]
+
     # obtain the directory containing all the json files for this package
     package = twtitle.split("-")[0]
     mod = __import__(_messages_package_name, fromlist=[str('__file__')])
@@ -1313,7 +1313,8 @@ class BasePage(UnicodeMixin, ComparableMixin):
         ccToolkit = CosmeticChangesToolkit(self.site,
                                            namespace=self.namespace(),
                                            pageTitle=self.title(),
-                                           ignore=CANCEL_MATCH)
+                                           ignore=CANCEL_MATCH,
+                                           skip_unchanged=True)
         self.text = ccToolkit.change(old)
         if summary and old.strip().replace(
                 '\r\n', '\n') != self.text.strip().replace('\r\n', '\n'):
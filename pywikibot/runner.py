@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Run scripts in processes forked from a resident process.
+
+Starting a script imports pywikibot, reads the user configuration, loads the
+cookies and creates the sites with their siteinfo and API parameter
+information again. A L{Runner} does this once and forks a process for each
+script which it is asked to run, so the scripts start with all of that
+already done.
+
+Scripts are submitted over a Unix socket by C{pwb.py -runner:<socket>}. The
+client sends the length of the request as an unsigned 32 bit integer in
+network byte order and the request as JSON object with the keys C{argv},
+C{cwd} and C{env}. The file descriptors of its standard input, output and
+error stream are passed along, so the script reads from and writes directly
+to them. The runner answers with the process id of the worker and then its
+exit status, both as signed 32 bit integers in network byte order.
+
+The throttles of all scripts are shared, so that scripts running at the
+same time on the same site do not access it faster than one script would.
+
+It requires Python 3.3 or newer on a Unix system.
+"""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import array
+import atexit
+import io
+import json
+import os
+import runpy
+import socket
+import stat
+import struct
+import sys
+import traceback
+import warnings
+
+import pywikibot
+
+from pywikibot import config, throttle
+from pywikibot.tools import PY2
+
+if not PY2:
+    import socketserver
+else:
+    import SocketServer as socketserver
+
+_logger = 'runner'
+
+#: The length of a request
+HEADER = struct.Struct('!I')
+#: The process id of the worker and its exit status
+STATUS = struct.Struct('!i')
+
+#: The packages which are searched for scripts after
+#: C{config.user_script_paths}
+script_packages = ['scripts', 'scripts.maintenance', 'scripts.archive',
+                   'scripts.userscripts']
+
+
+def _receive_request(sock):
+    """
+    Receive a request and the file descriptors of the standard streams.
+
+    @param sock: The connection to the client
+    @type sock: socket.socket
+    @return: The request and the file descriptors
+    @rtype: dict, list of int
+    """
+    fds = array.array(str('i'))
+    data, ancdata, _, _ = sock.recvmsg(
+        4096, socket.CMSG_LEN(3 * fds.itemsize))
+    for level, kind, fd_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(
+                fd_data[:len(fd_data) - len(fd_data) % fds.itemsize])
+    if len(fds) != 3:
+        raise ValueError('The client must pass three file descriptors.')
+
+    while len(data) < HEADER.size:
+        data += _receive(sock, HEADER.size - len(data))
+    size = HEADER.unpack(data[:HEADER.size])[0]
+    data = data[HEADER.size:]
+    while len(data) < size:
+        data += _receive(sock, size - len(data))
+    return json.loads(data.decode('utf-8')), list(fds)
+
+
+def _receive(sock, size):
+    """Receive at most size bytes and fail if the client closed it."""
+    data = sock.recv(size)
+    if not data:
+        raise EOFError('The client closed the connection.')
+    return data
+
+
+def find_script(name):
+    """
+    Return the path of the script with that name.
+
+    It is looked up like pwb.py does, but relative to the current working
+    directory if it's a path.
+
+    @param name: The name or path of the script
+    @type name: str
+    @rtype: str
+    @raises OSError: The script does not exist
+    """
+    if not name.endswith('.py'):
+        name += '.py'
+    if os.path.exists(name):
+        return os.path.abspath(name)
+    base_dir = os.environ.get('PYWIKIBOT2_DIR_PWB') or os.path.dirname(
+        os.path.dirname(os.path.abspath(pywikibot.__file__)))
+    for package in list(config.user_script_paths) + script_packages:
+        path = os.path.join(base_dir, *(package.split('.') + [name]))
+        if os.path.exists(path):
+            return path
+    raise OSError('{0} not found!'.format(name))
+
+
+def run_script(argv):
+    """
+    Run a script as main module in this process.
+
+    @param argv: The name of the script and its arguments
+    @type argv: list of str
+    @return: The exit status
+    @rtype: int
+    """
+    try:
+        filename = find_script(argv[0])
+    except OSError as e:
+        sys.stderr.write('{0}\n'.format(e))
+        return 1
+    try:
+        sys.argv = [filename] + argv[1:]
+        pywikibot.argvu = list(argv)
+        sys.path[0] = os.path.dirname(filename)
+        runpy.run_path(filename, run_name='__main__')
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        sys.stderr.write('{0}\n'.format(e.code))
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+class JobHandler(socketserver.BaseRequestHandler):
+
+    """Run the script of a request in the forked process."""
+
+    @staticmethod
+    def _open_streams():
+        """Replace the standard streams of Python and the user interface."""
+        sys.stdin = io.open(0, 'r', encoding=config.console_encoding,
+                            closefd=False)
+        sys.stdout = io.open(1, 'w', buffering=1, closefd=False,
+                             encoding=config.console_encoding)
+        sys.stderr = io.open(2, 'w', buffering=1, closefd=False,
+                             encoding=config.console_encoding)
+        ui = pywikibot.bot.ui
+        ui.stdin, ui.stdout, ui.stderr = sys.stdin, sys.stdout, sys.stderr
+
+    def handle(self):
+        """Set up the process as requested and run the script."""
+        request, fds = _receive_request(self.request)
+        self.request.sendall(STATUS.pack(os.getpid()))
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        self._open_streams()
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+
+        # Initialise the logging again for the module name of the script and
+        # the new streams
+        pywikibot.bot._handlers_initialized = False
+        # The sites are created in advance on purpose
+        warnings.filterwarnings('ignore', 'Site objects have been created '
+                                          'before arguments were handled')
+        status = run_script(request['argv'])
+        try:
+            atexit._run_exitfuncs()
+        except Exception:
+            traceback.print_exc()
+            status = status or 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.request.sendall(STATUS.pack(status))
+
+
+class Runner(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+
+    """
+    A server which runs scripts in forked processes.
+
+    The socket is only accessible by the user, as the scripts run with the
+    permissions and the accounts of the user.
+    """
+
+    #: The modules which are imported before the first script runs
+    preloaded_modules = ['pywikibot.data.api', 'pywikibot.page',
+                         'pywikibot.pagegenerators', 'pywikibot.site']
+
+    def __init__(self, path, max_jobs=8):
+        """
+        Constructor.
+
+        @param path: The path of the Unix socket
+        @type path: str
+        @param max_jobs: The number of scripts which may run at the same time
+        @type max_jobs: int
+        """
+        if not hasattr(socket.socket, 'recvmsg'):
+            raise NotImplementedError(
+                'The runner requires Python 3.3+ on a Unix system.')
+        if os.path.exists(path):
+            self._remove_stale_socket(path)
+        self.max_children = max_jobs
+        self._cookies_mtime = self._get_cookies_mtime()
+        if throttle.shared is None:
+            throttle.shared = throttle.SharedState()
+
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, JobHandler)
+        finally:
+            os.umask(umask)
+
+    @staticmethod
+    def _remove_stale_socket(path):
+        """Remove the socket if no runner is listening on it."""
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise OSError('{0} is not a socket'.format(path))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            os.remove(path)
+        else:
+            raise OSError('A runner is already listening on {0}'.format(path))
+        finally:
+            sock.close()
+
+    @staticmethod
+    def _get_cookies_mtime():
+        """Return when the cookie file was modified or None."""
+        try:
+            return os.path.getmtime(pywikibot.comms.http.cookie_jar.filename)
+        except OSError:
+            return None
+
+    def warm_up(self, sites):
+        """
+        Import the modules and prepare the sites which the scripts use.
+
+        It logs in and loads the siteinfo and paraminfo of the sites.
+
+        @param sites: The sites which the scripts use
+        @type sites: iterable of APISite
+        """
+        for module in self.preloaded_modules:
+            __import__(module)
+        for site in sites:
+            try:
+                if site.username():
+                    site.login()
+                site.namespaces
+                site._paraminfo.fetch(set(['query+info', 'query+revisions',
+                                           'edit']))
+            except pywikibot.Error as e:
+                pywikibot.warning('Unable to prepare {0}: {1}'.format(
+                    site, e))
+            else:
+                pywikibot.log('Prepared {0}'.format(site), _logger)
+        self._close_connections()
+
+    @staticmethod
+    def _close_connections():
+        """Close the HTTP connections, which can't be shared by processes."""
+        pywikibot.comms.http.session.close()
+
+    def process_request(self, request, client_address):
+        """Fork a process for the request after updating the cookies."""
+        mtime = self._get_cookies_mtime()
+        if mtime != self._cookies_mtime:
+            # A script logged in and saved new cookies
+            self._cookies_mtime = mtime
+            pywikibot.comms.http.cookie_jar.load()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socketserver.ForkingMixIn.process_request(self, request,
+                                                  client_address)
+
+    def server_close(self):
+        """Close the server and remove the socket."""
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
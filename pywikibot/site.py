@@ -6,15 +6,17 @@ This module also includes functions to load families, which are
 groups of wikis on the same topic in different languages.
 """
 #
-# (C) Pywikibot team, 2008-2017
+# (C) Pywikibot team, 2008-2018
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, unicode_literals
 
+import atexit
 import copy
 import datetime
 import functools
+import hashlib
 import heapq
 import itertools
 import json
@@ -25,7 +27,10 @@ import sys
 import threading
 import time
 
-from collections import Iterable, Container, namedtuple, Mapping
+from collections import (
+    Iterable, Container, namedtuple, Mapping, OrderedDict, defaultdict,
+)
+from contextlib import contextmanager
 from warnings import warn
 
 import pywikibot
@@ -70,18 +75,20 @@ from pywikibot.tools import (
     redirect_func, issue_deprecation_warning,
     manage_wrapping, MediaWikiVersion, first_upper, normalize_username,
     merge_unique_dicts,
-    PY2,
+    PY2, PYTHON_VERSION,
     filter_unique,
 )
 from pywikibot.tools.ip import is_IP
 
 if sys.version_info[0] > 2:
+    import pickle
     from itertools import zip_longest
     from urllib.parse import urlencode, urlparse
 
     basestring = (str,)
     unicode = str
 else:
+    import cPickle as pickle
     from itertools import izip_longest as zip_longest
     from urllib import urlencode
     from urlparse import urlparse
@@ -1819,6 +1826,398 @@ class TokenWallet(object):
         return self._tokens.__repr__()
 
 
+class SiteSnapshot(object):
+
+    """
+    A persistent snapshot of the information a site needs to start working.
+
+    It holds the siteinfo, the parameter information of the API modules, the
+    userinfo and the tokens of one user on one site in a single file. When
+    the site is created it is loaded with one read, so that a new process
+    can send its first request without asking the server for them again.
+
+    The loaded information is treated as current. It is checked against the
+    server before the first write and refreshed in the background when the
+    snapshot is older than C{config.site_snapshot_expiry} days. What the site
+    loaded additionally is added to the snapshot when Python exits.
+    """
+
+    #: Version of the file format. Snapshots of other versions are ignored.
+    format_version = 1
+
+    #: The attributes of ParamInfo which are stored in the snapshot.
+    paraminfo_attributes = ('_paraminfo', '_action_modules', '_modules',
+                            '_limit', 'preloaded_modules', 'modules_only_mode',
+                            'paraminfo_keys')
+
+    _snapshots = []
+
+    def __init__(self, site):
+        """
+        Constructor.
+
+        @param site: The site of the snapshot
+        @type site: APISite
+        """
+        self.site = site
+        # The time when the information was last fetched from or checked
+        # against the server, None if no snapshot was loaded.
+        self.timestamp = None
+        self.verified = False
+        self._saved = None
+        self._refresh_thread = None
+
+    @property
+    def key(self):
+        """Return the site and user which the snapshot belongs to."""
+        return '{0}:{1}:{2}'.format(self.site.family.name, self.site.code,
+                                    self.site._username[0] or '')
+
+    @property
+    def filename(self):
+        """Return the path of the snapshot file."""
+        return os.path.join(
+            pywikibot.config.base_dir,
+            'site-snapshots-py{0:d}'.format(PYTHON_VERSION[0]),
+            '{0}-{1}-{2}'.format(
+                self.site.family.name, self.site.code,
+                hashlib.sha256(self.key.encode('utf-8')).hexdigest()[:16]))
+
+    def _state(self):
+        """Return the information of the site which is stored."""
+        site = self.site
+        state = {
+            'siteinfo': dict((prop, value) for prop, (value, date)
+                             in site._siteinfo._cache.items()
+                             if date),  # default values have no date
+            'paraminfo': dict((name, copy.copy(getattr(site._paraminfo,
+                                                       name)))
+                              for name in self.paraminfo_attributes),
+            'userinfo': copy.copy(getattr(site, '_userinfo', None)),
+            'tokens': {},
+        }
+        if site.user():
+            state['tokens'] = dict(site.tokens._tokens.get(site.user(), {}))
+        return state
+
+    def load(self):
+        """
+        Load the snapshot into the site.
+
+        @return: Whether a snapshot was loaded
+        @rtype: bool
+        """
+        self._register()
+        try:
+            with open(self.filename, 'rb') as f:
+                data = pickle.load(f)
+        except (IOError, OSError):
+            return False
+        except Exception as e:
+            pywikibot.log('Unable to load the site snapshot of {0}: {1!r}'
+                          .format(self.site, e))
+            return False
+        if (data.get('version') != self.format_version or
+                data.get('key') != self.key):
+            return False
+
+        site = self.site
+        state = data['state']
+        now = datetime.datetime.utcnow()
+        # The information of the snapshot is treated as current, so that the
+        # siteinfo does not expire separately.
+        for prop, value in state['siteinfo'].items():
+            site._siteinfo._cache[prop] = (value, now)
+        for name, value in state['paraminfo'].items():
+            setattr(site._paraminfo, name, copy.copy(value))
+        if state['userinfo'] is not None:
+            site._userinfo = copy.copy(state['userinfo'])
+            if state['tokens'] and site.user():
+                site.tokens._tokens[site.user()] = dict(state['tokens'])
+
+        self.timestamp = data['timestamp']
+        self._saved = (self.timestamp, state)
+        pywikibot.debug('Loaded the site snapshot of {0} from {1}'
+                        .format(site, data['timestamp']), _logger)
+        if self._is_expired():
+            self._refresh_thread = threading.Thread(
+                target=self.refresh, name='Refresh {0}'.format(site))
+            self._refresh_thread.setDaemon(True)
+            self._refresh_thread.start()
+        return True
+
+    def _is_expired(self):
+        """Return whether the snapshot needs to be refreshed."""
+        expiry = datetime.timedelta(pywikibot.config.site_snapshot_expiry)
+        return self.timestamp + expiry < datetime.datetime.utcnow()
+
+    def save(self):
+        """Save the snapshot if the information of the site changed."""
+        state = self._state()
+        if not state['siteinfo'] and not state['paraminfo']['_paraminfo']:
+            return
+        timestamp = self.timestamp or datetime.datetime.utcnow()
+        if self._saved == (timestamp, state):
+            return
+
+        filename = self.filename
+        api.CachedRequest._make_dir(os.path.dirname(filename))
+        data = {
+            'version': self.format_version,
+            'key': self.key,
+            'timestamp': timestamp,
+            'state': state,
+        }
+        # The snapshot contains the tokens, so it may only be readable by
+        # the owner.
+        tmp_filename = filename + '.tmp'
+        fd = os.open(tmp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                     0o600)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, protocol=pywikibot.config.pickle_protocol)
+        if os.path.exists(filename) and sys.platform == 'win32':
+            os.remove(filename)
+        os.rename(tmp_filename, filename)
+        self.timestamp = timestamp
+        self._saved = (timestamp, state)
+
+    def verify(self):
+        """
+        Check the loaded snapshot against the server.
+
+        It requests the general siteinfo and the userinfo. If the MediaWiki
+        version changed, the snapshot is discarded and rebuilt from the
+        information the site loads again. If the user changed, the site logs
+        in again.
+        """
+        if self.timestamp is None or self.verified:
+            return
+        site = self.site
+        data = site._simple_request(
+            action='query', meta='siteinfo|userinfo', siprop='general',
+            uiprop='blockinfo|hasmsg|groups|rights').submit()['query']
+        general = data['general']
+        site._siteinfo._post_process('general', general)
+
+        cached = site._siteinfo._cache.get('general')
+        if cached and cached[0].get('generator') != general['generator']:
+            pywikibot.log('{0} was updated to {1}; discarding its site '
+                          'snapshot.'.format(site, general['generator']))
+            self.reset()
+        site._siteinfo._cache['general'] = (general,
+                                            datetime.datetime.utcnow())
+        self.timestamp = datetime.datetime.utcnow()
+
+        userinfo = data['userinfo']
+        old_name = getattr(site, '_userinfo', {}).get('name')
+        if old_name and userinfo.get('name') != old_name:
+            pywikibot.log('The site snapshot of {0} is for {1}, but the '
+                          'server reports {2}; logging in again.'.format(
+                              site, old_name, userinfo.get('name')))
+            site._relogin()
+        else:
+            site._userinfo = userinfo
+            site._userinfo_time = time.time()
+        # Only now, so that a failed check is repeated before the next write
+        self.verified = True
+
+    def reset(self):
+        """Discard the information of the site which the snapshot loaded."""
+        site = self.site
+        site._siteinfo = Siteinfo(site)
+        site._paraminfo = api.ParamInfo(site)
+        site._interwikimap.reset()
+        for name in ('_namespaces', '_magicwords'):
+            if hasattr(site, name):
+                delattr(site, name)
+        self.timestamp = None
+
+    def refresh(self):
+        """Fetch the stored siteinfo and paraminfo again and save them."""
+        site = self.site
+        old_siteinfo = site._siteinfo
+        old_paraminfo = site._paraminfo
+        try:
+            siteinfo = Siteinfo(site)
+            props = [prop for prop, value in old_siteinfo._cache.items()
+                     if value[1]]
+            if props:
+                siteinfo._cache.update(siteinfo._get_siteinfo(props, 0))
+            site._siteinfo = siteinfo
+
+            paraminfo = api.ParamInfo(site)
+            paraminfo.fetch(set(old_paraminfo._paraminfo))
+            site._paraminfo = paraminfo
+        except Exception as e:
+            site._siteinfo = old_siteinfo
+            site._paraminfo = old_paraminfo
+            pywikibot.log('Unable to refresh the site snapshot of {0}: {1!r}'
+                          .format(site, e))
+            return
+        self.timestamp = datetime.datetime.utcnow()
+        self.save()
+
+    def _register(self):
+        """Save the snapshot when Python exits."""
+        if not SiteSnapshot._snapshots:
+            atexit.register(SiteSnapshot._save_all)
+        SiteSnapshot._snapshots.append(self)
+
+    @classmethod
+    def _save_all(cls):
+        """Save all snapshots of this process."""
+        for snapshot in cls._snapshots:
+            try:
+                snapshot.save()
+            except Exception as e:
+                pywikibot.log('Unable to save the site snapshot of {0}: {1!r}'
+                              .format(snapshot.site, e))
+
+
+class PageBatch(object):
+
+    """
+    Pages whose properties are loaded together.
+
+    When a property of one page of the batch is loaded, e.g. by
+    C{page.exists()} or C{page.coordinates()}, it is loaded for the following
+    pages of the batch in the same query, up to the limit of titles per
+    query. Pages which already have the property are skipped. Each page gets
+    a property from the batch once; loading it again sends a request for the
+    page alone.
+
+    It is created by L{APISite.batch}.
+    """
+
+    def __init__(self, site, pages=(), limit=None):
+        """
+        Constructor.
+
+        @param site: The site of the pages
+        @type site: APISite
+        @param pages: The pages of the batch
+        @type pages: iterable of BasePage
+        @param limit: The maximum number of pages per query, by default the
+            limit of titles per query of the site
+        @type limit: int or None
+        """
+        self.site = site
+        self.limit = limit
+        self._pages = []
+        self._indexes = {}
+        self._loaded = defaultdict(set)
+        self._results = defaultdict(dict)
+        self.add(pages)
+
+    def __contains__(self, page):
+        """Return whether the page is in the batch."""
+        return page in self._indexes
+
+    def __len__(self):
+        """Return the number of pages."""
+        return len(self._pages)
+
+    def add(self, pages):
+        """
+        Add pages to the batch.
+
+        @param pages: The pages, which are not in the batch already
+        @type pages: iterable of BasePage
+        """
+        for page in pages:
+            if page.site != self.site:
+                raise ValueError('{0} is not on {1}'.format(page, self.site))
+            if page not in self._indexes:
+                self._indexes[page] = len(self._pages)
+                self._pages.append(page)
+
+    def load(self, kind, page):
+        """
+        Load a property of the page together with the following pages.
+
+        @param kind: The kind of query, a key of L{APISite.batch_queries}
+        @type kind: str
+        @param page: A page of the batch
+        @type page: BasePage
+        @return: The result for the page, or None if the page must be loaded
+            alone
+        @rtype: dict or None
+        """
+        if page not in self._loaded[kind]:
+            limit = self.limit or self.site._batch_limit()
+            index = self._indexes[page]
+            pages = [page]
+            for other in self._pages[index + 1:] + self._pages[:index]:
+                if len(pages) >= limit:
+                    break
+                if (other not in self._loaded[kind] and
+                        self.site._needs_batch_load(kind, other)):
+                    pages.append(other)
+            self._loaded[kind].update(pages)
+            self._results[kind].update(self.site._load_batch(kind, pages))
+        return self._results[kind].pop(page, None)
+
+
+class _LoadCoalescer(object):
+
+    """
+    Combine the loads of pages by several threads.
+
+    The first thread which loads a property waits up to
+    C{config.api_batch_window} seconds for other threads to load the same
+    property of other pages and sends one query for all of them.
+    """
+
+    class _Group(object):
+
+        """The pages which are loaded by one query."""
+
+        def __init__(self):
+            """Constructor."""
+            self.pages = []
+            self.results = {}
+            self.full = threading.Event()
+            self.done = threading.Event()
+
+    def __init__(self, site):
+        """Constructor."""
+        self.site = site
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def load(self, kind, page):
+        """
+        Load a property of the page together with pages of other threads.
+
+        @return: The result for the page, or None if the page must be loaded
+            alone
+        @rtype: dict or None
+        """
+        with self._lock:
+            group = self._groups.get(kind)
+            leader = group is None
+            if leader:
+                group = self._groups[kind] = self._Group()
+            group.pages.append(page)
+            if len(group.pages) >= self.site._batch_limit():
+                del self._groups[kind]
+                group.full.set()
+
+        if not leader:
+            group.done.wait()
+            return group.results.get(page)
+
+        group.full.wait(pywikibot.config.api_batch_window)
+        with self._lock:
+            if self._groups.get(kind) is group:
+                del self._groups[kind]
+        try:
+            group.results = self.site._load_batch(kind, group.pages)
+        finally:
+            group.done.set()
+        return group.results.get(page)
+
+
 class RemovedSite(BaseSite):
 
     """Site removed from a family."""
@@ -1864,12 +2263,22 @@ class APISite(BaseSite):
         self._paraminfo = api.ParamInfo(self)
         self._interwikimap = _InterwikiMap(self)
         self.tokens = TokenWallet(self)
+        self._request_profile = None
+        self._userinfo_time = 0
+        self._snapshot = SiteSnapshot(self)
+        if pywikibot.config.site_snapshot:
+            self._snapshot.load()
+        self._batch = None
+        self._coalescer = _LoadCoalescer(self)
 
     def __getstate__(self):
         """Remove TokenWallet before pickling, for security reasons."""
         new = super(APISite, self).__getstate__()
         del new['tokens']
         del new['_interwikimap']
+        del new['_snapshot']
+        del new['_batch']
+        del new['_coalescer']
         return new
 
     def __setstate__(self, attrs):
@@ -1877,6 +2286,9 @@ class APISite(BaseSite):
         super(APISite, self).__setstate__(attrs)
         self._interwikimap = _InterwikiMap(self)
         self.tokens = TokenWallet(self)
+        self._snapshot = SiteSnapshot(self)
+        self._batch = None
+        self._coalescer = _LoadCoalescer(self)
 
     @classmethod
     def fromDBName(cls, dbname, site=None):
@@ -2177,6 +2589,7 @@ class APISite(BaseSite):
             assert 'userinfo' in uidata['query'], \
                    "API userinfo response lacks 'userinfo' key"
             self._userinfo = uidata['query']['userinfo']
+            self._userinfo_time = time.time()
         return self._userinfo
 
     userinfo = property(fget=getuserinfo, doc=getuserinfo.__doc__)
@@ -2723,6 +3136,20 @@ class APISite(BaseSite):
         """Site information dict."""
         return self._siteinfo
 
+    @property
+    def request_profile(self):
+        """
+        Return the decisions about the default parameters of API requests.
+
+        The profile is built again when the siteinfo is replaced.
+
+        @rtype: pywikibot.data.api.RequestProfile
+        """
+        if (self._request_profile is None or
+                self._request_profile.siteinfo is not self._siteinfo):
+            self._request_profile = api.RequestProfile(self)
+        return self._request_profile
+
     @deprecated('siteinfo or Namespace instance')
     def case(self):
         """Return this site's capitalization rule."""
@@ -2966,14 +3393,215 @@ class APISite(BaseSite):
             return (0, 0, 0)
 
     def _update_page(self, page, query):
+        query.set_formatversion()
         for pageitem in query:
             if not self.sametitle(pageitem['title'],
                                   page.title(withSection=False)):
                 raise InconsistentTitleReceived(page, pageitem['title'])
             api.update_page(page, pageitem, query.props)
 
+    #: The parameters of the queries which load a property of several pages
+    batch_queries = {
+        'info': {'prop': 'info', 'inprop': 'protection'},
+        'coordinates': {'prop': 'coordinates',
+                        'coprop': ['type', 'name', 'dim', 'country',
+                                   'region', 'globe'],
+                        'coprimary': 'all'},
+        'pageimages': {'prop': 'pageimages', 'piprop': ['name']},
+        'pageprops': {'prop': 'pageprops'},
+        'imageinfo': {'prop': 'imageinfo',
+                      'iiprop': ['timestamp', 'user', 'comment', 'url',
+                                 'size', 'sha1', 'mime', 'metadata',
+                                 'archivename']},
+        'redirects': {'prop': 'info', 'redirects': True},
+    }
+
+    @contextmanager
+    def batch(self, pages=(), limit=None):
+        """
+        Load the properties of pages together while in the context.
+
+        When a property of a page of the batch is loaded, e.g. by
+        C{page.exists()}, C{page.isRedirectPage()}, C{page.coordinates()},
+        C{page.page_image()}, C{page.properties()},
+        C{page.getRedirectTarget()} or C{filepage.latest_file_info}, it is
+        loaded for the other pages of the batch in the same query:
+
+            >>> with site.batch(pages):  # doctest: +SKIP
+            ...     existing = [page for page in pages if page.exists()]
+
+        @param pages: The pages of the batch; more can be added with
+            L{PageBatch.add}
+        @type pages: iterable of BasePage
+        @param limit: The maximum number of pages per query, by default the
+            limit of titles per query of the site
+        @type limit: int or None
+        @rtype: PageBatch
+        """
+        previous = self._batch
+        self._batch = PageBatch(self, pages, limit)
+        try:
+            yield self._batch
+        finally:
+            self._batch = previous
+
+    def _batch_limit(self):
+        """Return the maximum number of titles per query."""
+        try:
+            param = self._paraminfo.parameter('query', 'titles')
+        except (KeyError, ValueError):
+            param = None
+        if not param or 'limit' not in param:
+            return 50
+        if self.logged_in() and self.has_right('apihighlimits'):
+            return int(param['highlimit'])
+        return int(param['limit'])
+
+    def _needs_batch_load(self, kind, page):
+        """Return whether a property of the page has not been loaded yet."""
+        if kind == 'info':
+            return not hasattr(page, '_protection')
+        elif kind == 'coordinates':
+            return not hasattr(page, '_coords')
+        elif kind == 'pageimages':
+            return not hasattr(page, '_pageimage')
+        elif kind == 'pageprops':
+            return not hasattr(page, '_pageprops')
+        elif kind == 'imageinfo':
+            return (isinstance(page, pywikibot.FilePage) and
+                    not page._file_revisions)
+        elif kind == 'redirects':
+            return (getattr(page, '_isredir', False) and
+                    not hasattr(page, '_redirtarget'))
+        raise ValueError('Unknown batch query kind "{0}"'.format(kind))
+
+    def _load_batched(self, kind, page):
+        """
+        Load a property of the page together with other pages.
+
+        The page is loaded with the pages of the active L{batch} or, if
+        C{config.api_batch_window} is set, with the pages of other threads.
+        Except for the kind 'redirects', the page is updated with the result.
+
+        @param kind: The kind of query, a key of L{batch_queries}
+        @type kind: str
+        @return: The result for the page or None if it must be loaded alone
+        @rtype: dict or None
+        """
+        if self._batch is not None and page in self._batch:
+            result = self._batch.load(kind, page)
+        elif pywikibot.config.api_batch_window > 0:
+            result = self._coalescer.load(kind, page)
+        else:
+            return None
+        if result is not None and kind != 'redirects':
+            # The result is looked up by the title, so the page object which
+            # has been queried might be another one
+            api.update_page(page, result, [self.batch_queries[kind]['prop']])
+        return result
+
+    def _load_batch(self, kind, pages):
+        """
+        Load a property of several pages with one query.
+
+        The pages are not updated; L{_load_batched} updates each page object
+        which it is called for with its result.
+
+        @param kind: The kind of query, a key of L{batch_queries}
+        @type kind: str
+        @param pages: The pages
+        @type pages: list of BasePage
+        @return: The page item of each page in the response, or for the kind
+            'redirects' the response reduced to the redirects of each page
+        @rtype: dict
+        """
+        titles = {}
+        for page in pages:
+            titles.setdefault(page.title(withSection=False), page)
+        args = dict(self.batch_queries[kind])
+        args['titles'] = list(titles)
+        if kind == 'redirects':
+            result = self._simple_request(action='query', **args).submit()
+            return self._split_redirects(titles, result)
+
+        query = self._generator(api.PropertyGenerator,
+                                type_arg=args.pop('prop'), **args)
+        if kind != 'imageinfo':
+            query.set_formatversion()
+        pageitems = OrderedDict()
+        for pageitem in query:
+            if pageitem['title'] in pageitems:
+                # The property is continued in another response
+                previous = pageitems[pageitem['title']]
+                for key, value in pageitem.items():
+                    if isinstance(value, list) and key in previous:
+                        previous[key] = previous[key] + value
+                    else:
+                        previous[key] = value
+            else:
+                pageitems[pageitem['title']] = pageitem
+
+        results = {}
+        for title, pageitem in pageitems.items():
+            page = titles.get(title)
+            if page is None:
+                # The title has been normalized
+                for key, page in titles.items():
+                    if self.sametitle(key, title):
+                        break
+                else:
+                    pywikibot.warning('Query returned unexpected title '
+                                      '"{0}"'.format(title))
+                    continue
+            results[page] = pageitem
+        return results
+
+    def _split_redirects(self, titles, result):
+        """
+        Split the response to a query of several redirects.
+
+        Each result only contains the redirects of one page and, unless they
+        are circular, the page data of their final target, like the response
+        to a query of the page alone.
+
+        @param titles: The pages by title
+        @type titles: dict
+        @param result: The response
+        @type result: dict
+        @rtype: dict
+        """
+        query = result.get('query', {})
+        redirects = dict((item['from'], item)
+                         for item in query.get('redirects', []))
+        normalized = dict((item['from'], item['to'])
+                          for item in query.get('normalized', []))
+        pages = query.get('pages', {})
+        if isinstance(pages, dict):
+            pages = list(pages.values())
+
+        results = {}
+        for title, page in titles.items():
+            title = normalized.get(title, title)
+            chain = []
+            while title in redirects and redirects[title] not in chain:
+                chain.append(redirects[title])
+                title = redirects[title]['to']
+            data = {'redirects': chain,
+                    'normalized': query.get('normalized', [])}
+            if title not in redirects:
+                for pagedata in pages:
+                    if pagedata['title'] == title:
+                        data['pages'] = {str(pagedata.get('pageid', -1)):
+                                         pagedata}
+                        break
+            results[page] = {'query': data}
+        return results
+
     def loadpageinfo(self, page, preload=False):
         """Load page info from api and store in page attributes."""
+        if not preload and self._load_batched('info', page) is not None:
+            return
+
         title = page.title(withSection=False)
         inprop = 'protection'
         if preload:
@@ -2987,6 +3615,9 @@ class APISite(BaseSite):
 
     def loadcoordinfo(self, page):
         """Load [[mw:Extension:GeoData]] info."""
+        if self._load_batched('coordinates', page) is not None:
+            return
+
         title = page.title(withSection=False)
         query = self._generator(api.PropertyGenerator,
                                 type_arg="coordinates",
@@ -3007,6 +3638,9 @@ class APISite(BaseSite):
 
         @raises APIError: PageImages extension is not installed
         """
+        if self._load_batched('pageimages', page) is not None:
+            return
+
         title = page.title(withSection=False)
         query = self._generator(api.PropertyGenerator,
                                 type_arg='pageimages',
@@ -3016,6 +3650,9 @@ class APISite(BaseSite):
 
     def loadpageprops(self, page):
         """Load page props for the given page."""
+        if self._load_batched('pageprops', page) is not None:
+            return
+
         title = page.title(withSection=False)
         query = self._generator(api.PropertyGenerator,
                                 type_arg="pageprops",
@@ -3082,26 +3719,31 @@ class APISite(BaseSite):
 
         """
         title = page.title(withSection=False)
-        args = {'titles': title,
-                'iiurlwidth': url_width,
-                'iiurlheight': url_height,
-                'iiurlparam': url_param,
-                }
-        if not history:
-            args["total"] = 1
-        query = self._generator(api.PropertyGenerator,
-                                type_arg="imageinfo",
-                                iiprop=["timestamp", "user", "comment",
-                                        "url", "size", "sha1", "mime",
-                                        "metadata", "archivename"],
-                                **args)
+        pageitem = None
+        if history and url_width is url_height is url_param is None:
+            # The page has already been updated with the result
+            pageitem = self._load_batched('imageinfo', page)
+        if pageitem is None:
+            args = {'titles': title,
+                    'iiurlwidth': url_width,
+                    'iiurlheight': url_height,
+                    'iiurlparam': url_param,
+                    }
+            if not history:
+                args["total"] = 1
+            query = self._generator(
+                api.PropertyGenerator, type_arg='imageinfo',
+                iiprop=self.batch_queries['imageinfo']['iiprop'], **args)
+        else:
+            query = [pageitem]
         # kept for backward compatibility
         # TODO: when backward compatibility can be broken, adopt
         # self._update_page() pattern and remove return
         for pageitem in query:
             if not self.sametitle(pageitem['title'], title):
                 raise InconsistentTitleReceived(page, pageitem['title'])
-            api.update_page(page, pageitem, query.props)
+            if isinstance(query, api.PropertyGenerator):
+                api.update_page(page, pageitem, query.props)
 
             if "imageinfo" not in pageitem:
                 if "missing" in pageitem:
@@ -3187,12 +3829,14 @@ class APISite(BaseSite):
             return page._redirtarget
 
         title = page.title(withSection=False)
-        query = self._simple_request(
-            action='query',
-            prop='info',
-            titles=title,
-            redirects=True)
-        result = query.submit()
+        result = self._load_batched('redirects', page)
+        if result is None:
+            query = self._simple_request(
+                action='query',
+                prop='info',
+                titles=title,
+                redirects=True)
+            result = query.submit()
         if "query" not in result or "redirects" not in result["query"]:
             raise RuntimeError(
                 "getredirtarget: No 'redirects' found for page %s."
@@ -3295,6 +3939,7 @@ class APISite(BaseSite):
             next_prio = 0
             params = {'pageids': sublist, }
             rvgen = api.PropertyGenerator('info', site=self, parameters=params)
+            rvgen.set_formatversion()
 
             for pagedata in rvgen:
                 title = pagedata['title']
@@ -3364,6 +4009,7 @@ class APISite(BaseSite):
             next_prio = 0
             rvgen = api.PropertyGenerator(props, site=self)
             rvgen.set_maximum_items(-1)  # suppress use of "rvlimit" parameter
+            rvgen.set_formatversion()
 
             parameter = self._paraminfo.parameter('query+info', 'prop')
             if self.logged_in() and self.has_right('apihighlimits'):
@@ -4084,6 +4730,7 @@ class APISite(BaseSite):
 
         if latest or "revids" in rvgen.request:
             rvgen.set_maximum_items(-1)  # suppress use of rvlimit parameter
+        rvgen.set_formatversion()
 
         for pagedata in rvgen:
             if not self.sametitle(pagedata['title'],
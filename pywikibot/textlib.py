@@ -39,6 +39,7 @@ from pywikibot.tools import (
     deprecate_arg,
     deprecated,
     DeprecatedRegex,
+    first_upper,
     OrderedDict,
     StringTypes,
     UnicodeType,
@@ -99,6 +100,16 @@ NESTED_TEMPLATE_REGEX = re.compile(r"""
 (?P<unhandled_depth>{{\s*[^{\|#0-9][^{\|#]*?\s* [^{]* {{ .* }})
 """, re.VERBOSE | re.DOTALL)
 
+# Tokens relevant to extract_templates_and_params_tokenizer: runs of
+# opening and closing braces or brackets, parameter separators, comments
+# and tags whose content is not parsed as wikitext.
+_TEMPLATE_TOKEN_REGEX = re.compile(r"""
+\{\{+ | \}\}+ | \[\[+ | \]\]+ | [|=] | <!--
+| <(?P<tag>categorytree|ce|chem|gallery|graph|hiero|imagemap|inputbox|math
+          |nowiki|pre|score|section|source|syntaxhighlight|templatedata
+          |timeline)(?:\s[^>]*?)?(?P<selfclosing>/)?>
+""", re.VERBOSE | re.IGNORECASE)
+
 # The following regex supports wikilinks anywhere after the first pipe
 # and correctly matches the end of the file link if the wikilink contains
 # [[ or ]].
@@ -163,6 +174,36 @@ def unescape(s):
     return s
 
 
+def _trie_regex(trie, first_letter, first=True):
+    """
+    Return a regex alternation matching all words of a trie.
+
+    The trie is a nested dict of characters where the key '' marks the end
+    of a word. Spaces also match underscores and if first_letter is True,
+    the first character matches both cases.
+    """
+    alternatives = []
+    optional = False
+    for char in sorted(trie):
+        if not char:
+            optional = True
+            continue
+        if first and first_letter:
+            pattern = '[{0}{1}]'.format(re.escape(char.upper()),
+                                        re.escape(char.lower()))
+        elif char == ' ':
+            pattern = '[_ ]'
+        else:
+            pattern = re.escape(char)
+        alternatives.append(
+            pattern + _trie_regex(trie[char], first_letter, False))
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1 and not optional:
+        return alternatives[0]
+    return '(?:{0}){1}'.format('|'.join(alternatives), '?' if optional else '')
+
+
 class _MultiTemplateMatchBuilder(object):
 
     """Build template matcher."""
@@ -171,24 +212,49 @@ class _MultiTemplateMatchBuilder(object):
         """Constructor."""
         self.site = site
 
-    def pattern(self, template, flags=re.DOTALL):
-        """Return a compiled regex to match template."""
-        # TODO: add ability to also match contents within the template
-        # TODO: add option for template to be None to match any template
-        # TODO: use NESTED_TEMPLATE_REGEX with <parameters> instead of <params>
-        namespace = self.site.namespaces[10]
+    @staticmethod
+    def _template_name(template):
+        """Return the title without namespace of a template."""
         if isinstance(template, pywikibot.Page):
             if template.namespace() == 10:
-                old = template.title(withNamespace=False)
+                return template.title(withNamespace=False)
             else:
                 raise ValueError(
                     '{0} is not a template Page object'.format(template))
         elif isinstance(template, StringTypes):
-            old = template
+            return template
         else:
             raise ValueError(
                 '{0!r} is not a valid template'.format(template))
 
+    def _prefix_pattern(self):
+        """Return the regex of the optional namespace or msg: prefix."""
+        # namespaces may be any mixed case
+        namespaces = [''.join('[{0}{1}]'.format(char.upper(), char.lower())
+                              for char in ns)
+                      for ns in self.site.namespaces[10]]
+        return r'(' + ':|'.join(namespaces) + r':|[mM][sS][gG]:)?'
+
+    def normalize(self, name):
+        """
+        Return the normalized form of a template name.
+
+        Underscores are replaced by spaces and, if the template namespace is
+        first-letter case sensitive, the first letter is uppercased.
+        """
+        name = name.replace('_', ' ')
+        if self.site.namespaces[10].case == 'first-letter':
+            name = first_upper(name)
+        return name
+
+    def pattern(self, template, flags=re.DOTALL):
+        """Return a compiled regex to match template."""
+        # TODO: add ability to also match contents within the template
+        # TODO: add option for template to be None to match any template
+        # TODO: use NESTED_TEMPLATE_REGEX with <parameters> instead of <params>
+        namespace = self.site.namespaces[10]
+        old = self._template_name(template)
+
         if namespace.case == 'first-letter':
             pattern = '[' + \
                       re.escape(old[0].upper()) + \
@@ -196,21 +262,70 @@ class _MultiTemplateMatchBuilder(object):
                       ']' + re.escape(old[1:])
         else:
             pattern = re.escape(old)
-        # namespaces may be any mixed case
-        namespaces = [''.join('[{0}{1}]'.format(char.upper(), char.lower())
-                              for char in ns)
-                      for ns in namespace]
         pattern = re.sub(r'_|\\ ', r'[_ ]', pattern)
-        templateRegex = re.compile(r'\{\{ *(' + ':|'.join(namespaces) +
-                                   r':|[mM][sS][gG]:)?' + pattern +
+        templateRegex = re.compile(r'\{\{ *' + self._prefix_pattern() +
+                                   pattern +
                                    r'(?P<parameters>\s*\|.+?|) *}}',
                                    flags)
         return templateRegex
 
+    def pattern_any(self, templates, flags=re.DOTALL):
+        """
+        Return a compiled regex to match any of the templates.
+
+        The template names are combined into a single alternation built
+        from a trie of their normalized names, so a text is only scanned
+        once however many templates and aliases are given. The matched
+        name is available in the group 'name'.
+
+        @param templates: template titles without namespace or template
+            Page objects
+        @type templates: iterable
+        """
+        trie = {}
+        for template in templates:
+            node = trie
+            for char in self.normalize(self._template_name(template)):
+                node = node.setdefault(char, {})
+            node[''] = {}
+        if not trie:
+            raise ValueError('No templates given')
+        first_letter = self.site.namespaces[10].case == 'first-letter'
+        return re.compile(r'\{\{ *' + self._prefix_pattern() +
+                          '(?P<name>' + _trie_regex(trie, first_letter) + ')'
+                          r'(?P<parameters>\s*\|.+?|) *}}',
+                          flags)
+
+    def search_any(self, templates):
+        """
+        Return a function which finds the first of the templates in a text.
+
+        The returned function takes the text and returns a tuple of the
+        matching template, as it was given, and the match object. It
+        returns None if no template is found.
+
+        @param templates: template titles without namespace or template
+            Page objects
+        @type templates: iterable
+        """
+        templates = list(templates)
+        by_name = {}
+        for template in templates:
+            by_name.setdefault(
+                self.normalize(self._template_name(template)), template)
+        regex = self.pattern_any(templates)
+
+        def search(text):
+            match = regex.search(text)
+            if match:
+                return by_name[self.normalize(match.group('name'))], match
+            return None
+        return search
+
     def search_any_predicate(self, templates):
         """Return a predicate that matches any template."""
-        predicates = [self.pattern(template).search for template in templates]
-        return lambda text: any(predicate(text) for predicate in predicates)
+        regex = self.pattern_any(templates)
+        return lambda text: bool(regex.search(text))
 
 
 def _create_default_regexes():
@@ -1407,15 +1522,14 @@ def extract_templates_and_params(text, remove_disabled_parts=None, strip=None):
 
     This uses the package L{mwparserfromhell} (mwpfh) if it is installed
     and enabled by config.mwparserfromhell. Otherwise it falls back on a
-    regex based implementation.
+    single pass tokenizer which matches the braces like the MediaWiki
+    preprocessor.
 
-    There are minor differences between the two implementations.
+    Both implementations return nested templates after the template
+    containing them, i.e. for {{a|b={{c}}}} they return [a, c].
 
-    The two implementations return nested templates in a different order.
-    i.e. for {{a|b={{c}}}}, mwpfh returns [a, c], whereas regex returns [c, a].
-
-    mwpfh preserves whitespace in parameter names and values. regex excludes
-    anything between <!-- --> before parsing the text.
+    mwpfh preserves whitespace in parameter names and values. The
+    tokenizer excludes anything between <!-- --> before parsing the text.
 
     If there are multiple numbered parameters in the wikitext for the same
     position, MediaWiki will only use the last parameter value.
@@ -1452,7 +1566,7 @@ def extract_templates_and_params(text, remove_disabled_parts=None, strip=None):
     if use_mwparserfromhell:
         return extract_templates_and_params_mwpfh(text, strip)
     else:
-        return extract_templates_and_params_regex(text, False, strip)
+        return extract_templates_and_params_tokenizer(text, False, strip)
 
 
 def extract_templates_and_params_mwpfh(text, strip=False):
@@ -1499,11 +1613,11 @@ def extract_templates_and_params_regex(text, remove_disabled_parts=True,
     """
     Extract templates with params using a regex with additional processing.
 
-    This function should not be called directly.
-
-    Use extract_templates_and_params, which will fallback to using this
-    regex based implementation when the mwparserfromhell implementation
-    is not used.
+    The cost of this implementation grows with the depth of nested
+    templates, as the text is searched again for each level. The
+    extract_templates_and_params_tokenizer function, which
+    extract_templates_and_params falls back to when the mwparserfromhell
+    implementation is not used, only needs a single pass.
 
     @param text: The wikitext from which templates are extracted
     @type text: unicode or string
@@ -1674,6 +1788,130 @@ def extract_templates_and_params_regex(text, remove_disabled_parts=True,
     return result
 
 
+def extract_templates_and_params_tokenizer(text, remove_disabled_parts=True,
+                                           strip=True):
+    """
+    Extract templates with params using a single pass over the text.
+
+    This function should not be called directly.
+
+    Use extract_templates_and_params, which will fallback to using this
+    implementation when the mwparserfromhell implementation is not used.
+
+    Braces are matched like the MediaWiki preprocessor does: a run of
+    closing braces closes the innermost open run, template arguments
+    like {{{1}}} take three braces and templates two, and leftover braces
+    are treated as text. Parameters are split at '|' and '=' on the level
+    of the template itself, so separators within nested templates, links
+    and comments or tags like <nowiki> are part of the parameter value.
+
+    Nested templates are returned after the template containing them,
+    like extract_templates_and_params_mwpfh does. Template names are always
+    stripped; if strip is enabled, names of parameters and values of
+    named parameters are stripped as well.
+
+    @param text: The wikitext from which templates are extracted
+    @type text: unicode or string
+    @param remove_disabled_parts: Remove disabled wikitext such as comments
+        and pre before parsing the text.
+    @type remove_disabled_parts: bool
+    @param strip: if enabled, strip arguments and values of templates.
+    @type strip: bool
+    @return: list of template name and params
+    @rtype: list of tuple of name and OrderedDict
+    """
+    if remove_disabled_parts:
+        text = removeDisabledParts(text)
+
+    found = []
+    # Each open run is a list of the opening character, the start of the
+    # run, the number of unmatched characters and the parts; each part is
+    # a list of its start and the position of its first '=' if any.
+    stack = []
+    pos = 0
+    while True:
+        match = _TEMPLATE_TOKEN_REGEX.search(text, pos)
+        if match is None:
+            break
+
+        token = match.group()
+        start, pos = match.span()
+        char = token[0]
+        if char in '{[':
+            stack.append([char, start, len(token), [[pos, None]]])
+        elif char in '}]':
+            opening = '{' if char == '}' else '['
+            while start < pos and stack and stack[-1][0] == opening:
+                element = stack[-1]
+                count = min(pos - start, element[2], 3 if char == '}' else 2)
+                if count < 2:
+                    break  # a single brace is text
+
+                element[2] -= count
+                if char == '}' and count == 2:
+                    found.append(
+                        (element[1] + element[2],
+                         _template_from_parts(text, element[3], start, strip)))
+                start += count
+
+                if element[2] >= 2:
+                    # the remaining braces enclose what has been matched
+                    element[3] = [[element[1] + element[2], None]]
+                else:
+                    stack.pop()
+        elif char == '|':
+            if stack and stack[-1][0] == '{':
+                stack[-1][3].append([pos, None])
+        elif char == '=':
+            if stack and stack[-1][0] == '{' and stack[-1][3][-1][1] is None:
+                stack[-1][3][-1][1] = start
+        elif token == '<!--':
+            pos = text.find('-->', pos)
+            pos = len(text) if pos == -1 else pos + 3
+        elif not match.group('selfclosing'):
+            tag = match.group('tag')
+            end = re.compile(r'</{0}\s*>'.format(tag), re.IGNORECASE).search(
+                text, pos)
+            if end is not None:
+                pos = end.end()
+
+    found.sort(key=lambda item: item[0])
+    return [template for _, template in found if template[0]]
+
+
+def _template_from_parts(text, parts, end, strip):
+    """
+    Return the name and params of a template for extract_templates_and_params.
+
+    @param text: The wikitext containing the template
+    @type text: unicode or string
+    @param parts: the start and the position of the first '=' of each part
+    @type parts: list of list
+    @param end: the end of the last part
+    @type end: int
+    @param strip: if enabled, strip arguments and values of templates.
+    @type strip: bool
+    @rtype: tuple of name and OrderedDict
+    """
+    ends = [part[0] - 1 for part in parts[1:]] + [end]
+    name = text[parts[0][0]:ends[0]].strip()
+    params = OrderedDict()
+    numbered_param = 1
+    for (part_start, equals), part_end in zip(parts[1:], ends[1:]):
+        if equals is not None:
+            param_name = text[part_start:equals]
+            param_val = text[equals + 1:part_end]
+            if strip:
+                param_name = param_name.strip()
+                param_val = param_val.strip()
+        else:
+            param_name = unicode(numbered_param)
+            param_val = text[part_start:part_end]
+            numbered_param += 1
+        params[param_name] = param_val
+    return name, params
+
+
 def extract_templates_and_params_regex_simple(text):
     """
     Extract top-level templates with params using only a simple regex.
@@ -1984,6 +2222,11 @@ class TimeStripper(object):
         self.tzinfo = tzoneFixedOffset(self.site.siteinfo['timeoffset'],
                                        self.site.siteinfo['timezone'])
 
+        # translate all non-latin digits in one pass
+        self._digits_table = dict(
+            (ord(digit), '%d' % i) for system in NON_LATIN_DIGITS.values()
+            for i, digit in enumerate(system))
+
     @property
     @deprecated('_hyperlink_pat')
     def linkP(self):
@@ -2003,10 +2246,7 @@ class TimeStripper(object):
 
     def fix_digits(self, line):
         """Make non-latin digits like Persian to latin to parse."""
-        for system in NON_LATIN_DIGITS.values():
-            for i in range(0, 10):
-                line = line.replace(system[i], str(i))
-        return line
+        return line.translate(self._digits_table)
 
     def _last_match_and_replace(self, txt, pat):
         """
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Mechanics to slow down wiki read and/or write rate."""
 #
-# (C) Pywikibot team, 2008-2017
+# (C) Pywikibot team, 2008-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -10,6 +10,7 @@ from __future__ import absolute_import, unicode_literals
 import math
 import threading
 import time
+import zlib
 
 import pywikibot
 from pywikibot import config
@@ -23,6 +24,47 @@ _logger = "wiki.throttle"
 # process.
 pid = False
 
+# If set, the waits of all throttles are recorded with its record method,
+# e.g. by the BotTimings of a running bot
+timings = None
+
+# If set to a SharedState, the throttles created afterwards share their lock
+# and the times of the last read and write with the throttles of the same
+# site in all processes forked from this one, e.g. by the bot runner
+shared = None
+
+# The control file is read and written by the throttles of all sites
+_ctrlfile_lock = threading.Lock()
+
+
+class SharedState(object):
+
+    """
+    State of throttles which is shared between processes.
+
+    It must be created before the processes are forked. The sites are
+    distributed on a fixed number of slots, so two sites might share
+    their state and throttle each other.
+    """
+
+    def __init__(self, slots=64):
+        """
+        Constructor.
+
+        @param slots: The number of slots for the sites
+        @type slots: int
+        """
+        import multiprocessing
+
+        self.slots = slots
+        self.locks = [multiprocessing.RLock() for _ in range(slots)]
+        # The time of the last read and the last write of each slot
+        self.times = multiprocessing.RawArray('d', 2 * slots)
+
+    def slot(self, site):
+        """Return the slot of the site."""
+        return (zlib.crc32(site.encode('utf-8')) & 0xffffffff) % self.slots
+
 
 class Throttle(object):
 
@@ -39,8 +81,13 @@ class Throttle(object):
     def __init__(self, site, mindelay=None, maxdelay=None, writedelay=None,
                  multiplydelay=True):
         """Constructor."""
-        self.lock = threading.RLock()
         self.mysite = str(site)
+        self._shared = shared
+        if self._shared:
+            self._slot = self._shared.slot(self.mysite)
+            self.lock = self._shared.locks[self._slot]
+        else:
+            self.lock = threading.RLock()
         self.ctrlfilename = config.datafilepath('throttle.ctrl')
         self.mindelay = mindelay
         if self.mindelay is None:
@@ -51,8 +98,9 @@ class Throttle(object):
         self.writedelay = writedelay
         if self.writedelay is None:
             self.writedelay = config.put_throttle
-        self.last_read = 0
-        self.last_write = 0
+        # The shared times might already be used by other throttles
+        self._last_read = 0
+        self._last_write = 0
         self.next_multiplicity = 1.0
 
         # Check logfile again after this many seconds:
@@ -72,13 +120,43 @@ class Throttle(object):
             self.checkMultiplicity()
         self.setDelays()
 
+    @property
+    def last_read(self):
+        """Return the time of the last read."""
+        if self._shared:
+            return self._shared.times[2 * self._slot]
+        return self._last_read
+
+    @last_read.setter
+    def last_read(self, value):
+        """Set the time of the last read."""
+        if self._shared:
+            self._shared.times[2 * self._slot] = value
+        else:
+            self._last_read = value
+
+    @property
+    def last_write(self):
+        """Return the time of the last write."""
+        if self._shared:
+            return self._shared.times[2 * self._slot + 1]
+        return self._last_write
+
+    @last_write.setter
+    def last_write(self, value):
+        """Set the time of the last write."""
+        if self._shared:
+            self._shared.times[2 * self._slot + 1] = value
+        else:
+            self._last_write = value
+
     def checkMultiplicity(self):
         """Count running processes for site and set process_multiplicity."""
         global pid
         mysite = self.mysite
         pywikibot.debug(u"Checking multiplicity: pid = %(pid)s" % globals(),
                         _logger)
-        with self.lock:
+        with self.lock, _ctrlfile_lock:
             processes = []
             my_pid = pid or 1  # start at 1 if global pid not yet set
             count = 1
@@ -147,8 +225,11 @@ class Throttle(object):
             self.delay = delay
             self.writedelay = min(max(self.mindelay, writedelay),
                                   self.maxdelay)
-            # Start the delay count now, not at the next check
-            self.last_read = self.last_write = time.time()
+            # Start the delay count now, not at the next check, but keep
+            # the accesses which other throttles of the slot reserved
+            now = time.time()
+            self.last_read = max(self.last_read, now)
+            self.last_write = max(self.last_write, now)
 
     def getDelay(self, write=False):
         """Return the actual delay, accounting for multiple processes.
@@ -241,6 +322,8 @@ class Throttle(object):
             pywikibot.log(message)
 
         time.sleep(seconds)
+        if timings is not None:
+            timings.record('throttle', seconds)
 
     def __call__(self, requestsize=1, write=False):
         """Block the calling program if the throttle time has not expired.
@@ -261,17 +344,28 @@ class Throttle(object):
             # the delay time for the server.
             self.next_multiplicity = math.log(1 + requestsize) / math.log(2.0)
 
-            self.wait(wait)
+            if self._shared:
+                # A lock shared with other processes is not held while
+                # waiting, so the time of the access is reserved instead.
+                now = time.time() + max(wait, 0)
+            else:
+                self.wait(wait)
+                now = time.time()
 
             if write:
-                self.last_write = time.time()
+                self.last_write = now
             else:
-                self.last_read = time.time()
+                self.last_read = now
+
+        if self._shared:
+            self.wait(wait)
 
     def lag(self, lagtime):
         """Seize the throttle lock due to server lag.
 
-        This will prevent any thread from accessing this site.
+        This will prevent any thread from accessing this site. If the
+        state is shared, the lock is not held while waiting but the time
+        of the lag is reserved for reads and writes.
 
         """
         started = time.time()
@@ -282,4 +376,12 @@ class Throttle(object):
             # account for any time we waited while acquiring the lock
             wait = delay - (time.time() - started)
 
+            if self._shared:
+                end = time.time() + max(wait, 0)
+                self.last_read = max(self.last_read, end)
+                self.last_write = max(self.last_write, end)
+            else:
+                self.wait(wait)
+
+        if self._shared:
             self.wait(wait)
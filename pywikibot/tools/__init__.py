@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Miscellaneous helper functions (not wiki-dependent)."""
 #
-# (C) Pywikibot team, 2008-2017
+# (C) Pywikibot team, 2008-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -1663,7 +1663,12 @@ def redirect_func(target, source_module=None, target_module=None,
 
 class ModuleDeprecationWrapper(types.ModuleType):
 
-    """A wrapper for a module to deprecate classes or variables of it."""
+    """
+    A wrapper for a module to deprecate classes or variables of it.
+
+    It can also import attributes of the module lazily from other modules
+    on their first use.
+    """
 
     def __init__(self, module):
         """
@@ -1678,6 +1683,7 @@ class ModuleDeprecationWrapper(types.ModuleType):
         if isinstance(module, basestring):
             module = sys.modules[module]
         super(ModuleDeprecationWrapper, self).__setattr__('_deprecated', {})
+        super(ModuleDeprecationWrapper, self).__setattr__('_lazy', {})
         super(ModuleDeprecationWrapper, self).__setattr__('_module', module)
         self.__dict__.update(module.__dict__)
 
@@ -1737,6 +1743,46 @@ class ModuleDeprecationWrapper(types.ModuleType):
             delattr(self, name)
         self._deprecated[name] = replacement_name, replacement, warning_message
 
+    def _add_lazy_attr(self, name, module_name, attr_name=None):
+        """
+        Add a name which is imported from another module on its first use.
+
+        Unlike deprecated names it also works if Python is run with -O.
+
+        @param name: The name of the attribute. The module may not have an
+            attribute of that name already.
+        @type name: str
+        @param module_name: The module which is imported on the first use.
+        @type module_name: str
+        @param attr_name: The attribute of that module which is used as
+            value. If None the value is the submodule C{name} of the wrapped
+            module, which must be imported by importing C{module_name}.
+        @type attr_name: str or None
+        """
+        if hasattr(self._module, name):
+            raise ValueError('Module has already an attribute named '
+                             '"{0}".'.format(name))
+        if not self._lazy:
+            self._replace_references()
+        self._lazy[name] = module_name, attr_name
+
+    def _replace_references(self):
+        """
+        Replace the wrapped module by the wrapper.
+
+        Submodules which were imported while the module was imported hold
+        a reference to the wrapped module. They are changed to use the
+        wrapper so that they can access the lazy attributes.
+        """
+        name = self._module.__name__
+        sys.modules[name] = self
+        for module_name, module in list(sys.modules.items()):
+            if not module_name.startswith(name + '.') or module is None:
+                continue
+            for key, value in list(vars(module).items()):
+                if value is self._module:
+                    setattr(module, key, self)
+
     def __setattr__(self, attr, value):
         """Set the value of the wrapped module."""
         self.__dict__[attr] = value
@@ -1744,6 +1790,15 @@ class ModuleDeprecationWrapper(types.ModuleType):
 
     def __getattr__(self, attr):
         """Return the attribute with a deprecation warning if required."""
+        if attr in self._lazy:
+            module_name, attr_name = self._lazy[attr]
+            __import__(module_name)
+            if attr_name:
+                value = getattr(sys.modules[module_name], attr_name)
+            else:
+                value = sys.modules[self._module.__name__ + '.' + attr]
+            setattr(self, attr, value)
+            return value
         if attr in self._deprecated:
             warning_message = self._deprecated[attr][2]
             warn(warning_message.format(self._module.__name__, attr,
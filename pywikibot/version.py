@@ -19,19 +19,10 @@ import sys
 import time
 import xml.dom.minidom
 
-from distutils import log
 from distutils.sysconfig import get_python_lib
 from io import BytesIO
 from warnings import warn
 
-try:
-    from setuptools import svn_utils
-except ImportError:
-    try:
-        from setuptools_svn import svn_utils
-    except ImportError as e:
-        svn_utils = e
-
 import pywikibot
 
 from pywikibot import config2 as config
@@ -228,8 +219,12 @@ def getversion_svn_setuptools(path=None):
         - hash (git hash for the Subversion revision)
     @rtype: C{tuple} of three C{str} and a C{time.struct_time}
     """
-    if isinstance(svn_utils, Exception):
-        raise svn_utils
+    # setuptools takes a long time to import and is rarely needed
+    from distutils import log
+    try:
+        from setuptools import svn_utils
+    except ImportError:
+        from setuptools_svn import svn_utils
     tag = 'pywikibot-core'
     _program_dir = path or _get_program_dir()
     svninfo = svn_utils.SvnInfo(_program_dir)
@@ -78,6 +78,7 @@ See also:
 
 Options (may be omitted):
   -help           show this help message and exit
+  -batch          preload the talk pages and their archives in batches
   -calc:PAGE      calculate key for PAGE and exit
   -file:FILE      load list of pages from FILE
   -force          override security options
@@ -89,7 +90,7 @@ Options (may be omitted):
 #
 # (C) Misza13, 2006-2010
 # (C) xqt, 2009-2016
-# (C) Pywikibot team, 2007-2017
+# (C) Pywikibot team, 2007-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -111,7 +112,7 @@ from pywikibot.date import apply_month_delta
 from pywikibot import i18n
 from pywikibot.textlib import TimeStripper, _get_regexes
 from pywikibot.textlib import to_local_digits
-from pywikibot.tools import issue_deprecation_warning, FrozenDict
+from pywikibot.tools import issue_deprecation_warning, FrozenDict, itergroup
 
 ZERO = datetime.timedelta(0)
 
@@ -124,6 +125,9 @@ MW_KEYS = FrozenDict({
     # 'months' and 'minutes' were removed because confusion outweights merit
 }, 'MW_KEYS is a dict constant')
 
+# thread headers, the text between the equal signs is the thread title
+THREAD_HEADER_REGEX = re.compile(r'^== *([^=].*?) *== *$', re.M)
+
 
 class ArchiveBotSiteConfigError(pywikibot.Error):
 
@@ -307,6 +311,80 @@ def template_title_regex(tpl_page):
     return re.compile(r'(?:(?:%s):)%s%s' % (u'|'.join(ns), marker, title))
 
 
+def _line_numbers(text, matches):
+    """Yield the line number of each match, counting from 0."""
+    line_number = 0
+    pos = 0
+    for match in matches:
+        line_number += text.count('\n', pos, match.start())
+        pos = match.start()
+        yield line_number
+
+
+def split_threads(text, timestripper, now):
+    """
+    Break up the text of a discussion page into threads.
+
+    Thread headers inside comments, nowiki, pre, source and code parts are
+    ignored. The text is scanned once for headers and once for possible
+    signatures; only lines with a time zone like "(UTC)" are passed to the
+    TimeStripper, as no timestamp is found on other lines.
+
+    @param text: text of the page
+    @type text: unicode
+    @param timestripper: TimeStripper of the site
+    @type timestripper: TimeStripper
+    @param now: the time the threads are compared with
+    @type now: datetime.datetime
+    @return: the text before the first thread and the threads
+    @rtype: tuple of unicode and list of DiscussionThread
+    """
+    # Replace text in following exceptions by its line breaks, so that the
+    # line numbers don't change
+    exceptions = ['comment', 'code', 'pre', 'source', 'nowiki']
+    stripped_text = text
+    for regex in _get_regexes(exceptions, timestripper.site):
+        stripped_text = regex.sub(lambda m: '\n' * m.group().count('\n'),
+                                  stripped_text)
+    # Find thread headers in stripped text and return their line numbers
+    thread_headers = set(_line_numbers(
+        stripped_text, THREAD_HEADER_REGEX.finditer(stripped_text)))
+    stamped = set(_line_numbers(
+        text, timestripper.ptimeznR.finditer(text)))
+
+    # Fill threads by original thread headers on found line numbers
+    lines = text.split('\n')
+    headers = sorted(thread_headers) + [len(lines)]
+    header = ''.join(line + '\n' for line in lines[:headers[0]])
+    threads = []
+    for first, last in zip(headers, headers[1:]):
+        title = THREAD_HEADER_REGEX.match(lines[first]).group(1)
+        thread = DiscussionThread(title, now, timestripper)
+        thread.feed_lines(lines[first + 1:last],
+                          [line_number - first - 1
+                           for line_number in range(first + 1, last)
+                           if line_number in stamped])
+        threads.append(thread)
+    return header, threads
+
+
+def split_pages(pages, timestripper):
+    """
+    Split existing pages into threads.
+
+    @param pages: loaded pages
+    @type pages: iterable of pywikibot.Page
+    @param timestripper: TimeStripper of the site of the pages
+    @type timestripper: TimeStripper
+    @return: the page and its header and threads by title, for
+        PageArchiver
+    @rtype: dict
+    """
+    return dict((page.title(),
+                 (page, split_threads(page.text, timestripper, None)))
+                for page in pages if page.exists())
+
+
 def calc_md5_hexdigest(txt, salt):
     """Return md5 hexdigest computed from text and salt."""
     s = md5()
@@ -380,6 +458,36 @@ class DiscussionThread(object):
         if timestamp:
             self.timestamp = max(self.timestamp, timestamp)
 
+    def feed_lines(self, lines, stamped=None):
+        """
+        Add lines to the content and find the newest timestamp.
+
+        It is the same as calling feed_line for each line, but only the
+        lines which may contain a timestamp are searched.
+
+        @param lines: lines of the thread
+        @type lines: list of unicode
+        @param stamped: indexes of the lines which may contain a timestamp,
+            all lines are searched if None
+        @type stamped: iterable of int
+        """
+        start = 0
+        if not self.content:
+            while start < len(lines) and not lines[start]:
+                start += 1
+        if start == len(lines):
+            return
+
+        self.content += '\n'.join(lines[start:]) + '\n'
+        if stamped is None:
+            stamped = range(start, len(lines))
+
+        for index in stamped:
+            timestamp = self.ts.timestripper(lines[index])
+            if timestamp and (not self.timestamp
+                              or timestamp > self.timestamp):
+                self.timestamp = timestamp
+
     def size(self):
         """Return size of discussion thread."""
         return len(self.title.encode('utf-8')) + len(
@@ -420,8 +528,14 @@ class DiscussionPage(pywikibot.Page):
     Feed threads to it and run an update() afterwards.
     """
 
-    def __init__(self, source, archiver, params=None):
-        """Constructor."""
+    def __init__(self, source, archiver, params=None, threads=None):
+        """
+        Constructor.
+
+        @param threads: header and threads of the page as returned by
+            split_pages, the page is split if they are not given
+        @type threads: tuple
+        """
         super(DiscussionPage, self).__init__(source)
         self.threads = []
         self.full = False
@@ -438,7 +552,7 @@ class DiscussionPage(pywikibot.Page):
         self.params = params
         self.now = datetime.datetime.utcnow().replace(tzinfo=TZoneUTC())
         try:
-            self.load_page()
+            self.load_page(threads)
         except pywikibot.NoPage:
             self.header = archiver.get_attr('archiveheader',
                                             i18n.twtranslate(
@@ -447,50 +561,27 @@ class DiscussionPage(pywikibot.Page):
             if self.params:
                 self.header = self.header % self.params
 
-    def load_page(self):
-        """Load the page to be archived and break it up into threads."""
+    def load_page(self, threads=None):
+        """
+        Load the page to be archived and break it up into threads.
+
+        @param threads: header and threads of the page as returned by
+            split_pages, the page is split if they are not given
+        @type threads: tuple
+        """
         self.header = ''
         self.threads = []
         self.archives = {}
         self.archived_threads = 0
         text = self.get()
-        # Replace text in following exceptions by spaces, but don't change line
-        # numbers
-        exceptions = ['comment', 'code', 'pre', 'source', 'nowiki']
-        exc_regexes = _get_regexes(exceptions, self.site)
-        stripped_text = text
-        for regex in exc_regexes:
-            for match in re.finditer(regex, stripped_text):
-                before = stripped_text[:match.start()]
-                restricted = stripped_text[match.start():match.end()]
-                after = stripped_text[match.end():]
-                restricted = re.sub(r'[^\n]', r'', restricted)
-                stripped_text = before + restricted + after
-        # Find thread headers in stripped text and return their line numbers
-        stripped_lines = stripped_text.split('\n')
-        thread_headers = []
-        for line_number, line in enumerate(stripped_lines, start=1):
-            if re.search(r'^== *[^=].*? *== *$', line):
-                thread_headers.append(line_number)
-        # Fill self by original thread headers on returned line numbers
-        lines = text.split('\n')
-        found = False  # Reading header
-        cur_thread = None
-        for line_number, line in enumerate(lines, start=1):
-            if line_number in thread_headers:
-                thread_header = re.search('^== *([^=].*?) *== *$', line)
-                found = True  # Reading threads now
-                if cur_thread:
-                    self.threads.append(cur_thread)
-                cur_thread = DiscussionThread(thread_header.group(1), self.now,
-                                              self.timestripper)
-            else:
-                if found:
-                    cur_thread.feed_line(line)
-                else:
-                    self.header += line + '\n'
-        if cur_thread:
-            self.threads.append(cur_thread)
+        if threads is None:
+            self.header, self.threads = split_threads(
+                text, self.timestripper, self.now)
+        else:
+            # Copy the list, the threads fed to the page are appended to it
+            self.header, self.threads = threads[0], list(threads[1])
+            for thread in self.threads:
+                thread.now = self.now
         # This extra info is not desirable when run under the unittest
         # framework, which may be run either directly or via setup.py
         if pywikibot.calledModuleName() not in ['archivebot_tests', 'setup']:
@@ -540,8 +631,14 @@ class PageArchiver(object):
 
     algo = 'none'
 
-    def __init__(self, page, tpl, salt, force=False):
-        """Constructor."""
+    def __init__(self, page, tpl, salt, force=False, preloaded=None):
+        """
+        Constructor.
+
+        @param preloaded: pages and their threads by title as returned by
+            split_pages, other pages are loaded and split when needed
+        @type preloaded: dict
+        """
         self.attributes = {
             'algo': ['old(24h)', False],
             'archive': ['', False],
@@ -554,7 +651,8 @@ class PageArchiver(object):
         self.site = page.site
         self.tpl = pywikibot.Page(self.site, tpl)
         self.timestripper = TimeStripper(site=self.site)
-        self.page = DiscussionPage(page, self)
+        self.preloaded = preloaded if preloaded is not None else {}
+        self.page = self.discussion_page(page)
         self.load_config()
         self.comment_params = {
             'from': self.page.title(),
@@ -565,6 +663,21 @@ class PageArchiver(object):
         for n, (_long, _short) in enumerate(self.site.months_names):
             self.month_num2orig_names[n + 1] = {"long": _long, "short": _short}
 
+    def discussion_page(self, page, params=None):
+        """Return the DiscussionPage of a page, preloaded if possible."""
+        page, threads = self.preloaded.get(page.title(), (page, None))
+        return DiscussionPage(page, self, params, threads)
+
+    def update_page(self, page, summary):
+        """
+        Save a DiscussionPage and drop its preloaded version.
+
+        Another archiver of the batch which needs the page loads it again,
+        so that it does not save on an outdated text.
+        """
+        page.update(summary)
+        self.preloaded.pop(page.title(), None)
+
     def get_attr(self, attr, default=''):
         """Get an archiver attribute."""
         return self.attributes.get(attr, [default])[0]
@@ -625,9 +738,49 @@ class PageArchiver(object):
                 u"Archive page %s does not start with page title (%s)!"
                 % (archive, self.page.title()))
         if title not in self.archives:
-            self.archives[title] = DiscussionPage(archive, self, params)
+            self.archives[title] = self.discussion_page(archive, params)
         return self.archives[title].feed_thread(thread, max_archive_size)
 
+    def archive_params(self, thread, counter):
+        """Return the parameters of the archive name for a thread."""
+        lang = self.site.lang
+        timestamp = thread.timestamp
+        return {
+            'counter': to_local_digits(counter, lang),
+            'year': to_local_digits(timestamp.year, lang),
+            'isoyear': to_local_digits(timestamp.isocalendar()[0], lang),
+            'isoweek': to_local_digits(timestamp.isocalendar()[1], lang),
+            'quarter': to_local_digits(
+                int(ceil(float(timestamp.month) / 3)), lang),
+            'month': to_local_digits(timestamp.month, lang),
+            'monthname': self.month_num2orig_names[timestamp.month]['long'],
+            'monthnameshort': self.month_num2orig_names[
+                timestamp.month]['short'],
+            'week': to_local_digits(
+                int(time.strftime('%W', timestamp.timetuple())), lang),
+        }
+
+    def archive_titles(self):
+        """
+        Return the titles of the archives the old threads are moved to.
+
+        The current counter is used, further archives may be needed if an
+        archive gets full.
+
+        @rtype: set of unicode
+        """
+        archive = self.get_attr('archive')
+        counter = int(self.get_attr('counter', '1'))
+        titles = set()
+        if archive:
+            for thread in self.page.threads:
+                if thread.should_be_archived(self):
+                    titles.add(pywikibot.Page(
+                        self.site,
+                        archive % self.archive_params(thread, counter)
+                    ).title())
+        return titles
+
     def analyze_page(self):
         """Analyze DiscussionPage."""
         max_arch_size = str2size(self.get_attr('maxarchivesize'))
@@ -646,20 +799,7 @@ class PageArchiver(object):
             why = t.should_be_archived(self)
             if why:
                 archive = self.get_attr('archive')
-                lang = self.site.lang
-                params = {
-                    'counter': to_local_digits(arch_counter, lang),
-                    'year': to_local_digits(t.timestamp.year, lang),
-                    'isoyear': to_local_digits(t.timestamp.isocalendar()[0], lang),
-                    'isoweek': to_local_digits(t.timestamp.isocalendar()[1], lang),
-                    'quarter': to_local_digits(
-                        int(ceil(float(t.timestamp.month) / 3)), lang),
-                    'month': to_local_digits(t.timestamp.month, lang),
-                    'monthname': self.month_num2orig_names[t.timestamp.month]['long'],
-                    'monthnameshort': self.month_num2orig_names[t.timestamp.month]['short'],
-                    'week': to_local_digits(
-                        int(time.strftime('%W', t.timestamp.timetuple())), lang),
-                }
+                params = self.archive_params(t, arch_counter)
                 archive = pywikibot.Page(self.site, archive % params)
                 if self.feed_archive(archive, t, max_arch_size, params):
                     arch_counter += 1
@@ -698,7 +838,7 @@ class PageArchiver(object):
                 comment = i18n.twtranslate(self.site.code,
                                            'archivebot-archive-summary',
                                            self.comment_params)
-                self.archives[a].update(comment)
+                self.update_page(self.archives[a], comment)
 
             # Save the page itself
             self.page.header = rx.sub(self.attr2text(), self.page.header)
@@ -711,7 +851,7 @@ class PageArchiver(object):
             comment = i18n.twtranslate(self.site.code,
                                        'archivebot-page-summary',
                                        self.comment_params)
-            self.page.update(comment)
+            self.update_page(self.page, comment)
 
 
 def main(*args):
@@ -729,6 +869,7 @@ def main(*args):
     salt = ''
     force = False
     calc = None
+    batch = False
     args = []
 
     def if_arg_value(arg, name):
@@ -748,6 +889,8 @@ def main(*args):
                 time.tzset()
         for v in if_arg_value(arg, '-calc'):
             calc = v
+        for v in if_arg_value(arg, '-batch'):
+            batch = True
         for v in if_arg_value(arg, '-salt'):
             salt = v
         for v in if_arg_value(arg, '-force'):
@@ -795,20 +938,85 @@ def main(*args):
         if pagename:
             pagelist.append(pywikibot.Page(site, pagename, ns=3))
         pagelist = sorted(pagelist)
+        if batch:
+            process_batches(pagelist, a, salt, force)
+            continue
         for pg in iter(pagelist):
             pywikibot.output(u'Processing %s' % pg)
-            # Catching exceptions, so that errors in one page do not bail out
-            # the entire process
+            process_page(pg, lambda: PageArchiver(pg, a, salt, force).run())
+
+
+def process_page(page, function):
+    """
+    Call function for the page and report all errors.
+
+    Catching exceptions, so that errors in one page do not bail out the
+    entire process.
+
+    @return: the result of the function or None if it failed
+    """
+    try:
+        return function()
+    except ArchiveBotSiteConfigError as e:
+        # no stack trace for errors originated by pages on-site
+        pywikibot.error('Missing or malformed template in page %s: %s'
+                        % (page, e))
+    except Exception:
+        pywikibot.error(u'Error occurred while processing page %s' % page)
+        pywikibot.exception(tb=True)
+
+
+def process_batches(pages, tpl, salt, force, groupsize=50):
+    """
+    Archive the pages in batches.
+
+    The talk pages of a batch are preloaded and split into threads. The
+    archives of all these pages are preloaded and split the same way before
+    the archivers run one after another. A page saved by an archiver is
+    loaded again if another archiver of the batch needs it.
+
+    @param pages: talk pages to be archived
+    @type pages: list of pywikibot.Page
+    @param tpl: title of the archiving template
+    @type tpl: unicode
+    @param groupsize: number of talk pages of a batch
+    @type groupsize: int
+    """
+    for group in itergroup(pages, groupsize):
+        site = group[0].site
+        timestripper = TimeStripper(site=site)
+        preloaded = split_pages(site.preloadpages(group), timestripper)
+
+        archivers = []
+        for pg in group:
+            archiver = process_page(
+                pg, lambda: PageArchiver(pg, tpl, salt, force, preloaded))
+            if archiver:
+                archivers.append(archiver)
+
+        titles = set()
+        for archiver in archivers:
             try:
-                archiver = PageArchiver(pg, a, salt, force)
-                archiver.run()
-            except ArchiveBotSiteConfigError as e:
-                # no stack trace for errors originated by pages on-site
-                pywikibot.error('Missing or malformed template in page %s: %s'
-                                % (pg, e))
+                titles.update(archiver.archive_titles())
             except Exception:
-                pywikibot.error(u'Error occurred while processing page %s' % pg)
-                pywikibot.exception(tb=True)
+                pass  # errors are reported when the archiver runs
+        archives = [pywikibot.Page(site, title) for title in sorted(titles)
+                    if title not in preloaded]
+        if archives:
+            preloaded.update(split_pages(site.preloadpages(archives),
+                                         timestripper))
+
+        for archiver in archivers:
+            pg = archiver.page
+            if pg.title() not in preloaded:
+                # An earlier archiver saved the talk page as its archive
+                pg = pywikibot.Page(site, pg.title())
+                archiver = process_page(
+                    pg, lambda: PageArchiver(pg, tpl, salt, force, preloaded))
+                if not archiver:
+                    continue
+            pywikibot.output(u'Processing %s' % pg)
+            process_page(pg, archiver.run)
 
 
 if __name__ == '__main__':
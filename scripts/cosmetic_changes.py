@@ -21,13 +21,16 @@ The following parameters are supported:
 -ignore:          Ignores if an error occurred and either skips the page or
                   only that method. It can be set to 'page' or 'method'.
 
+-profile          Show how often each clean up method was executed, skipped
+                  and changed a page and the time spent in it at the end.
+
 &warning;
 
 For further information see pywikibot/cosmetic_changes.py
 """
 #
 # (C) xqt, 2009-2017
-# (C) Pywikibot team, 2006-2017
+# (C) Pywikibot team, 2006-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -61,6 +64,7 @@ class CosmeticChangesBot(MultipleSitesBot, ExistingPageBot, NoRedirectPageBot):
             'async': False,
             'summary': u'Robot: Cosmetic changes',
             'ignore': cosmetic_changes.CANCEL_ALL,
+            'profile': False,
         })
         super(CosmeticChangesBot, self).__init__(**kwargs)
 
@@ -69,13 +73,20 @@ class CosmeticChangesBot(MultipleSitesBot, ExistingPageBot, NoRedirectPageBot):
     def treat_page(self):
         """Treat page with the cosmetic toolkit."""
         ccToolkit = cosmetic_changes.CosmeticChangesToolkit.from_page(
-            self.current_page, False, self.getOption('ignore'))
+            self.current_page, False, self.getOption('ignore'),
+            skip_unchanged=True)
         changedText = ccToolkit.change(self.current_page.get())
         if changedText is not False:
             self.put_current(new_text=changedText,
                              summary=self.getOption('summary'),
                              asynchronous=self.getOption('async'))
 
+    def exit(self):
+        """Output the statistics of the clean up methods if requested."""
+        super(CosmeticChangesBot, self).exit()
+        if self.getOption('profile'):
+            cosmetic_changes.statistics.output()
+
 
 def main(*args):
     """
@@ -99,6 +110,8 @@ def main(*args):
             options['always'] = True
         elif arg == '-async':
             options['async'] = True
+        elif arg == '-profile':
+            options['profile'] = True
         elif arg.startswith('-ignore:'):
             ignore_mode = arg[len('-ignore:'):].lower()
             if ignore_mode == 'method':
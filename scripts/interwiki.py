@@ -305,6 +305,10 @@ The following arguments influence how many pages the bot works on at once:
     -query:        The maximum number of pages that the bot will load at once.
                    Default value is 50.
 
+    -parallel:     The number of sites from which pages are loaded at the
+                   same time. Each site keeps its own throttle. Default value
+                   is 1.
+
 Some configuration option can be used to change the working of this bot:
 
 interwiki_min_subjects: the minimum amount of subjects that should be processed
@@ -345,13 +349,17 @@ that you have to break it off, use "-continue" next time.
 from __future__ import absolute_import, unicode_literals
 
 import codecs
+import itertools
 import os
 import pickle
 import re
-import shelve
 import socket
 import sys
+import threading
 import time
+import zlib
+
+from collections import MutableMapping
 
 import pywikibot
 
@@ -474,6 +482,7 @@ class InterwikiBotConfig(object):
     cleanup = False
     remove = []
     maxquerysize = 50
+    parallel = 1
     same = False
     skip = set()
     skipauto = False
@@ -606,6 +615,8 @@ class InterwikiBotConfig(object):
             self.minsubjects = int(arg[7:])
         elif arg.startswith('-query:'):
             self.maxquerysize = int(arg[7:])
+        elif arg.startswith('-parallel:'):
+            self.parallel = int(arg[10:])
         elif arg == '-back':
             self.nobackonly = True
         elif arg == '-quiet':
@@ -630,6 +641,122 @@ class InterwikiBotConfig(object):
         return True
 
 
+class ContentStore(MutableMapping):
+
+    """
+    Append-only file store for page contents.
+
+    Each value is appended to a single file, optionally compressed with
+    zlib, and the in-memory index only keeps its position. Getting a value
+    reads just that entry and deleting it only drops it from the index.
+    The space of deleted and replaced entries is reclaimed by compact,
+    which is called automatically once most of the file is unused.
+    """
+
+    def __init__(self, path, compress=False, min_garbage=1 << 20):
+        """
+        Constructor.
+
+        @param path: the file to store the contents in. It is overwritten.
+        @type path: str
+        @param compress: whether values are compressed with zlib, which
+            makes the file smaller but getting and setting values slower
+        @type compress: bool
+        @param min_garbage: the number of unused bytes below which the file
+            is never compacted automatically
+        @type min_garbage: int
+        """
+        self.path = path
+        self.compress = compress
+        self.min_garbage = min_garbage
+        # key -> (offset, length, compressed)
+        self._index = {}
+        self._size = 0
+        self._garbage = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'w+b')
+
+    def __getitem__(self, key):
+        """Read the value from the file."""
+        with self._lock:
+            offset, length, compressed = self._index[key]
+            self._file.seek(offset)
+            data = self._file.read(length)
+        if compressed:
+            data = zlib.decompress(data)
+        return data.decode('utf-8')
+
+    def __setitem__(self, key, value):
+        """Append the value to the file."""
+        data = value.encode('utf-8')
+        compressed = False
+        if self.compress:
+            packed = zlib.compress(data, 1)
+            if len(packed) < len(data):
+                data = packed
+                compressed = True
+        with self._lock:
+            if key in self._index:
+                self._garbage += self._index[key][1]
+            self._file.seek(self._size)
+            self._file.write(data)
+            self._index[key] = (self._size, len(data), compressed)
+            self._size += len(data)
+        self._compact_if_needed()
+
+    def __delitem__(self, key):
+        """Forget the value; its space is reclaimed by compact."""
+        with self._lock:
+            self._garbage += self._index.pop(key)[1]
+        self._compact_if_needed()
+
+    def __contains__(self, key):
+        """Return whether a value is stored for key."""
+        return key in self._index
+
+    def __iter__(self):
+        """Iterate over the keys."""
+        return iter(list(self._index))
+
+    def __len__(self):
+        """Return the number of values."""
+        return len(self._index)
+
+    def _compact_if_needed(self):
+        """Compact when more than half of the file is unused."""
+        if (self._garbage >= self.min_garbage and
+                self._garbage * 2 > self._size):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the file with only the entries still in the index."""
+        with self._lock:
+            temp_path = self.path + '.tmp'
+            index = {}
+            size = 0
+            with open(temp_path, 'wb') as temp:
+                for key, (offset, length, compressed) in sorted(
+                        self._index.items(), key=lambda item: item[1][0]):
+                    self._file.seek(offset)
+                    temp.write(self._file.read(length))
+                    index[key] = (size, length, compressed)
+                    size += length
+            self._file.close()
+            os.remove(self.path)
+            os.rename(temp_path, self.path)
+            self._file = open(self.path, 'r+b')
+            self._index = index
+            self._size = size
+            self._garbage = 0
+
+    def close(self):
+        """Close and delete the file."""
+        with self._lock:
+            self._file.close()
+            self._index = {}
+            os.remove(self.path)
+
+
 class StoredPage(pywikibot.Page):
 
     """
@@ -642,10 +769,12 @@ class StoredPage(pywikibot.Page):
     # Please prefix the class members names by SP
     # to avoid possible name clashes with pywikibot.Page
 
-    # path to the shelve
+    # path to the ContentStore
     SPpath = None
-    # shelve
+    # ContentStore
     SPstore = None
+    # unique keys of the instances
+    SPkeys = itertools.count()
 
     # attributes created by pywikibot.Page.__init__
     SPcopy = ['_editrestriction',
@@ -666,14 +795,16 @@ class StoredPage(pywikibot.Page):
     def SPdeleteStore():
         """Delete SPStore."""
         if StoredPage.SPpath:
-            del StoredPage.SPstore
-            os.unlink(StoredPage.SPpath)
+            StoredPage.SPstore.close()
+            StoredPage.SPstore = None
+            StoredPage.SPpath = None
     SPdeleteStore = staticmethod(SPdeleteStore)
 
     def __init__(self, page):
         """Constructor."""
         for attr in StoredPage.SPcopy:
-            setattr(self, attr, getattr(page, attr))
+            if hasattr(page, attr):
+                setattr(self, attr, getattr(page, attr))
 
         if not StoredPage.SPpath:
             index = 1
@@ -683,9 +814,9 @@ class StoredPage(pywikibot.Page):
                     break
                 index += 1
             StoredPage.SPpath = path
-            StoredPage.SPstore = shelve.open(path)
+            StoredPage.SPstore = ContentStore(path)
 
-        self.SPkey = str(self)
+        self.SPkey = next(StoredPage.SPkeys)
         self.SPcontentSet = False
 
     def SPgetContents(self):
@@ -701,6 +832,7 @@ class StoredPage(pywikibot.Page):
         """Delete stored content."""
         if self.SPcontentSet:
             del StoredPage.SPstore[self.SPkey]
+            self.SPcontentSet = False
 
     _contents = property(SPgetContents, SPsetContents, SPdelContents)
 
@@ -1511,7 +1643,7 @@ class Subject(interwiki_graph.Subject):
 
     def isDone(self):
         """Return True if all the work for this subject has completed."""
-        return len(self.todo) == 0
+        return len(self.todo) == 0 and len(self.pending) == 0
 
     def problem(self, txt, createneed=True):
         """Report a problem with the resolution of this subject."""
@@ -2075,6 +2207,57 @@ class Subject(interwiki_graph.Subject):
             pywikibot.output(u'ERROR: could not report backlinks')
 
 
+class QueryBatch(object):
+
+    """A batch of pages from one site which is preloaded for some subjects."""
+
+    def __init__(self, site, subjects, pages):
+        """
+        Constructor.
+
+        @param site: the site of all the pages
+        @type site: BaseSite
+        @param subjects: the subjects which have been promised the pages
+        @type subjects: list of Subject
+        @param pages: the pages to preload
+        @type pages: list of Page
+        """
+        self.site = site
+        self.subjects = subjects
+        self.pages = pages
+        self._thread = None
+        self._error = None
+
+    def load(self):
+        """Get the content of the pages in one blow."""
+        gen = self.site.preloadpages(self.pages, templates=True,
+                                     langlinks=True, pageprops=True)
+        for page in gen:
+            # we don't want to do anything with them now. The
+            # page contents will be read via the Subject class.
+            pass
+
+    def _load_in_thread(self):
+        """Load the pages and keep any error for wait."""
+        try:
+            self.load()
+        except Exception as e:
+            self._error = e
+
+    def start(self):
+        """Start loading the pages in a background thread."""
+        self._thread = threading.Thread(target=self._load_in_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def wait(self):
+        """Wait until the pages are loaded and raise any error of start."""
+        if self._thread is not None:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
 class InterwikiBot(object):
 
     """
@@ -2095,6 +2278,8 @@ class InterwikiBot(object):
         self.pageGenerator = None
         self.generated = 0
         self.conf = conf
+        # The QueryBatch instances which are being preloaded, oldest first.
+        self.inflight = []
 
     def add(self, page, hints=None):
         """Add a single subject to the list."""
@@ -2210,23 +2395,27 @@ class InterwikiBot(object):
         if self.subjects:
             return self.subjects[0]
 
-    def maxOpenSite(self):
+    def maxOpenSite(self, exclude=()):
         """
         Return the site that has the most open queries plus the number.
 
         If there is nothing left, return None.
         Only languages that are TODO for the first Subject are returned.
+
+        @param exclude: sites which must not be returned
+        @type exclude: collection of BaseSite
         """
         max = 0
         maxlang = None
         if not self.firstSubject():
             return None
-        oc = dict(self.firstSubject().openSites())
+        oc = [site for site, count in self.firstSubject().openSites()
+              if site not in exclude]
         if not oc:
             # The first subject is done. This might be a recursive call made
             # because we have to wait before submitting another modification to
             # go live. Select any language from counts.
-            oc = self.counts
+            oc = [site for site in self.counts if site not in exclude]
         if pywikibot.Site() in oc:
             return pywikibot.Site()
         for lang in oc:
@@ -2236,8 +2425,14 @@ class InterwikiBot(object):
                 maxlang = lang
         return maxlang
 
-    def selectQuerySite(self):
-        """Select the site the next query should go out for."""
+    def selectQuerySite(self, exclude=()):
+        """
+        Select the site the next query should go out for.
+
+        @param exclude: sites which must not be returned, e.g. because
+            pages are already being loaded from them
+        @type exclude: collection of BaseSite
+        """
         # How many home-language queries we still have?
         mycount = self.counts.get(pywikibot.Site(), 0)
         # Do we still have enough subjects to work on for which the
@@ -2261,7 +2456,7 @@ class InterwikiBot(object):
                     else:
                         break
             # If we have a few, getting the home language is a good thing.
-            if not self.conf.restoreAll:
+            if not self.conf.restoreAll and pywikibot.Site() not in exclude:
                 try:
                     if self.counts[pywikibot.Site()] > 4:
                         return pywikibot.Site()
@@ -2269,24 +2464,32 @@ class InterwikiBot(object):
                     pass
         # If getting the home language doesn't make sense, see how many
         # foreign page queries we can find.
-        return self.maxOpenSite()
+        return self.maxOpenSite(exclude)
 
-    def oneQuery(self):
+    def nextBatch(self):
         """
-        Perform one step in the solution process.
+        Assemble the next batch of pages to preload.
 
-        Returns True if pages could be preloaded, or false
-        otherwise.
+        The batch is taken from a site from which no pages are being loaded
+        yet, and only from subjects which do not wait for another batch.
+
+        @return: the batch or None if there is nothing to load
+        @rtype: QueryBatch or None
         """
         # First find the best language to work on
-        site = self.selectQuerySite()
+        site = self.selectQuerySite(
+            exclude=[batch.site for batch in self.inflight])
         if site is None:
-            pywikibot.output(u"NOTE: Nothing left to do")
-            return False
+            if not self.inflight:
+                pywikibot.output(u"NOTE: Nothing left to do")
+            return None
         # Now assemble a reasonable list of pages to get
         subjectGroup = []
         pageGroup = []
         for subject in self.subjects:
+            if len(subject.pending) > 0:
+                # still waiting for a batch from another site
+                continue
             # Promise the subject that we will work on the site.
             # We will get a list of pages we can do.
             pages = subject.whatsNextPageBatch(site)
@@ -2297,17 +2500,38 @@ class InterwikiBot(object):
                     # We have found enough pages to fill the bandwidth.
                     break
         if len(pageGroup) == 0:
-            pywikibot.output(u"NOTE: Nothing left to do 2")
+            if not self.inflight:
+                pywikibot.output(u"NOTE: Nothing left to do 2")
+            return None
+        return QueryBatch(site, subjectGroup, pageGroup)
+
+    def oneQuery(self):
+        """
+        Perform one step in the solution process.
+
+        Pages are preloaded from up to conf.parallel sites at the same time.
+        The oldest batch is waited for and its subjects are told that the
+        promised work is done, so the subjects are always processed in the
+        order the batches were started in, whichever site answers first.
+
+        Returns True if pages could be preloaded, or false
+        otherwise.
+        """
+        while len(self.inflight) < max(self.conf.parallel, 1):
+            batch = self.nextBatch()
+            if batch is None:
+                break
+            if self.conf.parallel > 1:
+                batch.start()
+            else:
+                batch.load()
+            self.inflight.append(batch)
+        if not self.inflight:
             return False
-        # Get the content of the assembled list in one blow
-        gen = site.preloadpages(pageGroup, templates=True, langlinks=True,
-                                pageprops=True)
-        for page in gen:
-            # we don't want to do anything with them now. The
-            # page contents will be read via the Subject class.
-            pass
+        batch = self.inflight.pop(0)
+        batch.wait()
         # Tell all of the subjects that the promised work is done
-        for subject in subjectGroup:
+        for subject in batch.subjects:
             subject.batchLoaded(self)
         return True
 
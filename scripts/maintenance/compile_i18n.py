@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Compile the i18n message bundles into a single catalogue file.
+
+The catalogue is loaded by pywikibot.i18n instead of the JSON files of
+each bundle and language. It is written to the cache directory of the
+user, so the messages package is not modified, and it is ignored once the
+i18n messages have been updated until it is compiled again.
+
+Usage:
+
+    python pwb.py compile_i18n [-package:<name>] [-output:<filename>]
+
+-package    Name of the messages package. Default is scripts.i18n.
+
+-output     Write the catalogue to this file instead of the cache directory.
+"""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import pywikibot
+
+from pywikibot import i18n
+
+
+def main(*args):
+    """
+    Process command line arguments and compile the catalogue.
+
+    @param args: command line arguments
+    @type args: list of unicode
+    """
+    package_name = None
+    filename = None
+    for arg in pywikibot.handle_args(args):
+        option, _, value = arg.partition(':')
+        if option == '-package':
+            package_name = value
+        elif option == '-output':
+            filename = value
+        else:
+            pywikibot.bot.suggest_help(unknown_parameters=[arg])
+            return
+
+    filename = i18n.compile_messages(package_name, filename)
+    pywikibot.output('Message catalogue written to {0}'.format(filename))
+
+
+if __name__ == '__main__':
+    main()
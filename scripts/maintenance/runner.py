@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Run scripts in processes forked from this resident process.
+
+The runner logs in and loads the information of the sites once. The scripts
+it runs start with all of that already done and share the throttles of the
+sites. It requires Python 3.3 or newer on a Unix system.
+
+Usage:
+
+    python pwb.py runner [-socket:<path>] [-jobs:<n>] [-site:<family>:<code>]
+
+-socket     The Unix socket on which the runner waits for scripts. Default is
+            runner.sock in the user directory.
+
+-jobs       The number of scripts which may run at the same time. Default is
+            8.
+
+-site       A site which is prepared before the first script runs. It can be
+            given multiple times. Default is the site of user-config.py.
+
+Scripts are then run by the runner with:
+
+    python pwb.py -runner:<path> <name_of_script> <options>
+
+If no runner is listening on that socket, pwb.py runs the script itself.
+"""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import pywikibot
+
+from pywikibot import config
+from pywikibot.runner import Runner
+
+
+def main(*args):
+    """
+    Process command line arguments and run the runner.
+
+    @param args: command line arguments
+    @type args: list of unicode
+    """
+    path = config.datafilepath('runner.sock')
+    jobs = 8
+    sites = []
+    for arg in pywikibot.handle_args(args):
+        option, _, value = arg.partition(':')
+        if option == '-socket':
+            path = value
+        elif option == '-jobs':
+            jobs = int(value)
+        elif option == '-site':
+            family, _, code = value.partition(':')
+            sites.append(pywikibot.Site(code, family))
+        else:
+            pywikibot.bot.suggest_help(unknown_parameters=[arg])
+            return
+
+    runner = Runner(path, jobs)
+    try:
+        runner.warm_up(sites or [pywikibot.Site()])
+        pywikibot.output('Waiting for scripts on {0}'.format(path))
+        runner.serve_forever()
+    except KeyboardInterrupt:
+        pywikibot.output('Stopping the runner.')
+    finally:
+        runner.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -51,6 +51,9 @@ and arguments can be:
                pages. With -xml, the number of the redirect to restart with
                (see progress). Otherwise, ignored.
 
+               NOTE: With -xml, the redirect graph of the dump is kept in
+               the data folder and reused as long as the dump is unchanged.
+
 -start:title   The starting page title in each namespace. Page need not exist.
 
 -until:title   The possible last page title in each namespace. Page needs not
@@ -74,14 +77,20 @@ and arguments can be:
 # (C) Daniel Herding, 2004
 # (C) Purodha Blissenbach, 2009
 # (C) xqt, 2009-2017
-# (C) Pywikibot team, 2004-2017
+# (C) Pywikibot team, 2004-2018
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, unicode_literals
 
 import datetime
+import json
+import os
+import re
 import sys
+import unicodedata
+
+from array import array
 
 import pywikibot
 
@@ -90,7 +99,7 @@ from pywikibot.bot import OptionHandler, SingleSiteBot
 from pywikibot.exceptions import ArgumentDeprecationWarning
 from pywikibot.textlib import extract_templates_and_params_regex_simple
 from pywikibot.tools.formatter import color_format
-from pywikibot.tools import issue_deprecation_warning
+from pywikibot.tools import first_upper, issue_deprecation_warning
 
 if sys.version_info[0] > 2:
     basestring = (str, )
@@ -102,6 +111,230 @@ def space_to_underscore(link):
     return link.canonical_title().replace(' ', '_')
 
 
+class RedirectGraph(object):
+
+    """
+    Compact graph of the pages and redirects of a site.
+
+    Each title is interned into an integer id. The namespace, the redirect
+    target id and the flags of a page are stored in array columns indexed
+    by that id, so a graph of millions of pages needs a few bytes per page
+    besides the title strings. Titles use underscores like
+    space_to_underscore.
+
+    The graph may be saved to a file and loaded again by later runs.
+    """
+
+    MAGIC = b'pywikibot redirect graph\n'
+    VERSION = 1
+
+    # flag set for pages found in the dump
+    EXISTS = 1
+
+    def __init__(self):
+        """Constructor."""
+        self.titles = []
+        self.namespaces = array('i')
+        self.targets = array('i')
+        self.flags = bytearray()
+        self._ids = {}
+        self._resolved = None
+
+    def __len__(self):
+        """Return the number of pages in the graph."""
+        return len(self.titles)
+
+    @property
+    def ids(self):
+        """Return the mapping of titles to ids."""
+        if len(self._ids) != len(self.titles):
+            self._ids = dict(zip(self.titles, range(len(self.titles))))
+        return self._ids
+
+    def add(self, title, namespace, exists=False, target=None):
+        """
+        Add a page to the graph or update it.
+
+        @param title: page title with underscores
+        @type title: unicode
+        @param namespace: namespace number of the page
+        @type namespace: int
+        @param exists: whether the page exists
+        @type exists: bool
+        @param target: id of the redirect target of the page
+        @type target: int or None
+        @return: id of the page
+        @rtype: int
+        """
+        ids = self.ids
+        pid = ids.get(title)
+        if pid is None:
+            pid = ids[title] = len(self.titles)
+            self.titles.append(title)
+            self.namespaces.append(namespace)
+            self.targets.append(-1)
+            self.flags.append(0)
+        if exists:
+            self.flags[pid] |= self.EXISTS
+        if target is not None:
+            self.targets[pid] = target
+        self._resolved = None
+        return pid
+
+    def exists(self, pid):
+        """Return whether the page with the given id exists."""
+        return bool(self.flags[pid] & self.EXISTS)
+
+    def pages(self, namespaces=None):
+        """
+        Yield the ids of the existing pages.
+
+        @param namespaces: only yield pages in these namespaces,
+            all pages if empty
+        @type namespaces: iterable of int
+        """
+        namespaces = set(namespaces or ())
+        for pid, ns in enumerate(self.namespaces):
+            if (self.flags[pid] & self.EXISTS
+                    and (not namespaces or ns in namespaces)):
+                yield pid
+
+    def redirects(self, namespaces=None):
+        """
+        Yield the id and target id of each redirect.
+
+        @param namespaces: only yield redirects in these namespaces,
+            all redirects if empty
+        @type namespaces: iterable of int
+        """
+        namespaces = set(namespaces or ())
+        for pid, target in enumerate(self.targets):
+            if target >= 0 and (not namespaces
+                                or self.namespaces[pid] in namespaces):
+                yield pid, target
+
+    def resolve(self):
+        """
+        Resolve all redirect chains in one pass over the graph.
+
+        Every page is visited once: the end of a chain is stored for all
+        pages on the path to it, and later chains stop at the first page
+        already resolved.
+
+        @return: the id of the last page of the chain and the number of
+            redirects followed for each id. Both are -1 for pages leading
+            into a redirect loop.
+        @rtype: tuple of array
+        """
+        if self._resolved is not None:
+            return self._resolved
+        unknown, on_path = -2, -3
+        targets = self.targets
+        final = array('i', [unknown]) * len(targets)
+        hops = array('i', [0]) * len(targets)
+        for node in range(len(targets)):
+            path = []
+            while final[node] == unknown:
+                if targets[node] < 0:
+                    final[node] = node
+                    break
+                final[node] = on_path
+                path.append(node)
+                node = targets[node]
+            end = final[node]
+            count = hops[node]
+            if end == on_path:
+                end = count = -1
+            for node in reversed(path):
+                if count >= 0:
+                    count += 1
+                final[node] = end
+                hops[node] = count
+        self._resolved = final, hops
+        return self._resolved
+
+    def chains(self, namespaces=None):
+        """
+        Yield the resolved chain of each redirect.
+
+        The number of redirects is 1 for a redirect to a page which is not
+        a redirect, more for a double redirect and -1 for a redirect loop.
+
+        @param namespaces: only yield redirects in these namespaces,
+            all redirects if empty
+        @type namespaces: iterable of int
+        @return: redirect id, number of redirects, id of the last page
+        @rtype: generator of tuple
+        """
+        final, hops = self.resolve()
+        for pid, _ in self.redirects(namespaces):
+            yield pid, hops[pid], final[pid]
+
+    def save(self, filename, **info):
+        """
+        Save the graph to a file.
+
+        The file starts with a magic line and a JSON header line including
+        the given info, followed by the titles and the array columns.
+
+        @param filename: name of the file
+        @type filename: str
+        @param info: additional items stored in the header
+        """
+        titles = '\n'.join(self.titles).encode('utf-8')
+        header = dict(info, version=self.VERSION, count=len(self.titles),
+                      titles=len(titles), byteorder=sys.byteorder,
+                      itemsize=self.targets.itemsize)
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.MAGIC)
+            f.write(json.dumps(header, sort_keys=True).encode('utf-8'))
+            f.write(b'\n')
+            f.write(titles)
+            self.namespaces.tofile(f)
+            self.targets.tofile(f)
+            f.write(self.flags)
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a graph saved to a file.
+
+        @param filename: name of the file
+        @type filename: str
+        @return: the graph and the info items of the header
+        @rtype: tuple
+        @raises ValueError: the file is not a graph saved by this version
+        """
+        graph = cls()
+        with open(filename, 'rb') as f:
+            if f.readline() != cls.MAGIC:
+                raise ValueError('{0} is not a redirect graph'
+                                 .format(filename))
+            info = json.loads(f.readline().decode('utf-8'))
+            if (info.pop('version') != cls.VERSION
+                    or info.pop('itemsize') != graph.targets.itemsize):
+                raise ValueError('{0} has an unsupported format'
+                                 .format(filename))
+            count = info.pop('count')
+            size = info.pop('titles')
+            swap = info.pop('byteorder') != sys.byteorder
+            titles = f.read(size).decode('utf-8')
+            graph.titles = titles.split('\n') if count else []
+            graph.namespaces.fromfile(f, count)
+            graph.targets.fromfile(f, count)
+            graph.flags = bytearray(f.read(count))
+        if len(graph.titles) != count or len(graph.flags) != count:
+            raise ValueError('{0} is truncated'.format(filename))
+        if swap:
+            graph.namespaces.byteswap()
+            graph.targets.byteswap()
+        return graph, info
+
+
 class RedirectGenerator(OptionHandler):
 
     """Redirect generator."""
@@ -150,60 +383,170 @@ class RedirectGenerator(OptionHandler):
         a dictionary where the redirect names are the keys and the redirect
         targets are the values.
         """
-        xmlFilename = self.xmlFilename
-        redict = {}
+        graph = self.get_redirect_graph_from_dump()
+        titles = graph.titles
+        redict = dict((titles[pid], titles[target])
+                      for pid, target in graph.redirects(self.namespaces))
+        if alsoGetPageTitles:
+            pageTitles = set(titles[pid]
+                             for pid in graph.pages(self.namespaces))
+            return redict, pageTitles
+        else:
+            return redict
+
+    def get_redirect_graph_from_dump(self):
+        """
+        Return the redirect graph of the dump.
+
+        The graph is loaded from the data folder if it was saved for the
+        same dump file before. Otherwise the dump is read and the graph is
+        saved for later runs.
+
+        @rtype: RedirectGraph
+        """
+        stat = os.stat(self.xmlFilename)
+        info = {'site': '{0}'.format(self.site),
+                'dump': os.path.abspath(self.xmlFilename),
+                'size': stat.st_size,
+                'mtime': int(stat.st_mtime)}
+        filename = pywikibot.config.datafilepath(
+            'redirects', 'redirects-{0}-{1}.graph'.format(
+                self.site.family.name, self.site.code))
+        if os.path.exists(filename):
+            try:
+                graph, cached = RedirectGraph.load(filename)
+            except (EOFError, IOError, ValueError) as e:
+                pywikibot.log('Could not load redirect graph: {0}'.format(e))
+            else:
+                if cached == info:
+                    pywikibot.output('Loaded redirect graph of {0} pages from '
+                                     '{1}'.format(len(graph), filename))
+                    return graph
+        graph = self.read_redirect_graph(self.xmlFilename)
+        graph.save(filename, **info)
+        return graph
+
+    def read_redirect_graph(self, xmlFilename):
+        """
+        Read the pages and redirects of a XML dump into a graph.
+
+        All namespaces are read, so the graph does not depend on the
+        namespaces option.
+
+        @param xmlFilename: name of the dump file
+        @type xmlFilename: str
+        @rtype: RedirectGraph
+        """
+        graph = RedirectGraph()
         # open xml dump and read page titles out of it
         dump = xmlreader.XmlDump(xmlFilename)
         redirR = self.site.redirectRegex()
         readPagesCount = 0
-        if alsoGetPageTitles:
-            pageTitles = set()
         for entry in dump.parse():
             readPagesCount += 1
             # always print status message after 10000 pages
             if readPagesCount % 10000 == 0:
                 pywikibot.output(u'%i pages read...' % readPagesCount)
-            if len(self.namespaces) > 0:
-                if pywikibot.Page(self.site, entry.title).namespace() \
-                        not in self.namespaces:
-                    continue
-            if alsoGetPageTitles:
-                pageTitles.add(space_to_underscore(pywikibot.Link(entry.title,
-                                                                  self.site)))
-
+            if entry.ns:
+                namespace = int(entry.ns)
+            else:
+                namespace = pywikibot.Page(self.site, entry.title).namespace()
+            target_id = None
             m = redirR.match(entry.text)
             if m:
-                target = m.group(1)
-                # There might be redirects to another wiki. Ignore these.
-                target_link = pywikibot.Link(target, self.site)
-                try:
-                    target_link.parse()
-                except pywikibot.SiteDefinitionError as e:
-                    pywikibot.log(e)
-                    pywikibot.output(
-                        u'NOTE: Ignoring {0} which is a redirect ({1}) to an '
-                        u'unknown site.'.format(entry.title, target))
-                    target_link = None
-                else:
-                    if target_link.site != self.site:
-                        pywikibot.output(
-                            'NOTE: Ignoring {0} which is a redirect to '
-                            'another site {1}.'
-                            .format(entry.title, target_link.site))
-                        target_link = None
-                # if the redirect does not link to another wiki
-                if target_link and target_link.title:
-                    source = pywikibot.Link(entry.title, self.site)
-                    if target_link.anchor:
-                        pywikibot.output(
-                            u'HINT: %s is a redirect with a pipelink.'
-                            % entry.title)
-                    redict[space_to_underscore(source)] = (
-                        space_to_underscore(target_link))
-        if alsoGetPageTitles:
-            return redict, pageTitles
-        else:
-            return redict
+                target = self.parse_redirect_target(entry.title, m.group(1))
+                if target:
+                    target_id = graph.add(*target)
+            graph.add(entry.title.replace(' ', '_'), namespace,
+                      exists=True, target=target_id)
+        return graph
+
+    # characters and sequences which need the full title parser of Link
+    _link_chars = re.compile('[%&<>\\[\\]{}|\ufffd\u200e\u200f]|~~~')
+    _link_spaces = re.compile(
+        '[_ \xa0\u1680\u180E\u2000-\u200A\u2028\u2029\u202F\u205F'
+        '\u3000]+')
+
+    def parse_redirect_target(self, title, target):
+        """
+        Parse the target of a redirect.
+
+        Plain titles are normalized directly, anything else is parsed by
+        pywikibot.Link.
+
+        @param title: title of the redirect page
+        @type title: unicode
+        @param target: link text of the target
+        @type target: unicode
+        @return: target title with underscores and namespace number, or
+            None if the target is not a page of this site
+        @rtype: tuple or None
+        """
+        text = target.partition('#')[0]
+        if not self._link_chars.search(text):
+            text = self._link_spaces.sub(
+                ' ', unicodedata.normalize('NFC', text)).strip()
+            prefix, colon, text = text.partition(':')
+            if not colon:
+                namespace = self.site.namespaces[0]
+                text = prefix
+            elif prefix:
+                namespace = self._namespace_prefix(prefix)
+                text = text.lstrip(' ')
+            else:
+                namespace = None
+            if (namespace is not None and text and ':' not in text
+                    and len(text) <= 255 and not text.startswith('.')
+                    and '/.' not in text
+                    and not pywikibot.Link.illegal_titles_pattern.search(
+                        text)):
+                if namespace.case == 'first-letter':
+                    text = first_upper(text)
+                if namespace != 0:
+                    text = '{0}:{1}'.format(namespace.custom_name, text)
+                return text.replace(' ', '_'), int(namespace)
+
+        target_link = pywikibot.Link(target, self.site)
+        try:
+            target_link.parse()
+        except pywikibot.SiteDefinitionError as e:
+            pywikibot.log(e)
+            pywikibot.output(
+                u'NOTE: Ignoring {0} which is a redirect ({1}) to an '
+                u'unknown site.'.format(title, target))
+            return None
+        except pywikibot.InvalidTitle as e:
+            pywikibot.log(e)
+            pywikibot.output(
+                'NOTE: Ignoring {0} which is a redirect ({1}) to an '
+                'invalid title.'.format(title, target))
+            return None
+        if target_link.site != self.site:
+            pywikibot.output(
+                'NOTE: Ignoring {0} which is a redirect to '
+                'another site {1}.'
+                .format(title, target_link.site))
+            return None
+        # if the redirect does not link to another wiki
+        if not target_link.title:
+            return None
+        if target_link.anchor:
+            pywikibot.output(
+                u'HINT: %s is a redirect with a pipelink.' % title)
+        return (space_to_underscore(target_link),
+                int(target_link.namespace))
+
+    def _namespace_prefix(self, prefix):
+        """Return the namespace of a title prefix or None, cached."""
+        try:
+            return self._prefixes[prefix]
+        except AttributeError:
+            self._prefixes = {}
+        except KeyError:
+            pass
+        namespace = self.site.namespaces.lookup_name(prefix)
+        self._prefixes[prefix] = namespace
+        return namespace
 
     def get_redirect_pages_via_api(self):
         """Yield Pages that are redirects."""
@@ -309,11 +652,10 @@ class RedirectGenerator(OptionHandler):
             # retrieve information from XML dump
             pywikibot.output(
                 u'Getting a list of all redirects and of all page titles...')
-            redirs, pageTitles = self.get_redirects_from_dump(
-                alsoGetPageTitles=True)
-            for (key, value) in redirs.items():
-                if value not in pageTitles:
-                    yield key
+            graph = self.get_redirect_graph_from_dump()
+            for pid, hops, final in graph.chains(self.namespaces):
+                if hops == 1 and not graph.exists(final):
+                    yield graph.titles[pid]
         elif self.page_title:
             yield self.page_title
         else:
@@ -338,16 +680,17 @@ class RedirectGenerator(OptionHandler):
                         if count >= self.api_number:
                             break
         elif self.xmlFilename:
-            redict = self.get_redirects_from_dump()
+            graph = self.get_redirect_graph_from_dump()
+            total = sum(1 for _ in graph.redirects(self.namespaces))
             num = 0
-            for (key, value) in redict.items():
+            for pid, hops, final in graph.chains(self.namespaces):
                 num += 1
-                # check if the value - that is, the redirect target - is a
-                # redirect as well
-                if num > self.offset and value in redict:
-                    yield key
+                # check if the redirect target is a redirect as well,
+                # or if the redirect is part of a loop
+                if num > self.offset and hops != 1:
+                    yield graph.titles[pid]
                     pywikibot.output(u'\nChecking redirect %i of %i...'
-                                     % (num + 1, len(redict)))
+                                     % (num + 1, total))
         elif self.page_title:
             yield self.page_title
         else:
@@ -35,7 +35,7 @@ pdfinfo is needed for parsing pdf titles.
                   one from i18n/reflinks.py
 """
 # (C) Nicolas Dumazet (NicDumZ), 2008
-# (C) Pywikibot team, 2008-2017
+# (C) Pywikibot team, 2008-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -48,7 +48,9 @@ import socket
 import subprocess
 import sys
 import tempfile
+import threading
 
+from collections import deque
 from functools import partial
 
 import pywikibot
@@ -58,6 +60,7 @@ from pywikibot import config2 as config
 from pywikibot.pagegenerators import (
     XMLDumpPageGenerator as _XMLDumpPageGenerator,
 )
+from pywikibot.tools import OrderedDict
 from pywikibot.tools.formatter import color_format
 
 import requests
@@ -67,9 +70,11 @@ from scripts import noreferences
 if sys.version_info[0] > 2:
     import http.client as httplib
     from urllib.error import URLError
+    from urllib.parse import urlsplit
 else:
     import httplib
     from urllib2 import URLError
+    from urlparse import urlsplit
 
 docuReplacements = {
     '&params;': pagegenerators.parameterHelp
@@ -184,6 +189,9 @@ linksInRef = re.compile(
 # ( maintained by User:Dispenser )
 listof404pages = '404-links.txt'
 
+# The number of bytes of a page which are read at most to find its title
+max_prefetch_size = 100 * 1024
+
 XmlDumpPageGenerator = partial(
     _XMLDumpPageGenerator, text_predicate=linksInRef.search)
 
@@ -485,6 +493,95 @@ class ReferencesRobot(Bot):
             urlobj.close()
             os.unlink(infile)
 
+    def fetch(self, url):
+        """
+        Fetch the start of the page of a link.
+
+        The body is read until the end of the title or until
+        max_prefetch_size bytes, whichever comes first. PDF files are read
+        completely unless PDF files are ignored, and the body of other
+        media and of errors is not read at all.
+
+        @param url: the link
+        @type url: str
+        @return: the request and the body which has been read
+        @rtype: tuple of L{threadedhttp.HttpRequest} and bytes
+        """
+        f = comms.http.fetch(url, stream=True,
+                             use_fake_user_agent=self._use_fake_user_agent)
+        try:
+            contentType = f.response_headers.get('content-type')
+            if contentType and not self.MIME.search(contentType):
+                if (url.lower().endswith('.pdf') and
+                        not self.getOption('ignorepdf')):
+                    return f, f.raw
+                return f, b''
+            if f.status != requests.codes.ok:
+                return f, b''
+            body = b''
+            for chunk in f.data.iter_content(8192):
+                body += chunk
+                if (len(body) >= max_prefetch_size or
+                        b'</title>' in body[-len(chunk) - 7:].lower()):
+                    break
+            return f, body[:max_prefetch_size]
+        finally:
+            f.data.close()
+
+    def prefetch(self, urls):
+        """
+        Fetch the pages of many links at the same time.
+
+        Up to max_external_links pages are fetched at once, but at most
+        max_external_links_per_host of the same host.
+
+        @param urls: the links
+        @type urls: iterable of str
+        @return: for each link the result of fetch or the exception it
+            raised
+        @rtype: dict
+        """
+        queues = OrderedDict()
+        for url in urls:
+            queues.setdefault(urlsplit(url).netloc.lower(), deque()).append(
+                url)
+        active = dict.fromkeys(queues, 0)
+        results = {}
+        condition = threading.Condition()
+
+        def work():
+            while True:
+                with condition:
+                    while True:
+                        if not any(queues.values()):
+                            return
+                        host = next(
+                            (host for host, queue in queues.items()
+                             if queue and active[host] <
+                             config.max_external_links_per_host), None)
+                        if host is not None:
+                            break
+                        condition.wait()
+                    url = queues[host].popleft()
+                    active[host] += 1
+                try:
+                    result = self.fetch(url)
+                except Exception as e:
+                    result = e
+                with condition:
+                    results[url] = result
+                    active[host] -= 1
+                    condition.notify_all()
+
+        threads = [threading.Thread(target=work) for _ in range(
+            min(config.max_external_links, sum(map(len, queues.values()))))]
+        for thread in threads:
+            thread.setDaemon(True)
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
     def run(self):
         """Run the Bot."""
         try:
@@ -513,7 +610,7 @@ class ReferencesRobot(Bot):
                                  % page.title(asLink=True))
                 continue
 
-            # for each link to change
+            refs = []
             for match in linksInRef.finditer(
                     textlib.removeDisabledParts(page.get())):
 
@@ -524,12 +621,21 @@ class ReferencesRobot(Bot):
                     # TODO: Clean URL blacklist
                     continue
 
-                ref = RefLink(link, match.group('name'))
+                refs.append((match, RefLink(link, match.group('name'))))
+
+            # fetch the pages of all the links at once
+            fetched = self.prefetch(set(ref.url for match, ref in refs))
+
+            # for each link to change
+            for match, ref in refs:
+                link = ref.link
                 f = None
 
                 try:
-                    f = comms.http.fetch(
-                        ref.url, use_fake_user_agent=self._use_fake_user_agent)
+                    result = fetched[ref.url]
+                    if isinstance(result, Exception):
+                        raise result
+                    f, linkedpagetext = result
 
                     # Try to get Content-Type from server
                     contentType = f.response_headers.get('content-type')
@@ -587,8 +693,6 @@ class ReferencesRobot(Bot):
                             repl = ref.refDead()
                             new_text = new_text.replace(match.group(), repl)
                         continue
-
-                    linkedpagetext = f.raw
                 except UnicodeError:
                     # example : http://www.adminet.com/jo/20010615¦/ECOC0100037D.html
                     # in [[fr:Cyanure]]
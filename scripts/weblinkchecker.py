@@ -9,7 +9,7 @@ max_external_links, which defaults to 50.
 The bot won't change any wiki pages, it will only report dead links such that
 people can fix or remove the links themselves.
 
-The bot will store all links found dead in a .dat file in the deadlinks
+The bot will store all links found dead in a database in the deadlinks
 subdirectory. To avoid the removing of links which are only temporarily
 unavailable, the bot ONLY reports links which were reported dead at least
 two times, with a time lag of at least one week. Such links will be logged to a
@@ -28,7 +28,7 @@ feature, set report_dead_links_on_talk = True in your user-config.py, or
 specify "-talk" on the command line. Adding "-notalk" switches this off
 irrespective of the configuration variable.
 
-When a link is found alive, it will be removed from the .dat file.
+When a link is found alive, it will be removed from the database.
 
 These command line parameters can be used to specify which pages to work on:
 
@@ -37,7 +37,9 @@ These command line parameters can be used to specify which pages to work on:
 -repeat      Work on all pages were dead links were found before. This is
              useful to confirm that the links are dead after some time (at
              least one week), which is required before the script will report
-             the problem.
+             the problem. If given as -repeat:X, only pages with links which
+             were found dead for the first time at least X days ago are
+             worked on.
 
 -namespace   Only process templates in the namespace with the given number or
              name. This parameter may be used multiple times.
@@ -71,6 +73,15 @@ max_external_links        - The maximum number of web pages that should be
                             is congested, and will then think that the page
                             is offline.
 
+max_external_links_per_host - The maximum number of web pages of the same
+                            host that should be loaded simultaneously.
+
+weblink_host_delay        - The minimum number of seconds between two
+                            requests to the same host.
+
+weblink_cache_ttl         - The number of seconds the result of a check is
+                            reused when the link is found on another page.
+
 report_dead_links_on_talk - If set to true, causes the script to report dead
                             links on the article's talk page if (and ONLY if)
                             the linked page has been unavailable at least two
@@ -107,13 +118,16 @@ from __future__ import absolute_import, unicode_literals
 
 import codecs
 import datetime
+import os
 import pickle
 import re
 import socket
+import sqlite3
 import sys
 import threading
 import time
 
+from collections import deque
 from functools import partial
 from time import sleep
 from warnings import warn
@@ -133,7 +147,9 @@ from pywikibot.bot import ExistingPageBot, SingleSiteBot
 from pywikibot.pagegenerators import (
     XMLDumpPageGenerator as _XMLDumpPageGenerator,
 )
-from pywikibot.tools import deprecated
+from pywikibot.tools import (
+    deprecated, issue_deprecation_warning, OrderedDict,
+)
 from pywikibot.tools.formatter import color_format
 
 import requests
@@ -563,27 +579,293 @@ class LinkChecker(object):
                                      self.response.reason)
 
 
+class LinkCheckPool(object):
+
+    """
+    A pool of threads checking the links found on the pages.
+
+    The links are queued per host. A thread only takes a link of a host
+    with less than per_host checks in progress and whose last check started
+    at least host_delay seconds ago, so a slow host can not occupy all the
+    threads. A link which is already queued or being checked is not checked
+    twice; the page is added to the pages waiting for its result instead.
+    Results are reused for ttl seconds; at most max_cached of them are kept.
+    """
+
+    max_cached = 10000
+
+    header = {
+        'Accept': 'text/xml,application/xml,application/xhtml+xml,'
+                  'text/html;q=0.9,text/plain;q=0.8,image/png,*/*;q=0.5',
+        'Accept-Language': 'de-de,de;q=0.8,en-us;q=0.5,en;q=0.3',
+        'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
+        'Keep-Alive': '30',
+        'Connection': 'keep-alive',
+    }
+
+    def __init__(self, history, HTTPignore=None, workers=None, per_host=None,
+                 host_delay=None, ttl=None):
+        """
+        Constructor.
+
+        The defaults of the limits are taken from the config variables
+        max_external_links, max_external_links_per_host, weblink_host_delay
+        and weblink_cache_ttl.
+
+        @param history: the history which records the results
+        @type history: History
+        @param HTTPignore: HTTP status codes which do not mark a link as dead
+        @type HTTPignore: list of int
+        @param workers: the number of threads checking links
+        @type workers: int
+        @param per_host: the number of links of one host checked at once
+        @type per_host: int
+        @param host_delay: seconds between two checks of the same host
+        @type host_delay: float
+        @param ttl: seconds for which the result of a check is reused
+        @type ttl: float
+        """
+        self.history = history
+        self.HTTPignore = set(int(code) for code in HTTPignore or [])
+        self.workers = workers or config.max_external_links
+        self.per_host = per_host or config.max_external_links_per_host
+        self.host_delay = (config.weblink_host_delay if host_delay is None
+                           else host_delay)
+        self.ttl = config.weblink_cache_ttl if ttl is None else ttl
+        # do not queue much more links than can be checked at once
+        self.max_queued = self.workers * 10
+        self._use_fake_user_agent = config.fake_user_agent_default.get(
+            'weblinkchecker', False)
+
+        self._condition = threading.Condition()
+        # host -> queued links, in the order the hosts are taken from
+        self._queues = OrderedDict()
+        # host -> number of checks in progress, while there are any
+        self._active = {}
+        # host -> time the last check started, oldest first, while a check
+        # of the host has to wait
+        self._started = OrderedDict()
+        # link -> pages waiting for its result
+        self._waiting = {}
+        # link -> (time, alive, message), oldest first
+        self._cache = OrderedDict()
+        self._threads = []
+        self._finishing = False
+
+    def add(self, page, url):
+        """
+        Check a link found on a page.
+
+        This blocks while too many links are waiting to be checked.
+
+        @param page: the page containing the link
+        @type page: pywikibot.Page
+        @param url: the link
+        @type url: str
+        """
+        with self._condition:
+            cached = self._cache.get(url)
+            if cached is not None and time.time() - cached[0] >= self.ttl:
+                del self._cache[url]
+                cached = None
+            if cached is None:
+                if url in self._waiting:
+                    self._waiting[url].append(page)
+                    return
+                while len(self._waiting) >= self.max_queued:
+                    self._condition.wait()
+                self._waiting[url] = [page]
+                host = urlparse.urlsplit(url).netloc.lower()
+                self._queues.setdefault(host, deque()).append(url)
+                self._start_threads()
+                self._condition.notify()
+                return
+        self.report(page, url, cached[1], cached[2])
+
+    def remaining(self):
+        """Return the number of links which are queued or being checked."""
+        return len(self._waiting)
+
+    def finish(self):
+        """Let the threads end once all the queued links are checked."""
+        with self._condition:
+            self._finishing = True
+            self._condition.notify_all()
+
+    def _start_threads(self):
+        """Start the threads if they are not running yet."""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run)
+            # thread dies when program terminates
+            thread.setDaemon(True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next(self):
+        """
+        Take the next link which may be checked now.
+
+        This must be called while holding the condition.
+
+        @return: the link and its host, or the number of seconds after which
+            a link of a busy host may be checked and None
+        @rtype: tuple
+        """
+        now = time.time()
+        delay = None
+        for host, queue in self._queues.items():
+            if self._active.get(host, 0) >= self.per_host:
+                continue
+            wait = self._started.get(host, 0) + self.host_delay - now
+            if wait > 0:
+                delay = wait if delay is None else min(delay, wait)
+                continue
+            url = queue.popleft()
+            # move the host to the end so that the hosts take turns
+            del self._queues[host]
+            if queue:
+                self._queues[host] = queue
+            self._active[host] = self._active.get(host, 0) + 1
+            # move the host to the end, so that the oldest time comes first
+            self._started.pop(host, None)
+            self._started[host] = now
+            return url, host
+        return delay, None
+
+    def _prune(self, now):
+        """
+        Forget the expired results and the start times no longer needed.
+
+        This must be called while holding the condition.
+        """
+        while self._started:
+            host, started = next(iter(self._started.items()))
+            if started + self.host_delay > now:
+                break
+            del self._started[host]
+        while self._cache:
+            url, cached = next(iter(self._cache.items()))
+            if (now - cached[0] < self.ttl and
+                    len(self._cache) <= self.max_cached):
+                break
+            del self._cache[url]
+
+    def _run(self):
+        """Check the queued links until the pool is finished."""
+        while True:
+            with self._condition:
+                while True:
+                    url, host = self._next()
+                    if host is not None:
+                        break
+                    if self._finishing and not self._queues:
+                        return
+                    self._condition.wait(url)
+            try:
+                alive, message = self.check_url(url)
+            except Exception:
+                alive, message = None, None
+                pywikibot.exception()
+            with self._condition:
+                self._active[host] -= 1
+                if not self._active[host]:
+                    del self._active[host]
+                pages = self._waiting.pop(url)
+                now = time.time()
+                if alive is not None:
+                    self._cache.pop(url, None)
+                    self._cache[url] = (now, alive, message)
+                self._prune(now)
+                self._condition.notify_all()
+            if alive is not None:
+                for page in pages:
+                    self.report(page, url, alive, message)
+
+    def check_url(self, url):
+        """
+        Check whether a link is alive.
+
+        A HEAD request is tried first. Some servers do not support it, so
+        if it does not succeed, the status is taken from a streamed GET
+        request whose body is not read.
+
+        @param url: the link
+        @type url: str
+        @return: whether the link is alive and why it is dead, or None and
+            None if it could not be checked
+        @rtype: tuple
+        """
+        try:
+            r = comms.http.fetch(
+                url, method='HEAD', headers=self.header,
+                default_error_handling=False,
+                use_fake_user_agent=self._use_fake_user_agent)
+            if isinstance(r.exception, (requests.exceptions.ConnectionError,
+                                        requests.exceptions.Timeout)):
+                raise r.exception
+            if r.exception is None and self._alive(r.status):
+                return True, None
+
+            r = comms.http.fetch(
+                url, headers=self.header, stream=True,
+                use_fake_user_agent=self._use_fake_user_agent)
+            r.data.close()
+        except requests.exceptions.InvalidURL:
+            return False, i18n.twtranslate(
+                self.history.site, 'weblinkchecker-badurl_msg', {'URL': url})
+        except Exception as e:
+            pywikibot.output('Exception while processing URL {0}: {1}'
+                             .format(url, e))
+            return None, None
+        if self._alive(r.status):
+            return True, None
+        return False, '{0}'.format(r.status)
+
+    def _alive(self, status):
+        """Return whether the HTTP status means that a link is alive."""
+        return status == requests.codes.ok or status in self.HTTPignore
+
+    def report(self, page, url, alive, message):
+        """
+        Record the result of a check in the history.
+
+        @param page: the page containing the link
+        @type page: pywikibot.Page
+        @param url: the link
+        @type url: str
+        @param alive: whether the link is alive
+        @type alive: bool
+        @param message: why the link is dead
+        @type message: str
+        """
+        if alive:
+            if self.history.setLinkAlive(url):
+                pywikibot.output('*Link to %s in [[%s]] is back alive.'
+                                 % (url, page.title()))
+        else:
+            pywikibot.output('*[[%s]] links to %s - %s.'
+                             % (page.title(), url, message))
+            self.history.setLinkDead(url, message, page,
+                                     config.weblink_dead_days)
+
+
 class LinkCheckThread(threading.Thread):
 
-    """A thread responsible for checking one URL.
+    """
+    DEPRECATED: A thread responsible for checking one URL.
 
-    After checking the page, it will die.
+    After checking the page, it will die. Use LinkCheckPool instead.
     """
 
+    header = LinkCheckPool.header
+
     def __init__(self, page, url, history, HTTPignore, day):
         """Constructor."""
+        issue_deprecation_warning('LinkCheckThread', 'LinkCheckPool', 2)
         threading.Thread.__init__(self)
         self.page = page
         self.url = url
         self.history = history
-        self.header = {
-            'Accept': 'text/xml,application/xml,application/xhtml+xml,'
-                      'text/html;q=0.9,text/plain;q=0.8,image/png,*/*;q=0.5',
-            'Accept-Language': 'de-de,de;q=0.8,en-us;q=0.5,en;q=0.3',
-            'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
-            'Keep-Alive': '30',
-            'Connection': 'keep-alive',
-        }
         # identification for debugging purposes
         self.setName((u'%s - %s' % (page.title(), url)).encode('utf-8',
                                                                'replace'))
@@ -629,23 +911,19 @@ class History(object):
     """
     Store previously found dead links.
 
-    The URLs are dictionary keys, and
-    values are lists of tuples where each tuple represents one time the URL was
-    found dead. Tuples have the form (title, date, error) where title is the
-    wiki page where the URL was found, date is an instance of time, and error
-    is a string with error code and message.
-
-    We assume that the first element in the list represents the first time we
-    found this dead link, and the last element represents the last time.
+    The dead links are kept in an SQLite database in the deadlinks
+    subdirectory. For each URL, every time it was found dead is stored as
+    an entry of the form (title, date, error) where title is the wiki page
+    where the URL was found, date is an instance of time, and error is a
+    string with error code and message. The time the URL was found dead the
+    first and the last time is kept separately and indexed.
 
-    Example:
-
-    dict = {
-        'https://www.example.org/page': [
-            ('WikiPageTitle', DATE, '404: File not found'),
-            ('WikiPageName2', DATE, '404: File not found'),
-        ]
+    A dead link history of older versions, which was a pickled dict,
+    is imported into the database and renamed to a .bak file.
 
+    The database is shared by the threads checking the links; all access
+    is serialized by a lock. Changes are committed every 100 changes and
+    when calling save.
     """
 
     def __init__(self, reportThread, site=None):
@@ -655,19 +933,111 @@ class History(object):
             self.site = pywikibot.Site()
         else:
             self.site = site
-        self.semaphore = threading.Semaphore()
+        self.semaphore = threading.RLock()
+        self.dbfilename = pywikibot.config.datafilepath(
+            'deadlinks', 'deadlinks-%s-%s.sqlite3' % (self.site.family.name,
+                                                      self.site.code))
         self.datfilename = pywikibot.config.datafilepath(
             'deadlinks', 'deadlinks-%s-%s.dat' % (self.site.family.name,
                                                   self.site.code))
         # Count the number of logged links, so that we can insert captions
         # from time to time
         self.logCount = 0
+        self._changes = 0
+        self.db = sqlite3.connect(self.dbfilename, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS links ('
+                        'url TEXT PRIMARY KEY, first_seen REAL NOT NULL, '
+                        'last_seen REAL NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS links_first_seen '
+                        'ON links (first_seen)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                        'url TEXT NOT NULL, title TEXT NOT NULL, '
+                        'date REAL NOT NULL, error TEXT NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_url '
+                        'ON entries (url)')
+        self.db.commit()
+        # The pickled history is renamed once it has been imported
+        if os.path.exists(self.datfilename):
+            self._migrate()
+
+    def _migrate(self):
+        """Import the pickled dead link history of older versions."""
         try:
             with open(self.datfilename, 'rb') as datfile:
-                self.historyDict = pickle.load(datfile)
-        except (IOError, EOFError):
-            # no saved history exists yet, or history dump broken
-            self.historyDict = {}
+                historyDict = pickle.load(datfile)
+            pywikibot.output('Importing {0} dead links from {1}'
+                             .format(len(historyDict), self.datfilename))
+            # A single transaction, nothing is imported if it fails
+            with self.db:
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO links VALUES (?, ?, ?)',
+                    ((url, entries[0][1], entries[-1][1])
+                     for url, entries in historyDict.items() if entries))
+                self.db.executemany(
+                    'INSERT INTO entries VALUES (?, ?, ?, ?)',
+                    ((url, title, date, error)
+                     for url, entries in historyDict.items()
+                     for title, date, error in entries))
+        except (IOError, EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError, IndexError, TypeError, ValueError,
+                sqlite3.Error) as e:
+            # history dump broken, ValueError includes UnicodeDecodeError
+            pywikibot.warning('Could not import the dead links from {0}: '
+                              '{1}: {2}'.format(self.datfilename,
+                                                e.__class__.__name__, e))
+            return
+        os.rename(self.datfilename, self.datfilename + '.bak')
+
+    def _changed(self):
+        """Commit the changes from time to time."""
+        self._changes += 1
+        if self._changes >= 100:
+            self.db.commit()
+            self._changes = 0
+
+    def entries(self, url):
+        """
+        Return the times a URL was found dead.
+
+        @param url: the URL
+        @type url: str
+        @return: the title, date and error of each time, oldest first
+        @rtype: list of tuple
+        """
+        with self.semaphore:
+            return self.db.execute(
+                'SELECT title, date, error FROM entries WHERE url = ? '
+                'ORDER BY rowid', (url, )).fetchall()
+
+    def pageTitles(self, days=0):
+        """
+        Return the titles of the pages with dead links.
+
+        @param days: only pages with links found dead for the first time at
+            least this number of days ago are returned
+        @type days: int
+        @rtype: set of str
+        """
+        with self.semaphore:
+            return set(row[0] for row in self.db.execute(
+                'SELECT DISTINCT entries.title FROM links '
+                'JOIN entries ON entries.url = links.url '
+                'WHERE links.first_seen <= ?',
+                (time.time() - 60 * 60 * 24 * days, )))
+
+    @property
+    @deprecated('History.entries or History.pageTitles')
+    def historyDict(self):
+        """Return all dead links with the times they were found dead."""
+        result = {}
+        with self.semaphore:
+            for url, title, date, error in self.db.execute(
+                    'SELECT url, title, date, error FROM entries '
+                    'ORDER BY rowid'):
+                result.setdefault(url, []).append((title, date, error))
+        return result
 
     def log(self, url, error, containingPage, archiveURL):
         """Log an error report to a text file in the deadlinks subdirectory."""
@@ -675,7 +1045,7 @@ class History(object):
             errorReport = u'* %s ([%s archive])\n' % (url, archiveURL)
         else:
             errorReport = u'* %s\n' % url
-        for (pageTitle, date, error) in self.historyDict[url]:
+        for (pageTitle, date, error) in self.entries(url):
             # ISO 8601 formulation
             isoDate = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(date))
             errorReport += "** In [[%s]] on %s, %s\n" % (pageTitle, isoDate,
@@ -698,61 +1068,70 @@ class History(object):
                                      archiveURL)
 
     def setLinkDead(self, url, error, page, weblink_dead_days):
-        """Add the fact that the link was found dead to the .dat file."""
-        self.semaphore.acquire()
+        """Add the fact that the link was found dead to the database."""
         now = time.time()
-        if url in self.historyDict:
-            timeSinceFirstFound = now - self.historyDict[url][0][1]
-            timeSinceLastFound = now - self.historyDict[url][-1][1]
+        with self.semaphore:
+            row = self.db.execute(
+                'SELECT first_seen, last_seen FROM links WHERE url = ?',
+                (url, )).fetchone()
+            if row is None:
+                self.db.execute('INSERT INTO links VALUES (?, ?, ?)',
+                                (url, now, now))
+                self.db.execute('INSERT INTO entries VALUES (?, ?, ?, ?)',
+                                (url, page.title(), now, error))
+                self._changed()
+                return
+
+            timeSinceFirstFound = now - row[0]
+            timeSinceLastFound = now - row[1]
             # if the last time we found this dead link is less than an hour
             # ago, we won't save it in the history this time.
             if timeSinceLastFound > 60 * 60:
-                self.historyDict[url].append((page.title(), now, error))
-            # if the first time we found this link longer than x day ago
-            # (default is a week), it should probably be fixed or removed.
-            # We'll list it in a file so that it can be removed manually.
-            if timeSinceFirstFound > 60 * 60 * 24 * weblink_dead_days:
-                # search for archived page
-                try:
-                    archiveURL = get_archive_url(url)
-                except Exception as e:
-                    pywikibot.warning(
-                        'get_closest_memento_url({0}) failed: {1}'.format(
-                            url, e))
-                    archiveURL = None
-                if archiveURL is None:
-                    archiveURL = weblib.getInternetArchiveURL(url)
-                if archiveURL is None:
-                    archiveURL = weblib.getWebCitationURL(url)
-                self.log(url, error, page, archiveURL)
-        else:
-            self.historyDict[url] = [(page.title(), now, error)]
-        self.semaphore.release()
+                self.db.execute(
+                    'UPDATE links SET last_seen = ? WHERE url = ?', (now, url))
+                self.db.execute('INSERT INTO entries VALUES (?, ?, ?, ?)',
+                                (url, page.title(), now, error))
+                self._changed()
+
+        # if the first time we found this link longer than x day ago
+        # (default is a week), it should probably be fixed or removed.
+        # We'll list it in a file so that it can be removed manually.
+        if timeSinceFirstFound > 60 * 60 * 24 * weblink_dead_days:
+            # search for archived page
+            try:
+                archiveURL = get_archive_url(url)
+            except Exception as e:
+                pywikibot.warning(
+                    'get_closest_memento_url({0}) failed: {1}'.format(
+                        url, e))
+                archiveURL = None
+            if archiveURL is None:
+                archiveURL = weblib.getInternetArchiveURL(url)
+            if archiveURL is None:
+                archiveURL = weblib.getWebCitationURL(url)
+            self.log(url, error, page, archiveURL)
 
     def setLinkAlive(self, url):
         """
         Record that the link is now alive.
 
-        If link was previously found dead, remove it from the .dat file.
+        If link was previously found dead, remove it from the database.
 
         @return: True if previously found dead, else returns False.
         """
-        if url in self.historyDict:
-            self.semaphore.acquire()
-            try:
-                del self.historyDict[url]
-            except KeyError:
-                # Not sure why this can happen, but I guess we can ignore this.
-                pass
-            self.semaphore.release()
-            return True
-        else:
-            return False
+        with self.semaphore:
+            deleted = self.db.execute(
+                'DELETE FROM links WHERE url = ?', (url, )).rowcount
+            if deleted:
+                self.db.execute('DELETE FROM entries WHERE url = ?', (url, ))
+                self._changed()
+        return bool(deleted)
 
     def save(self):
-        """Save the .dat file to disk."""
-        with open(self.datfilename, 'wb') as f:
-            pickle.dump(self.historyDict, f, protocol=config.pickle_protocol)
+        """Commit the changes to the database."""
+        with self.semaphore:
+            self.db.commit()
+            self._changes = 0
 
 
 class DeadLinkReportThread(threading.Thread):
@@ -861,7 +1240,7 @@ class WeblinkCheckerRobot(SingleSiteBot, ExistingPageBot):
     """
     Bot which will search for dead weblinks.
 
-    It uses several LinkCheckThreads at once to process pages from generator.
+    It uses a LinkCheckPool to check the links of several pages at once.
     """
 
     def __init__(self, generator, HTTPignore=None, day=7, site=True):
@@ -883,6 +1262,7 @@ class WeblinkCheckerRobot(SingleSiteBot, ExistingPageBot):
         else:
             self.HTTPignore = HTTPignore
         self.day = day
+        self.pool = LinkCheckPool(self.history, self.HTTPignore)
 
     def treat_page(self):
         """Process one page."""
@@ -894,16 +1274,8 @@ class WeblinkCheckerRobot(SingleSiteBot, ExistingPageBot):
                 if ignoreR.match(url):
                     ignoreUrl = True
             if not ignoreUrl:
-                # Limit the number of threads started at the same time. Each
-                # thread will check one page, then die.
-                while threading.activeCount() >= config.max_external_links:
-                    time.sleep(config.retry_wait)
-                thread = LinkCheckThread(page, url, self.history,
-                                         self.HTTPignore, self.day)
-                # thread dies when program terminates
-                thread.setDaemon(True)
                 try:
-                    thread.start()
+                    self.pool.add(page, url)
                 except threading.ThreadError:
                     pywikibot.warning(
                         "Can't start a new thread.\nPlease decrease "
@@ -913,18 +1285,21 @@ class WeblinkCheckerRobot(SingleSiteBot, ExistingPageBot):
                     raise
 
 
-def RepeatPageGenerator():
-    """Generator for pages in History."""
+def RepeatPageGenerator(days=0):
+    """
+    Generator for pages in History.
+
+    @param days: only yield pages with links found dead for the first time
+        at least this number of days ago
+    @type days: int
+    """
     history = History(None)
-    pageTitles = set()
-    for value in history.historyDict.values():
-        for entry in value:
-            pageTitles.add(entry[0])
-    for pageTitle in sorted(pageTitles):
+    for pageTitle in sorted(history.pageTitles(days)):
         page = pywikibot.Page(pywikibot.Site(), pageTitle)
         yield page
 
 
+@deprecated('LinkCheckPool.remaining')
 def countLinkCheckThreads():
     """
     Count LinkCheckThread threads.
@@ -973,6 +1348,8 @@ def main(*args):
             config.report_dead_links_on_talk = False
         elif arg == '-repeat':
             gen = RepeatPageGenerator()
+        elif arg.startswith('-repeat:'):
+            gen = RepeatPageGenerator(int(arg[8:]))
         elif arg.startswith('-ignore:'):
             HTTPignore.append(int(arg[8:]))
         elif arg.startswith('-day:'):
@@ -1012,22 +1389,26 @@ def main(*args):
         try:
             bot.run()
         finally:
+            bot.pool.finish()
+            remaining = 0
             waitTime = 0
-            # Don't wait longer than 30 seconds for threads to finish.
-            while countLinkCheckThreads() > 0 and waitTime < 30:
+            # Don't wait longer than 30 seconds for the links to be checked.
+            while bot.pool.remaining() > 0 and waitTime < 30:
                 try:
-                    pywikibot.output(u"Waiting for remaining %i threads to "
-                                     u"finish, please wait..."
-                                     % countLinkCheckThreads())
+                    if bot.pool.remaining() != remaining:
+                        remaining = bot.pool.remaining()
+                        pywikibot.output('Waiting for remaining %i links to '
+                                         'be checked, please wait...'
+                                         % remaining)
                     # wait 1 second
                     time.sleep(1)
                     waitTime += 1
                 except KeyboardInterrupt:
                     pywikibot.output(u'Interrupted.')
                     break
-            if countLinkCheckThreads() > 0:
-                pywikibot.output(u'Remaining %i threads will be killed.'
-                                 % countLinkCheckThreads())
+            if bot.pool.remaining() > 0:
+                pywikibot.output('Remaining %i links will not be checked.'
+                                 % bot.pool.remaining())
                 # Threads will die automatically because they are daemonic.
             if bot.history.reportThread:
                 bot.history.reportThread.shutdown()
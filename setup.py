@@ -89,6 +89,10 @@ elif PYTHON_VERSION[:2] == (3, 3):
     # Python 3.3 since version 17.5.0 (2017-11-30); T181912
     extra_deps['security'].append('PyOpenSSL<17.5.0')
 
+if PYTHON_VERSION >= (3, 6):
+    # Faster decoding of API responses
+    extra_deps['orjson'] = ['orjson']
+
 script_deps = {
     'flickrripper.py': [pillow],
     'states_redirect.py': ['pycountry'],
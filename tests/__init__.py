@@ -89,14 +89,20 @@ library_test_modules = [
     'tools',
     'tools_chars',
     'tools_ip',
+    'startup',
+    'runner',
     'xmlreader',
     'textlib',
     'diff',
     'http',
+    'cassette',
     'namespace',
     'dry_api',
     'dry_site',
+    'site_snapshot',
+    'site_batch',
     'api',
+    'api_server',
     'exceptions',
     'oauth',
     'family',
@@ -140,6 +146,7 @@ script_test_modules = [
     'data_ingestion',
     'deletionbot',
     'disambredir',
+    'interwiki',
     'isbn',
     'protectbot',
     'reflinks',
@@ -0,0 +1,1197 @@
+# -*- coding: utf-8 -*-
+"""
+A local stand-in for the MediaWiki API.
+
+It emulates the subset of the API which Pywikibot uses to read and edit
+pages and Wikibase items: siteinfo, paraminfo, userinfo, tokens, queries for
+pages, revisions and category members with continuation, edit,
+wbgetentities and wbeditentity. The wiki is generated from a few numbers, so
+it has the same content each time, and every request can be delayed to
+emulate the latency of a real wiki.
+
+It reports each client as logged in as the user it was started for, so
+sites don't need to log in, unless it is started with sessions: then clients
+are anonymous until they log in and send the session cookie. It is meant for
+measurements and tests, not to verify that the requests would be accepted by
+MediaWiki.
+
+Usage:
+
+    python -m tests.api_server [-port:<n>] [-pages:<n>] [-latency:<ms>]
+"""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, print_function, unicode_literals
+
+import collections
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from xml.sax.saxutils import escape
+
+from pywikibot.tools import PY2
+
+if not PY2:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+#: The version the stand-in claims to be
+GENERATOR = 'MediaWiki 1.31.0'
+
+#: The namespaces as (id, canonical name, name, case, default content model)
+NAMESPACES = [
+    (-2, 'Media', 'Media', 'first-letter', None),
+    (-1, 'Special', 'Special', 'first-letter', None),
+    (0, '', '', 'first-letter', None),
+    (1, 'Talk', 'Talk', 'first-letter', None),
+    (2, 'User', 'User', 'first-letter', None),
+    (3, 'User talk', 'User talk', 'first-letter', None),
+    (4, 'Project', 'Stand-in', 'first-letter', None),
+    (5, 'Project talk', 'Stand-in talk', 'first-letter', None),
+    (6, 'File', 'File', 'first-letter', None),
+    (7, 'File talk', 'File talk', 'first-letter', None),
+    (8, 'MediaWiki', 'MediaWiki', 'first-letter', None),
+    (9, 'MediaWiki talk', 'MediaWiki talk', 'first-letter', None),
+    (10, 'Template', 'Template', 'first-letter', None),
+    (11, 'Template talk', 'Template talk', 'first-letter', None),
+    (12, 'Help', 'Help', 'first-letter', None),
+    (13, 'Help talk', 'Help talk', 'first-letter', None),
+    (14, 'Category', 'Category', 'first-letter', None),
+    (15, 'Category talk', 'Category talk', 'first-letter', None),
+    (120, 'Item', 'Item', 'first-letter', 'wikibase-item'),
+    (121, 'Item talk', 'Item talk', 'first-letter', None),
+    (122, 'Property', 'Property', 'first-letter', 'wikibase-property'),
+    (123, 'Property talk', 'Property talk', 'first-letter', None),
+]
+
+TOKEN_TYPES = ['createaccount', 'csrf', 'deleteglobalaccount', 'login',
+               'patrol', 'rollback', 'setglobalaccountstatus', 'userrights',
+               'watch']
+
+#: The first revision has this timestamp, each following one a second later
+EPOCH = 1514764800  # 2018-01-01T00:00:00Z
+
+_WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do '
+          'eiusmod tempor incididunt ut labore et dolore magna aliqua enim '
+          'ad minim veniam quis nostrud exercitation ullamco laboris nisi '
+          'aliquip ex ea commodo consequat').split()
+
+_CATEGORY_REGEX = re.compile(r'\[\[Category:([^\]|]+)(?:\|[^\]]*)?\]\]')
+
+
+class APIError(Exception):
+
+    """An error which is returned to the client."""
+
+    def __init__(self, code, info):
+        """Constructor."""
+        super(APIError, self).__init__(info)
+        self.code = code
+        self.info = info
+
+
+def _param(name, kind='string', **kwargs):
+    """Return the paraminfo of a parameter."""
+    kwargs.update(name=name, type=kind)
+    return kwargs
+
+
+def _multi(name, kind='string', **kwargs):
+    """Return the paraminfo of a parameter which takes multiple values."""
+    return _param(name, kind, multi='', limit=50, lowlimit=50,
+                  highlimit=500, **kwargs)
+
+
+def _limit(name, maximum=500):
+    """Return the paraminfo of a limit parameter."""
+    return _param(name, 'limit', min=1, max=maximum, highmax=maximum * 10,
+                  default=10)
+
+
+def _submodules(name, kind, modules, **kwargs):
+    """Return the paraminfo of a parameter which selects modules."""
+    if kind == 'query':
+        paths = dict((module, 'query+' + module) for module in modules)
+    else:
+        paths = dict((module, module) for module in modules)
+    return _param(name, sorted(modules), submodules=paths, **kwargs)
+
+
+#: The query modules with their prefix, whether they are usable as generator
+#: and their parameters except for the limit and continue parameters
+QUERY_MODULES = {
+    'info': ('in', False, 'prop', [
+        _multi('prop', ['protection', 'talkid', 'url', 'preload']),
+        _multi('token', ['edit', 'delete', 'protect', 'move', 'block',
+                         'unblock', 'email', 'import', 'watch'],
+               deprecated='')]),
+    'revisions': ('rv', True, 'prop', [
+        _multi('prop', ['ids', 'flags', 'timestamp', 'user', 'userid',
+                        'size', 'sha1', 'contentmodel', 'comment',
+                        'content']),
+        _param('section'), _param('dir', ['newer', 'older']),
+        _param('start', 'timestamp'), _param('end', 'timestamp'),
+        _param('startid', 'integer'), _param('endid', 'integer'),
+        _param('user', 'user'), _param('excludeuser', 'user'),
+        _multi('token', ['rollback']), _limit('limit')]),
+    'categoryinfo': ('ci', False, 'prop', []),
+    'categories': ('cl', True, 'prop', [_limit('limit')]),
+    'imageinfo': ('ii', False, 'prop', [
+        _multi('prop', ['timestamp', 'user', 'comment', 'url', 'size',
+                        'sha1', 'mime', 'metadata']), _limit('limit')]),
+    'langlinks': ('ll', False, 'prop', [_limit('limit')]),
+    'pageprops': ('pp', False, 'prop', [_multi('prop')]),
+    'templates': ('tl', True, 'prop', [_multi('namespace', 'namespace'),
+                                       _limit('limit')]),
+    'allpages': ('ap', True, 'list', [
+        _param('from'), _param('to'), _param('prefix'),
+        _param('namespace', 'namespace'),
+        _param('filterredir', ['all', 'redirects', 'nonredirects']),
+        _limit('limit')]),
+    'categorymembers': ('cm', True, 'list', [
+        _param('title'), _param('pageid', 'integer'),
+        _multi('prop', ['ids', 'title', 'sortkey', 'sortkeyprefix', 'type',
+                        'timestamp']),
+        _multi('namespace', 'namespace'),
+        _multi('type', ['page', 'subcat', 'file']),
+        _param('sort', ['sortkey', 'timestamp']),
+        _param('dir', ['asc', 'desc', 'ascending', 'descending', 'newer',
+                       'older']),
+        _limit('limit')]),
+    'siteinfo': ('si', False, 'meta', [_multi('prop', [
+        'general', 'namespaces', 'namespacealiases', 'specialpagealiases',
+        'magicwords', 'interwikimap', 'extensions', 'restrictions',
+        'fileextensions', 'languages'])]),
+    'userinfo': ('ui', False, 'meta', [_multi('prop', [
+        'blockinfo', 'hasmsg', 'groups', 'rights', 'editcount'])]),
+    'tokens': ('', False, 'meta', [_multi('type', TOKEN_TYPES)]),
+    'wikibase': ('wb', False, 'meta', [_multi('prop', ['url', 'siteid'])]),
+    'allmessages': ('am', False, 'meta', [
+        _multi('messages'), _param('lang'), _param('from'), _param('to')]),
+}
+
+#: The interface messages of the wiki
+MESSAGES = {
+    'and': '&#32;and',
+    'colon-separator': ':&#32;',
+    'comma-separator': ',&#32;',
+    'pipe-separator': '&#32;|&#32;',
+    'semicolon-separator': ';&#32;',
+    'word-separator': '&#32;',
+}
+
+#: The action modules with whether they must be posted and their parameters
+ACTION_MODULES = {
+    'query': (False, []),
+    'paraminfo': (False, [
+        _multi('modules'),
+        _multi('querymodules', sorted(QUERY_MODULES), deprecated=''),
+        _param('helpformat', ['html', 'none', 'raw', 'wikitext'])]),
+    'edit': (True, [
+        _param('title'), _param('pageid', 'integer'), _param('section'),
+        _param('text', 'text'), _param('summary'), _param('minor', 'boolean'),
+        _param('notminor', 'boolean'), _param('bot', 'boolean'),
+        _param('basetimestamp', 'timestamp'), _param('recreate', 'boolean'),
+        _param('createonly', 'boolean'), _param('nocreate', 'boolean'),
+        _param('appendtext', 'text'), _param('prependtext', 'text'),
+        _param('token', 'string')]),
+    'login': (True, [_param('lgname'), _param('lgpassword', 'password'),
+                     _param('lgtoken')]),
+    'logout': (False, []),
+    'tokens': (False, [_multi('type', ['edit', 'delete', 'protect', 'move',
+                                       'block', 'unblock', 'email', 'import',
+                                       'watch', 'patrol', 'rollback'],
+                              deprecated='')]),
+    'wbgetentities': (False, [
+        _multi('ids'), _multi('sites'), _multi('titles'),
+        _multi('props', ['info', 'sitelinks', 'aliases', 'labels',
+                         'descriptions', 'claims', 'datatype']),
+        _multi('languages')]),
+    'wbeditentity': (True, [
+        _param('id'), _param('new'), _param('data', 'text'),
+        _param('baserevid', 'integer'), _param('summary'),
+        _param('bot', 'boolean'), _param('clear', 'boolean'),
+        _param('token', 'string')]),
+}
+
+
+def _timestamp(revid):
+    """Return the timestamp of the revision."""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(EPOCH + revid))
+
+
+def _text(words, count):
+    """Return text with count words and a link every few words."""
+    text = []
+    for i, word in enumerate(words[:count]):
+        text.append('[[{0}]]'.format(word) if i % 7 == 6 else word)
+    return ' '.join(text)
+
+
+class Wiki(object):
+
+    """
+    A generated wiki.
+
+    It has content pages 'Page 1' to 'Page <pages>', which are grouped into
+    'Category:Group 1' to 'Category:Group <categories>'. These categories are
+    subcategories of 'Category:Root'. It also has the items Q1 to Q<items>
+    with a label, a description and a claim of the string property P1.
+    """
+
+    def __init__(self, pages=100, categories=10, items=100,
+                 page_size=2000):
+        """
+        Constructor.
+
+        @param pages: The number of content pages
+        @type pages: int
+        @param categories: The number of categories grouping the pages
+        @type categories: int
+        @param items: The number of items
+        @type items: int
+        @param page_size: The approximate length of a content page
+        @type page_size: int
+        """
+        self.lock = threading.RLock()
+        self.pages = {}
+        self.pageids = {}
+        self.revisions = {}
+        self.members = collections.defaultdict(set)
+        self.last_revid = 0
+
+        words = page_size // 6
+        for i in range(1, pages + 1):
+            rand = random.Random(i)
+            text = '\n\n'.join(
+                _text([rand.choice(_WORDS) for _ in range(words // 4)],
+                      words // 4) for _ in range(4))
+            self.save('Page {0}'.format(i), text + '\n\n[[Category:Group '
+                      '{0}]]'.format(i % categories + 1))
+        for i in range(1, categories + 1):
+            self.save('Category:Group {0}'.format(i),
+                      'Pages of group {0}.\n\n[[Category:Root]]'.format(i))
+        self.save('Category:Root', 'The root of all groups.')
+
+        self.save('Property:P1', json.dumps({
+            'type': 'property', 'id': 'P1', 'datatype': 'string',
+            'labels': {'en': {'language': 'en', 'value': 'text'}},
+            'descriptions': {}, 'aliases': {}, 'claims': {}}),
+            model='wikibase-property')
+        for i in range(1, items + 1):
+            qid = 'Q{0}'.format(i)
+            self.save('Item:' + qid, json.dumps({
+                'type': 'item', 'id': qid,
+                'labels': {'en': {'language': 'en',
+                                  'value': 'Item {0}'.format(i)}},
+                'descriptions': {'en': {'language': 'en',
+                                        'value': 'Item number {0}'.format(i)}},
+                'aliases': {},
+                'claims': {'P1': [self._statement(qid, 'P1', 'value {0}'
+                                                  .format(i))]},
+                'sitelinks': {}}), model='wikibase-item')
+
+    @staticmethod
+    def _statement(entity, prop, value):
+        """Return a statement with a string value."""
+        guid = '{0}${1}'.format(entity, hashlib.md5(
+            '{0}{1}{2}'.format(entity, prop, value).encode('utf-8'))
+            .hexdigest())
+        return {'mainsnak': {'snaktype': 'value', 'property': prop,
+                             'datavalue': {'value': value, 'type': 'string'},
+                             'datatype': 'string'},
+                'type': 'statement', 'id': guid, 'rank': 'normal'}
+
+    @staticmethod
+    def namespace(title):
+        """Return the namespace id of a normalized title."""
+        prefix, sep, _ = title.partition(':')
+        if sep:
+            for ns, canonical, name, _, _ in NAMESPACES:
+                if prefix in (canonical, name) and ns:
+                    return ns
+        return 0
+
+    @staticmethod
+    def normalize(title):
+        """Normalize the title like MediaWiki does."""
+        title = title.replace('_', ' ').strip()
+        prefix, sep, rest = title.partition(':')
+        for ns, canonical, name, _, _ in NAMESPACES:
+            if sep and ns and prefix.lower() in (canonical.lower(),
+                                                 name.lower()):
+                return '{0}:{1}'.format(name, rest[:1].upper() + rest[1:])
+        return title[:1].upper() + title[1:]
+
+    def save(self, title, text, user='Stand-in', comment='', minor=False,
+             model=None):
+        """
+        Save a new revision of the page.
+
+        @return: The page and the new revision
+        @rtype: dict, dict
+        """
+        with self.lock:
+            page = self.pages.get(title)
+            if page is None:
+                page = {'pageid': len(self.pageids) + 1,
+                        'ns': self.namespace(title), 'title': title,
+                        'model': model or 'wikitext', 'revisions': [],
+                        'categories': set()}
+                self.pages[title] = page
+                self.pageids[page['pageid']] = page
+            self.last_revid += 1
+            revision = {'revid': self.last_revid,
+                        'parentid': page['revisions'][-1]['revid']
+                        if page['revisions'] else 0,
+                        'user': user, 'comment': comment, 'minor': minor,
+                        'text': text, 'pageid': page['pageid']}
+            page['revisions'].append(revision)
+            self.revisions[revision['revid']] = revision
+
+            if page['model'] == 'wikitext':
+                categories = set(
+                    self.normalize('Category:' + name)
+                    for name in _CATEGORY_REGEX.findall(text))
+                for category in page['categories'] - categories:
+                    self.members[category].discard(title)
+                for category in categories:
+                    self.members[category].add(title)
+                page['categories'] = categories
+            return page, revision
+
+    def entity(self, entity_id):
+        """Return the page of the entity or None."""
+        if entity_id[:1] == 'P':
+            return self.pages.get('Property:' + entity_id)
+        return self.pages.get('Item:' + entity_id)
+
+    def write_dump(self, filename):
+        """Write the latest revisions of all pages as an XML dump."""
+        with self.lock:
+            pages = sorted(self.pages.values(), key=lambda p: p['pageid'])
+        with open(filename, 'wb') as f:
+            f.write(b'<mediawiki xmlns="http://www.mediawiki.org/xml/'
+                    b'export-0.10/" version="0.10" xml:lang="en">\n')
+            for page in pages:
+                revision = page['revisions'][-1]
+                f.write((
+                    '  <page>\n    <title>{title}</title>\n'
+                    '    <ns>{ns}</ns>\n    <id>{pageid}</id>\n'
+                    '    <revision>\n      <id>{revid}</id>\n'
+                    '      <parentid>{parentid}</parentid>\n'
+                    '      <timestamp>{timestamp}</timestamp>\n'
+                    '      <contributor>\n        <username>{user}'
+                    '</username>\n      </contributor>\n'
+                    '      <comment>{comment}</comment>\n'
+                    '      <model>{model}</model>\n'
+                    '      <text xml:space="preserve">{text}</text>\n'
+                    '    </revision>\n  </page>\n').format(
+                        title=escape(page['title']), ns=page['ns'],
+                        pageid=page['pageid'], revid=revision['revid'],
+                        parentid=revision['parentid'],
+                        timestamp=_timestamp(revision['revid']),
+                        user=escape(revision['user']),
+                        comment=escape(revision['comment']),
+                        model=page['model'],
+                        text=escape(revision['text'])).encode('utf-8'))
+            f.write(b'</mediawiki>\n')
+
+
+class API(object):
+
+    """The API of a L{Wiki}."""
+
+    def __init__(self, wiki, server, username='Stand-in bot',
+                 sessions=False):
+        """
+        Constructor.
+
+        @param wiki: The wiki
+        @type wiki: Wiki
+        @param server: The protocol, host and port of the server
+        @type server: str
+        @param username: The user which every client is logged in as
+        @type username: str
+        @param sessions: Whether clients must log in and send the session
+        @type sessions: bool
+        """
+        self.wiki = wiki
+        self.server = server
+        self.username = username
+        self.token = hashlib.md5(username.encode('utf-8')).hexdigest() + '+\\'
+        self.sessions = set() if sessions else None
+        self._local = threading.local()
+
+    def __call__(self, params, session=None):
+        """
+        Handle a request and return the response.
+
+        @param params: The parameters of the request
+        @type params: dict
+        @param session: The session of the client, if it has one
+        @type session: str or None
+        @rtype: dict
+        """
+        action = params.get('action', 'help')
+        self._local.logged_in = (self.sessions is None or
+                                 session in self.sessions)
+        try:
+            if action not in ACTION_MODULES:
+                raise APIError('unknown_action', 'Unrecognized value for '
+                               'parameter "action": {0}.'.format(action))
+            if params.get('assert') and not self._local.logged_in:
+                raise APIError('assertuserfailed', 'Assertion that the user '
+                               'is logged in failed.')
+            if ACTION_MODULES[action][1] and params.get('token') is not None:
+                if params['token'] != self.token:
+                    raise APIError('badtoken', 'Invalid CSRF token.')
+            return getattr(self, action)(params)
+        except APIError as e:
+            return {'error': {'code': e.code, 'info': e.info},
+                    'servedby': 'stand-in'}
+        except Exception as e:
+            return {'error': {'code': 'internal_api_error_' +
+                                      type(e).__name__,
+                              'info': str(e)},
+                    'servedby': 'stand-in'}
+
+    @staticmethod
+    def _values(params, name, default=()):
+        """Return the values of a parameter which takes multiple values."""
+        value = params.get(name)
+        if value is None:
+            return list(default)
+        if value.startswith('\x1f'):
+            return value[1:].split('\x1f')
+        return value.split('|') if value else []
+
+    @staticmethod
+    def _limit(params, name, maximum=500):
+        """Return the value of a limit parameter."""
+        value = params.get(name, '10')
+        if value == 'max':
+            return maximum
+        return min(int(value), maximum)
+
+    def paraminfo(self, params):
+        """Describe the modules like action=paraminfo."""
+        modules = []
+        for path in self._values(params, 'modules'):
+            modules.append(self._module_info(path))
+        for name in self._values(params, 'querymodules'):
+            modules.append(self._module_info('query+' + name))
+        return {'paraminfo': {'modules': modules}}
+
+    def _module_info(self, path):
+        """Return the paraminfo of one module."""
+        name = path.rpartition('+')[2]
+        info = {'name': name, 'path': path, 'group': 'action', 'prefix': '',
+                'source': 'MediaWiki', 'licensetag': 'GPL-2.0+',
+                'helpurls': [], 'examples': []}
+        if path == 'main':
+            info.update(classname='ApiMain', parameters=[
+                _submodules('action', 'action', ACTION_MODULES,
+                            default='help'),
+                _submodules('format', 'format', ['json'], default='jsonfm'),
+                _param('maxlag', 'integer'), _param('assert', ['user', 'bot']),
+                _param('formatversion', ['1', '2'])])
+        elif path == 'query':
+            modules = collections.defaultdict(list)
+            for module, (_, generator, kind, _) in QUERY_MODULES.items():
+                modules[kind].append(module)
+                if generator:
+                    modules['generator'].append(module)
+            info.update(classname='ApiQuery', parameters=[
+                _submodules(kind, 'query', modules[kind], multi='',
+                            limit=50, highlimit=500)
+                for kind in ('prop', 'list', 'meta')] + [
+                _submodules('generator', 'query', modules['generator']),
+                _param('indexpageids', 'boolean'),
+                _param('continue'), _param('rawcontinue', 'boolean'),
+                _param('redirects', 'boolean'),
+                _multi('titles'), _multi('pageids', 'integer'),
+                _multi('revids', 'integer')])
+        elif path in ACTION_MODULES:
+            mustbeposted, parameters = ACTION_MODULES[path]
+            info.update(classname='Api' + name.title(), parameters=parameters)
+            if mustbeposted:
+                info.update(mustbeposted='', writerights='')
+        elif path.startswith('query+') and name in QUERY_MODULES:
+            prefix, generator, kind, parameters = QUERY_MODULES[name]
+            if kind != 'meta':
+                parameters = parameters + [_param('continue')]
+            info.update(classname='ApiQuery' + name.title(), group=kind,
+                        prefix=prefix, parameters=parameters)
+            if generator:
+                info['generator'] = ''
+        else:
+            return {'name': name, 'path': path, 'missing': ''}
+        return info
+
+    def login(self, params):
+        """Accept the login of the user."""
+        result = {'result': 'Success', 'lguserid': 1,
+                  'lgusername': self.username}
+        if self.sessions is not None:
+            if params.get('lgtoken') != self.token:
+                return {'login': {'result': 'NeedToken',
+                                  'token': self.token}}
+            result['sessionid'] = uuid.uuid4().hex
+            self.sessions.add(result['sessionid'])
+        return {'login': result}
+
+    def logout(self, params):
+        """Pretend to log out."""
+        return {}
+
+    def tokens(self, params):
+        """Return the tokens like the deprecated action=tokens."""
+        return {'tokens': dict((kind + 'token', self.token)
+                               for kind in self._values(params, 'type',
+                                                        ['edit']))}
+
+    def query(self, params):
+        """Answer a query."""
+        fv2 = params.get('formatversion') == '2'
+        result = {}
+        query = {}
+        continues = {}
+        warnings = []
+        for kind in ('prop', 'list', 'meta'):
+            for module in self._values(params, kind):
+                if QUERY_MODULES.get(module, (None,) * 3)[2] != kind:
+                    warnings.append('Unrecognized value for parameter "{0}": '
+                                    '{1}'.format(kind, module))
+        if warnings:
+            result['warnings'] = {'query': {'content' if fv2 else '*':
+                                            '\n'.join(warnings)}}
+        with self.wiki.lock:
+            pages = self._pageset(params, query, continues)
+            for module in self._values(params, 'list'):
+                if module in QUERY_MODULES:
+                    query[module] = self._list(module, params,
+                                               QUERY_MODULES[module][0],
+                                               continues)
+            for module in self._values(params, 'meta'):
+                if module in QUERY_MODULES:
+                    query.update(getattr(self, '_meta_' + module)(params))
+            if pages is not None:
+                query['pages'] = self._pages(pages, params, fv2)
+                if 'indexpageids' in params:
+                    query['pageids'] = [str(page['key']) for page in pages]
+        if query:
+            result['query'] = query
+        if continues:
+            if 'rawcontinue' in params:
+                result['query-continue'] = dict(
+                    (module, {key: value})
+                    for module, (key, value) in continues.items())
+            else:
+                cont = dict(continues.values())
+                if 'generator' in continues and len(continues) > 1:
+                    cont['continue'] = continues['generator'][0] + '||'
+                else:
+                    cont['continue'] = '-||'
+                result['continue'] = cont
+        elif 'rawcontinue' not in params:
+            result['batchcomplete'] = True if fv2 else ''
+        return result
+
+    def _pageset(self, params, query, continues):
+        """Return the pages which are selected by the parameters."""
+        if 'generator' in params:
+            module = params['generator']
+            prefix = 'g' + QUERY_MODULES[module][0]
+            if QUERY_MODULES[module][2] == 'prop':
+                # Only the categories of the pages are supported
+                titles = set()
+                for page in self._pageset(
+                        dict((key, value) for key, value in params.items()
+                             if key != 'generator'), query, {}):
+                    titles.update(self.wiki.pages.get(
+                        page['title'], {}).get('categories', ()))
+                items = [{'title': title} for title in sorted(titles)]
+            else:
+                items = self._list(module, params, prefix, continues,
+                                   'generator')
+            return [self._page(item['title']) for item in items]
+        if 'titles' in params:
+            pages = []
+            normalized = []
+            for title in self._values(params, 'titles'):
+                normal = self.wiki.normalize(title)
+                if normal != title:
+                    normalized.append({'from': title, 'to': normal})
+                pages.append(self._page(normal))
+            if normalized:
+                query['normalized'] = normalized
+            return pages
+        if 'pageids' in params:
+            pages = []
+            for pageid in self._values(params, 'pageids'):
+                page = self.wiki.pageids.get(int(pageid))
+                if page:
+                    pages.append(self._page(page['title']))
+                else:
+                    pages.append({'key': int(pageid), 'pageid': int(pageid),
+                                  'missing': True})
+            return pages
+        if 'revids' in params:
+            pages = []
+            for revid in self._values(params, 'revids'):
+                revision = self.wiki.revisions.get(int(revid))
+                if revision:
+                    page = self._page(self.wiki.pageids[
+                        revision['pageid']]['title'])
+                    page['revids'] = set([revision['revid']])
+                    pages.append(page)
+            return pages
+        return None
+
+    def _page(self, title):
+        """Return the entry of the page for the pageset."""
+        page = self.wiki.pages.get(title)
+        if page:
+            return {'pageid': page['pageid'], 'title': title}
+        return {'key': -1, 'title': title, 'missing': True}
+
+    def _pages(self, entries, params, fv2):
+        """Return the pages of the query result."""
+        props = set(self._values(params, 'prop'))
+        pages = []
+        missing = 0
+        for entry in entries:
+            page = self.wiki.pages.get(entry.get('title'))
+            if 'pageid' in entry and not page:
+                pages.append({'pageid': entry['pageid'],
+                              'missing': True if fv2 else ''})
+                continue
+            if page:
+                entry['key'] = page['pageid']
+                data = {'pageid': page['pageid'], 'ns': page['ns'],
+                        'title': page['title']}
+            else:
+                missing -= 1
+                entry['key'] = missing
+                data = {'ns': self.wiki.namespace(entry['title']),
+                        'title': entry['title'],
+                        'missing': True if fv2 else ''}
+            if 'info' in props:
+                self._prop_info(page, data, params, fv2)
+            if 'revisions' in props and page:
+                data['revisions'] = self._prop_revisions(
+                    page, entry.get('revids'), params, fv2)
+            if 'categoryinfo' in props and data['ns'] == 14:
+                data['categoryinfo'] = self._prop_categoryinfo(data['title'])
+            if 'categories' in props and page and page['categories']:
+                data['categories'] = [{'ns': 14, 'title': category}
+                                      for category in
+                                      sorted(page['categories'])]
+            pages.append(data)
+        if fv2:
+            return pages
+        return collections.OrderedDict(
+            (str(entry['key']), data)
+            for data, entry in zip(pages, entries))
+
+    def _prop_info(self, page, data, params, fv2):
+        """Add the page info."""
+        data.update(contentmodel=page['model'] if page else 'wikitext',
+                    pagelanguage='en', pagelanguagehtmlcode='en',
+                    pagelanguagedir='ltr')
+        if page:
+            revision = page['revisions'][-1]
+            data.update(touched=_timestamp(revision['revid']),
+                        lastrevid=revision['revid'],
+                        length=len(revision['text'].encode('utf-8')))
+            redirect = revision['text'].lower().startswith('#redirect')
+            if fv2:
+                data.update(redirect=redirect,
+                            new=len(page['revisions']) == 1)
+            elif redirect:
+                data['redirect'] = ''
+        if 'protection' in self._values(params, 'inprop'):
+            data.update(protection=[], restrictiontypes=['edit', 'move']
+                        if page else ['create'])
+
+    def _prop_revisions(self, page, revids, params, fv2):
+        """Return the revisions of the page."""
+        props = set(self._values(params, 'rvprop',
+                                 ['ids', 'timestamp', 'flags', 'comment',
+                                  'user']))
+        revisions = page['revisions']
+        if revids:
+            revisions = [rev for rev in revisions if rev['revid'] in revids]
+        elif any(name in params for name in ('rvlimit', 'rvdir', 'rvstartid',
+                                             'rvendid', 'rvstart', 'rvend')):
+            revisions = list(reversed(revisions))
+            if params.get('rvdir') == 'newer':
+                revisions.reverse()
+            revisions = revisions[:self._limit(params, 'rvlimit', 50)]
+        else:
+            revisions = revisions[-1:]
+
+        result = []
+        for revision in revisions:
+            data = {}
+            if 'ids' in props:
+                data.update(revid=revision['revid'],
+                            parentid=revision['parentid'])
+            if 'flags' in props:
+                if fv2:
+                    data['minor'] = revision['minor']
+                elif revision['minor']:
+                    data['minor'] = ''
+            if 'timestamp' in props:
+                data['timestamp'] = _timestamp(revision['revid'])
+            if 'user' in props:
+                data['user'] = revision['user']
+            if 'comment' in props:
+                data['comment'] = revision['comment']
+            if 'size' in props:
+                data['size'] = len(revision['text'].encode('utf-8'))
+            if 'sha1' in props:
+                data['sha1'] = hashlib.sha1(
+                    revision['text'].encode('utf-8')).hexdigest()
+            if 'contentmodel' in props or 'content' in props:
+                data['contentmodel'] = page['model']
+            if 'content' in props:
+                data['contentformat'] = ('application/json'
+                                         if page['model'] != 'wikitext'
+                                         else 'text/x-wiki')
+                data['content' if fv2 else '*'] = revision['text']
+            result.append(data)
+        return result
+
+    def _prop_categoryinfo(self, title):
+        """Return the number of members of the category."""
+        members = self.wiki.members.get(title, ())
+        subcats = sum(1 for member in members
+                      if self.wiki.namespace(member) == 14)
+        files = sum(1 for member in members
+                    if self.wiki.namespace(member) == 6)
+        return {'size': len(members), 'pages': len(members) - subcats - files,
+                'files': files, 'subcats': subcats}
+
+    def _list(self, module, params, prefix, continues, key=None):
+        """Return the items of a list module and set the continuation."""
+        if module == 'categorymembers':
+            items = self._list_categorymembers(params, prefix)
+        elif module == 'allpages':
+            items = self._list_allpages(params, prefix)
+        else:
+            raise APIError('badvalue', 'Unrecognized value for parameter '
+                           '"list": {0}.'.format(module))
+        offset = int(params.get(prefix + 'continue', 0))
+        limit = self._limit(params, prefix + 'limit')
+        if offset + limit < len(items):
+            continues[key or module] = (prefix + 'continue',
+                                        str(offset + limit))
+        return items[offset:offset + limit]
+
+    def _item(self, title):
+        """Return the item of a page for a list."""
+        page = self.wiki.pages[title]
+        return {'pageid': page['pageid'], 'ns': page['ns'], 'title': title}
+
+    def _list_categorymembers(self, params, prefix):
+        """Return the members of a category."""
+        if prefix + 'title' in params:
+            title = self.wiki.normalize(params[prefix + 'title'])
+        elif prefix + 'pageid' in params:
+            title = self.wiki.pageids[int(params[prefix + 'pageid'])]['title']
+        else:
+            raise APIError(prefix + 'notitle', 'The parameter "{0}title" '
+                           'is required.'.format(prefix))
+        types = set(self._values(params, prefix + 'type',
+                                 ['page', 'subcat', 'file']))
+        namespaces = set(int(ns) for ns in
+                         self._values(params, prefix + 'namespace'))
+        items = []
+        for member in sorted(self.wiki.members.get(title, ())):
+            item = self._item(member)
+            kind = {14: 'subcat', 6: 'file'}.get(item['ns'], 'page')
+            if kind not in types or namespaces and item['ns'] not in (
+                    namespaces):
+                continue
+            if 'type' in self._values(params, prefix + 'prop'):
+                item['type'] = kind
+            items.append(item)
+        return items
+
+    def _list_allpages(self, params, prefix):
+        """Return the pages of a namespace in alphabetical order."""
+        ns = int(params.get(prefix + 'namespace', 0))
+        start = params.get(prefix + 'from', '')
+        start_title = self.wiki.normalize(start) if start else ''
+        titles = sorted(
+            title for title, page in self.wiki.pages.items()
+            if page['ns'] == ns and title.startswith(
+                params.get(prefix + 'prefix', '')) and title >= start_title)
+        return [self._item(title) for title in titles]
+
+    def _meta_siteinfo(self, params):
+        """Return the siteinfo properties."""
+        result = {}
+        for prop in self._values(params, 'siprop', ['general']):
+            if prop == 'general':
+                result[prop] = {
+                    'mainpage': 'Main Page',
+                    'base': self.server + '/wiki/Main_Page',
+                    'sitename': 'Stand-in', 'generator': GENERATOR,
+                    'phpversion': '7.0.0', 'phpsapi': 'stand-in',
+                    'dbtype': 'stand-in', 'dbversion': '0',
+                    'case': 'first-letter', 'lang': 'en', 'fallback': [],
+                    'fallback8bitEncoding': 'windows-1252',
+                    'writeapi': '', 'timezone': 'UTC', 'timeoffset': 0,
+                    'articlepath': '/wiki/$1', 'scriptpath': '/w',
+                    'script': '/w/index.php', 'variantarticlepath': False,
+                    'server': self.server, 'servername': urlparse(
+                        self.server).hostname,
+                    'wikiid': 'standin', 'time': _timestamp(
+                        self.wiki.last_revid),
+                    'maxarticlesize': 2097152, 'maxuploadsize': 104857600,
+                    'wikibase-conceptbaseuri': self.server + '/entity/',
+                }
+            elif prop == 'namespaces':
+                result[prop] = dict(
+                    (str(ns), dict({'id': ns, 'case': case, '*': name,
+                                    'canonical': canonical},
+                                   **({'defaultcontentmodel': model}
+                                      if model else {})))
+                    for ns, canonical, name, case, model in NAMESPACES)
+                result[prop]['0'].update(content='', subpages='')
+                del result[prop]['0']['canonical']
+            elif prop == 'extensions':
+                result[prop] = [{'type': 'wikibase', 'name': name}
+                                for name in ('WikibaseRepository',
+                                             'WikibaseClient')]
+            elif prop == 'restrictions':
+                result[prop] = {'types': ['create', 'edit', 'move', 'upload'],
+                                'levels': ['', 'autoconfirmed', 'sysop'],
+                                'cascadinglevels': ['sysop'],
+                                'semiprotectedlevels': ['autoconfirmed']}
+            else:
+                result[prop] = []
+        return result
+
+    def _meta_userinfo(self, params):
+        """Return the userinfo of the user."""
+        if not self._local.logged_in:
+            return {'userinfo': {'id': 0, 'name': '127.0.0.1', 'anon': '',
+                                 'groups': ['*'],
+                                 'rights': ['read', 'edit', 'writeapi']}}
+        return {'userinfo': {
+            'id': 1, 'name': self.username,
+            'groups': ['bot', '*', 'user', 'autoconfirmed'],
+            'rights': ['read', 'edit', 'createpage', 'bot', 'writeapi',
+                       'minoredit', 'item-term', 'property-term']}}
+
+    def _meta_tokens(self, params):
+        """Return the tokens."""
+        return {'tokens': dict((kind + 'token', self.token)
+                               for kind in self._values(params, 'type',
+                                                        ['csrf']))}
+
+    def _meta_allmessages(self, params):
+        """Return the interface messages."""
+        messages = []
+        for name in self._values(params, 'ammessages', ['*']):
+            names = sorted(MESSAGES) if name == '*' else [name]
+            for name in names:
+                if name in MESSAGES:
+                    messages.append({'name': name, 'normalizedname': name,
+                                     '*': MESSAGES[name]})
+                else:
+                    messages.append({'name': name, 'missing': ''})
+        return {'allmessages': messages}
+
+    def _meta_wikibase(self, params):
+        """Return the wiki itself as its repository."""
+        return {'wikibase': {'repo': {'url': {'base': self.server,
+                                              'scriptpath': '/w',
+                                              'articlepath': '/wiki/$1'}},
+                             'siteid': 'standin'}}
+
+    def edit(self, params):
+        """Save the text of a page."""
+        if 'title' in params:
+            title = self.wiki.normalize(params['title'])
+        elif 'pageid' in params:
+            title = self.wiki.pageids[int(params['pageid'])]['title']
+        else:
+            raise APIError('missingtitle', 'The page you specified '
+                           "doesn't exist.")
+        with self.wiki.lock:
+            page = self.wiki.pages.get(title)
+            if page and 'createonly' in params:
+                raise APIError('articleexists', 'The article you tried to '
+                               'create has been created already.')
+            if not page and 'nocreate' in params:
+                raise APIError('missingtitle', "The page you specified "
+                               "doesn't exist.")
+            old_text = page['revisions'][-1]['text'] if page else ''
+            text = params.get('text', old_text)
+            text = (params.get('prependtext', '') + text +
+                    params.get('appendtext', ''))
+            result = {'result': 'Success', 'title': title,
+                      'contentmodel': 'wikitext'}
+            if page and text == old_text:
+                result.update(pageid=page['pageid'], nochange='')
+            else:
+                old_revid = page['revisions'][-1]['revid'] if page else 0
+                page, revision = self.wiki.save(
+                    title, text, self.username, params.get('summary', ''),
+                    'minor' in params)
+                result.update(pageid=page['pageid'], oldrevid=old_revid,
+                              newrevid=revision['revid'],
+                              newtimestamp=_timestamp(revision['revid']))
+                if not old_revid:
+                    result['new'] = ''
+        return {'edit': result}
+
+    def wbgetentities(self, params):
+        """Return the entities."""
+        props = set(self._values(params, 'props', [
+            'info', 'sitelinks', 'aliases', 'labels', 'descriptions',
+            'claims', 'datatype']))
+        entities = {}
+        with self.wiki.lock:
+            for entity_id in self._values(params, 'ids'):
+                entity_id = entity_id.upper()
+                page = self.wiki.entity(entity_id)
+                if not page:
+                    entities[entity_id] = {'id': entity_id, 'missing': ''}
+                    continue
+                revision = page['revisions'][-1]
+                content = json.loads(revision['text'])
+                entity = dict((key, value) for key, value in content.items()
+                              if key in props or key in ('id', 'type'))
+                if 'info' in props:
+                    entity.update(pageid=page['pageid'], ns=page['ns'],
+                                  title=page['title'],
+                                  lastrevid=revision['revid'],
+                                  modified=_timestamp(revision['revid']))
+                entities[entity_id] = entity
+        return {'entities': entities, 'success': 1}
+
+    def wbeditentity(self, params):
+        """Change an entity with the data of the request."""
+        data = json.loads(params.get('data', '{}'))
+        with self.wiki.lock:
+            if 'new' in params:
+                entity_id = 'Q{0}'.format(sum(
+                    1 for page in self.wiki.pages.values()
+                    if page['ns'] == 120) + 1)
+                content = {'type': 'item', 'id': entity_id, 'labels': {},
+                           'descriptions': {}, 'aliases': {}, 'claims': {},
+                           'sitelinks': {}}
+            else:
+                entity_id = params.get('id', '').upper()
+                page = self.wiki.entity(entity_id)
+                if not page:
+                    raise APIError('no-such-entity',
+                                   'Could not find such an entity.')
+                content = json.loads(page['revisions'][-1]['text'])
+            if 'clear' in params:
+                for key in ('labels', 'descriptions', 'aliases', 'claims',
+                            'sitelinks'):
+                    content[key] = {}
+            self._merge(content, data)
+            page, revision = self.wiki.save(
+                ('Property:' if entity_id[0] == 'P' else 'Item:') + entity_id,
+                json.dumps(content), self.username,
+                params.get('summary', ''), model='wikibase-item')
+        entity = dict(content, pageid=page['pageid'], ns=page['ns'],
+                      title=page['title'], lastrevid=revision['revid'],
+                      modified=_timestamp(revision['revid']))
+        return {'entity': entity, 'success': 1}
+
+    def _merge(self, content, data):
+        """Merge the changes of wbeditentity into the entity."""
+        for key in ('labels', 'descriptions', 'sitelinks'):
+            values = data.get(key, {})
+            if isinstance(values, list):
+                values = dict((value.get('language', value.get('site')),
+                               value) for value in values)
+            for name, value in values.items():
+                if 'remove' in value:
+                    content[key].pop(name, None)
+                else:
+                    content[key][name] = value
+        aliases = data.get('aliases', {})
+        if isinstance(aliases, list):
+            grouped = collections.defaultdict(list)
+            for alias in aliases:
+                grouped[alias['language']].append(alias)
+            aliases = grouped
+        for language, values in aliases.items():
+            content['aliases'][language] = [
+                value for value in values if 'remove' not in value]
+        claims = data.get('claims', {})
+        if isinstance(claims, dict):
+            claims = [claim for values in claims.values()
+                      for claim in values]
+        for claim in claims:
+            prop = claim.get('mainsnak', {}).get('property')
+            for statements in content['claims'].values():
+                statements[:] = [statement for statement in statements
+                                 if statement['id'] != claim.get('id')]
+            if 'remove' in claim or not prop:
+                continue
+            if 'id' not in claim:
+                claim['id'] = self.wiki._statement(
+                    content['id'], prop, json.dumps(
+                        claim['mainsnak'].get('datavalue'),
+                        sort_keys=True))['id']
+            content['claims'].setdefault(prop, []).append(claim)
+        for prop in list(content['claims']):
+            if not content['claims'][prop]:
+                del content['claims'][prop]
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    """Pass the requests to api.php to the API."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # noqa: N802
+        """Handle a GET request."""
+        self._handle(urlparse(self.path).query)
+
+    def do_POST(self):  # noqa: N802
+        """Handle a POST request."""
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        query = urlparse(self.path).query
+        self._handle(query + '&' + body if query else body)
+
+    def _handle(self, query):
+        """Respond to the request with the parameters in the query."""
+        if not urlparse(self.path).path.endswith('/api.php'):
+            self.send_error(404)
+            return
+        params = dict((key, values[-1]) for key, values in
+                      parse_qs(query, keep_blank_values=True).items())
+        if PY2:
+            params = dict((key.decode('utf-8'), value.decode('utf-8'))
+                          for key, value in params.items())
+        self.server.count(params.get('action'))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        # Like the cookies of MediaWiki, the cookie names differ per wiki
+        cookie = 'standin{0}_session'.format(self.server.server_port)
+        match = re.search(r'(?:^|;)\s*{0}=(\w+)'.format(cookie),
+                          self.headers.get('Cookie', ''))
+        result = self.server.api(params, match and match.group(1))
+        body = json.dumps(result,
+                          ensure_ascii=params.get('formatversion') != '2')
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if 'sessionid' in result.get('login', {}):
+            self.send_header('Set-Cookie', '{0}={1}; Path=/'.format(
+                cookie, result['login']['sessionid']))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Don't log the requests."""
+        pass
+
+
+class APIServer(ThreadingMixIn, HTTPServer):
+
+    """A server which answers API requests to the wiki."""
+
+    daemon_threads = True
+
+    def __init__(self, wiki=None, latency=0, port=0,
+                 username='Stand-in bot', sessions=False):
+        """
+        Constructor.
+
+        @param wiki: The wiki, by default one with 100 pages and items
+        @type wiki: Wiki
+        @param latency: The time each request takes in seconds
+        @type latency: float
+        @param port: The port on localhost, any free port if 0
+        @type port: int
+        @param username: The user which every client is logged in as
+        @type username: str
+        @param sessions: Whether clients must log in and send the session
+            cookie
+        @type sessions: bool
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', port), RequestHandler)
+        self.wiki = wiki or Wiki()
+        self.latency = latency
+        self.api = API(self.wiki, 'http://127.0.0.1:{0}'.format(
+            self.server_port), username, sessions)
+        self.requests = collections.Counter()
+        self._counter_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        """The URL of api.php."""
+        return self.api.server + '/w/api.php'
+
+    def count(self, action):
+        """Count a request."""
+        with self._counter_lock:
+            self.requests[action] += 1
+
+    def start(self):
+        """Serve requests in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests and close the socket."""
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+def main(*args):
+    """Serve a generated wiki until interrupted."""
+    options = {'port': 8080, 'pages': 100, 'latency': 0}
+    for arg in args or sys.argv[1:]:
+        option, _, value = arg.lstrip('-').partition(':')
+        if option not in options:
+            print(__doc__)
+            return 1
+        options[option] = int(value)
+    server = APIServer(Wiki(pages=options['pages'], items=options['pages']),
+                       options['latency'] / 1000.0, options['port'])
+    print('Serving {0}'.format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
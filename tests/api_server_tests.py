@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Tests for the local API stand-in."""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+
+import pywikibot
+
+from pywikibot import config, xmlreader
+from pywikibot.comms import http
+from pywikibot.data.api import CachedRequest
+from pywikibot.family import AutoFamily
+from pywikibot.site import DataSite
+
+from tests.api_server import API, APIServer, Wiki
+from tests.aspects import unittest, PatchingTestCase, TestCase
+
+
+class TestAPI(TestCase):
+
+    """Test the answers of the stand-in API."""
+
+    net = False
+
+    def setUp(self):
+        """Create a small wiki."""
+        super(TestAPI, self).setUp()
+        self.wiki = Wiki(pages=12, categories=3, items=2)
+        self.api = API(self.wiki, 'http://localhost', 'Test bot')
+
+    def test_continue(self):
+        """Test listing the members of a category with continuation."""
+        params = {'action': 'query', 'list': 'categorymembers',
+                  'cmtitle': 'Category:Group_1', 'cmlimit': '3'}
+        result = self.api(params)
+        self.assertEqual([page['title'] for page in
+                          result['query']['categorymembers']],
+                         ['Page 12', 'Page 3', 'Page 6'])
+        self.assertEqual(result['continue'],
+                         {'cmcontinue': '3', 'continue': '-||'})
+        params.update(result['continue'])
+        result = self.api(params)
+        self.assertEqual([page['title'] for page in
+                          result['query']['categorymembers']], ['Page 9'])
+        self.assertNotIn('continue', result)
+        self.assertIn('batchcomplete', result)
+
+    def test_formatversion(self):
+        """Test the shape of pages in both format versions."""
+        params = {'action': 'query', 'titles': 'page 1|Missing',
+                  'prop': 'revisions', 'rvprop': 'content'}
+        pages = self.api(params)['query']['pages']
+        self.assertEqual(sorted(pages), ['-1', '1'])
+        self.assertIn('[[Category:Group 2]]', pages['1']['revisions'][0]['*'])
+        self.assertEqual(pages['-1']['missing'], '')
+
+        params['formatversion'] = '2'
+        result = self.api(params)['query']
+        self.assertEqual(result['normalized'],
+                         [{'from': 'page 1', 'to': 'Page 1'}])
+        self.assertEqual(result['pages'][0]['revisions'][0]['content'],
+                         pages['1']['revisions'][0]['*'])
+        self.assertIs(result['pages'][1]['missing'], True)
+
+    def test_edit(self):
+        """Test that an edit changes the category members."""
+        result = self.api({'action': 'edit', 'title': 'Page 1',
+                           'text': '[[Category:Group 3]]',
+                           'token': self.api.token})['edit']
+        self.assertEqual(result['result'], 'Success')
+        self.assertGreater(result['newrevid'], result['oldrevid'])
+        self.assertIn('Page 1', self.wiki.members['Category:Group 3'])
+        self.assertNotIn('Page 1', self.wiki.members['Category:Group 2'])
+
+        result = self.api({'action': 'edit', 'title': 'Page 1',
+                           'text': '[[Category:Group 3]]',
+                           'token': self.api.token})['edit']
+        self.assertIn('nochange', result)
+
+        result = self.api({'action': 'edit', 'title': 'Page 1',
+                           'text': 'foo', 'token': 'bad'})
+        self.assertEqual(result['error']['code'], 'badtoken')
+
+    def test_entities(self):
+        """Test loading and changing an item."""
+        data = {'labels': {'de': {'language': 'de', 'value': 'Ding'}}}
+        result = self.api({'action': 'wbeditentity', 'id': 'Q2',
+                           'data': json.dumps(data),
+                           'token': self.api.token})
+        self.assertEqual(result['entity']['labels']['de']['value'], 'Ding')
+        entities = self.api({'action': 'wbgetentities', 'ids': 'Q1|Q2|Q3',
+                             'props': 'labels|claims'})['entities']
+        self.assertEqual(entities['Q1']['labels']['en']['value'], 'Item 1')
+        self.assertEqual(entities['Q2']['labels']['de']['value'], 'Ding')
+        self.assertEqual(
+            entities['Q1']['claims']['P1'][0]['mainsnak']['datavalue'],
+            {'value': 'value 1', 'type': 'string'})
+        self.assertNotIn('lastrevid', entities['Q1'])
+        self.assertIn('missing', entities['Q3'])
+
+    def test_unknown_module(self):
+        """Test that unknown query modules cause a warning."""
+        result = self.api({'action': 'query', 'meta': 'foo'})
+        self.assertEqual(result['warnings']['query']['*'],
+                         'Unrecognized value for parameter "meta": foo')
+        result = self.api({'action': 'foo'})
+        self.assertEqual(result['error']['code'], 'unknown_action')
+
+    def test_dump(self):
+        """Test that the XML dump contains all pages."""
+        dirname = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(dirname, 'dump.xml')
+            self.wiki.write_dump(filename)
+            entries = list(xmlreader.XmlDump(filename).parse())
+        finally:
+            shutil.rmtree(dirname)
+        self.assertEqual(len(entries), len(self.wiki.pages))
+        self.assertEqual(entries[0].title, 'Page 1')
+        self.assertEqual(entries[0].text,
+                         self.wiki.pages['Page 1']['revisions'][-1]['text'])
+
+
+class TestAPIServer(PatchingTestCase):
+
+    """Test Pywikibot against the stand-in API."""
+
+    net = False
+
+    @classmethod
+    def setUpClass(cls):
+        """Start the server."""
+        super(TestAPIServer, cls).setUpClass()
+        cls.server = APIServer(Wiki(pages=30, categories=3, items=5),
+                               username='Test bot')
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server."""
+        cls.server.stop()
+        super(TestAPIServer, cls).tearDownClass()
+
+    def setUp(self):
+        """Create a site of the server."""
+        super(TestAPIServer, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.patch(CachedRequest, '_get_cache_dir', classmethod(
+            lambda cls: self.cache_dir))
+        self.patch(config, 'put_throttle', 0)
+        self.site = DataSite('standin', AutoFamily('standin', self.server.url),
+                             user='Test bot')
+
+    def tearDown(self):
+        """Remove the cache."""
+        shutil.rmtree(self.cache_dir)
+        super(TestAPIServer, self).tearDown()
+
+    def test_http(self):
+        """Test that the server answers GET requests."""
+        response = http.fetch(self.server.url + '?action=query&meta=userinfo'
+                              '&format=json')
+        self.assertEqual(json.loads(response.content)['query']['userinfo']
+                         ['name'], 'Test bot')
+
+    def test_site(self):
+        """Test the siteinfo and logging in."""
+        self.assertEqual(self.site.version(), '1.31.0')
+        self.assertEqual(self.site.namespaces[120].custom_name, 'Item')
+        self.site.login()
+        self.assertTrue(self.site.logged_in())
+
+    def test_pages(self):
+        """Test loading pages and saving one."""
+        category = pywikibot.Category(self.site, 'Category:Root')
+        pages = list(category.articles(recurse=True, content=True))
+        self.assertEqual(len(pages), 30)
+        page = pywikibot.Page(self.site, 'Page 1')
+        page.text += '\nfoo'
+        page.save('Test')
+        self.assertEqual(page.latest_revision_id,
+                         self.server.wiki.last_revid)
+
+    def test_item(self):
+        """Test loading an item and changing its labels."""
+        item = pywikibot.ItemPage(self.site, 'Q1')
+        self.assertEqual(item.get()['labels']['en'], 'Item 1')
+        self.assertEqual(item.claims['P1'][0].getTarget(), 'value 1')
+        item.editLabels({'de': 'Ding'}, summary='Test')
+        item = pywikibot.ItemPage(self.site, 'Q1')
+        self.assertEqual(item.get()['labels']['de'], 'Ding')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -16,6 +16,7 @@ import pywikibot.login
 import pywikibot.page
 import pywikibot.site
 
+from pywikibot import config
 from pywikibot.throttle import Throttle
 from pywikibot.tools import (
     suppress_warnings,
@@ -24,6 +25,7 @@ from pywikibot.tools import (
     UnicodeType,
 )
 
+from tests import patch
 from tests.aspects import (
     unittest,
     TestCase,
@@ -659,6 +661,67 @@ class TestDryPageGenerator(TestCase):
         self.assertRaises(AssertionError, self.gen.set_namespace, None)
 
 
+class TestDryPageGeneratorFormatversion2(DefaultDrySiteTestCase):
+
+    """Test PageGenerator with responses in formatversion 2."""
+
+    def setUp(self):
+        """Set up a generator which loads the content."""
+        super(TestDryPageGeneratorFormatversion2, self).setUp()
+        with patch.object(config, 'api_formatversion', 2):
+            self.gen = api.PageGenerator(site=self.get_site(),
+                                         generator='links', g_content=True,
+                                         parameters={'titles': 'Foo'})
+        self.gen.request.submit = types.MethodType(lambda self: {
+            'batchcomplete': True,
+            'query': {'pages': [
+                {'pageid': 20, 'ns': 0, 'title': 'Bar',
+                 'contentmodel': 'wikitext', 'redirect': False,
+                 'lastrevid': 200, 'protection': [],
+                 'revisions': [{'revid': 200, 'parentid': 0, 'minor': False,
+                                'user': 'Foo', 'timestamp':
+                                '2018-01-01T00:00:00Z', 'comment': 'Bar',
+                                'contentformat': 'text/x-wiki',
+                                'contentmodel': 'wikitext',
+                                'content': 'Bar text'}]},
+                {'pageid': 10, 'ns': 0, 'title': 'Baz',
+                 'contentmodel': 'wikitext', 'redirect': True,
+                 'lastrevid': 100, 'protection': [],
+                 'revisions': [{'revid': 100, 'parentid': 99, 'minor': True,
+                                'user': 'Foo', 'timestamp':
+                                '2018-01-01T00:00:00Z', 'comment': 'Baz',
+                                'contentformat': 'text/x-wiki',
+                                'contentmodel': 'wikitext',
+                                'content': '#REDIRECT [[Bar]]'}]},
+                {'ns': 0, 'title': 'Qux', 'missing': True},
+            ]}
+        }, self.gen.request)
+
+    def test_request(self):
+        """Test that formatversion 2 is requested."""
+        self.assertEqual(self.gen.request['formatversion'], [2])
+
+    def test_results(self):
+        """Test that the pages are loaded in the order of the response."""
+        pages = list(self.gen)
+        self.assertEqual([page.title() for page in pages],
+                         ['Bar', 'Baz', 'Qux'])
+        self.assertEqual([page.exists() for page in pages],
+                         [True, True, False])
+        self.assertEqual([page._isredir for page in pages[:2]],
+                         [False, True])
+        self.assertEqual(pages[0].text, 'Bar text')
+        self.assertEqual(pages[1].text, '#REDIRECT [[Bar]]')
+        self.assertFalse(pages[0]._revisions[200].minor)
+        self.assertTrue(pages[1]._revisions[100].minor)
+
+    def test_formatversion_1(self):
+        """Test that formatversion 1 stays the default."""
+        gen = api.PageGenerator(site=self.get_site(), generator='links',
+                                parameters={'titles': 'Foo'})
+        self.assertNotIn('formatversion', gen.request)
+
+
 class TestPropertyGenerator(TestCase):
 
     """API PropertyGenerator object test class."""
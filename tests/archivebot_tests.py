@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Tests for archivebot scripts."""
 #
-# (C) Pywikibot team, 2016-2017
+# (C) Pywikibot team, 2016-2018
 #
 # Distributed under the terms of the MIT license.
 #
@@ -32,6 +32,162 @@ THREADS_WITH_UPDATED_FORMAT = {
     'eo': 1, 'pdc': 1,
 }
 
+TALK_PAGE = '''{{Talk header}}
+<!--
+== Not a thread ==
+-->
+== First thread ==
+
+Question. [[User:A|A]] 10:00, 1 March 2017 (UTC)
+:Answer with <nowiki>== no header ==</nowiki>. 11:30, 2 March 2017 (UTC)
+::Unsigned.
+
+== Second thread ==
+<pre>
+== Still second thread ==
+</pre>
+Persian digits. ۱۲:۰۰, 3 April 2017 (UTC)
+== Third thread ==
+Unsigned.'''
+
+
+class DummySite(object):
+
+    """Site with English month names in UTC for the TimeStripper."""
+
+    code = 'en'
+    months_names = [
+        ('January', 'Jan'), ('February', 'Feb'), ('March', 'Mar'),
+        ('April', 'Apr'), ('May', 'May'), ('June', 'Jun'), ('July', 'Jul'),
+        ('August', 'Aug'), ('September', 'Sep'), ('October', 'Oct'),
+        ('November', 'Nov'), ('December', 'Dec'),
+    ]
+    siteinfo = {'timeoffset': 0, 'timezone': 'UTC'}
+
+
+class TestSplitThreads(TestCase):
+
+    """Test breaking up a discussion page into threads."""
+
+    net = False
+
+    def setUp(self):
+        """Create the TimeStripper."""
+        super(TestSplitThreads, self).setUp()
+        self.timestripper = TimeStripper(DummySite())
+        self.now = datetime.utcnow()
+
+    def test_split_threads(self):
+        """Test thread titles, contents and timestamps."""
+        header, threads = archivebot.split_threads(
+            TALK_PAGE, self.timestripper, self.now)
+        self.assertEqual(header, '{{Talk header}}\n<!--\n'
+                                 '== Not a thread ==\n-->\n')
+        self.assertEqual([thread.title for thread in threads],
+                         ['First thread', 'Second thread', 'Third thread'])
+        self.assertTrue(threads[0].content.startswith('Question.'))
+        self.assertTrue(threads[0].content.endswith('Unsigned.\n\n'))
+        self.assertIn('== Still second thread ==', threads[1].content)
+        self.assertEqual(threads[2].content, 'Unsigned.\n')
+        self.assertEqual(
+            [thread.timestamp and thread.timestamp.replace(tzinfo=None)
+             for thread in threads],
+            [datetime(2017, 3, 2, 11, 30), datetime(2017, 4, 3, 12, 0),
+             None])
+
+    def test_large_page(self):
+        """Test a talk page of 2 MB with 4000 threads."""
+        text = TALK_PAGE.replace('Third thread', 'Last thread')
+        text = text.replace('== First thread ==', ''.join(
+            line + '\n' for line in TALK_PAGE.split('\n')[4:-2]
+            + ['Lorem ipsum. ' * 64]) * 2000 + '== First thread ==')
+        self.assertGreater(len(text.encode('utf-8')), 2 * 1024 ** 2)
+        header, threads = archivebot.split_threads(
+            text, self.timestripper, self.now)
+        self.assertEqual(len(threads), 4003)
+        self.assertEqual(threads[-1].title, 'Last thread')
+        self.assertEqual(threads[-2].timestamp, threads[1].timestamp)
+
+    def test_feed_line(self):
+        """Test that feed_lines is the same as feeding each line."""
+        header, threads = archivebot.split_threads(
+            TALK_PAGE, self.timestripper, self.now)
+        lines = TALK_PAGE.split('\n')
+        thread = archivebot.DiscussionThread('First thread', self.now,
+                                             self.timestripper)
+        for line in lines[5:10]:
+            thread.feed_line(line)
+        self.assertEqual(thread.content, threads[0].content)
+        self.assertEqual(thread.timestamp, threads[0].timestamp)
+
+
+class DummyPage(object):
+
+    """Loaded page with a text."""
+
+    def __init__(self, title, text=None):
+        """Constructor."""
+        self._title = title
+        self.text = text
+
+    def title(self):
+        """Return the title."""
+        return self._title
+
+    def exists(self):
+        """Return whether the page has a text."""
+        return self.text is not None
+
+
+class DummyDiscussionPage(DummyPage):
+
+    """Discussion page which records its saves."""
+
+    def __init__(self, title):
+        """Constructor."""
+        super(DummyDiscussionPage, self).__init__(title)
+        self.summaries = []
+
+    def update(self, summary):
+        """Record the summary."""
+        self.summaries.append(summary)
+
+
+class TestSplitPages(TestCase):
+
+    """Test splitting and saving preloaded pages."""
+
+    net = False
+
+    def test_split_pages(self):
+        """Test that the pages are split like with split_threads."""
+        timestripper = TimeStripper(DummySite())
+        pages = [DummyPage('Talk', TALK_PAGE), DummyPage('Missing'),
+                 DummyPage('Empty', '')]
+        preloaded = archivebot.split_pages(pages, timestripper)
+        self.assertEqual(sorted(preloaded), ['Empty', 'Talk'])
+        page, (header, threads) = preloaded['Talk']
+        self.assertIs(page, pages[0])
+        expected = archivebot.split_threads(TALK_PAGE, timestripper, None)
+        self.assertEqual(header, expected[0])
+        self.assertEqual([(t.title, t.content, t.timestamp) for t in threads],
+                         [(t.title, t.content, t.timestamp)
+                          for t in expected[1]])
+        self.assertEqual(preloaded['Empty'][1], ('\n', []))
+
+    def test_update_page(self):
+        """Test that a saved page is no longer used from the preloaded."""
+        preloaded = {'Archive': None, 'Talk': None}
+        archiver = archivebot.PageArchiver.__new__(archivebot.PageArchiver)
+        archiver.preloaded = preloaded
+        page = DummyDiscussionPage('Archive')
+        archiver.update_page(page, 'Summary')
+        self.assertEqual(page.summaries, ['Summary'])
+        self.assertEqual(list(preloaded), ['Talk'])
+        # A page which was not preloaded
+        archiver.update_page(DummyDiscussionPage('Other'), 'Summary')
+        self.assertEqual(list(preloaded), ['Talk'])
+
 
 class TestArchiveBotFunctionsWithSites(TestCase):
 
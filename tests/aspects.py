@@ -1238,7 +1238,9 @@ class PatchingTestCase(TestCase):
 
     def tearDown(self):
         """Tear down the test by unpatching the patched."""
-        for patched in self._patched_instances:
+        # Restore in reverse order, so that an attribute which has been
+        # patched twice gets its original value back
+        for patched in reversed(self._patched_instances):
             setattr(*patched)
         super(TestCaseBase, self).tearDown()
 
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+Measure how fast Pywikibot processes pages of a local API stand-in.
+
+Each benchmark runs in its own process against a freshly generated wiki
+served by L{tests.api_server}, so the results only depend on the code of
+Pywikibot, the settings and the machine:
+
+preload     Load the text of all pages with APISite.preloadpages.
+category    Load all pages of a category tree with CategorizedPageGenerator.
+replace     Run the replace bot on the pages of an XML dump of the wiki.
+wikibase    Load all items and change the label of every tenth one.
+json        Decode the recorded responses with the revisions of all pages
+            20 times using json and update the pages with them.
+orjson      The same using orjson, if it is installed.
+
+For every benchmark it reports the pages processed per second, the API
+requests per page and the peak resident memory of the process. The
+requests to start up, i.e. to load the siteinfo and paraminfo and to
+record responses, are counted separately.
+
+The format versions are compared by running the benchmarks with
+-formatversion:1 and -output:, then with -formatversion:2 and -compare:.
+
+Usage:
+
+    python -m tests.benchmark [<benchmark> ...] [-pages:<n>] [-size:<n>]
+        [-latency:<ms>] [-formatversion:<n>] [-repeat:<n>] [-output:<file>]
+        [-compare:<file>]
+
+-pages:<n>       The number of pages and items of the wiki (default 500).
+-size:<n>        The approximate length of a page (default 2000).
+-latency:<ms>    The time each API request takes (default 0).
+-formatversion:<n>  Set config.api_formatversion to n (default 1).
+-repeat:<n>      Run each benchmark n times and report the fastest run.
+-output:<file>   Write the results as JSON to this file.
+-compare:<file>  Compare the results with those in this file, which has
+                 been written by -output:, e.g. for another commit.
+"""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from tests.api_server import APIServer, Wiki
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#: The user which the benchmarks run as
+USERNAME = 'BenchBot'
+
+#: The benchmarks in the order they are run
+BENCHMARKS = ['preload', 'category', 'replace', 'wikibase', 'json',
+              'orjson']
+
+#: How often the json and orjson benchmarks decode the recorded responses,
+#: so that they take long enough to be measured
+DECODE_ROUNDS = 20
+
+#: The metrics of the results with their format
+METRICS = [('pages_per_second', '{0:.1f}', 'pages/s'),
+           ('requests_per_page', '{0:.3f}', 'requests/page'),
+           ('peak_rss', '{0:.1f}', 'MiB peak RSS')]
+
+
+def _count(generator, counter):
+    """Yield the items of the generator and count them."""
+    for item in generator:
+        counter[0] += 1
+        yield item
+
+
+def bench_preload(site, options):
+    """Load the text of all pages."""
+    import pywikibot
+    pages = [pywikibot.Page(site, 'Page {0}'.format(i))
+             for i in range(1, options['pages'] + 1)]
+    count = 0
+    for page in site.preloadpages(pages):
+        page.text
+        count += 1
+    return count
+
+
+def bench_category(site, options):
+    """Load all pages of the category tree."""
+    import pywikibot
+    from pywikibot import pagegenerators
+    category = pywikibot.Category(site, 'Category:Root')
+    count = 0
+    for page in pagegenerators.CategorizedPageGenerator(
+            category, recurse=True, content=True):
+        page.text
+        count += 1
+    return count
+
+
+def bench_replace(site, options):
+    """Replace a word on the pages of the XML dump."""
+    import pywikibot
+    from pywikibot import pagegenerators
+    from scripts import replace
+
+    replacement = replace.Replacement('lorem', 'Lorem')
+    replacement.compile(False, 0)
+    exceptions = {}
+    counter = [0]
+    generator = replace.XmlDumpReplacePageGenerator(
+        options['dump'], None, [replacement], exceptions, site)
+    generator = pagegenerators.PreloadingGenerator(_count(generator, counter))
+    bot = replace.ReplaceRobot(generator, [replacement], exceptions,
+                               always=True, summary='Benchmark', site=site)
+    bot.run()
+    if not bot.changed_pages:
+        raise pywikibot.Error('The replace bot did not save any page.')
+    return counter[0]
+
+
+def bench_wikibase(site, options):
+    """Load all items and change the label of every tenth one."""
+    import pywikibot
+    repo = site.data_repository()
+    items = [pywikibot.ItemPage(repo, 'Q{0}'.format(i))
+             for i in range(1, options['pages'] + 1)]
+    count = 0
+    for item in repo.preloaditempages(items):
+        count += 1
+        if int(item.getID()[1:]) % 10 == 0:
+            item.editLabels({'de': item.labels['en']},
+                            summary='Benchmark')
+    return count
+
+
+def record_revisions(site, options):
+    """Record the responses with the revisions of all pages."""
+    import pywikibot
+    from pywikibot.comms import http
+
+    responses = []
+    request = http.request
+
+    def record(*args, **kwargs):
+        response = request(*args, **kwargs)
+        responses.append(response)
+        return response
+
+    pages = [pywikibot.Page(site, 'Page {0}'.format(i))
+             for i in range(1, options['pages'] + 1)]
+    http.request = record
+    try:
+        for page in site.preloadpages(pages, groupsize=len(pages)):
+            pass
+    finally:
+        http.request = request
+    # Preloading may need other requests, e.g. for the paraminfo
+    return {'responses': [response for response in responses
+                          if 'pages' in json.loads(response).get('query', {})]}
+
+
+def _decode(site, options, loads):
+    """Decode the recorded responses and update the pages with them."""
+    import pywikibot
+    from pywikibot.data import api
+    count = 0
+    for response in options['responses'] * DECODE_ROUNDS:
+        pages = loads(response)['query']['pages']
+        # A dict by page id with formatversion 1
+        if isinstance(pages, dict):
+            pages = pages.values()
+        for pagedict in pages:
+            page = pywikibot.Page(site, pagedict['title'])
+            api.update_page(page, pagedict,
+                            ['revisions', 'info', 'categoryinfo'])
+            page.text
+            count += 1
+    return count
+
+
+def bench_json(site, options):
+    """Decode the recorded responses using json."""
+    return _decode(site, options, json.loads)
+
+
+def bench_orjson(site, options):
+    """Decode the recorded responses using orjson."""
+    return _decode(site, options, orjson.loads)
+
+
+#: The functions which prepare a benchmark before it is measured by name
+SETUPS = {'json': record_revisions, 'orjson': record_revisions}
+
+
+def _peak_rss():
+    """Return the peak resident memory of the process in MiB or None."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # It is in bytes on macOS and in kilobytes elsewhere
+    return rss / 1024.0 ** (2 if sys.platform == 'darwin' else 1)
+
+
+def run_benchmark(name, url, options):
+    """
+    Run a benchmark in this process and print its result.
+
+    It prints a line when the site is set up and waits for a line on the
+    standard input before it starts, so that the requests of the benchmark
+    can be counted separately.
+    """
+    import pywikibot
+    from pywikibot import config
+    from pywikibot.data import api
+
+    cache_dir = os.path.join(config.base_dir, 'apicache')
+    api.CachedRequest._get_cache_dir = classmethod(
+        lambda cls: cls._make_dir(cache_dir))
+    config.family_files['standin'] = url
+    config.usernames['standin']['standin'] = USERNAME
+    config.put_throttle = 0
+    config.max_retries = 1
+    config.api_formatversion = options['formatversion']
+
+    site = pywikibot.Site('standin', 'standin', interface='DataSite')
+    site.login()
+    if name in SETUPS:
+        options = dict(options, **SETUPS[name](site, options))
+    print('ready')
+    sys.stdout.flush()
+    sys.stdin.readline()
+
+    start = time.time()
+    pages = globals()['bench_' + name](site, options)
+    seconds = time.time() - start
+    pywikibot.stopme()
+    print(json.dumps({'pages': pages, 'seconds': seconds,
+                      'peak_rss': _peak_rss()}))
+
+
+def measure(name, options):
+    """
+    Measure a benchmark in a new process.
+
+    @param name: The name of the benchmark
+    @type name: str
+    @param options: The options, see L{main}
+    @type options: dict
+    @return: The metrics
+    @rtype: dict
+    """
+    wiki = Wiki(pages=options['pages'], categories=options['pages'] // 50 + 1,
+                items=options['pages'], page_size=options['size'])
+    server = APIServer(wiki, options['latency'] / 1000.0, username=USERNAME)
+    base_dir = tempfile.mkdtemp(prefix='pywikibot-benchmark-')
+    try:
+        with open(os.path.join(base_dir, 'user-config.py'), 'w'):
+            pass
+        options = dict(options, dump=os.path.join(base_dir, 'dump.xml'))
+        wiki.write_dump(options['dump'])
+        server.start()
+
+        env = dict(os.environ, PYWIKIBOT2_DIR=base_dir,
+                   PYWIKIBOT_TEST_QUIET='1')
+        env.pop('PYWIKIBOT2_NO_USER_CONFIG', None)
+        with open(os.path.join(base_dir, 'output.log'), 'w+') as log:
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'tests.benchmark', '-run:' + name,
+                 '-url:' + server.url, '-options:' + json.dumps(options)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=log,
+                env=env, universal_newlines=True,
+                cwd=os.path.dirname(os.path.dirname(
+                    os.path.abspath(__file__))))
+            ready = process.stdout.readline()
+            startup_requests = sum(server.requests.values())
+            server.requests.clear()
+            stdout = process.communicate('go\n')[0] if ready else ''
+            if process.returncode:
+                log.seek(0)
+                raise RuntimeError('The benchmark {0} failed:\n{1}'.format(
+                    name, log.read()))
+    finally:
+        if server._thread:
+            server.stop()
+        else:
+            server.server_close()
+        shutil.rmtree(base_dir)
+
+    result = json.loads(stdout.splitlines()[-1])
+    requests = sum(server.requests.values())
+    return {
+        'pages': result['pages'],
+        'seconds': result['seconds'],
+        'pages_per_second': result['pages'] / result['seconds'],
+        'requests': requests,
+        'requests_per_page': float(requests) / result['pages'],
+        'requests_by_action': dict(server.requests),
+        'startup_requests': startup_requests,
+        'peak_rss': result['peak_rss'],
+    }
+
+
+def _revision():
+    """Return the current git commit or None."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], universal_newlines=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format(value, fmt):
+    """Format a metric which may be missing."""
+    return '-' if value is None else fmt.format(value)
+
+
+def report(results, baseline=None):
+    """Print the results and their change compared with the baseline."""
+    for name in BENCHMARKS:
+        if name not in results['benchmarks']:
+            continue
+        result = results['benchmarks'][name]
+        print('{0}: {1} pages in {2:.2f} s, {3} requests and {4} to '
+              'start up'.format(name, result['pages'], result['seconds'],
+                                result['requests'],
+                                result['startup_requests']))
+        old = (baseline or {}).get('benchmarks', {}).get(name)
+        for metric, fmt, unit in METRICS:
+            line = '  {0:>10} {1}'.format(_format(result[metric], fmt), unit)
+            if old and old.get(metric) and result[metric] is not None:
+                line += ' ({0:+.1f} % compared with {1} at {2})'.format(
+                    (result[metric] / old[metric] - 1) * 100,
+                    _format(old[metric], fmt), baseline['revision'])
+            print(line)
+
+
+def main(*args):
+    """Run the benchmarks and report the results."""
+    options = {'pages': 500, 'size': 2000, 'latency': 0, 'formatversion': 1,
+               'repeat': 1}
+    names = []
+    output = compare = run = url = None
+    for arg in args or sys.argv[1:]:
+        option, _, value = arg.partition(':')
+        if option == '-run':
+            run = value
+        elif option == '-url':
+            url = value
+        elif option == '-options':
+            options = json.loads(value)
+        elif option == '-output':
+            output = value
+        elif option == '-compare':
+            compare = value
+        elif option[1:] in options:
+            options[option[1:]] = int(value)
+        elif arg in BENCHMARKS:
+            names.append(arg)
+        else:
+            print(__doc__)
+            return 1
+
+    if run:
+        run_benchmark(run, url, options)
+        return 0
+
+    baseline = None
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)
+    results = {'revision': _revision(),
+               'python': platform.python_version(),
+               'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+               'options': options, 'benchmarks': {}}
+    for name in names or BENCHMARKS:
+        if name == 'orjson' and orjson is None:
+            print('orjson: skipped, orjson is not installed')
+            continue
+        runs = [measure(name, options) for _ in range(options['repeat'])]
+        results['benchmarks'][name] = max(
+            runs, key=lambda result: result['pages_per_second'])
+    report(results, baseline)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
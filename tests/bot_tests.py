@@ -7,16 +7,23 @@
 #
 from __future__ import absolute_import, unicode_literals
 
+import json
+import os
+import shutil
 import sys
+import tempfile
+import threading
+import time
 
 import pywikibot
 import pywikibot.bot
 
-from pywikibot import i18n
+from pywikibot import config, i18n
 from pywikibot.tools import PY2, suppress_warnings
 
 from tests.aspects import (
-    unittest, DefaultSiteTestCase, SiteAttributeTestCase, TestCase,
+    unittest, DefaultSiteTestCase, PatchingTestCase, SiteAttributeTestCase,
+    TestCase,
 )
 
 
@@ -301,6 +308,237 @@ class TestDrySiteBot(TestBotTreatExit, SiteAttributeTestCase):
         self.bot.run()
 
 
+class DummySite(object):
+
+    """Site with only a name."""
+
+    def __init__(self, name):
+        """Constructor."""
+        self.name = name
+
+    def __repr__(self):
+        """Return the name."""
+        return 'DummySite({0!r})'.format(self.name)
+
+    def version(self):
+        """Return a MediaWiki version."""
+        return '1.31'
+
+
+class DummyPage(object):
+
+    """Page with only a title and maybe a site."""
+
+    def __init__(self, title, site=None):
+        """Constructor."""
+        self._title = title
+        self.site = site
+
+    def title(self, **kwargs):
+        """Return the title."""
+        return self._title
+
+
+class TestBotWorkers(PatchingTestCase):
+
+    """Test treating the pages of a bot in worker threads."""
+
+    net = False
+
+    def setUp(self):
+        """Use four workers."""
+        super(TestBotWorkers, self).setUp()
+        self.patch(config, 'bot_workers', 4)
+        self.pages = [DummyPage('Page %d' % i) for i in range(12)]
+        self.bot = pywikibot.bot.CurrentPageBot(generator=iter(self.pages),
+                                                always=True)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.treated = []
+        self.saved = []
+
+    def treat_page(self):
+        """Treat the current page of the worker, the first ones slowly."""
+        page = self.bot.current_page
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02 * (12 - self.pages.index(page)) / 12)
+        self.assertIs(self.bot.current_page, page)
+        with self.lock:
+            self.running -= 1
+            self.treated.append(page)
+        self.bot._save_page(page, self.save, page)
+
+    def save(self, page, **kwargs):
+        """Record saving the page."""
+        self.saved.append(page)
+
+    def test_workers(self):
+        """Test that all pages are treated and saved concurrently."""
+        self.bot.treat_page = self.treat_page
+        self.bot.run()
+        self.assertEqual(self.bot._treat_counter, 12)
+        self.assertEqual(self.bot._save_counter, 12)
+        self.assertCountEqual(self.treated, self.pages)
+        self.assertGreater(self.max_running, 1)
+        self.assertLessEqual(self.max_running, 4)
+        self.assertIsNone(self.bot._treat_local)
+
+    def test_ordered_saves(self):
+        """Test saving the pages in the order of the generator."""
+        self.patch(config, 'bot_workers_ordered', True)
+        self.bot.treat_page = self.treat_page
+        self.bot.run()
+        self.assertNotEqual(self.treated, self.pages)
+        self.assertEqual(self.saved, self.pages)
+
+    def test_quit(self):
+        """Test that QuitKeyboardInterrupt of a worker stops the run."""
+        def treat_page():
+            if self.bot.current_page is self.pages[2]:
+                self.bot.quit()
+            self.treat_page()
+
+        self.bot.treat_page = treat_page
+        self.bot.run()
+        self.assertNotIn(self.pages[2], self.treated)
+        self.assertLess(len(self.treated), 8)
+        self.assertEqual(self.bot._treat_counter, self.bot._save_counter)
+
+    def _run_multiple_sites(self, bot_class):
+        """Run a bot on pages of several sites and return its site."""
+        sites = [DummySite(name) for name in 'abc']
+        pages = [DummyPage('Page %d' % i, sites[i % 3]) for i in range(12)]
+        bot = bot_class(generator=iter(pages))
+        wrong = []
+
+        def treat(page):
+            # The sites of the next pages are set while it waits
+            time.sleep(0.02 * (12 - pages.index(page)) / 12)
+            if bot.site is not page.site:
+                wrong.append(page)
+
+        bot.treat = treat
+        bot.exit = lambda: None
+        bot.run()
+        self.assertEqual(wrong, [])
+        self.assertEqual(bot._treat_counter, 12)
+        self.assertIsNone(bot._treat_local)
+        return bot._site
+
+    def test_Bot_sites(self):
+        """Test that each worker of a Bot keeps the site of its page."""
+        # The site of the last page is kept after the run
+        self.assertEqual(self._run_multiple_sites(pywikibot.bot.Bot).name,
+                         'c')
+
+    @suppress_warnings('pywikibot.bot.MultipleSitesBot.site is deprecated')
+    def test_MultipleSitesBot_sites(self):
+        """Test that each worker of a MultipleSitesBot keeps its site."""
+        self.assertIsNone(
+            self._run_multiple_sites(pywikibot.bot.MultipleSitesBot))
+
+
+class TestBotTimings(PatchingTestCase):
+
+    """Test the timings of the phases of a bot run."""
+
+    net = False
+
+    def setUp(self):
+        """Create a timings object with some durations."""
+        super(TestBotTimings, self).setUp()
+        self.timings = pywikibot.bot.BotTimings()
+        for i in range(1, 101):
+            self.timings.record('treat', i / 100.0)
+        self.timings.record('save', 0.5)
+
+    def test_percentiles(self):
+        """Test the statistics of each phase."""
+        stats = self.timings.as_dict()
+        self.assertEqual(set(stats), set(['treat', 'save']))
+        self.assertEqual(stats['treat']['count'], 100)
+        self.assertAlmostEqual(stats['treat']['total'], 50.5)
+        self.assertEqual(stats['treat']['p50'], 0.5)
+        self.assertEqual(stats['treat']['p95'], 0.95)
+        self.assertEqual(stats['treat']['p99'], 0.99)
+        self.assertEqual(stats['treat']['max'], 1.0)
+        self.assertEqual(stats['save']['p50'], 0.5)
+        self.assertEqual(stats['save']['p99'], 0.5)
+        self.timings.reset()
+        self.assertEqual(self.timings.as_dict(), {})
+
+    def test_dump(self):
+        """Test writing the timings as JSON and in the Prometheus format."""
+        dirname = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(dirname, 'timings.json')
+            self.timings.dump(filename, bot='TestBot', pages_read=100)
+            with open(filename) as f:
+                data = json.load(f)
+            self.assertEqual(data['bot'], 'TestBot')
+            self.assertEqual(data['pages_read'], 100)
+            self.assertEqual(data['phases']['treat']['p95'], 0.95)
+
+            if sys.platform != 'win32':
+                # The file is replaced without removing it first, so it
+                # always exists for a monitoring system
+                self.patch(os, 'remove', lambda path: self.fail(
+                    'Removed {0}'.format(path)))
+            self.timings.dump(filename, bot='OtherBot', pages_read=100)
+            with open(filename) as f:
+                self.assertEqual(json.load(f)['bot'], 'OtherBot')
+
+            filename = os.path.join(dirname, 'timings.prom')
+            self.timings.dump(filename, bot='TestBot', pages_read=100)
+            with open(filename) as f:
+                lines = f.read().splitlines()
+            self.assertIn('pywikibot_bot_phase_seconds{bot="TestBot",'
+                          'phase="treat",quantile="0.95"} 0.95', lines)
+            self.assertIn('pywikibot_bot_phase_seconds_count{bot="TestBot",'
+                          'phase="treat"} 100', lines)
+            self.assertIn('pywikibot_bot_pages_read{bot="TestBot"} 100',
+                          lines)
+            self.assertEqual(sorted(os.listdir(dirname)),
+                             ['timings.json', 'timings.prom'])
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_run(self):
+        """Test the timings and the progress of a bot run."""
+        def treat_page():
+            throttle = pywikibot.throttle.Throttle.__new__(
+                pywikibot.throttle.Throttle)
+            throttle.wait(0.01)
+            bot._save_page(bot.current_page, lambda **kwargs: None)
+
+        def init_page(page):
+            if page is pages[2]:
+                raise pywikibot.bot.SkipPageError(page, 'test')
+
+        output = []
+        self.patch(pywikibot, 'output', output.append)
+        self.patch(config, 'bot_progress_interval', 0.001)
+        pages = [DummyPage('Page %d' % i) for i in range(4)]
+        bot = pywikibot.bot.CurrentPageBot(generator=iter(pages), always=True)
+        bot.treat_page = treat_page
+        bot.init_page = init_page
+        bot.exit = lambda: None
+        bot.run()
+        stats = bot.timings.as_dict()
+        self.assertEqual(stats['generator']['count'], 4)
+        self.assertEqual(stats['init_page']['count'], 4)
+        self.assertEqual(stats['treat']['count'], 3)
+        self.assertEqual(stats['save']['count'], 3)
+        self.assertEqual(stats['throttle']['count'], 3)
+        self.assertGreaterEqual(stats['throttle']['total'], 0.03)
+        self.assertIsNone(pywikibot.throttle.timings)
+        self.assertRegex(output[-1],
+                         r'^3 pages read, 3 pages written, [\d.]+ pages/min$')
+
+
 # TODO: This could be written as dry tests probably by faking the important
 # properties
 class LiveBotTestCase(TestBotTreatExit, DefaultSiteTestCase):
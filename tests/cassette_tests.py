@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Tests for recording and replaying HTTP traffic."""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pywikibot
+
+from pywikibot import config
+from pywikibot.comms import cassette, http
+from pywikibot.data.api import CachedRequest
+from pywikibot.exceptions import FatalServerError
+from pywikibot.family import AutoFamily
+from pywikibot.site import DataSite
+
+from tests.api_server import APIServer, Wiki
+from tests.aspects import unittest, PatchingTestCase, TestCase
+
+
+class TestNormalizeRequest(TestCase):
+
+    """Test the keys of requests."""
+
+    net = False
+
+    def test_order(self):
+        """Test that the order of the parameters doesn't matter."""
+        self.assertEqual(
+            cassette.normalize_request('get', 'http://Example.org/?b=2&a=1',
+                                       {'c': 'ä'}),
+            cassette.normalize_request('GET', 'http://example.org/?c=%C3%A4',
+                                       [('b', '2'), ('a', '1')]))
+        self.assertEqual(
+            cassette.normalize_request('POST', 'http://example.org/',
+                                       data='b=2&a=1'),
+            cassette.normalize_request('POST', 'http://example.org/',
+                                       data={'a': '1', 'b': '2'}))
+        self.assertNotEqual(
+            cassette.normalize_request('GET', 'http://example.org/?a=1'),
+            cassette.normalize_request('POST', 'http://example.org/?a=1'))
+
+    def test_secret(self):
+        """Test that passwords are removed."""
+        key = cassette.normalize_request(
+            'POST', 'http://example.org/',
+            data='action=login&lgname=Foo&lgpassword=secret')
+        self.assertNotIn('secret', key)
+        self.assertEqual(key, cassette.normalize_request(
+            'POST', 'http://example.org/',
+            data='action=login&lgname=Foo&lgpassword=other'))
+
+    def test_multipart(self):
+        """Test that the boundary of a multipart body is ignored."""
+        keys = set()
+        for boundary in ('abc', 'xyz'):
+            body = '--{0}\r\nfoo\r\n--{0}--'.format(boundary)
+            keys.add(cassette.normalize_request(
+                'POST', 'http://example.org/', data=body, headers={
+                    'Content-Type': 'multipart/form-data; boundary="{0}"'
+                                    .format(boundary)}))
+        self.assertEqual(len(keys), 1)
+
+
+class TestCassette(PatchingTestCase):
+
+    """Test recording the requests of a site and replaying them."""
+
+    net = False
+
+    @classmethod
+    def setUpClass(cls):
+        """Start the server."""
+        super(TestCassette, cls).setUpClass()
+        cls.server = APIServer(Wiki(pages=20, categories=2, items=2),
+                               username='Test bot')
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server."""
+        cls.server.stop()
+        super(TestCassette, cls).tearDownClass()
+
+    def setUp(self):
+        """Use a temporary directory for the cassette and the cache."""
+        super(TestCassette, self).setUp()
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, 'cassette.gz')
+        self.patch(CachedRequest, '_get_cache_dir', classmethod(
+            lambda cls: self.dirname))
+        self.patch(config, 'put_throttle', 0)
+        self.patch(http, 'transport', http.transport)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.dirname)
+        super(TestCassette, self).tearDown()
+
+    def _run(self):
+        """Load pages of a new site, edit one and return the texts."""
+        site = DataSite('standin', AutoFamily('standin', self.server.url),
+                        user='Test bot')
+        pages = [pywikibot.Page(site, 'Page {0}'.format(i))
+                 for i in range(1, 6)]
+        texts = [page.text for page in site.preloadpages(pages)]
+        pages[0].text += '\nfoo'
+        pages[0].save('Test')
+        texts.append(pywikibot.Page(site, 'Page 1').get(force=True))
+        return texts
+
+    def test_replay(self):
+        """Test that the replay gives the same results offline."""
+        self.server.requests.clear()
+        http.transport = cassette.RecordingTransport(self.filename,
+                                                     http.session)
+        texts = self._run()
+        requests = sum(self.server.requests.values())
+        self.assertTrue(texts[-1].endswith('\nfoo'))
+        with gzip.open(self.filename, 'rb') as f:
+            entries = [json.loads(line.decode('utf-8')) for line in f]
+        self.assertEqual(len(entries), requests)
+
+        http.transport = cassette.ReplayTransport(self.filename)
+        self.assertEqual(self._run(), texts)
+        self.assertEqual(sum(self.server.requests.values()), requests)
+
+    def test_missing(self):
+        """Test that a request which has not been recorded fails."""
+        url = self.server.url + '?action=query&meta=userinfo&format=json'
+        http.transport = cassette.RecordingTransport(self.filename,
+                                                     http.session)
+        http.fetch(url)
+        http.transport = cassette.ReplayTransport(self.filename)
+        self.assertEqual(
+            json.loads(http.fetch(url).content)['query']['userinfo']['name'],
+            'Test bot')
+        self.assertRaises(FatalServerError, http.fetch, url + '&uiprop=groups')
+
+    def test_stream(self):
+        """Test that only the read part of a streamed body is recorded."""
+        url = self.server.url + ('?action=query&list=allpages&aplimit=500'
+                                 '&format=json')
+        content = http.fetch(url).raw
+        http.transport = cassette.RecordingTransport(self.filename,
+                                                     http.session)
+        r = http.fetch(url, stream=True)
+        chunk = next(r.data.iter_content(100))
+        r.data.close()
+        self.assertEqual(chunk, content[:100])
+        with gzip.open(self.filename, 'rb') as f:
+            entries = [json.loads(line.decode('utf-8')) for line in f]
+        self.assertEqual(len(entries), 1)
+        self.assertLess(len(entries[0]['content']), len(content))
+
+        http.transport = cassette.ReplayTransport(self.filename)
+        r = http.fetch(url, stream=True)
+        self.assertEqual(next(r.data.iter_content(100)), chunk)
+        self.assertEqual(r.data.raw.read(), content[:len(r.data.content)])
+        r.data.close()
+
+    def test_latency(self):
+        """Test the simulated latency."""
+        url = self.server.url + '?action=query&meta=userinfo&format=json'
+        http.transport = cassette.RecordingTransport(self.filename,
+                                                     http.session)
+        http.fetch(url)
+        http.transport = cassette.ReplayTransport(self.filename,
+                                                  latency=0.2)
+        start = time.time()
+        http.fetch(url)
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
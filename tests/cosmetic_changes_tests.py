@@ -1,13 +1,13 @@
 # -*- coding: utf-8 -*-
 """Test cosmetic_changes module."""
 #
-# (C) Pywikibot team, 2015-2017
+# (C) Pywikibot team, 2015-2018
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, unicode_literals
 
-from pywikibot.cosmetic_changes import CosmeticChangesToolkit
+from pywikibot.cosmetic_changes import CosmeticChangesToolkit, statistics
 
 from tests.aspects import unittest, TestCase
 
@@ -255,6 +255,48 @@ class TestDryCosmeticChanges(TestCosmeticChanges):
         # fixArabicLetters must not change text when site is not fa or ckb
         self.assertEqual(text, self.cct.fixArabicLetters(text))
 
+    def test_triggers(self):
+        """Test that methods do not change texts without their triggers."""
+        text = 'Foo bar\nbaz'
+        for method in (self.cct.fixSelfInterwiki,
+                       self.cct.standardizePageFooter,
+                       self.cct.removeUselessSpaces,
+                       self.cct.removeNonBreakingSpaceBeforePercent,
+                       self.cct.cleanUpSectionHeaders,
+                       self.cct.putSpacesInLists,
+                       self.cct.replaceDeprecatedTemplates,
+                       self.cct.fixSyntaxSave,
+                       self.cct.fixHtml,
+                       self.cct.fixReferences,
+                       self.cct.fixStyle,
+                       self.cct.fixTypo):
+            self.assertFalse(self.cct.may_change(method, text))
+            self.assertEqual(method(text), text)
+        self.assertTrue(self.cct.may_change(self.cct.standardizePageFooter,
+                                            text + '\n'))
+        self.assertTrue(self.cct.may_change(self.cct.removeUselessSpaces,
+                                            'Foo \nbar'))
+        self.assertTrue(self.cct.may_change(self.cct.fixTypo, '5 ccm'))
+        self.assertTrue(self.cct.may_change(self.cct.fixArabicLetters, text))
+
+    def test_skip_unchanged(self):
+        """Test skipping methods and the statistics."""
+        cct = CosmeticChangesToolkit(self.site, namespace=0,
+                                     pageTitle='Test', skip_unchanged=True)
+        cct.common_methods = (cct.removeNonBreakingSpaceBeforePercent,
+                              cct.fixTypo)
+        statistics.reset()
+        self.assertEqual(cct.change('42&nbsp;%'), '42 %')
+        stats = statistics.as_dict()
+        self.assertEqual(
+            stats['removeNonBreakingSpaceBeforePercent']['calls'], 1)
+        self.assertEqual(
+            stats['removeNonBreakingSpaceBeforePercent']['hits'], 1)
+        self.assertEqual(stats['fixTypo']['calls'], 0)
+        self.assertEqual(stats['fixTypo']['skips'], 1)
+        statistics.reset()
+        self.assertEqual(statistics.as_dict(), {})
+
 
 class TestLiveCosmeticChanges(TestCosmeticChanges):
 
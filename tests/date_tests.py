@@ -95,6 +95,52 @@ class TestMonthDelta(TestCase):
         self.assertEqual(date.get_month_delta(datetime(2014, 3, 31), datetime(2013, 3, 31)), -12)
 
 
+class TestLazyFormats(TestCase):
+
+    """Test the lazily built day of month and month of year formats."""
+
+    net = False
+
+    def test_contains_without_building(self):
+        """Test that membership does not build the converter."""
+        fmt = date._LazyFormatDict()
+        fmt.add_lazy('xx', lambda: self.fail('factory called'))
+        self.assertIn('xx', fmt)
+        self.assertEqual(list(fmt), ['xx'])
+        self.assertEqual(len(fmt), 1)
+
+    def test_build_once(self):
+        """Test that the factory is only called on the first lookup."""
+        calls = []
+        fmt = date._LazyFormatDict()
+        fmt.add_lazy('xx', lambda: calls.append(1) or str)
+        self.assertIs(fmt['xx'], str)
+        self.assertIs(fmt['xx'], str)
+        self.assertEqual(calls, [1])
+        self.assertRaises(KeyError, fmt.__getitem__, 'yy')
+
+    def test_set_and_delete(self):
+        """Test that set and delete replace pending factories."""
+        fmt = date._LazyFormatDict()
+        fmt.add_lazy('xx', lambda: self.fail('factory called'))
+        fmt['xx'] = str
+        self.assertIs(fmt['xx'], str)
+        fmt.add_lazy('yy', lambda: self.fail('factory called'))
+        del fmt['yy']
+        self.assertNotIn('yy', fmt)
+        self.assertEqual(dict(fmt), {'xx': str})
+
+    def test_month_formats(self):
+        """Test lazily registered month formats."""
+        self.assertIsInstance(date.formats['Day_May'], date._LazyFormatDict)
+        self.assertEqual(date.formats['Day_May']['en'](15), 'May 15')
+        self.assertEqual(date.formats['Day_May']['en']('May 15'), 15)
+        self.assertEqual(date.formats['Year_May']['de'](1976), 'Mai 1976')
+        self.assertEqual(date.formats['Day_January']['wa'](1),
+                         '1î d\' djanvî')
+        self.assertEqual(date.formats['Day_January']['br'](2), '2 Genver')
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()
@@ -2,12 +2,16 @@
 # -*- coding: utf-8 -*-
 """Test diff module."""
 #
-# (C) Pywikibot team, 2016
+# (C) Pywikibot team, 2016-2018
 #
 # Distributed under the terms of the MIT license.
 from __future__ import absolute_import, unicode_literals
 
-from pywikibot.diff import cherry_pick, html_comparator, PatchManager
+import difflib
+
+from pywikibot.diff import (
+    cherry_pick, html_comparator, LineMatcher, PatchManager,
+)
 from pywikibot.tools import PY2
 
 from tests import join_html_data_path, patch
@@ -182,6 +186,63 @@ class TestPatchManager(TestCase):
             for key in case[2].keys():  # for each hunk
                 self.assertEqual(p.hunks[key].diff_plain_text, case[2][key])
 
+    def test_lazy_diff(self):
+        """Test that the diff of a hunk is only created when needed."""
+        p = PatchManager('foo\nbar\n', 'foo\nbaz\n')
+        hunk = p.hunks[0]
+        self.assertEqual(hunk.header, '@@ -2 +2 @@\n')
+        self.assertIsNone(hunk._diff)
+        self.assertIsNone(hunk._diff_text)
+        self.assertEqual(hunk.diff, ['- bar\n', '?   ^\n',
+                                     '+ baz\n', '?   ^\n'])
+        self.assertIsNone(hunk._diff_text)
+        self.assertEqual(hunk.diff_text,
+                         '\x03{lightred}-\x03{default} ba\x03{lightred}r'
+                         '\x03{default}\n\x03{lightgreen}+\x03{default} ba'
+                         '\x03{lightgreen}z\x03{default}\n')
+
+
+class TestLineMatcher(TestCase):
+
+    """Test LineMatcher class."""
+
+    net = False
+
+    def assertOpcodes(self, a, b):
+        """Assert that LineMatcher returns the opcodes of SequenceMatcher."""
+        self.assertEqual(LineMatcher(None, a, b).get_opcodes(),
+                         difflib.SequenceMatcher(None, a, b).get_opcodes())
+
+    def test_scattered_changes(self):
+        """Test a long text with scattered changes and repeated lines."""
+        a = ['line {0}\n'.format(i) if i % 3 else '\n' for i in range(1000)]
+        b = list(a)
+        for i in range(5, 1000, 97):
+            b[i] = 'changed\n'
+        del b[500:505]
+        b[700:700] = ['new\n', '\n', 'new\n']
+        self.assertOpcodes(a, b)
+
+    def test_repeated_lines_between_anchors(self):
+        """Test repeated lines between lines occurring once."""
+        self.assertOpcodes(
+            ['u1\n', '=\n', 'x\n', 'd\n', 'y\n', 'u2\n', 'd\n', '=\n'],
+            ['u1\n', '=\n', 'X\n', 'd\n', 'Y\n', 'u2\n', 'd\n', '=\n'])
+
+    def test_no_unique_lines(self):
+        """Test sequences without lines occurring once."""
+        self.assertOpcodes(['a\n', 'b\n', 'a\n', 'b\n'],
+                           ['b\n', 'a\n', 'b\n', 'b\n'])
+        self.assertOpcodes([], ['a\n'])
+        self.assertOpcodes(['a\n'], [])
+
+    def test_moved_line(self):
+        """Test that crossing unique lines are not both matched."""
+        a = ['a\n', 'b\n', 'c\n', 'd\n']
+        b = ['d\n', 'a\n', 'b\n', 'c\n']
+        self.assertEqual(LineMatcher(None, a, b).get_matching_blocks(),
+                         [(0, 1, 3), (4, 4, 0)])
+
 
 class TestCherryPick(TestCase):
 
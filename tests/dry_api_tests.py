@@ -8,8 +8,10 @@
 from __future__ import absolute_import, unicode_literals
 
 import datetime
+import time
 
 import pywikibot
+from pywikibot import config
 from pywikibot.data.api import (
     CachedRequest,
     ParamInfo,
@@ -265,6 +267,115 @@ class DryWriteAssertTests(DefaultDrySiteTestCase):
         Request(site=site, parameters={'action': 'edit'})
 
 
+class DryRequestDefaultsTests(DefaultDrySiteTestCase):
+
+    """Test the default parameters of queries."""
+
+    def _get_params(self, site, **params):
+        """Return the parameters of a query with the defaults added."""
+        params['action'] = 'query'
+        request = Request(site=site, parameters=params)
+        request._add_defaults()
+        return request._params
+
+    def _replace_siteinfo(self, site):
+        """Replace the siteinfo of the site with a copy."""
+        siteinfo = DummySiteinfo({})
+        siteinfo._cache = dict(site._siteinfo._cache)
+        site._siteinfo = siteinfo
+
+    def test_defaults(self):
+        """Test that queries ask for the userinfo by default."""
+        params = self._get_params(self.get_site(), prop='info')
+        self.assertEqual(params['meta'], ['userinfo'])
+        self.assertEqual(params['uiprop'], ['blockinfo', 'hasmsg'])
+        self.assertEqual(params['rawcontinue'], [''])
+        self.assertEqual(params['format'], ['json'])
+        self.assertEqual(params['maxlag'], [str(config.maxlag)])
+
+    @patch.object(config, 'lean_api_requests', True)
+    def test_lean(self):
+        """Test that lean queries don't ask for the userinfo."""
+        params = self._get_params(self.get_site(), prop='info',
+                                  meta='siteinfo')
+        self.assertEqual(params['meta'], ['siteinfo'])
+        self.assertNotIn('uiprop', params)
+        self.assertEqual(params['rawcontinue'], [''])
+        self.assertEqual(params['format'], ['json'])
+        self.assertEqual(params['maxlag'], [str(config.maxlag)])
+
+    def test_profile(self):
+        """Test that the version is only parsed for the first query."""
+        site = self.get_site()
+        self._replace_siteinfo(site)
+        with patch.object(site, 'version', return_value='1.24') as version:
+            self.assertNotIn('rawcontinue', self._get_params(site))
+            self.assertNotIn('rawcontinue', self._get_params(site))
+        self.assertEqual(version.call_count, 1)
+        self.assertIs(site.request_profile, site.request_profile)
+
+        # The profile is built again for new siteinfo
+        self._replace_siteinfo(site)
+        self.assertEqual(self._get_params(site)['rawcontinue'], [''])
+
+    def test_proofread(self):
+        """Test that queries with prop ask for proofread if available."""
+        site = self.get_site()
+        self.assertNotIn('proofread', self._get_params(site, prop='info')[
+            'prop'])
+        site._siteinfo._cache['extensions'] = ([{'name': 'ProofreadPage'}],
+                                               True)
+        self._replace_siteinfo(site)
+        self.assertIn('proofread', self._get_params(site, prop='info')[
+            'prop'])
+
+
+class DryLeanUserinfoTests(DefaultDrySiteTestCase):
+
+    """Test that lean requests check the userinfo separately."""
+
+    def setUp(self):
+        """Log in the site as myusername."""
+        super(DryLeanUserinfoTests, self).setUp()
+        self.site = self.get_site()
+        self.site._userinfo = {'name': 'myusername', 'groups': []}
+        self.site._username[0] = 'myusername'
+
+    def _check(self, action, userinfo):
+        """Check the userinfo for a request and return the mocks."""
+        request = Request(site=self.site, parameters={'action': action})
+        with patch.object(config, 'lean_api_requests', True), \
+                patch.object(self.site, 'getuserinfo',
+                             return_value=userinfo) as getuserinfo, \
+                patch.object(self.site, '_relogin') as relogin:
+            request._check_userinfo()
+        return getuserinfo, relogin
+
+    def test_read(self):
+        """Test that reads only request outdated userinfo."""
+        self.site._userinfo_time = 0
+        getuserinfo, relogin = self._check('query', self.site._userinfo)
+        getuserinfo.assert_called_once_with(force=True)
+        self.assertFalse(relogin.called)
+
+        self.site._userinfo_time = time.time()
+        getuserinfo, relogin = self._check('query', self.site._userinfo)
+        self.assertFalse(getuserinfo.called)
+
+    def test_write(self):
+        """Test that writes always request the userinfo."""
+        self.site._userinfo_time = time.time()
+        getuserinfo, relogin = self._check('edit', self.site._userinfo)
+        getuserinfo.assert_called_once_with(force=True)
+        self.assertFalse(relogin.called)
+
+    def test_other_user(self):
+        """Test that the site logs in again as another user is reported."""
+        with patch('pywikibot.error'):
+            getuserinfo, relogin = self._check('purge', {'name': 'other'})
+        relogin.assert_called_once_with()
+
+
 class DryMimeTests(TestCase):
 
     """Test MIME request handling without a real site."""
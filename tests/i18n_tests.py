@@ -7,11 +7,16 @@
 #
 from __future__ import absolute_import, unicode_literals
 
+import os
+import shutil
+import tempfile
+
 import pywikibot
 
 from pywikibot import i18n, bot, plural
 from pywikibot.tools import StringTypes
 
+from tests import join_root_path
 from tests.aspects import (
     unittest, TestCase, DefaultSiteTestCase, PwbTestCase,
     AutoDeprecationTestCase,
@@ -336,6 +341,84 @@ class TestTWNTranslate(TWNTestCaseBase, AutoDeprecationTestCase):
             u'Robot: Changer seulement une page.')
 
 
+class TestMessageCatalogue(TWNTestCaseBase):
+
+    """Test translations loaded from a compiled message catalogue."""
+
+    net = False
+    message_package = 'tests.i18n'
+
+    def setUp(self):
+        """Compile the test translations into a temporary directory."""
+        super(TestMessageCatalogue, self).setUp()
+        self.base_dir = pywikibot.config.base_dir
+        pywikibot.config.base_dir = tempfile.mkdtemp()
+        self.filename = i18n.compile_messages(self.message_package)
+
+    def tearDown(self):
+        """Remove the compiled test translations."""
+        shutil.rmtree(pywikibot.config.base_dir)
+        pywikibot.config.base_dir = self.base_dir
+        i18n._catalogues.pop(self.message_package, None)
+        super(TestMessageCatalogue, self).tearDown()
+
+    def test_catalogue_used(self):
+        """Test that the compiled catalogue is loaded."""
+        self.assertEqual(self.filename, os.path.join(
+            pywikibot.config.base_dir, 'cache',
+            'tests.i18n.' + i18n.CATALOGUE_FILENAME))
+        catalogue = i18n._get_catalogue()
+        self.assertIsInstance(catalogue, i18n._MessageCatalogue)
+        self.assertEqual(catalogue.langs('test-semi-localized'),
+                         ['en', 'nl'])
+
+    def test_outdated(self):
+        """Test that the catalogue is ignored after a bundle changed."""
+        bundle = join_root_path('tests', 'i18n', 'test')
+        stat = os.stat(bundle)
+        os.utime(bundle, (stat.st_atime, stat.st_mtime + 10))
+        try:
+            self.assertFalse(i18n._get_catalogue())
+            self.assertEqual(i18n.twtranslate('nl', 'test-localized'),
+                             'test-localized NL')
+        finally:
+            os.utime(bundle, (stat.st_atime, stat.st_mtime))
+        i18n._catalogues.pop(self.message_package)
+        self.assertTrue(i18n._get_catalogue())
+
+    def test_added(self):
+        """Test that the catalogue is ignored after a file was added."""
+        json_file = join_root_path('tests', 'i18n', 'test', 'af.json')
+        with open(json_file, 'wb') as f:
+            f.write(b'{"test-localized": "test-localized AF"}')
+        try:
+            self.assertFalse(i18n._get_catalogue())
+            self.assertEqual(i18n.twtranslate('af', 'test-localized'),
+                             'test-localized AF')
+        finally:
+            os.remove(json_file)
+            i18n._cache.pop('af', None)
+            i18n._resolved_cache.clear()
+
+    def test_twtranslate(self):
+        """Test translating with fallback and plural."""
+        self.assertEqual(i18n.twtranslate('fy', 'test-semi-localized'),
+                         'test-semi-localized NL')
+        self.assertEqual(i18n.twtranslate('ru', 'test-non-localized'),
+                         'test-non-localized EN')
+        self.assertEqual(i18n.twtranslate('en', 'test-plural', {'num': 2}),
+                         'Bot: Changing 2 pages.')
+        self.assertRaises(i18n.TranslationError, i18n.twtranslate,
+                          'en', 'test-no-english')
+
+    def test_keys(self):
+        """Test twhas_key and twget_keys."""
+        self.assertTrue(i18n.twhas_key('nl', 'test-semi-localized'))
+        self.assertFalse(i18n.twhas_key('fy', 'test-semi-localized'))
+        self.assertEqual(i18n.twget_keys('test-semi-localized'),
+                         ['en', 'nl'])
+
+
 class ScriptMessagesTestCase(TWNTestCaseBase, AutoDeprecationTestCase):
 
     """Real messages test."""
@@ -468,6 +551,35 @@ class TestExtractPlural(TestCase):
             'dozen')
 
 
+class TestLRUCache(TestCase):
+
+    """Test the cache used for resolved and parsed messages."""
+
+    net = False
+
+    def test_maxsize(self):
+        """Test that the least recently used item is dropped."""
+        cache = i18n._LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1)
+        cache['c'] = 3
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
+
+    def test_compile_plural(self):
+        """Test that parsed plural messages are reused."""
+        message = 'x {{PLURAL:foo|one|other|12=dozen}} y'
+        parts = i18n._compile_plural(message)
+        self.assertEqual(parts,
+                         ['x ', ('foo', ['one', 'other'], {12: 'dozen'}),
+                          ' y'])
+        self.assertIs(i18n._compile_plural(message), parts)
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()
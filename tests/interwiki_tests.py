@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""Tests for the interwiki script."""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pywikibot
+
+from scripts.interwiki import (
+    ContentStore, InterwikiBot, InterwikiBotConfig, PageTree, QueryBatch,
+    Subject,
+)
+
+from tests.aspects import unittest, PatchingTestCase, TestCase
+
+
+class TestContentStore(TestCase):
+
+    """Test the file store of page contents."""
+
+    net = False
+
+    def setUp(self):
+        """Create a store in a temporary directory."""
+        super(TestContentStore, self).setUp()
+        self.dirname = tempfile.mkdtemp()
+        self.path = os.path.join(self.dirname, 'store')
+        self.store = ContentStore(self.path, min_garbage=100)
+
+    def tearDown(self):
+        """Close the store and remove the temporary directory."""
+        if not self.store._file.closed:
+            self.store.close()
+        shutil.rmtree(self.dirname)
+        super(TestContentStore, self).tearDown()
+
+    def test_set_get(self):
+        """Test storing and reading values."""
+        self.store['a'] = 'Foo'
+        self.store['b'] = 'Bär ' * 100
+        self.assertEqual(self.store['a'], 'Foo')
+        self.assertEqual(self.store['b'], 'Bär ' * 100)
+        self.assertIn('a', self.store)
+        self.assertNotIn('c', self.store)
+        self.assertEqual(sorted(self.store), ['a', 'b'])
+        self.assertEqual(len(self.store), 2)
+        self.assertRaises(KeyError, self.store.__getitem__, 'c')
+
+    def test_compress(self):
+        """Test that values are only compressed if they get smaller."""
+        store = ContentStore(os.path.join(self.dirname, 'compressed'),
+                             compress=True)
+        store['a'] = 'Foo'
+        store['b'] = 'Bär ' * 100
+        self.assertFalse(store._index['a'][2])
+        self.assertTrue(store._index['b'][2])
+        self.assertLess(store._size, 100)
+        self.assertEqual(store['a'], 'Foo')
+        self.assertEqual(store['b'], 'Bär ' * 100)
+        self.assertFalse(self.store.compress)
+        store.close()
+
+    def test_delete(self):
+        """Test deleting values."""
+        self.store['a'] = 'Foo'
+        self.store['b'] = 'Bar'
+        del self.store['a']
+        self.assertNotIn('a', self.store)
+        self.assertEqual(self.store['b'], 'Bar')
+        self.assertEqual(self.store._garbage, 3)
+        self.assertRaises(KeyError, self.store.__delitem__, 'a')
+
+    def test_overwrite(self):
+        """Test replacing a value."""
+        self.store['a'] = 'Foo'
+        self.store['a'] = 'Foobar'
+        self.assertEqual(self.store['a'], 'Foobar')
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store._garbage, 3)
+        self.assertEqual(self.store._size, 9)
+
+    def test_compact(self):
+        """Test that the file is compacted once most of it is unused."""
+        for i in range(10):
+            self.store[i] = '{0:02}'.format(i) * 10
+        for i in range(5):
+            del self.store[i]
+        # Half of the file and more than min_garbage is not enough
+        self.assertEqual(self.store._garbage, 100)
+        self.assertEqual(self.store._size, 200)
+        del self.store[5]
+        self.assertEqual(self.store._garbage, 0)
+        self.assertEqual(self.store._size, 80)
+        self.assertEqual(os.path.getsize(self.path), 80)
+        self.assertEqual([self.store[i] for i in range(6, 10)],
+                         ['{0:02}'.format(i) * 10 for i in range(6, 10)])
+
+    def test_min_garbage(self):
+        """Test that a small file is not compacted."""
+        self.store['a'] = 'Foo' * 10
+        del self.store['a']
+        self.assertEqual(self.store._garbage, 30)
+        self.assertEqual(self.store._size, 30)
+        self.store.compact()
+        self.assertEqual(self.store._size, 0)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_reopen(self):
+        """Test using the store after the file has been reopened."""
+        self.store['a'] = 'Foo'
+        self.store['b'] = 'Bar'
+        del self.store['a']
+        self.store.compact()
+        self.store['c'] = 'Baz'
+        self.store['b'] = 'Qux'
+        self.assertEqual(self.store['b'], 'Qux')
+        self.assertEqual(self.store['c'], 'Baz')
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+        self.store.close()
+        self.assertFalse(os.path.exists(self.path))
+
+        # A new store overwrites the file of an old one
+        with open(self.path, 'wb') as f:
+            f.write(b'old')
+        self.store = ContentStore(self.path)
+        self.assertEqual(len(self.store), 0)
+        self.store['a'] = 'Foo'
+        self.assertEqual(self.store['a'], 'Foo')
+        self.assertEqual(self.store._size, 3)
+
+
+class DrySite(object):
+
+    """A site which preloads its pages after a delay."""
+
+    def __init__(self, code, delay=0, error=None):
+        """Constructor."""
+        self.code = code
+        self.delay = delay
+        self.error = error
+        self.loaded = []
+
+    def __repr__(self):
+        """Return the code of the site."""
+        return 'DrySite({0!r})'.format(self.code)
+
+    def preloadpages(self, pages, **kwargs):
+        """Record the pages after the delay or raise the error."""
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self.loaded.append((list(pages), threading.current_thread()))
+        return iter(pages)
+
+
+class DryPage(object):
+
+    """A page of a DrySite."""
+
+    def __init__(self, site, title):
+        """Constructor."""
+        self.site = site
+        self.title = title
+
+    def __repr__(self):
+        """Return the title of the page."""
+        return 'DryPage({0!r}, {1!r})'.format(self.site.code, self.title)
+
+
+class DrySubject(Subject):
+
+    """A subject which records its loaded batches."""
+
+    def __init__(self, name, sites, loaded):
+        """Constructor which adds a page of each site to the todo list."""
+        self.name = name
+        self.loaded = loaded
+        self.todo = PageTree()
+        self.pending = PageTree()
+        self.done = PageTree()
+        for site in sites:
+            self.todo.add(DryPage(site, name))
+
+    def batchLoaded(self, counter):
+        """Record the batch and mark its pages as done."""
+        self.loaded.append((self.name, [page.site for page in self.pending]))
+        for page in self.pending:
+            self.done.add(page)
+            counter.minus(page.site)
+        self.pending = PageTree()
+
+
+class TestQueryBatch(PatchingTestCase):
+
+    """Test preloading the pages of several sites at once."""
+
+    net = False
+
+    def setUp(self):
+        """Create a bot with subjects which need pages of dry sites."""
+        super(TestQueryBatch, self).setUp()
+        self.home = DrySite('home')
+        self.slow = DrySite('slow', delay=0.3)
+        self.fast = DrySite('fast')
+        self.patch(pywikibot, 'Site', lambda *args, **kwargs: self.home)
+        self.conf = InterwikiBotConfig()
+        self.conf.parallel = 3
+        self.bot = InterwikiBot(self.conf)
+        self.loaded = []
+
+    def _add(self, name, *sites):
+        """Add a subject which needs a page of each site."""
+        subject = DrySubject(name, sites, self.loaded)
+        self.bot.subjects.append(subject)
+        for site, count in subject.openSites():
+            self.bot.plus(site, count)
+        return subject
+
+    def test_order(self):
+        """Test that batches are processed in the order they started."""
+        self._add('A', self.slow)
+        self._add('B', self.fast)
+        self.assertTrue(self.bot.oneQuery())
+        # Both batches have been started, but only the oldest is done
+        self.assertEqual([batch.site for batch in self.bot.inflight],
+                         [self.fast])
+        self.assertEqual(self.loaded, [('A', [self.slow])])
+        self.assertTrue(self.bot.oneQuery())
+        self.assertEqual(self.loaded, [('A', [self.slow]),
+                                       ('B', [self.fast])])
+        self.assertFalse(self.bot.oneQuery())
+        self.assertEqual(len(self.slow.loaded), 1)
+        self.assertEqual(len(self.fast.loaded), 1)
+        self.assertIsNot(self.slow.loaded[0][1], threading.current_thread())
+
+    def test_sequential(self):
+        """Test that a single batch is loaded in the main thread."""
+        self.conf.parallel = 1
+        self._add('A', self.slow)
+        self._add('B', self.fast)
+        self.assertTrue(self.bot.oneQuery())
+        self.assertEqual(self.bot.inflight, [])
+        self.assertEqual(self.slow.loaded[0][1], threading.current_thread())
+        self.assertEqual(self.fast.loaded, [])
+
+    def test_pending(self):
+        """Test that a subject waiting for a batch gets no other one."""
+        first = self._add('A', self.slow, self.fast)
+        self._add('B', self.fast)
+        self._add('C', self.fast)
+        third = self._add('D', self.slow)
+        batch = self.bot.nextBatch()
+        self.assertIs(batch.site, self.fast)
+        self.assertEqual(len(first.todo), 1)
+        self.assertEqual(len(first.pending), 1)
+        self.assertFalse(first.isDone())
+        self.bot.inflight.append(batch)
+        second = self.bot.nextBatch()
+        self.assertIs(second.site, self.slow)
+        self.assertEqual(second.subjects, [third])
+        self.bot.inflight = []
+
+        # A subject is not done before its last batch has been loaded
+        first.todo = PageTree()
+        self.assertFalse(first.isDone())
+        first.batchLoaded(self.bot)
+        self.assertTrue(first.isDone())
+
+    def test_select_exclude(self):
+        """Test selecting a site which is not excluded."""
+        self.conf.restoreAll = False
+        self._add('A', self.home, self.fast)
+        for name in 'BCDE':
+            self._add(name, self.home, self.slow, self.slow)
+        self.assertIs(self.bot.selectQuerySite(), self.home)
+        # Only the open sites of the first subject are considered
+        self.assertIs(self.bot.selectQuerySite([self.home]), self.fast)
+        self.assertIs(self.bot.selectQuerySite([self.home, self.fast]),
+                      self.slow)
+        self.assertIsNone(self.bot.selectQuerySite(
+            [self.home, self.slow, self.fast]))
+
+    def test_max_open_site(self):
+        """Test selecting the site with the most open pages."""
+        self.assertIsNone(self.bot.maxOpenSite())
+        first = self._add('A', self.fast, self.slow)
+        self._add('B', self.slow)
+        self.assertIs(self.bot.maxOpenSite(), self.slow)
+        self.assertIs(self.bot.maxOpenSite([self.slow]), self.fast)
+        self._add('C', self.home)
+        self.assertIs(self.bot.maxOpenSite(), self.slow)
+        # Without open sites of the first subject any site is used
+        first.todo = PageTree()
+        self.assertIs(self.bot.maxOpenSite(), self.home)
+        self.assertIs(self.bot.maxOpenSite([self.home]), self.slow)
+
+    def test_error(self):
+        """Test that an error of a loading thread is raised."""
+        broken = DrySite('broken', error=pywikibot.ServerError('broken'))
+        self._add('A', broken)
+        self._add('B', self.fast)
+        self.assertRaisesRegex(pywikibot.ServerError, 'broken',
+                               self.bot.oneQuery)
+        self.assertEqual(self.loaded, [])
+        batch = QueryBatch(broken, [], [])
+        batch.start()
+        self.assertRaises(pywikibot.ServerError, batch.wait)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
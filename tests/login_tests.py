@@ -5,21 +5,34 @@ Tests for LoginManager classes.
 e.g. used to test password-file based login.
 """
 #
-# (C) Pywikibot team, 2012-2016
+# (C) Pywikibot team, 2012-2018
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, unicode_literals
 
+import os
+import shutil
+import tempfile
+
 from collections import defaultdict
 from io import StringIO
 
+import pywikibot
+
+from pywikibot import config
+from pywikibot.comms import http
+from pywikibot.data.api import CachedRequest
 from pywikibot.exceptions import NoUsername
+from pywikibot.family import AutoFamily
 from pywikibot.login import LoginManager
+from pywikibot.site import APISite
 
+from tests.api_server import APIServer, Wiki
 from tests.aspects import (
     unittest,
     DefaultDrySiteTestCase,
+    PatchingTestCase,
 )
 from tests import mock
 
@@ -181,5 +194,106 @@ class TestPasswordFile(DefaultDrySiteTestCase):
         self.assertEqual(obj.login_name, "~FakeUsername@~FakeSuffix")
 
 
+class TestLoginAll(PatchingTestCase):
+
+    """Test logging in to several sites at the same time."""
+
+    net = False
+
+    @classmethod
+    def setUpClass(cls):
+        """Start servers which require to log in."""
+        super(TestLoginAll, cls).setUpClass()
+        wiki = Wiki(pages=5, categories=1, items=1)
+        cls.servers = [APIServer(wiki, username='Test bot', sessions=True)
+                       for _ in range(6)]
+        for server in cls.servers:
+            server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the servers."""
+        for server in cls.servers:
+            server.stop()
+        super(TestLoginAll, cls).tearDownClass()
+
+    def setUp(self):
+        """Use a temporary password file, cookie file and cache."""
+        super(TestLoginAll, self).setUp()
+        self.dirname = tempfile.mkdtemp()
+        password_file = os.path.join(self.dirname, 'passwords')
+        with open(password_file, 'w') as f:
+            f.write("('Test bot', 'secret')\n")
+        os.chmod(password_file, config.private_files_permission)
+        self.patch(config, 'password_file', password_file)
+        self.patch(config, 'put_throttle', 0)
+        self.patch(http.cookie_jar, 'filename',
+                   os.path.join(self.dirname, 'pywikibot.lwp'))
+        self.patch(CachedRequest, '_get_cache_dir', classmethod(
+            lambda cls: self.dirname))
+        self._clear_cookies()
+        for server in self.servers:
+            server.requests.clear()
+
+    def _sites(self, servers):
+        """Return a site for each server."""
+        return [APISite('standin', AutoFamily('standin{0}'.format(i),
+                                              server.url),
+                        user='Test bot')
+                for i, server in enumerate(servers)]
+
+    def _requests(self, action):
+        """Return the number of requests to all servers."""
+        return sum(server.requests[action] for server in self.servers)
+
+    def tearDown(self):
+        """Remove the session cookie and the temporary directory."""
+        self._clear_cookies()
+        shutil.rmtree(self.dirname)
+        super(TestLoginAll, self).tearDown()
+
+    def _clear_cookies(self):
+        """Remove the cookies of the server."""
+        try:
+            http.cookie_jar.clear('127.0.0.1')
+        except KeyError:
+            pass
+
+    def test_login_all(self):
+        """Test that all sites log in and preload the tokens."""
+        sites = self._sites(self.servers)
+        self.assertEqual(pywikibot.login_all(sites, workers=3), {})
+        self.assertEqual(self._requests('login'), 6)
+        for site in sites:
+            self.assertTrue(site.logged_in())
+            self.assertIn('csrf', site.tokens._tokens['Test bot'])
+        self.assertTrue(os.path.exists(http.cookie_jar.filename))
+
+        # Logged in sites are skipped
+        self.assertEqual(pywikibot.login_all(sites, tokens=()), {})
+        self.assertEqual(self._requests('login'), 6)
+        self.assertEqual(self._requests('query'), 6 * 5)
+
+    def test_central_login(self):
+        """Test that sites sharing the session log in only once."""
+        sites = self._sites(self.servers[:1] * 6)
+        for site in sites:
+            site.family.cross_projects = [site.family.name]
+        self.assertEqual(pywikibot.login_all(sites), {})
+        self.assertEqual(self._requests('login'), 1)
+        self.assertTrue(all(site.logged_in() for site in sites))
+
+    def test_error(self):
+        """Test that the errors of the sites are returned."""
+        sites = self._sites(self.servers[:3])
+        sites[0]._username = ['Unknown bot', None]
+        with mock.patch.object(LoginManager, 'check_user_exists',
+                               side_effect=NoUsername('test')):
+            errors = pywikibot.login_all(sites)
+        self.assertEqual(list(errors), [sites[0]])
+        self.assertIsInstance(errors[sites[0]], NoUsername)
+        self.assertTrue(sites[1].logged_in())
+
+
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()
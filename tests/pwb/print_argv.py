@@ -0,0 +1,23 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Script that forms part of runner_tests."""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import sys
+
+import pywikibot
+
+status = 0
+args = []
+for arg in pywikibot.handle_args():
+    if arg.startswith('-exit:'):
+        status = int(arg[len('-exit:'):])
+    else:
+        args.append(arg)
+print(' '.join(args))
+sys.exit(status)
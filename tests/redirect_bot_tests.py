@@ -1,19 +1,23 @@
 # -*- coding: utf-8 -*-
 """Tests for the redirect.py script."""
 #
-# (C) Pywikibot team, 2017
+# (C) Pywikibot team, 2017-2018
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, unicode_literals
 
+import os
+import shutil
+import tempfile
+
 import pywikibot
 from pywikibot import site, Page, i18n
 
-from scripts.redirect import RedirectRobot
+from scripts.redirect import RedirectGraph, RedirectRobot
 
 from tests import Mock, patch
-from tests.aspects import DefaultSiteTestCase
+from tests.aspects import DefaultSiteTestCase, TestCase
 
 
 # To make `self.site.logged_in(sysop=True)` always return False
@@ -52,3 +56,75 @@ class TestGetSDTemplateNoSysop(DefaultSiteTestCase):
                 bot = RedirectRobot('broken', **options)
         w.assert_called_with('No speedy deletion template "n" available.')
         self.assertEqual(bot.sdtemplate, None)
+
+
+class TestRedirectGraph(TestCase):
+
+    """Test the RedirectGraph class."""
+
+    net = False
+
+    def setUp(self):
+        """Build a graph with a double redirect, a broken one and a loop."""
+        super(TestRedirectGraph, self).setUp()
+        graph = RedirectGraph()
+        page = graph.add('Page', 0, exists=True)
+        redirect = graph.add('Redirect', 0, exists=True, target=page)
+        graph.add('Double', 0, exists=True, target=redirect)
+        graph.add('Talk:Triple', 1, exists=True,
+                  target=graph.add('Double', 0))
+        graph.add('Broken', 0, exists=True, target=graph.add('Missing', 0))
+        loop = graph.add('Loop_a', 0, exists=True)
+        graph.add('Loop_b', 0, exists=True, target=loop)
+        graph.add('Loop_a', 0, target=graph.add('Loop_b', 0))
+        graph.add('Into_loop', 0, exists=True, target=loop)
+        self.graph = graph
+
+    def chains(self, graph, namespaces=None):
+        """Return the resolved chains by title."""
+        titles = graph.titles
+        return dict((titles[pid], (hops, final >= 0 and titles[final] or None))
+                    for pid, hops, final in graph.chains(namespaces))
+
+    def test_chains(self):
+        """Test resolving the redirect chains."""
+        self.assertEqual(self.chains(self.graph), {
+            'Redirect': (1, 'Page'),
+            'Double': (2, 'Page'),
+            'Talk:Triple': (3, 'Page'),
+            'Broken': (1, 'Missing'),
+            'Loop_a': (-1, None),
+            'Loop_b': (-1, None),
+            'Into_loop': (-1, None),
+        })
+        self.assertNotIn('Talk:Triple', self.chains(self.graph, [0]))
+        self.assertFalse(self.graph.exists(self.graph.ids['Missing']))
+
+    def test_pages_and_redirects(self):
+        """Test the pages and redirects of some namespaces."""
+        titles = self.graph.titles
+        self.assertEqual(len(self.graph), 9)
+        self.assertEqual(
+            set(titles[pid] for pid in self.graph.pages([1])),
+            set(['Talk:Triple']))
+        self.assertEqual(
+            dict((titles[pid], titles[target])
+                 for pid, target in self.graph.redirects([1])),
+            {'Talk:Triple': 'Double'})
+
+    def test_save_and_load(self):
+        """Test saving the graph to a file and loading it again."""
+        dirname = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(dirname, 'test.graph')
+            self.graph.save(filename, dump='test.xml', size=1)
+            graph, info = RedirectGraph.load(filename)
+            with open(filename, 'r+b') as f:
+                f.truncate(os.path.getsize(filename) - 1)
+            self.assertRaises(ValueError, RedirectGraph.load, filename)
+        finally:
+            shutil.rmtree(dirname)
+        self.assertEqual(info, {'dump': 'test.xml', 'size': 1})
+        self.assertEqual(graph.titles, self.graph.titles)
+        self.assertEqual(graph.ids['Missing'], self.graph.ids['Missing'])
+        self.assertEqual(self.chains(graph), self.chains(self.graph))
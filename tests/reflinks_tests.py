@@ -1,16 +1,27 @@
 # -*- coding: utf-8 -*-
 """Tests for reflinks script."""
 #
-# (C) Pywikibot team, 2014
+# (C) Pywikibot team, 2014-2018
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, unicode_literals
 
+import re
+import threading
+import time
+
+from collections import Counter
+
+from pywikibot import comms, config
+
+from scripts import reflinks
 from scripts.reflinks import XmlDumpPageGenerator, ReferencesRobot, main
 
 from tests import join_xml_data_path
-from tests.aspects import unittest, TestCase, ScriptMainTestCase
+from tests.aspects import (
+    unittest, PatchingTestCase, TestCase, ScriptMainTestCase,
+)
 
 
 class TestXMLPageGenerator(TestCase):
@@ -208,6 +219,138 @@ class TestReferencesBotConstructor(ScriptMainTestCase):
                                   site=self.get_site())
 
 
+class FakeRequest(object):
+
+    """A streamed response which counts the bytes read of its body."""
+
+    def __init__(self, body, status=200, content_type='text/html'):
+        """Constructor."""
+        self.body = body
+        self.status = status
+        self.response_headers = {'content-type': content_type}
+        self.data = self
+        self.read = 0
+        self.closed = False
+
+    @property
+    def raw(self):
+        """Return the whole body."""
+        self.read = len(self.body)
+        return self.body
+
+    def iter_content(self, chunk_size):
+        """Yield the body in chunks."""
+        for start in range(0, len(self.body), chunk_size):
+            self.read = min(start + chunk_size, len(self.body))
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        """Close the response."""
+        self.closed = True
+
+
+class TestFetch(PatchingTestCase):
+
+    """Test fetching the start of linked pages with a stubbed http."""
+
+    net = False
+
+    def setUp(self):
+        """Create a bot without a site and stub fetching urls."""
+        super(TestFetch, self).setUp()
+        self.bot = ReferencesRobot.__new__(ReferencesRobot)
+        self.bot.options = {}
+        self.bot.availableOptions = {'ignorepdf': False}
+        self.bot._use_fake_user_agent = False
+        self.bot.MIME = re.compile('text/html')
+        self.responses = {}
+        self.errors = {}
+        self.delay = 0
+        self.lock = threading.Lock()
+        self.active = Counter()
+        self.max_active = Counter()
+        self.threads = set()
+        self.patch(comms.http, 'fetch', self._fetch)
+
+    def _fetch(self, url, **kwargs):
+        """Return the response of the url and record the active ones."""
+        self.assertTrue(kwargs['stream'])
+        host = url.split('/')[2]
+        with self.lock:
+            self.threads.add(threading.current_thread())
+            self.active[host] += 1
+            self.max_active[host] = max(self.max_active[host],
+                                        self.active[host])
+        time.sleep(self.delay)
+        with self.lock:
+            self.active[host] -= 1
+        if url in self.errors:
+            raise self.errors[url]
+        return self.responses.get(url) or FakeRequest(b'<title>x</title>')
+
+    def test_truncate(self):
+        """Test that at most max_prefetch_size bytes are read."""
+        response = FakeRequest(b'<html>' + b'x' * 300000)
+        self.responses['http://a/'] = response
+        f, body = self.bot.fetch('http://a/')
+        self.assertIs(f, response)
+        self.assertEqual(body, response.body[:reflinks.max_prefetch_size])
+        self.assertLess(response.read, reflinks.max_prefetch_size + 8192)
+        self.assertTrue(response.closed)
+
+    def test_title(self):
+        """Test that the body is only read until the end of the title."""
+        # The end of the title is split between two chunks
+        start = b'<html><head><title>' + b'x' * 8170 + b'</TIT'
+        self.assertEqual(start[8189:8192], b'</T')
+        response = FakeRequest(start + b'LE></head>' + b'y' * 100000)
+        self.responses['http://a/'] = response
+        body = self.bot.fetch('http://a/')[1]
+        self.assertEqual(response.read, 16384)
+        self.assertEqual(body, response.body[:16384])
+        self.assertTrue(response.closed)
+
+    def test_not_html(self):
+        """Test that the body of media and errors is not read."""
+        self.responses['http://a/image'] = FakeRequest(
+            b'PNG', content_type='image/png')
+        self.responses['http://a/error'] = FakeRequest(b'<html>', status=404)
+        self.responses['http://a/file.pdf'] = FakeRequest(
+            b'PDF', content_type='application/pdf')
+        for url in self.responses:
+            f, body = self.bot.fetch(url)
+            self.assertEqual(body, b'PDF' if url.endswith('.pdf') else b'')
+            self.assertEqual(f.read, len(body))
+            self.assertTrue(f.closed)
+
+        self.bot.options['ignorepdf'] = True
+        self.assertEqual(self.bot.fetch('http://a/file.pdf')[1], b'')
+
+    def test_per_host(self):
+        """Test that only a few links of the same host are fetched at once."""
+        self.patch(config, 'max_external_links', 10)
+        self.patch(config, 'max_external_links_per_host', 2)
+        self.delay = 0.05
+        urls = (['http://a/{0}'.format(i) for i in range(12)] +
+                ['http://b/{0}'.format(i) for i in range(3)])
+        start = time.time()
+        results = self.bot.prefetch(urls)
+        self.assertEqual(sorted(results), sorted(urls))
+        self.assertEqual(self.max_active, Counter({'a': 2, 'b': 2}))
+        # The links of the hosts have been fetched at the same time
+        self.assertLess(time.time() - start, 0.05 * 8)
+
+    def test_error(self):
+        """Test that the error of a link is returned to be raised."""
+        error = comms.http.requests.exceptions.ConnectionError('refused')
+        self.errors['http://a/broken'] = error
+        results = self.bot.prefetch(['http://a/broken', 'http://a/'])
+        # The error raised by a worker thread is the one the bot raises
+        self.assertIs(results['http://a/broken'], error)
+        self.assertNotIn(threading.current_thread(), self.threads)
+        self.assertEqual(results['http://a/'][1], b'<title>x</title>')
+
+
 def dummy_constructor(self, *args, **kwargs):
     """A constructor faking the actual constructor."""
     TestReferencesBotConstructor.constructor_args = args
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Tests for the runner of scripts."""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import time
+
+from pywikibot import throttle
+
+from tests import join_tests_path
+from tests.aspects import unittest, PatchingTestCase
+from tests.utils import execute_pwb
+
+
+@unittest.skipUnless(hasattr(socket.socket, 'recvmsg'),
+                     'The runner requires Python 3.3+ on a Unix system.')
+class TestRunner(PatchingTestCase):
+
+    """Test running scripts by a runner."""
+
+    net = False
+
+    def setUp(self):
+        """Start a runner in a thread."""
+        from pywikibot.runner import Runner
+        super(TestRunner, self).setUp()
+        self.patch(throttle, 'shared', None)
+        self.dirname = tempfile.mkdtemp()
+        self.path = os.path.join(self.dirname, 'runner.sock')
+        self.runner = Runner(self.path)
+        self.thread = threading.Thread(target=self.runner.serve_forever,
+                                       kwargs={'poll_interval': 0.1})
+        self.thread.start()
+
+    def tearDown(self):
+        """Stop the runner."""
+        self.runner.shutdown()
+        self.runner.server_close()
+        self.thread.join()
+        shutil.rmtree(self.dirname)
+        super(TestRunner, self).tearDown()
+
+    def _run(self, *args):
+        """Run the test script by the runner."""
+        return execute_pwb(['-runner:' + self.path,
+                            join_tests_path('pwb', 'print_argv.py')] +
+                           list(args))
+
+    def test_run(self):
+        """Test that the script gets its arguments and exit status."""
+        result = self._run('foo', '-exit:3', 'bar')
+        self.assertEqual(result['stdout'].strip(), 'foo bar')
+        self.assertEqual(result['exit_code'], 3)
+        self.assertNotIn('No runner available', result['stderr'])
+
+    def test_missing_script(self):
+        """Test running a script which does not exist."""
+        result = execute_pwb(['-runner:' + self.path, 'not_a_script'])
+        self.assertIn('not_a_script.py not found!', result['stderr'])
+        self.assertEqual(result['exit_code'], 1)
+
+    def test_no_runner(self):
+        """Test that the script is run directly without a runner."""
+        self.path = os.path.join(self.dirname, 'missing.sock')
+        result = self._run('foo')
+        self.assertIn('No runner available', result['stderr'])
+        self.assertEqual(result['stdout'].strip(), 'foo')
+        self.assertEqual(result['exit_code'], 0)
+
+    def test_socket(self):
+        """Test that only the user can use the socket."""
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertIsInstance(throttle.shared, throttle.SharedState)
+
+    def test_existing_path(self):
+        """Test that only the socket of a stopped runner is replaced."""
+        from pywikibot.runner import Runner
+        self.assertRaisesRegex(OSError, 'already listening', Runner,
+                               self.path)
+
+        path = os.path.join(self.dirname, 'stale.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.close()
+        Runner(path).server_close()
+
+        path = os.path.join(self.dirname, 'file')
+        with open(path, 'w') as f:
+            f.write('data')
+        self.assertRaisesRegex(OSError, 'is not a socket', Runner, path)
+        self.assertTrue(os.path.isfile(path))
+
+
+class TestSharedThrottle(PatchingTestCase):
+
+    """Test throttles sharing their state."""
+
+    net = False
+
+    def setUp(self):
+        """Share the state of throttles created afterwards."""
+        super(TestSharedThrottle, self).setUp()
+        self.patch(throttle, 'shared', throttle.SharedState(slots=4))
+
+    def _create_throttle(self, site):
+        """Create a throttle which records its waits."""
+        result = throttle.Throttle(site, multiplydelay=False)
+        result.waits = []
+        result.wait = result.waits.append
+        return result
+
+    def test_shared(self):
+        """Test that throttles of the same site share their state."""
+        first = self._create_throttle('wikipedia:en')
+        second = self._create_throttle('wikipedia:en')
+        self.assertIs(first.lock, second.lock)
+        first.last_write = 42
+        self.assertEqual(second.last_write, 42)
+        self.assertEqual(throttle.shared.slot('wikipedia:en'),
+                         throttle.shared.slot('wikipedia:en'))
+
+    def test_reserve(self):
+        """Test that an access is reserved instead of waited for locked."""
+        first = self._create_throttle('wikipedia:en')
+        second = self._create_throttle('wikipedia:en')
+        first.delay = second.delay = 10
+        start = time.time()
+        first()
+        second()
+        self.assertAlmostEqual(first.waits[0], 10, delta=1)
+        self.assertAlmostEqual(second.waits[0], 20, delta=1)
+        self.assertGreater(second.last_read, start + 19)
+
+    def test_create(self):
+        """Test that a new throttle keeps the reservations of the slot."""
+        first = self._create_throttle('wikipedia:en')
+        first.delay = 10
+        first()
+        reserved = first.last_read
+        self.assertGreater(reserved, time.time() + 9)
+        second = self._create_throttle('wikipedia:en')
+        self.assertEqual(second.last_read, reserved)
+        second.setDelays(10)
+        self.assertEqual(first.last_read, reserved)
+        second()
+        self.assertAlmostEqual(second.waits[0], 20, delta=1)
+
+    def test_lag(self):
+        """Test that a lag is reserved instead of waited for locked."""
+        first = self._create_throttle('wikipedia:en')
+        second = self._create_throttle('wikipedia:en')
+        second.delay = 0
+        locked = []
+
+        def acquire():
+            locked.append(second.lock.acquire(False))
+            if locked[-1]:
+                second.lock.release()
+
+        def wait(seconds):
+            # Another thread can use the slot while this one waits
+            thread = threading.Thread(target=acquire)
+            thread.start()
+            thread.join()
+            first.waits.append(seconds)
+
+        first.wait = wait
+        start = time.time()
+        first.lag(20)
+        self.assertEqual(locked, [True])
+        self.assertAlmostEqual(first.waits[0], 10, delta=1)
+        self.assertGreater(second.last_read, start + 9)
+        self.assertGreater(second.last_write, start + 9)
+        second()
+        self.assertAlmostEqual(second.waits[0], 10, delta=1)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Tests for loading the properties of several pages together."""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import shutil
+import tempfile
+import threading
+
+import pywikibot
+
+from pywikibot import config
+from pywikibot.data.api import CachedRequest
+from pywikibot.family import AutoFamily
+from pywikibot.site import DataSite
+
+from tests.api_server import APIServer, Wiki
+from tests.aspects import unittest, PatchingTestCase
+
+
+class TestBatch(PatchingTestCase):
+
+    """Test loading page properties with one query per batch."""
+
+    net = False
+
+    @classmethod
+    def setUpClass(cls):
+        """Start the server."""
+        super(TestBatch, cls).setUpClass()
+        cls.server = APIServer(Wiki(pages=30, categories=2, items=2),
+                               username='Test bot')
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server."""
+        cls.server.stop()
+        super(TestBatch, cls).tearDownClass()
+
+    def setUp(self):
+        """Create a site which uses a temporary cache."""
+        super(TestBatch, self).setUp()
+        self.dirname = tempfile.mkdtemp()
+        self.patch(CachedRequest, '_get_cache_dir', classmethod(
+            lambda cls: self.dirname))
+        self.patch(config, 'api_batch_window', 0.0)
+        self.site = DataSite('standin',
+                             AutoFamily('standin', self.server.url),
+                             user='Test bot')
+        self.site.siteinfo.get('general')
+        self.site.siteinfo.get('extensions')
+        self.site._paraminfo.fetch(['query', 'query+info'])
+        self.pages = [pywikibot.Page(self.site, 'Page {0}'.format(i))
+                      for i in range(1, 31)]
+        self.pages.append(pywikibot.Page(self.site, 'Missing'))
+        self.server.requests.clear()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.dirname)
+        super(TestBatch, self).tearDown()
+
+    def test_without_batch(self):
+        """Test that each page is loaded alone outside of a batch."""
+        for page in self.pages[:5]:
+            page.exists()
+        self.assertEqual(self.server.requests['query'], 5)
+
+    def test_batch(self):
+        """Test that the pages of a batch are loaded together."""
+        with self.site.batch(self.pages, limit=20) as batch:
+            self.assertEqual(len(batch), 31)
+            self.assertEqual([page.exists() for page in self.pages],
+                             [True] * 30 + [False])
+            self.assertEqual(self.server.requests['query'], 2)
+            self.assertEqual(self.pages[0].protection(), {})
+            self.assertEqual(self.server.requests['query'], 2)
+            # Only the result of the first load is taken from the batch
+            del self.pages[0]._protection
+            self.pages[0].protection()
+            self.assertEqual(self.server.requests['query'], 3)
+        self.assertIsNone(self.site._batch)
+
+    def test_equal_pages(self):
+        """Test that another object of a page of the batch is updated."""
+        with self.site.batch(self.pages):
+            page = pywikibot.Page(self.site, 'Page 3')
+            self.assertIsNot(page, self.pages[2])
+            self.assertTrue(page.exists())
+            self.assertTrue(self.pages[3].exists())
+            self.assertTrue(self.pages[2].exists())
+        self.assertEqual(page.pageid, self.pages[2].pageid)
+
+    def test_loaded_pages(self):
+        """Test that pages which have been loaded are skipped."""
+        for page in self.pages[:10]:
+            page.exists()
+        self.server.requests.clear()
+        with self.site.batch(self.pages, limit=25):
+            for page in self.pages[10:]:
+                page.exists()
+        self.assertEqual(self.server.requests['query'], 1)
+
+    def test_add(self):
+        """Test adding pages to a batch."""
+        with self.site.batch() as batch:
+            batch.add(self.pages[:3])
+            batch.add(self.pages[1:5])
+            self.assertEqual(len(batch), 5)
+            self.assertIn(self.pages[4], batch)
+            self.assertNotIn(self.pages[5], batch)
+            for page in self.pages[:6]:
+                page.exists()
+            self.assertEqual(self.server.requests['query'], 2)
+            other = DataSite('other', AutoFamily('other', self.server.url))
+            self.assertRaises(ValueError, batch.add,
+                              [pywikibot.Page(other, 'Page 1')])
+
+    def test_properties(self):
+        """Test loading the page props of a batch."""
+        with self.site.batch(self.pages):
+            for page in self.pages:
+                self.assertEqual(page.properties(), {})
+        self.assertEqual(self.server.requests['query'], 1)
+
+    def test_threads(self):
+        """Test that the loads of several threads are combined."""
+        config.api_batch_window = 0.5
+
+        def exists(page):
+            page.exists()
+
+        threads = [threading.Thread(target=exists, args=(page, ))
+                   for page in self.pages[:10]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests['query'], 1)
+        self.assertTrue(all(page._pageid > 0 for page in self.pages[:10]))
+
+    def test_threads_equal_pages(self):
+        """Test that equal pages of several threads are all updated."""
+        config.api_batch_window = 0.5
+        pages = [pywikibot.Page(self.site, 'Page 1') for _ in range(5)]
+        threads = [threading.Thread(target=page.exists) for page in pages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests['query'], 1)
+        self.assertTrue(all(page._pageid > 0 for page in pages))
+
+
+class TestSplitRedirects(PatchingTestCase):
+
+    """Test splitting the response to a query of several redirects."""
+
+    net = False
+
+    def test_split(self):
+        """Test splitting the redirects and their targets."""
+        site = DataSite('standin', AutoFamily('standin', 'http://localhost'))
+        # The pages are only used as keys of the results
+        pages = dict((title, title) for title in ('A', 'B', 'C', 'D', 'e'))
+        result = {'query': {
+            'normalized': [{'from': 'e', 'to': 'E'}],
+            'redirects': [{'from': 'A', 'to': 'B'},
+                          {'from': 'B', 'to': 'Target',
+                           'tofragment': 'Section'},
+                          {'from': 'C', 'to': 'D'},
+                          {'from': 'D', 'to': 'C'},
+                          {'from': 'E', 'to': 'Missing'}],
+            'pages': {'1': {'pageid': 1, 'ns': 0, 'title': 'Target'},
+                      '-1': {'ns': 0, 'title': 'Missing', 'missing': ''}},
+        }}
+        results = site._split_redirects(pages, result)
+        self.assertEqual(results[pages['A']]['query']['redirects'],
+                         result['query']['redirects'][:2])
+        self.assertEqual(results[pages['A']]['query']['pages'],
+                         {'1': result['query']['pages']['1']})
+        self.assertEqual(results[pages['B']]['query']['pages'],
+                         {'1': result['query']['pages']['1']})
+        self.assertNotIn('pages', results[pages['C']]['query'])
+        self.assertEqual(len(results[pages['D']]['query']['redirects']), 2)
+        self.assertEqual(results[pages['e']]['query']['pages'],
+                         {'-1': result['query']['pages']['-1']})
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Tests for the site snapshot."""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+import os
+import shutil
+import stat
+import tempfile
+
+import pywikibot
+
+from pywikibot.data import api
+from pywikibot.site import APISite, SiteSnapshot
+
+from tests.aspects import unittest, PatchingTestCase
+
+
+class TestSiteSnapshot(PatchingTestCase):
+
+    """Test saving and loading site snapshots without network access."""
+
+    net = False
+
+    general = {
+        'generator': 'MediaWiki 1.31.0-wmf.20',
+        'lang': 'en',
+        'case': 'first-letter',
+        'articlepath': '/wiki/$1',
+    }
+
+    def setUp(self):
+        """Use a temporary base directory."""
+        super(TestSiteSnapshot, self).setUp()
+        self.base_dir = tempfile.mkdtemp()
+        self.patch(pywikibot.config, 'base_dir', self.base_dir)
+        self.patch(pywikibot.config, 'site_snapshot', True)
+        self.patch(SiteSnapshot, '_register', lambda snapshot: None)
+        self.requests = []
+        self.response = None
+        self.patch(api.Request, 'submit',
+                   lambda request: self._submit(request))
+
+    def tearDown(self):
+        """Remove the temporary base directory."""
+        shutil.rmtree(self.base_dir)
+        super(TestSiteSnapshot, self).tearDown()
+
+    def _submit(self, request):
+        """Record the request and return the response or fail."""
+        self.requests.append(request._params)
+        if self.response is None:
+            raise api.APIError('nonet',
+                               'Offline tests do not query the server')
+        return self.response
+
+    def _create_snapshot(self, timestamp=None):
+        """Create a snapshot of a site with some information."""
+        site = APISite('en', 'wikipedia', 'SnapshotBot')
+        now = datetime.datetime.utcnow()
+        site._siteinfo._cache['general'] = (dict(self.general), now)
+        site._siteinfo._cache['magicwords'] = ([], False)  # a default value
+        site._paraminfo._paraminfo['main'] = {'name': 'main', 'path': 'main'}
+        site._paraminfo._action_modules = frozenset(['query', 'edit'])
+        site._userinfo = {'id': 1, 'name': 'SnapshotBot', 'groups': []}
+        site.tokens._tokens['SnapshotBot'] = {'csrf': 'token+\\'}
+        site._snapshot.timestamp = timestamp
+        site._snapshot.save()
+        return site
+
+    def test_load(self):
+        """Test that the snapshot restores the site without requests."""
+        old_site = self._create_snapshot()
+        site = APISite('en', 'wikipedia', 'SnapshotBot')
+        self.assertEqual(site._snapshot.timestamp,
+                         old_site._snapshot.timestamp)
+        self.assertEqual(site.version(), '1.31.0-wmf.20')
+        self.assertEqual(site.siteinfo['lang'], 'en')
+        self.assertNotIn('magicwords', site._siteinfo._cache)
+        self.assertEqual(site._paraminfo._action_modules,
+                         frozenset(['query', 'edit']))
+        self.assertIn('main', site._paraminfo._paraminfo)
+        self.assertTrue(site.logged_in())
+        self.assertEqual(site.user(), 'SnapshotBot')
+        self.assertIn('csrf', site.tokens)
+        self.assertEqual(self.requests, [])
+        self.assertIsNone(site._snapshot._refresh_thread)
+
+    def test_file(self):
+        """Test that the snapshot file is only readable by the owner."""
+        site = self._create_snapshot()
+        mode = os.stat(site._snapshot.filename).st_mode
+        if os.name == 'posix':
+            self.assertEqual(stat.S_IMODE(mode), 0o600)
+        self.assertFalse(os.path.exists(site._snapshot.filename + '.tmp'))
+
+    def test_other_user(self):
+        """Test that a snapshot is only loaded for the same user."""
+        self._create_snapshot()
+        site = APISite('en', 'wikipedia', 'OtherBot')
+        self.assertIsNone(site._snapshot.timestamp)
+        self.assertNotIn('general', site._siteinfo._cache)
+
+    def test_disabled(self):
+        """Test that the snapshot is not loaded if it is disabled."""
+        self._create_snapshot()
+        # Already patched in setUp, which restores it
+        pywikibot.config.site_snapshot = False
+        site = APISite('en', 'wikipedia', 'SnapshotBot')
+        self.assertIsNone(site._snapshot.timestamp)
+
+    def test_save_unchanged(self):
+        """Test that an unchanged snapshot is not written again."""
+        site = self._create_snapshot()
+        filename = site._snapshot.filename
+        os.remove(filename)
+        site._snapshot.save()
+        self.assertFalse(os.path.exists(filename))
+        site._paraminfo._paraminfo['query'] = {'name': 'query'}
+        site._snapshot.save()
+        self.assertTrue(os.path.exists(filename))
+
+    def test_expired(self):
+        """Test that an expired snapshot is refreshed in the background."""
+        refreshed = []
+        self.patch(SiteSnapshot, 'refresh',
+                   lambda snapshot: refreshed.append(snapshot))
+        self._create_snapshot(
+            datetime.datetime.utcnow() - datetime.timedelta(days=2))
+        site = APISite('en', 'wikipedia', 'SnapshotBot')
+        site._snapshot._refresh_thread.join()
+        self.assertEqual(refreshed, [site._snapshot])
+        self.assertEqual(site.version(), '1.31.0-wmf.20')
+
+    def test_verify(self):
+        """Test that an outdated snapshot is discarded before writing."""
+        self._create_snapshot()
+        site = APISite('en', 'wikipedia', 'SnapshotBot')
+        general = dict(self.general, generator='MediaWiki 1.32.0-wmf.1')
+        self.response = {
+            'query': {'general': general,
+                      'userinfo': {'id': 1, 'name': 'SnapshotBot',
+                                   'groups': []}}}
+        site._snapshot.verify()
+        self.assertTrue(site._snapshot.verified)
+        self.assertEqual(site.version(), '1.32.0-wmf.1')
+        self.assertNotIn('main', site._paraminfo._paraminfo)
+        self.assertEqual(site.user(), 'SnapshotBot')
+
+    def test_verify_failed(self):
+        """Test that the snapshot is verified again after a failure."""
+        self._create_snapshot()
+        site = APISite('en', 'wikipedia', 'SnapshotBot')
+        self.assertRaises(api.APIError, site._snapshot.verify)
+        self.assertFalse(site._snapshot.verified)
+        self.response = {
+            'query': {'general': dict(self.general),
+                      'userinfo': {'id': 1, 'name': 'SnapshotBot',
+                                   'groups': []}}}
+        site._snapshot.verify()
+        self.assertTrue(site._snapshot.verified)
+        self.assertEqual(len(self.requests), 2)
+        # a verified snapshot is not checked again
+        site._snapshot.verify()
+        self.assertEqual(len(self.requests), 2)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Tests for the import of pywikibot."""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+import sys
+import types
+
+from pywikibot.tools import ModuleDeprecationWrapper
+
+from tests.aspects import unittest, TestCase
+from tests.utils import execute
+
+
+class TestStartup(TestCase):
+
+    """Test which modules are imported by pywikibot."""
+
+    net = False
+
+    #: The time in seconds which importing pywikibot may take at most. It is
+    #: generous as the tests may run on slow or busy machines.
+    import_budget = 1.0
+
+    #: Modules which must not be imported by importing pywikibot only.
+    lazy_modules = ('pywikibot.page', 'pywikibot.site', 'pywikibot.data.api',
+                    'pywikibot.comms.http', 'requests', 'setuptools')
+
+    #: The public names of pywikibot before its modules were imported
+    #: lazily, which must still be importable from it.
+    exported_names = (
+        'BadTitle', 'BaseSite', 'Bot', 'CaptchaError', 'CascadeLockedPage',
+        'Category', 'CircularRedirect', 'Claim', 'Coordinate',
+        'CoordinateGlobeUnknownException', 'CurrentPageBot', 'Decimal',
+        'EditConflict', 'Error', 'Family', 'FatalServerError', 'FilePage',
+        'InterwikiRedirectPage', 'InvalidTitle', 'IsNotRedirectPage',
+        'IsRedirectPage', 'ItemPage', 'Link', 'LockedNoPage', 'LockedPage',
+        'MediaWikiVersion', 'NoCreateError', 'NoMoveTarget', 'NoPage',
+        'NoSuchSite', 'NoUsername', 'OtherPageSaveError', 'PY2', 'Page',
+        'PageCreatedConflict', 'PageDeletedConflict', 'PageNotSaved',
+        'PageRelatedError', 'PageSaveRelatedError', 'PatchManager',
+        'PropertyPage', 'Queue', 'SectionError', 'Server504Error',
+        'ServerError', 'Site', 'SiteDefinitionError', 'SpamfilterError',
+        'TimeStripper', 'Timestamp', 'UnicodeMixin', 'UnknownExtension',
+        'UnknownFamily', 'UnknownSite', 'UnsupportedPage', 'User',
+        'UserBlocked', 'WbGeoShape', 'WbMonolingualText', 'WbQuantity',
+        'WbTabularData', 'WbTime', 'WbUnknown', 'WikiBaseError',
+        'WikidataBot', 'argvu', 'async_manager', 'async_request',
+        'calledModuleName', 'categoryFormat', 'classproperty', 'color_format',
+        'compileLinkR', 'critical', 'debug', 'deprecate_arg', 'deprecated',
+        'error', 'exception', 'extract_templates_and_params',
+        'getCategoryLinks', 'getLanguageLinks', 'getSite', 'handleArgs',
+        'handle_args', 'html2unicode', 'input', 'inputChoice', 'input_choice',
+        'input_yn', 'interwikiFormat', 'interwikiSort', 'isDisabled',
+        'link_regex', 'log', 'normalize_username', 'output', 'page_put_queue',
+        'redirect_func', 'removeCategoryLinks',
+        'removeCategoryLinksAndSeparator', 'removeDisabledParts',
+        'removeHTMLParts', 'removeLanguageLinks',
+        'removeLanguageLinksAndSeparator', 'replaceCategoryInPlace',
+        'replaceCategoryLinks', 'replaceExcept', 'replaceLanguageLinks',
+        'setAction', 'showDiff', 'showHelp', 'stdout', 'stopme',
+        'textlib_methods', 'translate', 'ui', 'unescape', 'unicode2html',
+        'url2unicode', 'warn', 'warning', 'bot', 'bot_choice', 'comms',
+        'config', 'config2', 'daemonize', 'data', 'diff', 'echo',
+        'exceptions', 'family', 'i18n', 'logging', 'login', 'page', 'plural',
+        'site', 'textlib', 'throttle', 'tools', 'userinterfaces', 'version'
+    )
+
+    def _execute(self, code):
+        """Run the code in a new interpreter and return its output."""
+        result = execute([sys.executable, '-c', code])
+        self.assertEqual(result['exit_code'], 0, result['stderr'])
+        return result['stdout'].strip()
+
+    def test_lazy_modules(self):
+        """Test that importing pywikibot does not import the lazy modules."""
+        loaded = self._execute(
+            'import sys\n'
+            'import pywikibot\n'
+            'print(" ".join(name for name in {0!r}\n'
+            '               if name in sys.modules))'.format(
+                self.lazy_modules))
+        self.assertEqual(loaded, '')
+
+    def test_import_time(self):
+        """Test that importing pywikibot is within the budget."""
+        duration = self._execute(
+            'import time\n'
+            'start = time.time()\n'
+            'import pywikibot\n'
+            'print(time.time() - start)')
+        self.assertLess(float(duration), self.import_budget)
+
+    def test_lazy_attributes(self):
+        """Test that the lazy attributes are imported on their first use."""
+        names = self._execute(
+            'import pywikibot\n'
+            'print(pywikibot.Page.__module__, pywikibot.site.__name__,\n'
+            '      pywikibot.data.api.__name__,\n'
+            '      pywikibot.textlib.pywikibot.Link.__module__)')
+        self.assertEqual(names.split(), ['pywikibot.page', 'pywikibot.site',
+                                         'pywikibot.data.api',
+                                         'pywikibot.page'])
+
+    def test_exported_names(self):
+        """Test that all names can still be imported from pywikibot."""
+        missing = self._execute(
+            'import pywikibot\n'
+            'for name in {0!r}:\n'
+            '    try:\n'
+            '        exec("from pywikibot import " + name)\n'
+            '    except ImportError:\n'
+            '        print(name)'.format(self.exported_names))
+        self.assertEqual(missing, '')
+
+
+class TestLazyAttributes(TestCase):
+
+    """Test the lazy attributes of ModuleDeprecationWrapper."""
+
+    net = False
+
+    def setUp(self):
+        """Create a module with a wrapper."""
+        super(TestLazyAttributes, self).setUp()
+        self.module = types.ModuleType(str('lazy_test_module'))
+        self.module.existing = 42
+        sys.modules[self.module.__name__] = self.module
+        self.wrapper = ModuleDeprecationWrapper(self.module)
+
+    def tearDown(self):
+        """Remove the module again."""
+        del sys.modules[self.module.__name__]
+        super(TestLazyAttributes, self).tearDown()
+
+    def test_lazy_attr(self):
+        """Test that a lazy attribute is imported and then cached."""
+        self.wrapper._add_lazy_attr('shortcut', 'pywikibot.diff',
+                                    'PatchManager')
+        self.assertIs(sys.modules[self.module.__name__], self.wrapper)
+        from pywikibot.diff import PatchManager
+        self.assertIs(self.wrapper.shortcut, PatchManager)
+        self.assertIn('shortcut', self.wrapper.__dict__)
+        self.assertIs(self.module.shortcut, PatchManager)
+
+    def test_existing_attr(self):
+        """Test that an existing attribute can't be made lazy."""
+        self.assertRaises(ValueError, self.wrapper._add_lazy_attr,
+                          'existing', 'pywikibot.diff')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Measure how fast the interwiki bot stores the contents of pages.
+
+It compares the ContentStore of the interwiki script, with and without
+compression, with the shelve which it replaced. The contents are the texts
+of the pages of a wiki generated by L{tests.api_server}, so every run uses
+the same data:
+
+set         Store the contents of all pages.
+get         Read the contents of all pages.
+delete      Delete the contents of every second page.
+
+It also reports the size of the files after these steps.
+
+Usage:
+
+    python -m tests.store_benchmark [-entries:<n>] [-size:<n>] [-repeat:<n>]
+
+-entries:<n>     The number of pages (default 3000).
+-size:<n>        The approximate length of a page (default 20000).
+-repeat:<n>      Run each benchmark n times and report the fastest run.
+"""
+#
+# (C) Pywikibot team, 2018
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shelve
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    from dbm import whichdb
+except ImportError:
+    from whichdb import whichdb
+
+from tests.api_server import Wiki
+
+#: The steps of each benchmark in the order they are run
+STEPS = ['set', 'get', 'delete']
+
+
+def _shelve(path):
+    """Open a shelve like the interwiki bot did."""
+    return shelve.open(path)
+
+
+def _store(compress):
+    """Return a function which opens a ContentStore."""
+    def open_store(path):
+        from scripts.interwiki import ContentStore
+        return ContentStore(path, compress=compress)
+    return open_store
+
+
+#: The stores in the order they are run
+STORES = [('shelve', _shelve),
+          ('plain', _store(False)),
+          ('zlib', _store(True))]
+
+
+def measure(open_store, texts):
+    """
+    Measure the steps with one store.
+
+    @param open_store: Opens a store at the path given to it
+    @type open_store: callable
+    @param texts: The contents to store
+    @type texts: list of str
+    @return: The seconds of each step and the size of the files
+    @rtype: dict
+    """
+    dirname = tempfile.mkdtemp(prefix='pywikibot-benchmark-')
+    try:
+        store = open_store(os.path.join(dirname, 'store'))
+        keys = [str(i) for i in range(len(texts))]
+        result = {}
+
+        start = time.time()
+        for key, text in zip(keys, texts):
+            store[key] = text
+        result['set'] = time.time() - start
+
+        start = time.time()
+        for key in keys:
+            store[key]
+        result['get'] = time.time() - start
+
+        start = time.time()
+        for key in keys[::2]:
+            del store[key]
+        result['delete'] = time.time() - start
+
+        if hasattr(store, 'sync'):
+            store.sync()
+        result['size'] = sum(os.path.getsize(os.path.join(dirname, name))
+                             for name in os.listdir(dirname))
+        store.close()
+    finally:
+        shutil.rmtree(dirname)
+    return result
+
+
+def main(*args):
+    """Run the benchmarks and report the results."""
+    options = {'entries': 3000, 'size': 20000, 'repeat': 1}
+    for arg in args or sys.argv[1:]:
+        option, _, value = arg.partition(':')
+        if option[1:] in options:
+            options[option[1:]] = int(value)
+        else:
+            print(__doc__)
+            return 1
+
+    wiki = Wiki(pages=options['entries'], categories=1, items=0,
+                page_size=options['size'])
+    texts = [wiki.pages['Page {0}'.format(i)]['revisions'][-1]['text']
+             for i in range(1, options['entries'] + 1)]
+    print('{0} entries of {1:.1f} KiB on average'.format(
+        len(texts), sum(len(text) for text in texts) / 1024.0 / len(texts)))
+    dirname = tempfile.mkdtemp(prefix='pywikibot-benchmark-')
+    try:
+        path = os.path.join(dirname, 'store')
+        shelve.open(path).close()
+        backend = whichdb(path)
+    finally:
+        shutil.rmtree(dirname)
+
+    print('{0:<8}'.format('store') + ''.join(
+        '{0:>10}'.format(step) for step in STEPS) + '{0:>12}'.format('size'))
+    for name, open_store in STORES:
+        runs = [measure(open_store, texts) for _ in range(options['repeat'])]
+        result = dict((step, min(run[step] for run in runs))
+                      for step in STEPS)
+        print('{0:<8}'.format(name) + ''.join(
+            '{0:>7.0f} ms'.format(result[step] * 1000) for step in STEPS) +
+            '{0:>8.1f} MiB'.format(runs[0]['size'] / 1024.0 ** 2))
+    print('The shelve uses {0}.'.format(backend))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
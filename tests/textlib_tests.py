@@ -495,6 +495,57 @@ class TestTemplateParams(TestCase):
                                ('d', OrderedDict([('1', '}')]))
                                ])
 
+    def test_extract_templates_params_tokenizer(self):
+        """Test using the single pass tokenizer."""
+        func = functools.partial(textlib.extract_templates_and_params_tokenizer,
+                                 remove_disabled_parts=False, strip=False)
+        self._common_results(func)
+        self._order_differs(func)
+        self._unstripped(func)
+        self._etp_regex_differs(func)
+
+        # Nested templates are returned in the same order as mwpfh
+        self.assertEqual(func('{{a|{{c|{{d|}}}}}}'),
+                         [('a', OrderedDict([('1', '{{c|{{d|}}}}')])),
+                          ('c', OrderedDict((('1', '{{d|}}'), ))),
+                          ('d', OrderedDict([('1', '')]))])
+        self.assertEqual(func('{{a|b={{{1|{{c}}}}}}}'),
+                         [('a', OrderedDict((('b', '{{{1|{{c}}}}}'), ))),
+                          ('c', OrderedDict())])
+
+        # separators within links, comments and nowiki are not split
+        self.assertEqual(func('{{a|[[b|c]]|d=[[e|f=g]]}}'),
+                         [('a', OrderedDict((('1', '[[b|c]]'),
+                                             ('d', '[[e|f=g]]'))))])
+        self.assertEqual(func('{{a|b<!--|c=}}-->}}'),
+                         [('a', OrderedDict((('1', 'b<!--|c=}}-->'), )))])
+        self.assertEqual(func('{{a|<nowiki>|}}</nowiki>|b}}'),
+                         [('a', OrderedDict((('1', '<nowiki>|}}</nowiki>'),
+                                             ('2', 'b'))))])
+        self.assertEqual(func('{{a|<nowiki />{{b}}}}'),
+                         [('a', OrderedDict((('1', '<nowiki />{{b}}'), ))),
+                          ('b', OrderedDict())])
+
+        # template arguments and parser functions
+        self.assertEqual(func('{{{a}}}'), [])
+        self.assertEqual(func('{{#if:a|b}}'),
+                         [('#if:a', OrderedDict((('1', 'b'), )))])
+        self.assertEqual(func('{{}}'), [])
+
+        # an unclosed link hides the end of the template
+        self.assertEqual(func('{{a|[[b}} {{c}}'), [('c', OrderedDict())])
+
+    def test_extract_templates_params_tokenizer_stripped(self):
+        """Test using the single pass tokenizer with stripping."""
+        func = textlib.extract_templates_and_params_tokenizer
+
+        self._common_results(func)
+        self._order_differs(func)
+        self._stripped(func)
+
+        self.assertEqual(func('{{a|b=<!--{{{1}}}-->}}'),
+                         [('a', OrderedDict((('b', ''), )))])
+
     def test_extract_templates_params(self):
         """Test that the normal entry point works."""
         func = functools.partial(textlib.extract_templates_and_params,
@@ -673,15 +724,15 @@ class TestGenericTemplateParams(PatchingTestCase):
         self._args = args
         self._mwpfh = True
 
-    @PatchingTestCase.patched(textlib, 'extract_templates_and_params_regex')
-    def extract_regex(self, text, *args, **kwargs):
-        """Patched call to extract_templates_and_params_regex."""
+    @PatchingTestCase.patched(textlib, 'extract_templates_and_params_tokenizer')
+    def extract_tokenizer(self, text, *args, **kwargs):
+        """Patched call to extract_templates_and_params_tokenizer."""
         self._text = text
         self._args = args
         self._mwpfh = False
 
-    def test_removing_disabled_parts_regex(self):
-        """Test removing disabled parts when using the regex variant."""
+    def test_removing_disabled_parts_tokenizer(self):
+        """Test removing disabled parts when using the tokenizer variant."""
         self.patch(config, 'use_mwparserfromhell', False)
         textlib.extract_templates_and_params('{{a<!-- -->}}', True)
         self.assertEqual(self._text, '{{a}}')
@@ -707,8 +758,8 @@ class TestGenericTemplateParams(PatchingTestCase):
         self.assertEqual(self._text, '{{a<!-- -->}}')
         self.assertTrue(self._mwpfh)
 
-    def test_strip_regex(self):
-        """Test stripping values when using the regex variant."""
+    def test_strip_tokenizer(self):
+        """Test stripping values when using the tokenizer variant."""
         self.patch(config, 'use_mwparserfromhell', False)
         textlib.extract_templates_and_params('{{a| foo }}', False, True)
         self.assertEqual(self._args, (False, True))
@@ -1438,6 +1489,42 @@ class TestMultiTemplateMatchBuilder(DefaultDrySiteTestCase):
                                                 string % (t, q))),
                                  self._template_not_case_sensitive)
 
+    def test_pattern_any(self):
+        """Test matching any of several templates in one regex."""
+        builder = _MultiTemplateMatchBuilder(self.site)
+        regex = builder.pattern_any(['quick', 'quick brown', 'fox'])
+        match = regex.search('The {{Template:quick_brown|x}} fox')
+        self.assertIsNotNone(match)
+        self.assertEqual(match.group('name'), 'quick_brown')
+        self.assertEqual(match.group('parameters'), '|x')
+        self.assertEqual(regex.search('The {{msg:fox}}').group('name'), 'fox')
+        self.assertIsNone(regex.search('The {{quickly}} {{foxes}}'))
+        self.assertEqual(bool(regex.search('The {{Quick}}')),
+                         self._template_not_case_sensitive)
+        self.assertRaises(ValueError, builder.pattern_any, [])
+
+    def test_search_any(self):
+        """Test that search_any reports the matched template."""
+        builder = _MultiTemplateMatchBuilder(self.site)
+        search = builder.search_any(['quick', 'Quick_brown', 'fox'])
+        template, match = search('The {{quick brown}} fox {{fox}}')
+        self.assertEqual(template, 'Quick_brown')
+        self.assertEqual(match.start(), 4)
+        self.assertEqual(search('The {{ fox }}')[0], 'fox')
+        self.assertIsNone(search('The quick brown fox'))
+
+    def test_search_any_predicate(self):
+        """Test that the predicate matches like the single patterns."""
+        builder = _MultiTemplateMatchBuilder(self.site)
+        templates = ['quick', 'brown', 'fox']
+        predicate = builder.search_any_predicate(templates)
+        for text in ('{{quick}}', '{{template:brown|a}}', '{{msg:fox}}',
+                     '{{quick fox}}', '{{foxy}}', 'no templates'):
+            self.assertEqual(
+                predicate(text),
+                any(builder.pattern(template).search(text)
+                    for template in templates))
+
 
 class TestGetLanguageLinks(SiteAttributeTestCase):
 
@@ -1,15 +1,22 @@
 # -*- coding: utf-8 -*-
 """weblinkchecker test module."""
 #
-# (C) Pywikibot team, 2015
+# (C) Pywikibot team, 2015-2018
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, unicode_literals
 
 import datetime
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
 
 from requests import ConnectionError as RequestsConnectionError
+from requests.exceptions import InvalidURL
 
 from pywikibot.tools import PY2
 if not PY2:
@@ -17,9 +24,13 @@ if not PY2:
 else:
     from urlparse import urlparse
 
+import pywikibot
+
 from scripts import weblinkchecker
 
-from tests.aspects import unittest, require_modules, TestCase
+from tests.aspects import (
+    unittest, require_modules, PatchingTestCase, TestCase,
+)
 from tests import weblib_tests
 
 
@@ -93,6 +104,342 @@ class TestMementoDefault(MementoTestCase):
             self._get_archive_url, 'invalid')
 
 
+class DummyPage(object):
+
+    """A page which only has a title."""
+
+    def __init__(self, title):
+        """Constructor."""
+        self._title = title
+
+    def title(self):
+        """Return the title."""
+        return self._title
+
+
+class DummyHistory(object):
+
+    """A history which records the results."""
+
+    def __init__(self):
+        """Constructor."""
+        self.alive = []
+        self.dead = []
+
+    def setLinkAlive(self, url):
+        """Record a link which is alive."""
+        self.alive.append(url)
+        return False
+
+    def setLinkDead(self, url, error, page, weblink_dead_days):
+        """Record a dead link."""
+        self.dead.append((url, error, page.title()))
+
+
+class DummyLinkCheckPool(weblinkchecker.LinkCheckPool):
+
+    """A LinkCheckPool which does not access the links."""
+
+    def __init__(self, *args, **kwargs):
+        """Constructor."""
+        super(DummyLinkCheckPool, self).__init__(DummyHistory(), *args,
+                                                 **kwargs)
+        self.checked = []
+        self.started = []
+        self.running = {}
+        self.max_running = {}
+        self.release = threading.Event()
+
+    def check_url(self, url):
+        """Wait until released and return dead links for 'dead' hosts."""
+        host = url.split('/')[2]
+        with self._condition:
+            self.checked.append(url)
+            self.started.append((url, time.time()))
+            self.running[host] = self.running.get(host, 0) + 1
+            self.max_running[host] = max(self.max_running.get(host, 0),
+                                         self.running[host])
+        self.release.wait()
+        with self._condition:
+            self.running[host] -= 1
+        if host == 'dead':
+            return False, '404'
+        return True, None
+
+    def wait(self):
+        """Wait until all links are checked."""
+        self.release.set()
+        self.finish()
+        for thread in self._threads:
+            thread.join()
+
+
+class TestLinkCheckPool(TestCase):
+
+    """Test the LinkCheckPool without accessing the links."""
+
+    net = False
+
+    def test_coalescing(self):
+        """Test that a link is only checked once for several pages."""
+        pool = DummyLinkCheckPool(workers=2, host_delay=0)
+        pool.add(DummyPage('A'), 'http://dead/x')
+        pool.add(DummyPage('B'), 'http://dead/x')
+        pool.add(DummyPage('C'), 'http://alive/y')
+        pool.wait()
+        self.assertEqual(sorted(pool.checked),
+                         ['http://alive/y', 'http://dead/x'])
+        self.assertEqual(sorted(pool.history.dead),
+                         [('http://dead/x', '404', 'A'),
+                          ('http://dead/x', '404', 'B')])
+        self.assertEqual(pool.history.alive, ['http://alive/y'])
+        self.assertEqual(pool.remaining(), 0)
+
+    def test_cache(self):
+        """Test that results are reused until they expire."""
+        pool = DummyLinkCheckPool(workers=1, host_delay=0)
+        pool.release.set()
+        pool.add(DummyPage('A'), 'http://dead/x')
+        while not pool.history.dead:
+            time.sleep(0.01)
+        pool.add(DummyPage('B'), 'http://dead/x')
+        self.assertEqual(pool.checked, ['http://dead/x'])
+        self.assertEqual(len(pool.history.dead), 2)
+
+        pool.ttl = 0
+        pool.add(DummyPage('C'), 'http://dead/x')
+        pool.wait()
+        self.assertEqual(pool.checked, ['http://dead/x'] * 2)
+        self.assertEqual(len(pool.history.dead), 3)
+
+    def test_per_host(self):
+        """Test that a host does not use all the threads."""
+        pool = DummyLinkCheckPool(workers=4, per_host=1, host_delay=0)
+        for i in range(5):
+            pool.add(DummyPage('A'), 'http://slow/{0}'.format(i))
+        pool.add(DummyPage('A'), 'http://fast/')
+        # the link of the other host is checked while the first one waits
+        while len(pool.checked) < 2:
+            time.sleep(0.01)
+        self.assertCountEqual(pool.checked, ['http://slow/0', 'http://fast/'])
+        pool.wait()
+        self.assertEqual(len(pool.checked), 6)
+        self.assertEqual(pool.max_running, {'slow': 1, 'fast': 1})
+
+    def test_host_delay(self):
+        """Test that the checks of a host are delayed."""
+        pool = DummyLinkCheckPool(workers=3, per_host=3, host_delay=0.2)
+        pool.release.set()
+        pool.add(DummyPage('A'), 'http://slow/0')
+        pool.add(DummyPage('A'), 'http://slow/1')
+        pool.add(DummyPage('A'), 'http://fast/')
+        pool.wait()
+        started = dict(pool.started)
+        self.assertGreaterEqual(started['http://slow/1'],
+                                started['http://slow/0'] + 0.2)
+        # the other host is not delayed by the first one
+        self.assertLess(started['http://fast/'], started['http://slow/1'])
+
+    def test_prune(self):
+        """Test that hosts and results which are not needed are dropped."""
+        pool = DummyLinkCheckPool(workers=1, host_delay=0)
+        pool.max_cached = 2
+        pool.release.set()
+        for i in range(4):
+            pool.add(DummyPage('A'), 'http://host{0}/'.format(i))
+        pool.wait()
+        self.assertEqual(pool._active, {})
+        self.assertEqual(list(pool._started), [])
+        self.assertEqual(list(pool._cache), ['http://host2/', 'http://host3/'])
+
+        # expired results are dropped
+        pool = DummyLinkCheckPool(workers=1, host_delay=60, ttl=0)
+        pool.add(DummyPage('A'), 'http://host/')
+        pool.wait()
+        self.assertEqual(list(pool._started), ['host'])
+        self.assertEqual(list(pool._cache), [])
+
+
+class FakeResponse(object):
+
+    """A response of comms.http.fetch."""
+
+    def __init__(self, status, exception=None):
+        """Constructor."""
+        self.status = status
+        self.exception = exception
+        self.data = self
+        self.closed = False
+
+    def close(self):
+        """Close the streamed response."""
+        self.closed = True
+
+
+class TestCheckUrl(PatchingTestCase):
+
+    """Test checking a link with a stubbed http."""
+
+    net = False
+
+    def setUp(self):
+        """Create a pool and stub fetching urls."""
+        super(TestCheckUrl, self).setUp()
+        self.pool = weblinkchecker.LinkCheckPool(DummyHistory(), [404])
+        self.responses = {}
+        self.requests = []
+        self.patch(weblinkchecker.comms.http, 'fetch', self.fetch)
+
+    def fetch(self, url, method='GET', **kwargs):
+        """Return the response of the url for the method."""
+        self.requests.append((method, url))
+        response = self.responses[method, url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def test_head(self):
+        """Test a link which is alive with a HEAD request."""
+        self.responses['HEAD', 'http://a/'] = FakeResponse(200)
+        self.assertEqual(self.pool.check_url('http://a/'), (True, None))
+        self.assertEqual(self.requests, [('HEAD', 'http://a/')])
+
+    def test_get(self):
+        """Test that a GET request is used if HEAD does not succeed."""
+        get = FakeResponse(200)
+        self.responses['HEAD', 'http://a/'] = FakeResponse(405)
+        self.responses['GET', 'http://a/'] = get
+        self.responses['HEAD', 'http://b/'] = FakeResponse(None, ValueError())
+        self.responses['GET', 'http://b/'] = FakeResponse(500)
+        self.assertEqual(self.pool.check_url('http://a/'), (True, None))
+        self.assertTrue(get.closed)
+        self.assertEqual(self.pool.check_url('http://b/'), (False, '500'))
+        self.assertEqual(self.requests, [('HEAD', 'http://a/'),
+                                         ('GET', 'http://a/'),
+                                         ('HEAD', 'http://b/'),
+                                         ('GET', 'http://b/')])
+
+    def test_ignored(self):
+        """Test that an ignored HTTP status means that a link is alive."""
+        self.responses['HEAD', 'http://a/'] = FakeResponse(404)
+        self.assertEqual(self.pool.check_url('http://a/'), (True, None))
+
+    def test_errors(self):
+        """Test links which can not be checked or are invalid."""
+        self.responses['HEAD', 'http://a/'] = FakeResponse(
+            None, RequestsConnectionError())
+        self.assertEqual(self.pool.check_url('http://a/'), (None, None))
+        self.assertEqual(self.requests, [('HEAD', 'http://a/')])
+
+        self.patch(weblinkchecker.i18n, 'twtranslate',
+                   lambda site, twtitle, params: params['URL'])
+        self.pool.history.site = DummySite()
+        self.responses['HEAD', 'http://b/'] = InvalidURL()
+        self.assertEqual(self.pool.check_url('http://b/'),
+                         (False, 'http://b/'))
+
+
+class DummyFamily(object):
+
+    """A family which only has a name."""
+
+    name = 'wikipedia'
+
+
+class DummySite(object):
+
+    """A site which only has a family and a code."""
+
+    family = DummyFamily()
+    code = lang = 'en'
+
+
+class TestHistory(PatchingTestCase):
+
+    """Test the dead link history in a temporary directory."""
+
+    net = False
+
+    def setUp(self):
+        """Patch the data directory."""
+        super(TestHistory, self).setUp()
+        self.dirname = tempfile.mkdtemp()
+        self.patch(pywikibot.config, 'datafilepath',
+                   lambda *path: os.path.join(self.dirname, path[-1]))
+
+    def tearDown(self):
+        """Remove the data directory."""
+        shutil.rmtree(self.dirname)
+        super(TestHistory, self).tearDown()
+
+    def test_dead_and_alive(self):
+        """Test recording dead links and links which are alive again."""
+        history = weblinkchecker.History(None, site=DummySite())
+        history.setLinkDead('http://a/', '404', DummyPage('A'), 7)
+        # found again within an hour
+        history.setLinkDead('http://a/', '404', DummyPage('B'), 7)
+        history.setLinkDead('http://b/', '500', DummyPage('B'), 7)
+        self.assertEqual(history.entries('http://a/')[0][::2], ('A', '404'))
+        self.assertEqual(len(history.entries('http://a/')), 1)
+        self.assertEqual(history.pageTitles(), set(['A', 'B']))
+        self.assertEqual(history.pageTitles(1), set())
+
+        self.assertTrue(history.setLinkAlive('http://a/'))
+        self.assertFalse(history.setLinkAlive('http://a/'))
+        self.assertEqual(history.entries('http://a/'), [])
+        history.save()
+
+        history = weblinkchecker.History(None, site=DummySite())
+        self.assertEqual(history.pageTitles(), set(['B']))
+
+    def test_migration(self):
+        """Test importing the pickled history."""
+        old = {'http://a/': [('A', 1.0, '404'), ('B', 2.0, '404')],
+               'http://b/': [('C', time.time(), '500')]}
+        datfilename = os.path.join(self.dirname, 'deadlinks-wikipedia-en.dat')
+        with open(datfilename, 'wb') as f:
+            pickle.dump(old, f)
+        history = weblinkchecker.History(None, site=DummySite())
+        self.assertFalse(os.path.exists(datfilename))
+        self.assertEqual(history.entries('http://a/'), old['http://a/'])
+        self.assertEqual(history.pageTitles(1), set(['A', 'B']))
+        self.assertEqual(history.pageTitles(), set(['A', 'B', 'C']))
+        self.assertTrue(os.path.exists(datfilename + '.bak'))
+
+    def test_migration_failed(self):
+        """Test that a history which could not be imported stays."""
+        datfilename = os.path.join(self.dirname, 'deadlinks-wikipedia-en.dat')
+        warnings = []
+        self.patch(pywikibot, 'warning', warnings.append)
+        with open(datfilename, 'wb') as f:
+            f.write(b'broken')
+        history = weblinkchecker.History(None, site=DummySite())
+        self.assertEqual(len(warnings), 1)
+        self.assertIn('UnpicklingError', warnings[0])
+        self.assertTrue(os.path.exists(datfilename))
+        history.save()
+
+        # An entry of the wrong size, no link is imported
+        old = {'http://a/': [('A', 1.0, '404')], 'http://b/': [('B', 2.0)]}
+        with open(datfilename, 'wb') as f:
+            pickle.dump(old, f)
+        history = weblinkchecker.History(None, site=DummySite())
+        self.assertEqual(len(warnings), 2)
+        self.assertIn('ValueError', warnings[1])
+        self.assertEqual(history.pageTitles(), set())
+        self.assertTrue(os.path.exists(datfilename))
+        history.save()
+
+        # The existing database does not prevent the import
+        old['http://b/'] = [('B', 2.0, '500')]
+        with open(datfilename, 'wb') as f:
+            pickle.dump(old, f)
+        history = weblinkchecker.History(None, site=DummySite())
+        self.assertEqual(len(warnings), 2)
+        self.assertEqual(history.pageTitles(), set(['A', 'B']))
+        self.assertFalse(os.path.exists(datfilename))
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()